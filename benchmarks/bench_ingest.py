@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ bench_ingest.py
+
+ End-to-end benchmark of plugin ingestion through QgisRepo.update_plugin,
+ with per-stage timings, for stable, suffixed (-dev) and auth repos
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import argparse
+import functools
+import gc
+import os
+import shutil
+import sys
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    from .common import DEFAULT_CACHE_DIR, environment_info, format_table, \
+        peak_rss_mb, reset_peak_rss, temp_repo, write_json
+    from .zipgen import generate_plugins
+except ImportError:
+    from common import DEFAULT_CACHE_DIR, environment_info, format_table, \
+        peak_rss_mb, reset_peak_rss, temp_repo, write_json
+    from zipgen import generate_plugins
+
+from qgis_repo.repo import QgisPlugin, QgisRepo
+
+# (configuration, repo name, update_plugin kwargs)
+CONFIGS = OrderedDict([
+    ('stable', ('qgis', {})),
+    ('dev', ('qgis-dev', {})),  # ' DEV' name suffix, dated versions
+    ('auth', ('qgis', {'auth': True, 'auth_role': 'DesktopPro'})),
+])
+
+# (stage name, class, method) in pipeline order; none of them nest
+STAGES = [
+    ('validate_archive', QgisPlugin, '_validate_archive'),
+    ('validate_metadata', QgisPlugin, '_validate_metadata'),
+    ('update_metadata', QgisPlugin, '_update_metadata'),
+    ('move_archive', QgisPlugin, '_move_plugin_archive'),
+    ('extract_icon', QgisPlugin, '_extract_icon'),
+    ('update_zip', QgisPlugin, '_update_zip_archive'),
+    ('index_package', QgisPlugin, '_index_package'),
+    ('plugin_element', QgisPlugin, 'pyqgis_plugin_element'),
+    ('load_tree', QgisRepo, 'load_plugins_tree'),
+    ('remove_old', QgisRepo, 'remove_plugin_by_name'),
+    ('serialize_xml', QgisRepo, 'plugins_tree_xml'),
+    ('write_xml', QgisRepo, 'write_plugins_xml'),
+]
+
+
+@contextmanager
+def stage_timer(stages=STAGES):
+    """
+    Temporarily wrap pipeline methods, accumulating their wall time.
+    :return: OrderedDict stage name -> [calls, seconds]
+    """
+    totals = OrderedDict((name, [0, 0.0]) for name, _, _ in stages)
+    originals = []
+    for name, cls, attr in stages:
+        orig = cls.__dict__[attr]
+        originals.append((cls, attr, orig))
+
+        def _wrap(fn, acc):
+            @functools.wraps(fn)
+            def _timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    acc[0] += 1
+                    acc[1] += time.perf_counter() - start
+            return _timed
+
+        setattr(cls, attr, _wrap(orig, totals[name]))
+    try:
+        yield totals
+    finally:
+        for cls, attr, orig in originals:
+            setattr(cls, attr, orig)
+
+
+def plugin_archives(count, seed=0, max_size=2097152,
+                    cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Directory of cached synthetic plugin archives, generated if missing.
+    :rtype: (str, list[str])
+    """
+    zip_dir = os.path.join(cache_dir, 'plugins_{0}_{1}_{2}'.format(
+        count, seed, max_size))
+    done = os.path.join(zip_dir, '.complete')
+    if not os.path.exists(done):
+        if os.path.isdir(zip_dir):
+            shutil.rmtree(zip_dir)
+        generate_plugins(zip_dir, count, seed=seed, max_size=max_size)
+        open(done, 'w').close()
+    zips = sorted(z for z in os.listdir(zip_dir) if z.endswith('.zip'))
+    return zip_dir, zips
+
+
+def run_config(config, zip_dir, zips, mode='all'):
+    """
+    Ingest archives into a fresh repo of a configuration.
+    :param config: str Key of CONFIGS
+    :param mode: str 'all': one update_plugin('all') call, as for
+                 'plugins-xml.sh update <repo> all'; 'each': one call per
+                 archive, each writing plugins.xml, as for CI uploads
+    :rtype: dict
+    """
+    repo_name, kwargs = CONFIGS[config]
+    repo = temp_repo(repo_name)
+    try:
+        for z in zips:
+            shutil.copyfile(os.path.join(zip_dir, z),
+                            os.path.join(repo.upload_dir, z))
+        gc.collect()
+        reset_peak_rss()
+        with stage_timer() as stages:
+            start = time.perf_counter()
+            if mode == 'all':
+                ok = repo.update_plugin('all', **kwargs)
+            else:
+                ok = all(repo.update_plugin(z, **kwargs) for z in zips)
+            elapsed = time.perf_counter() - start
+        if not ok:
+            raise RuntimeError('Ingestion failed for config: {0}'
+                               .format(config))
+        timed = sum(s for _, s in stages.values())
+        result = {
+            'benchmark': 'ingest', 'config': config, 'mode': mode,
+            'plugins': len(zips), 'total_s': elapsed,
+            'plugins_per_sec': len(zips) / elapsed if elapsed else None,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': OrderedDict(
+                (name, {'calls': c, 'total_s': s})
+                for name, (c, s) in stages.items()),
+        }
+        result['stages']['other'] = {'calls': None,
+                                     'total_s': max(0.0, elapsed - timed)}
+        return result
+    finally:
+        shutil.rmtree(repo.temp_base)
+
+
+def report(results):
+    lines = []
+    rows = [[r['config'], r['mode'], r['plugins'], r['total_s'],
+             r['plugins_per_sec'], r['peak_rss_mb']] for r in results]
+    lines.append(format_table(
+        ['config', 'mode', 'plugins', 'total s', 'plugins/sec',
+         'peak RSS MiB'], rows))
+    for r in results:
+        lines.append('')
+        lines.append('Stages: {0} ({1})'.format(r['config'], r['mode']))
+        rows = []
+        for name, s in r['stages'].items():
+            mean_ms = s['total_s'] * 1000.0 / s['calls'] \
+                if s['calls'] else None
+            pct = 100.0 * s['total_s'] / r['total_s'] if r['total_s'] else 0
+            rows.append([name, s['calls'], s['total_s'], mean_ms, pct])
+        lines.append(format_table(
+            ['stage', 'calls', 'total s', 'mean ms', '% of total'], rows))
+    return '\n'.join(lines)
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Benchmark ingestion of synthetic plugin archives '
+                    'through QgisRepo.update_plugin')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='Number of plugin archives')
+    parser.add_argument('--configs', default=','.join(CONFIGS),
+                        help='Comma-separated configurations '
+                             '(default: %(default)s)')
+    parser.add_argument('--mode', choices=['all', 'each'], default='all',
+                        help="'all': one update of all uploads (default); "
+                             "'each': one update per archive")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-size', type=int, default=2097152,
+                        help='Max bytes of extra payload per plugin')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Where generated archives are kept')
+    parser.add_argument('--json', metavar='path',
+                        help='Also write results to a JSON file')
+    return parser
+
+
+def main(argv=None):
+    args = arg_parser().parse_args(argv)
+    zip_dir, zips = plugin_archives(args.count, seed=args.seed,
+                                    max_size=args.max_size,
+                                    cache_dir=args.cache_dir)
+    results = [run_config(c, zip_dir, zips, mode=args.mode)
+               for c in args.configs.split(',') if c]
+    print(report(results))
+    if args.json:
+        write_json({'environment': environment_info(), 'results': results},
+                   args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ bench_serve.py
+
+ In-process benchmark of the serve app's request handling, per route
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import sys
+
+try:
+    from .common import DEFAULT_CACHE_DIR, TEST_DATA_DIR, bench_op, \
+        environment_info, format_table, temp_repo, write_json
+    from .synth import synthetic_catalog
+except ImportError:
+    from common import DEFAULT_CACHE_DIR, TEST_DATA_DIR, bench_op, \
+        environment_info, format_table, temp_repo, write_json
+    from synth import synthetic_catalog
+
+from qgis_repo.server import create_app
+
+OPERATIONS = [
+    'filter_xml[cached]',
+    'filter_xml[uncached]',
+    'plugins_json',
+    'package',
+    'package_range',
+]
+
+
+def run_serve(size=1000, ops=None, min_time=1.0, max_runs=1000,
+              min_runs=1, qgis_version='1.8', cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Time requests through the serve app (Flask test client, no sockets)
+    for a repo with a synthetic catalog of size plugins.
+    :rtype: list[dict]
+    """
+    ops = ops or OPERATIONS
+    repo = temp_repo('qgis')
+    try:
+        shutil.copyfile(synthetic_catalog(size, cache_dir=cache_dir),
+                        repo.plugins_xml)
+        zip_name = 'test_plugin_1.0.1.zip'
+        zip_path = os.path.join(repo.packages_dir(), zip_name)
+        shutil.copyfile(os.path.join(TEST_DATA_DIR, 'plugins',
+                                     'test_plugin_1.zip'), zip_path)
+        repo.package_index.add('{0}/{1}'.format(repo.packages_subdir(),
+                                                zip_name), zip_path)
+        repo.package_index.write()
+
+        app = create_app(repo)
+        catalog = app.config['QGIS_REPO_CATALOG']
+        client = app.test_client()
+        xml_url = '/plugins/plugins.xml?qgis={0}'.format(qgis_version)
+        pkg_url = '/plugins/packages/{0}'.format(zip_name)
+
+        def _get(url, headers=None, status=200):
+            def _fn(_=None):
+                resp = client.get(url, headers=headers)
+                assert resp.status_code == status, resp.status_code
+                resp.get_data()
+                resp.close()
+            return _fn
+
+        cases = [
+            ('filter_xml[cached]', _get(xml_url), None),
+            ('filter_xml[uncached]', _get(xml_url), catalog.cache.clear),
+            ('plugins_json', _get('/plugins/plugins.json?limit=100'),
+             catalog.cache.clear),
+            ('package', _get(pkg_url), None),
+            ('package_range', _get(pkg_url, {'Range': 'bytes=100-'}, 206),
+             None),
+        ]
+        results = []
+        for op, fn, setup in cases:
+            if op not in ops:
+                continue
+            fn()  # warm up, e.g. the catalog's first parse
+            gc.collect()
+            stats = bench_op(fn, setup=setup, min_time=min_time,
+                             max_runs=max_runs, min_runs=min_runs)
+            stats.update({'benchmark': 'serve', 'op': op, 'size': size})
+            results.append(stats)
+        return results
+    finally:
+        shutil.rmtree(repo.temp_base)
+
+
+def report(results):
+    rows = [[r['op'], r['size'], r['runs'], r['mean_s'] * 1000.0,
+             r['ops_per_sec']] for r in results]
+    return format_table(['route', 'plugins', 'runs', 'mean ms', 'req/sec'],
+                        rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark serve request handling, in-process')
+    parser.add_argument('--size', type=int, default=1000,
+                        help='Plugins in the synthetic catalog')
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help='Seconds to repeat each request for')
+    parser.add_argument('--qgis-version', default='1.8')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--json', metavar='path',
+                        help='Also write results to a JSON file')
+    args = parser.parse_args(argv)
+    results = run_serve(args.size, min_time=args.min_time,
+                        qgis_version=args.qgis_version,
+                        cache_dir=args.cache_dir)
+    print(report(results))
+    if args.json:
+        write_json({'environment': environment_info(), 'results': results},
+                   args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ bench_startup.py
+
+ Benchmark of plugins-xml command startup (interpreter and import time),
+ per subcommand, with the modules each one loads
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+try:
+    from .common import DEFAULT_CACHE_DIR, REPO_DIR, environment_info, \
+        format_table, write_json
+except ImportError:
+    from common import DEFAULT_CACHE_DIR, REPO_DIR, environment_info, \
+        format_table, write_json
+
+SCRIPT = os.path.join(REPO_DIR, 'scripts', 'plugins-xml.py')
+
+SUBCOMMANDS = ['setup', 'update', 'watch', 'remove', 'promote', 'mirror',
+               'serve', 'package', 'reconstruct', 'unpack', 'rollback',
+               'clear']
+
+# Top-level modules only some subcommands need, so none should load at
+# startup
+HEAVY_MODULES = ['flask', 'werkzeug', 'jinja2', 'asyncio', 'wget',
+                 'urllib.request', 'http.client', 'tarfile', 'progress',
+                 'tracemalloc', 'pprint', 'xml.sax']
+
+# Runs the script as __main__ up to its argument parsing ('-h' exits), then
+# prints the modules loaded by then
+_MODULES_CODE = """\
+import json, runpy, sys
+sys.argv = {argv!r}
+try:
+    runpy.run_path({script!r}, run_name='__main__')
+except SystemExit:
+    pass
+sys.stderr.write('\\nMODULES ' + json.dumps(sorted(sys.modules)) + '\\n')
+"""
+
+
+def child_env(cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Environment for timed interpreters: bytecode cached (as once deployed)
+    in cache_dir, even if PYTHONDONTWRITEBYTECODE is set here.
+    :rtype: dict
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPYCACHEPREFIX'] = os.path.join(cache_dir, 'pycache')
+    env['PYTHONPATH'] = os.pathsep.join(
+        [REPO_DIR] + [p for p in env.get('PYTHONPATH', '').split(os.pathsep)
+                      if p])
+    return env
+
+
+def commands(subcommands=None):
+    """
+    :return: (label, argv) of commands to time; 'python' is the bare
+    interpreter, to subtract
+    :rtype: list[(str, list[str])]
+    """
+    cmds = [('python', [sys.executable, '-c', 'pass']),
+            ('import qgis_repo.repo',
+             [sys.executable, '-c', 'import qgis_repo.repo'])]
+    for sub in subcommands or SUBCOMMANDS:
+        cmds.append(('plugins-xml {0}'.format(sub),
+                     [sys.executable, SCRIPT, sub, '-h']))
+    return cmds
+
+
+def time_command(argv, runs=10, env=None):
+    """
+    :return: Wall seconds of each run, after one untimed warm-up run
+    :rtype: list[float]
+    """
+    times = []
+    for i in range(runs + 1):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=REPO_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if i:
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def loaded_modules(subcommand, env=None):
+    """
+    :param subcommand: str plugins-xml subcommand
+    :return: Modules loaded once the script has parsed its arguments
+    :rtype: list[str]
+    """
+    code = _MODULES_CODE.format(argv=[SCRIPT, subcommand, '-h'],
+                                script=SCRIPT)
+    proc = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR,
+                          env=env, check=True, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+    for line in proc.stderr.splitlines():
+        if line.startswith('MODULES '):
+            return json.loads(line[len('MODULES '):])
+    raise RuntimeError('No module list from: {0}'.format(proc.stderr))
+
+
+def heavy_modules(modules):
+    """
+    :param modules: list[str] Loaded modules
+    :return: HEAVY_MODULES that are loaded
+    :rtype: list[str]
+    """
+    loaded = set(modules)
+    return [m for m in HEAVY_MODULES if m in loaded]
+
+
+def run_startup(subcommands=None, runs=10, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    :rtype: list[dict]
+    """
+    env = child_env(cache_dir)
+    results = []
+    base = None
+    for label, argv in commands(subcommands):
+        times = time_command(argv, runs=runs, env=env)
+        stats = {
+            'benchmark': 'startup',
+            'op': label,
+            'runs': runs,
+            'min_s': min(times),
+            'median_s': statistics.median(times),
+        }
+        if base is None:
+            base = stats['min_s']
+        stats['over_python_s'] = max(0.0, stats['min_s'] - base)
+        if argv[1] == SCRIPT:
+            modules = loaded_modules(argv[2], env=env)
+            stats['modules'] = len(modules)
+            stats['heavy_modules'] = heavy_modules(modules)
+        results.append(stats)
+    return results
+
+
+def report(results):
+    rows = [[r['op'], r['runs'], r['min_s'] * 1000.0,
+             r['median_s'] * 1000.0, r['over_python_s'] * 1000.0,
+             r.get('modules'), ', '.join(r.get('heavy_modules', []))]
+            for r in results]
+    return format_table(['command', 'runs', 'min ms', 'median ms',
+                         'over python ms', 'modules', 'heavy modules'],
+                        rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark plugins-xml startup, per subcommand')
+    parser.add_argument('--subcommands', default=','.join(SUBCOMMANDS),
+                        help='Comma-separated subcommands '
+                             '(default: %(default)s)')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='Timed runs per command')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--json', metavar='path',
+                        help='Also write results to a JSON file')
+    args = parser.parse_args(argv)
+    results = run_startup([s for s in args.subcommands.split(',') if s],
+                          runs=args.runs, cache_dir=args.cache_dir)
+    print(report(results))
+    if args.json:
+        write_json({'environment': environment_info(), 'results': results},
+                   args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
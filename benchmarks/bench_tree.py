@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ bench_tree.py
+
+ Benchmarks of QgisPluginTree operations on synthetic catalogs, 1k to 1M
+ plugins, reporting ops/sec and peak RSS per operation and catalog size
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import shutil
+
+try:
+    from .common import REPO_DIR, DEFAULT_CACHE_DIR, bench_op, \
+        environment_info, format_table, write_json
+    from .synth import load_templates, synthetic_catalog, catalog_name, \
+        catalog_file_name
+except ImportError:
+    from common import REPO_DIR, DEFAULT_CACHE_DIR, bench_op, \
+        environment_info, format_table, write_json
+    from synth import load_templates, synthetic_catalog, catalog_name, \
+        catalog_file_name
+
+from qgis_repo.repo import QgisPluginTree
+from qgis_repo.catalog import QgisPluginCatalog
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+# in the order they are run; mutating operations come last
+OPERATIONS = [
+    'load_plugins_xml',
+    'find_plugin_by_name',
+    'find_plugin_by_package_name',
+    'plugins_sorted_by_name',
+    'plugins_sorted_by_version',
+    'to_xml',
+    'filter_xml[catalog]',
+    'filter_xml[flask_app]',
+    'merge_plugins',
+    'remove_plugin_by_name',
+]
+
+
+def _flask_app_module():
+    spec = importlib.util.spec_from_file_location(
+        'bench_flask_app_main',
+        os.path.join(REPO_DIR, 'flask_app', 'main.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_size(size, ops=None, skip=(), min_time=1.0, max_runs=1000,
+             min_runs=1, merge_count=100, qgis_version='1.8',
+             cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Benchmark operations on one synthetic catalog size, in this process.
+    :param size: int Number of plugins in the catalog
+    :param ops: list[str] Operations to run (default: all)
+    :param skip: list[str] Operations not to run
+    :param merge_count: int Plugins in the feed merged by merge_plugins,
+                        half of them duplicates of already present ones
+    :param qgis_version: str QGIS version to filter plugins.xml for
+    :rtype: list[dict]
+    """
+    ops = [o for o in (ops or OPERATIONS) if o not in skip]
+    templates = load_templates()
+    plugins_xml = synthetic_catalog(size, cache_dir=cache_dir,
+                                    templates=templates)
+    merge_xml = synthetic_catalog(merge_count,
+                                  start=max(0, size - merge_count // 2),
+                                  cache_dir=cache_dir, templates=templates)
+    last = size - 1
+    results = []
+
+    def _record(op, stats):
+        stats.update({'benchmark': 'tree', 'op': op, 'size': size})
+        results.append(stats)
+
+    def _run(op, fn, setup=None, runs=None):
+        if op not in ops:
+            return
+        gc.collect()
+        _record(op, bench_op(fn, setup=setup, min_time=min_time,
+                             max_runs=runs or max_runs,
+                             min_runs=min(min_runs, runs or max_runs)))
+
+    _run('load_plugins_xml', lambda: QgisPluginTree(plugins_xml))
+    tree = QgisPluginTree(plugins_xml)
+    plugins = tree.plugins()
+
+    _run('find_plugin_by_name', lambda: tree.find_plugin_by_name(
+        catalog_name(templates, last), versions='latest'))
+    _run('find_plugin_by_package_name',
+         lambda: tree.find_plugin_by_package_name(
+             catalog_file_name(templates, last)))
+    _run('plugins_sorted_by_name',
+         lambda: QgisPluginTree.plugins_sorted_by_name(plugins))
+    _run('plugins_sorted_by_version',
+         lambda: QgisPluginTree.plugins_sorted_by_version(plugins))
+    del plugins
+    _run('to_xml', tree.to_xml)
+
+    if 'filter_xml[catalog]' in ops:
+        catalog = QgisPluginCatalog(plugins_xml, check_interval=float('inf'))
+
+        def _filter(c):
+            c.cache.clear()  # time the filtering, not the response cache
+            return c.filtered_xml(qgis_version)
+        _run('filter_xml[catalog]', _filter, setup=lambda: catalog)
+        del catalog
+
+    if 'filter_xml[flask_app]' in ops:
+        doc_root = tempfile.mkdtemp(prefix='bench-docroot-')
+        try:
+            os.mkdir(os.path.join(doc_root, 'plugins'))
+            os.symlink(plugins_xml,
+                       os.path.join(doc_root, 'plugins', 'plugins.xml'))
+            client = _flask_app_module().app.test_client()
+            url = '/plugins/plugins.xml?qgis={0}'.format(qgis_version)
+
+            def _get():
+                resp = client.get(url, environ_base={
+                    'DOCUMENT_ROOT': doc_root})
+                assert resp.status_code == 200, resp.status_code
+            _run('filter_xml[flask_app]', _get)
+        finally:
+            shutil.rmtree(doc_root)
+
+    # mutating operations: each merge into a freshly loaded tree, so
+    # every run merges the same duplicates and new plugins
+    _run('merge_plugins', lambda t: t.merge_plugins(merge_xml),
+         setup=lambda: QgisPluginTree(plugins_xml))
+
+    # each run removes another plugin, from the already loaded tree
+    names = iter(catalog_name(templates, i)
+                 for i in range(last, -1, -max(1, size // max_runs)))
+    _run('remove_plugin_by_name',
+         lambda name: tree.remove_plugin_by_name(name, versions='all'),
+         setup=lambda: next(names), runs=min(max_runs, size))
+    return results
+
+
+def run_sizes(sizes, op_timeout=60.0, isolate=True, **kwargs):
+    """
+    Benchmark each catalog size, each in a fresh process by default, so peak
+    RSS of one size doesn't inflate the next. Once a single run of an
+    operation exceeds op_timeout seconds, it is skipped for larger sizes.
+    :rtype: list[dict]
+    """
+    results = []
+    slow = set()
+    for size in sorted(sizes):
+        if isolate:
+            cmd = [sys.executable, os.path.abspath(__file__), '--child',
+                   '--sizes', str(size), '--skip', ','.join(sorted(slow))]
+            for k, v in kwargs.items():
+                if v is None:
+                    continue
+                if k == 'ops':
+                    v = ','.join(v)
+                cmd += ['--{0}'.format(k.replace('_', '-')), str(v)]
+            out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE,
+                                 universal_newlines=True).stdout
+            size_results = json.loads(out)
+        else:
+            size_results = run_size(size, skip=slow, **kwargs)
+        for r in size_results:
+            if r['min_s'] > op_timeout:
+                slow.add(r['op'])
+        results.extend(size_results)
+        for op in sorted(slow):
+            if not any(r['op'] == op and r['size'] == size
+                       for r in size_results):
+                results.append({'benchmark': 'tree', 'op': op, 'size': size,
+                                'skipped': True})
+    return results
+
+
+def report(results):
+    rows = []
+    for r in results:
+        if r.get('skipped'):
+            rows.append([r['op'], r['size'], 'skipped', None, None, None])
+            continue
+        rows.append([r['op'], r['size'], r['runs'], r['mean_s'] * 1000.0,
+                     r['ops_per_sec'], r['peak_rss_mb']])
+    return format_table(
+        ['operation', 'plugins', 'runs', 'mean ms', 'ops/sec',
+         'peak RSS MiB'], rows)
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Benchmark QgisPluginTree operations on synthetic '
+                    'catalogs, seeded from tests/data')
+    parser.add_argument(
+        '--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+        help='Comma-separated catalog sizes, in plugins '
+             '(default: %(default)s)')
+    parser.add_argument(
+        '--ops', default=None,
+        help='Comma-separated operations to run (default: all): {0}'
+             .format(', '.join(OPERATIONS)))
+    parser.add_argument('--skip', default='', help=argparse.SUPPRESS)
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help='Seconds to repeat each operation for')
+    parser.add_argument('--max-runs', type=int, default=1000,
+                        help='Max runs per operation')
+    parser.add_argument('--merge-count', type=int, default=100,
+                        help='Plugins in the feed to merge (half duplicates)')
+    parser.add_argument('--qgis-version', default='1.8',
+                        help='QGIS version to filter plugins.xml for')
+    parser.add_argument('--op-timeout', type=float, default=60.0,
+                        help='Skip an operation for larger sizes once one '
+                             'run takes longer than this many seconds')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Where synthetic catalogs are kept')
+    parser.add_argument('--json', metavar='path',
+                        help='Also write results to a JSON file')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = arg_parser().parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    kwargs = dict(
+        ops=args.ops.split(',') if args.ops else None,
+        min_time=args.min_time, max_runs=args.max_runs,
+        merge_count=args.merge_count, qgis_version=args.qgis_version,
+        cache_dir=args.cache_dir)
+    if args.child:
+        skip = [s for s in args.skip.split(',') if s]
+        json.dump(run_size(sizes[0], skip=skip, **kwargs), sys.stdout)
+        return 0
+    results = run_sizes(sizes, op_timeout=args.op_timeout, **kwargs)
+    print(report(results))
+    if args.json:
+        write_json({'environment': environment_info(), 'results': results},
+                   args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ common.py
+
+ Shared timing, memory and reporting helpers for the benchmark scripts
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.abspath(os.path.dirname(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+TEST_DATA_DIR = os.path.join(REPO_DIR, 'tests', 'data')
+SEED_PLUGINS_XML = os.path.join(TEST_DATA_DIR, 'plugins_plugins-qgis-org.xml')
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'qgis-repo-bench')
+
+
+def _proc_status_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (IOError, ValueError, IndexError):
+        pass
+    return None
+
+
+def rss_mb():
+    """Current resident set size of this process, in MiB (or None)"""
+    kb = _proc_status_kb('VmRSS')
+    return None if kb is None else kb / 1024.0
+
+
+def reset_peak_rss():
+    """
+    Reset the peak RSS high-water mark, so peak_rss_mb() measures what
+    follows (Linux only; elsewhere the peak is process-wide).
+    :rtype: bool Whether the peak could be reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size, since reset_peak_rss() if supported, in MiB"""
+    kb = _proc_status_kb('VmHWM')
+    if kb is not None:
+        return kb / 1024.0
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return maxrss / (1048576.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def process_tree_cpu_s(pid):
+    """
+    User plus system CPU seconds used by a process and its live descendants
+    (and their reaped children), e.g. a pre-forking server (Linux only).
+    :rtype: float or None
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    ticks = float(os.sysconf('SC_CLK_TCK'))
+    procs = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/{0}/stat'.format(entry)) as f:
+                # comm may hold spaces or parens, fields follow the last ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (IOError, OSError, IndexError):
+            continue
+        procs[int(entry)] = (int(fields[1]),
+                             sum(int(v) for v in fields[11:15]) / ticks)
+    if pid not in procs:
+        return None
+    tree = {pid}
+    added = True
+    while added:
+        added = False
+        for p, (ppid, _) in procs.items():
+            if ppid in tree and p not in tree:
+                tree.add(p)
+                added = True
+    return sum(procs[p][1] for p in tree)
+
+
+def bench_op(fn, setup=None, min_time=1.0, max_runs=1000, min_runs=1):
+    """
+    Time repeated calls of fn, until min_time has been spent (or max_runs).
+    :param fn: callable Called with setup()'s result, if setup is given
+    :param setup: callable Untimed per-run preparation
+    :return: dict of runs, total_s, mean_s, min_s, ops_per_sec, peak_rss_mb
+    :rtype: dict
+    """
+    reset_peak_rss()
+    times = []
+    total = 0.0
+    while len(times) < min_runs or \
+            (total < min_time and len(times) < max_runs):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            fn(arg)
+        else:
+            fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+    mean = total / len(times)
+    return {
+        'runs': len(times),
+        'total_s': total,
+        'mean_s': mean,
+        'min_s': min(times),
+        'ops_per_sec': (1.0 / mean) if mean > 0 else float('inf'),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def format_table(headers, rows):
+    """
+    Plain-text table, right-aligning numbers.
+    :param headers: list[str]
+    :param rows: list[list]
+    :rtype: str
+    """
+    def _fmt(v):
+        if v is None:
+            return '-'
+        if isinstance(v, float):
+            if v >= 100:
+                return '{0:,.0f}'.format(v)
+            return '{0:.3g}'.format(v)
+        if isinstance(v, int):
+            return '{0:,}'.format(v)
+        return str(v)
+
+    cells = [[_fmt(v) for v in row] for row in rows]
+    widths = [max([len(h)] + [len(r[i]) for r in cells])
+              for i, h in enumerate(headers)]
+    lines = ['  '.join(h.ljust(w) for h, w in zip(headers, widths)),
+             '  '.join('-' * w for w in widths)]
+    for row, raw in zip(cells, rows):
+        lines.append('  '.join(
+            c.rjust(w) if isinstance(v, (int, float)) else c.ljust(w)
+            for c, v, w in zip(row, raw, widths)))
+    return '\n'.join(lines)
+
+
+def write_json(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.write('\n')
+
+
+def temp_repo(repo_name='qgis', base=None):
+    """
+    Set up a repo, as the tests do (see qgis_repo.testing.temp_repo()), in
+    a temp dir (or base dir); caller removes QgisRepo.temp_base
+    :rtype: qgis_repo.repo.QgisRepo
+    """
+    from qgis_repo.testing import temp_repo as _temp_repo
+    return _temp_repo(repo_name, base=base, prefix='qgis-repo-bench-')
@@ -0,0 +1,646 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ loadgen.py
+
+ Load generator simulating a QGIS startup storm against the serve
+ subcommand's servers and flask_app, over real sockets
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import argparse
+import http.client
+import math
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+try:
+    from .common import BENCH_DIR, DEFAULT_CACHE_DIR, REPO_DIR, \
+        environment_info, format_table, process_tree_cpu_s, temp_repo, \
+        write_json
+    from .bench_ingest import plugin_archives
+    from .synth import synthetic_catalog
+except ImportError:
+    from common import BENCH_DIR, DEFAULT_CACHE_DIR, REPO_DIR, \
+        environment_info, format_table, process_tree_cpu_s, temp_repo, \
+        write_json
+    from bench_ingest import plugin_archives
+    from synth import synthetic_catalog
+
+from lxml import etree
+
+# Servers the harness can start, for a temp repo
+TARGETS = [
+    'serve',             # Flask test server, as 'serve' without options
+    'serve-production',  # 'serve --production'
+    'serve-async',       # 'serve --async'
+    'flask_app',         # flask_app/main.py, plugins.xml filtering only
+]
+
+# Request kinds, and their default weights
+MIX = OrderedDict([
+    ('xml', 10),          # unfiltered /plugins/plugins.xml
+    ('xml_qgis', 50),     # /plugins/plugins.xml?qgis=#.#, as QGIS asks
+    ('conditional', 20),  # repeat request with If-None-Match/-Modified-Since
+    ('package', 10),      # plugin .zip download
+    ('icon', 10),         # plugin icon
+])
+
+# flask_app leaves files to the fronting web server
+FLASK_APP_KINDS = ['xml', 'xml_qgis', 'conditional']
+
+QGIS_VERSIONS = ['3.10', '3.16', '3.22', '3.28', '3.34', '3.40']
+XML_PATH = '/plugins/plugins.xml'
+
+
+def parse_mix(spec):
+    """
+    Request mix from e.g. 'xml=10,xml_qgis=50', omitted kinds not sent.
+    :rtype: OrderedDict
+    """
+    mix = OrderedDict()
+    for part in [p for p in spec.split(',') if p.strip()]:
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in MIX:
+            raise ValueError('Unknown request kind: {0}'.format(kind))
+        mix[kind] = float(weight) if weight else 1.0
+    return mix
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    k = max(0, int(math.ceil(pct / 100.0 * len(values))) - 1)
+    return values[min(k, len(values) - 1)]
+
+
+def _free_port():
+    s = socket.socket()
+    try:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+    finally:
+        s.close()
+
+
+def prepare_repo(base, size=5000, packages=20, max_size=262144,
+                 cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Set up a repo in base, with a synthetic catalog of size plugins plus
+    packages ingested (downloadable) synthetic plugins.
+    :return: request kind -> URL paths of files to download
+    :rtype: dict
+    """
+    repo = temp_repo('qgis', base)
+    repo.output = False
+    shutil.copyfile(synthetic_catalog(size, cache_dir=cache_dir),
+                    repo.plugins_xml)
+    zip_dir, zips = plugin_archives(packages, max_size=max_size,
+                                    cache_dir=cache_dir)
+    for z in zips:
+        shutil.copyfile(os.path.join(zip_dir, z),
+                        os.path.join(repo.upload_dir, z))
+    if not repo.update_plugin('all'):
+        raise RuntimeError('Ingestion of load test plugins failed')
+
+    def _paths(directory, ext):
+        paths = []
+        for root, _, files in os.walk(directory):
+            for f in files:
+                if f.lower().endswith(ext):
+                    rel = os.path.relpath(os.path.join(root, f),
+                                          repo.web_dir)
+                    paths.append('/' + rel.replace(os.sep, '/'))
+        return sorted(paths)
+
+    return {'package': _paths(repo.packages_dir(), '.zip'),
+            'icon': _paths(repo.icons_dir, '.png')}
+
+
+def discover_paths(base_url, timeout=30.0):
+    """
+    Package and icon URL paths of a running server, from its plugins.xml
+    (only those served from the same host).
+    :rtype: dict
+    """
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+    try:
+        conn.request('GET', XML_PATH)
+        resp = conn.getresponse()
+        data = resp.read()
+        if resp.status != 200:
+            raise RuntimeError('GET {0}: HTTP {1}'.format(XML_PATH,
+                                                          resp.status))
+    finally:
+        conn.close()
+    paths = {'package': set(), 'icon': set()}
+    for e in etree.fromstring(data).iter('pyqgis_plugin'):
+        for kind, tag in [('package', 'download_url'), ('icon', 'icon')]:
+            text = (e.findtext(tag) or '').strip()
+            if not text:
+                continue
+            u = urlsplit(text)
+            if not u.netloc:
+                paths[kind].add('/' + text.lstrip('/'))
+            elif u.netloc == url.netloc:
+                paths[kind].add(u.path)
+    return dict((k, sorted(v)) for k, v in paths.items())
+
+
+class ServerProcess(object):
+    """A target server for a prepared repo, in a child process"""
+
+    def __init__(self, target, base, workers=1, threads=8, verbose=False):
+        if target not in TARGETS:
+            raise ValueError('Unknown target: {0}'.format(target))
+        self.target = target
+        self.base = base
+        self.workers = workers
+        self.threads = threads
+        self.verbose = verbose
+        self.port = None
+        self.proc = None
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:{0}'.format(self.port)
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc is not None else None
+
+    def start(self, timeout=60.0):
+        self.port = _free_port()
+        if self.target == 'flask_app':
+            repo = temp_repo('qgis', self.base)
+            cmd = [sys.executable, os.path.join(REPO_DIR, 'flask_app',
+                                                'main.py'),
+                   '--host', '127.0.0.1', '--port', str(self.port),
+                   '--workers', str(self.workers),
+                   '--threads', str(self.threads), repo.web_dir]
+        else:
+            cmd = [sys.executable, os.path.join(BENCH_DIR, 'loadgen.py'),
+                   '--serve-child', self.target, '--base', self.base,
+                   '--port', str(self.port), '--workers', str(self.workers),
+                   '--threads', str(self.threads)]
+        out = None if self.verbose else subprocess.DEVNULL
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [REPO_DIR] + [p for p in [env.get('PYTHONPATH')] if p])
+        self.proc = subprocess.Popen(cmd, stdout=out, stderr=out, env=env)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError('Server {0} exited with status {1}'
+                                   .format(self.target, self.proc.returncode))
+            try:
+                socket.create_connection(('127.0.0.1', self.port), 1).close()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError('Server {0} did not start listening'
+                           .format(self.target))
+
+    def stop(self):
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        self.proc.send_signal(signal.SIGTERM)
+        try:
+            self.proc.wait(15)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def serve_child(target, base, port, workers=1, threads=8):
+    """Serve a prepared repo, as the serve subcommand does"""
+    from qgis_repo.catalog import QgisPluginCatalog
+    from qgis_repo.server import create_app
+
+    repo = temp_repo('qgis', base)
+    catalog = QgisPluginCatalog(repo.plugins_xml,
+                                package_index=repo.package_index)
+    if target == 'serve-async':
+        from qgis_repo.aioserver import serve_async
+        serve_async(repo, host='127.0.0.1', port=port, catalog=catalog)
+        return
+    app = create_app(repo, catalog)
+    if target == 'serve-production':
+        from qgis_repo.wsgi import serve
+        serve(app, host='127.0.0.1', port=port, workers=workers,
+              threads=threads, catalog=catalog)
+    else:
+        app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+class LoadGenerator(object):
+    """
+    Concurrent clients, each on its own (keep-alive) connection, sending
+    a weighted random mix of requests, as QGIS instances do on startup.
+    """
+
+    def __init__(self, base_url, paths, mix=None, qgis_versions=None,
+                 keepalive=True, timeout=30.0, seed=0):
+        """
+        :param base_url: str e.g. http://127.0.0.1:8008
+        :param paths: dict 'package'/'icon' -> list of URL paths
+        :param mix: dict Request kind -> weight, see MIX
+        :param keepalive: bool Reuse connections (if the server allows)
+        """
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.qgis_versions = qgis_versions or QGIS_VERSIONS
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.seed = seed
+        self.paths = {
+            'xml': [XML_PATH],
+            'xml_qgis': ['{0}?qgis={1}'.format(XML_PATH, v)
+                         for v in self.qgis_versions],
+            'package': list(paths.get('package', [])),
+            'icon': list(paths.get('icon', [])),
+        }
+        self.validators = OrderedDict()
+        self.mix = OrderedDict(
+            (k, w) for k, w in (mix or MIX).items()
+            if w > 0 and (k == 'conditional' or self.paths.get(k)))
+        if not self.mix:
+            raise ValueError('No requests to send in the mix')
+
+    def _connection(self):
+        return http.client.HTTPConnection(self.host, self.port,
+                                          timeout=self.timeout)
+
+    def prime(self):
+        """
+        Fetch each URL once, warming the server and collecting the
+        validators (ETag, Last-Modified) for conditional requests.
+        :return: URL paths that failed
+        :rtype: list[str]
+        """
+        failed = []
+        conn = self._connection()
+        try:
+            for kind in ['xml', 'xml_qgis', 'package', 'icon']:
+                # conditional requests repeat requests of the mix, or
+                # plugins.xml ones if only conditional requests are sent
+                if kind not in self.mix and not (
+                        kind.startswith('xml') and
+                        list(self.mix) == ['conditional']):
+                    continue
+                for path in self.paths[kind]:
+                    conn.request('GET', path)
+                    resp = conn.getresponse()
+                    resp.read()
+                    if resp.status != 200:
+                        failed.append(path)
+                        continue
+                    headers = {}
+                    if resp.getheader('ETag'):
+                        headers['If-None-Match'] = resp.getheader('ETag')
+                    if resp.getheader('Last-Modified'):
+                        headers['If-Modified-Since'] = \
+                            resp.getheader('Last-Modified')
+                    if headers:
+                        self.validators[path] = headers
+        finally:
+            conn.close()
+        return failed
+
+    def _request(self, kind, rng):
+        if kind == 'conditional':
+            if self.validators:
+                path = rng.choice(list(self.validators))
+                return path, dict(self.validators[path])
+            # nothing served validators: a plain repeat request
+            return rng.choice(self.paths['xml_qgis']), {}
+        return rng.choice(self.paths[kind]), {}
+
+    def run(self, concurrency=10, duration=10.0, requests=None,
+            server_pid=None):
+        """
+        Run the clients until duration seconds passed or requests were sent.
+        :param server_pid: int Server process, to measure its CPU time
+        :rtype: dict
+        """
+        kinds = list(self.mix)
+        weights = list(self.mix.values())
+        lock = threading.Lock()
+        go = threading.Event()
+        issued = [0]
+        records = []
+        state = {}
+
+        def _take():
+            if time.perf_counter() >= state['deadline']:
+                return False
+            with lock:
+                if requests is not None and issued[0] >= requests:
+                    return False
+                issued[0] += 1
+                return True
+
+        def _client(i):
+            rng = random.Random('{0}-{1}'.format(self.seed, i))
+            out = []
+            conn = None
+            go.wait()
+            while _take():
+                kind = rng.choices(kinds, weights)[0]
+                path, headers = self._request(kind, rng)
+                if not self.keepalive:
+                    headers['Connection'] = 'close'
+                start = time.perf_counter()
+                status, size = None, 0
+                try:
+                    if conn is None:
+                        conn = self._connection()
+                    conn.request('GET', path, headers=headers)
+                    resp = conn.getresponse()
+                    while True:
+                        chunk = resp.read(65536)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                    status = resp.status
+                    if not self.keepalive:
+                        conn.close()
+                        conn = None
+                except (OSError, http.client.HTTPException):
+                    if conn is not None:
+                        conn.close()
+                    conn = None
+                out.append((kind, status, time.perf_counter() - start, size))
+            if conn is not None:
+                conn.close()
+            with lock:
+                records.extend(out)
+
+        threads = [threading.Thread(target=_client, args=(i,), daemon=True)
+                   for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        cpu_before = process_tree_cpu_s(server_pid) if server_pid else None
+        client_cpu = time.process_time()
+        start = time.perf_counter()
+        state['deadline'] = start + (duration if duration else float('inf'))
+        go.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        client_cpu = time.process_time() - client_cpu
+        cpu_after = process_tree_cpu_s(server_pid) if server_pid else None
+        server_cpu = None
+        if cpu_before is not None and cpu_after is not None:
+            server_cpu = cpu_after - cpu_before
+        result = summarize(records, elapsed, server_cpu_s=server_cpu,
+                           client_cpu_s=client_cpu)
+        result.update({'concurrency': concurrency,
+                       'keepalive': self.keepalive,
+                       'mix': OrderedDict(self.mix),
+                       'conditional_urls': len(self.validators)})
+        return result
+
+
+def _ok(kind, status):
+    return status == 200 or (kind == 'conditional' and status == 304)
+
+
+def _latencies(records):
+    values = sorted(r[2] for r in records)
+    return OrderedDict([
+        ('mean_ms', 1000.0 * sum(values) / len(values) if values else None),
+        ('p50_ms', None if not values else 1000.0 * percentile(values, 50)),
+        ('p95_ms', None if not values else 1000.0 * percentile(values, 95)),
+        ('p99_ms', None if not values else 1000.0 * percentile(values, 99)),
+        ('max_ms', None if not values else 1000.0 * values[-1]),
+    ])
+
+
+def summarize(records, elapsed, server_cpu_s=None, client_cpu_s=None):
+    """
+    Summary of (kind, status, seconds, bytes) request records; status is
+    None for connection errors and timeouts.
+    :rtype: dict
+    """
+    total = len(records)
+    errors = sum(1 for k, s, _, _ in records if not _ok(k, s))
+    statuses = OrderedDict()
+    for _, s, _, _ in sorted(records, key=lambda r: r[1] or 0):
+        key = str(s) if s is not None else 'error'
+        statuses[key] = statuses.get(key, 0) + 1
+    result = OrderedDict([
+        ('requests', total),
+        ('elapsed_s', elapsed),
+        ('throughput_rps', total / elapsed if elapsed else None),
+        ('errors', errors),
+        ('error_rate', float(errors) / total if total else None),
+        ('not_modified', statuses.get('304', 0)),
+        ('bytes', sum(r[3] for r in records)),
+        ('statuses', statuses),
+        ('server_cpu_s', server_cpu_s),
+        ('server_cpu_ms_per_request',
+         1000.0 * server_cpu_s / total if server_cpu_s is not None and total
+         else None),
+        ('client_cpu_s', client_cpu_s),
+    ])
+    result.update(_latencies(records))
+    kinds = OrderedDict()
+    for kind in MIX:
+        recs = [r for r in records if r[0] == kind]
+        if not recs:
+            continue
+        kinds[kind] = OrderedDict([
+            ('requests', len(recs)),
+            ('errors', sum(1 for k, s, _, _ in recs if not _ok(k, s))),
+            ('not_modified', sum(1 for r in recs if r[1] == 304)),
+        ])
+        kinds[kind].update(_latencies(recs))
+    result['kinds'] = kinds
+    return result
+
+
+def report(results):
+    def _pct(v):
+        return None if v is None else '{0:.2f}%'.format(100.0 * v)
+
+    lines = [format_table(
+        ['target', 'clients', 'requests', 'req/sec', 'errors', 'p50 ms',
+         'p95 ms', 'p99 ms', 'server CPU ms/req'],
+        [[r['target'], r['concurrency'], r['requests'], r['throughput_rps'],
+          _pct(r['error_rate']), r['p50_ms'], r['p95_ms'], r['p99_ms'],
+          r['server_cpu_ms_per_request']] for r in results])]
+    for r in results:
+        lines.append('')
+        lines.append('Requests: {0}'.format(r['target']))
+        lines.append(format_table(
+            ['kind', 'requests', 'errors', '304s', 'p50 ms', 'p95 ms',
+             'p99 ms'],
+            [[k, v['requests'], v['errors'], v['not_modified'], v['p50_ms'],
+              v['p95_ms'], v['p99_ms']] for k, v in r['kinds'].items()]))
+        if r['client_cpu_s'] and r['elapsed_s'] and \
+                r['client_cpu_s'] > 0.9 * r['elapsed_s'] * (os.cpu_count()
+                                                             or 1):
+            lines.append('Note: the load generator was CPU bound; figures '
+                         'understate what the server can do')
+    return '\n'.join(lines)
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Load test plugins.xml and package serving, as on a '
+                    'QGIS startup storm, against a server started for a '
+                    'synthetic repo (or an already running one, with --url)')
+    parser.add_argument('--targets', default='serve-production',
+                        help='Comma-separated servers to start and test, of: '
+                             '{0} (default: %(default)s)'
+                             .format(', '.join(TARGETS)))
+    parser.add_argument('--url', metavar='http://host:port',
+                        help='Test a running server instead')
+    parser.add_argument('--server-pid', type=int,
+                        help='With --url, process to measure CPU time of '
+                             '(with its children)')
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Seconds to run for')
+    parser.add_argument('--requests', type=int,
+                        help='Stop after this many requests')
+    parser.add_argument('--mix', default=','.join(
+        '{0}={1}'.format(k, w) for k, w in MIX.items()),
+                        help='Request kinds and weights (default: '
+                             '%(default)s)')
+    parser.add_argument('--qgis-versions', default=','.join(QGIS_VERSIONS),
+                        help='QGIS versions for ?qgis= requests')
+    parser.add_argument('--no-keepalive', action='store_true',
+                        help='New connection per request')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='Per-request socket timeout, in seconds')
+    parser.add_argument('--size', type=int, default=5000,
+                        help='Plugins in the synthetic catalog')
+    parser.add_argument('--packages', type=int, default=20,
+                        help='Downloadable plugins ingested into the repo')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Server worker processes (serve-production, '
+                             'flask_app)')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Request threads per worker (serve-production, '
+                             'flask_app)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--verbose', action='store_true',
+                        help='Show server output')
+    parser.add_argument('--json', metavar='path',
+                        help='Also write results to a JSON file')
+    # internal: run a target server in this process
+    parser.add_argument('--serve-child', help=argparse.SUPPRESS)
+    parser.add_argument('--base', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    return parser
+
+
+def run_target(target, base, paths, mix, args):
+    if target == 'flask_app':
+        mix = OrderedDict((k, w) for k, w in mix.items()
+                          if k in FLASK_APP_KINDS)
+    with ServerProcess(target, base, workers=args.workers,
+                       threads=args.threads, verbose=args.verbose) as server:
+        gen = LoadGenerator(server.base_url, paths, mix=mix,
+                            qgis_versions=args.qgis_versions.split(','),
+                            keepalive=not args.no_keepalive,
+                            timeout=args.timeout, seed=args.seed)
+        failed = gen.prime()
+        if failed:
+            raise RuntimeError('{0}: priming requests failed: {1}'
+                               .format(target, ', '.join(failed[:5])))
+        result = gen.run(concurrency=args.concurrency,
+                         duration=args.duration, requests=args.requests,
+                         server_pid=server.pid)
+    result['target'] = target
+    return result
+
+
+def main(argv=None):
+    parser = arg_parser()
+    args = parser.parse_args(argv)
+    if args.serve_child:
+        serve_child(args.serve_child, args.base, args.port,
+                    workers=args.workers, threads=args.threads)
+        return 0
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = []
+    if args.url:
+        gen = LoadGenerator(args.url, discover_paths(args.url), mix=mix,
+                            qgis_versions=args.qgis_versions.split(','),
+                            keepalive=not args.no_keepalive,
+                            timeout=args.timeout, seed=args.seed)
+        gen.prime()
+        result = gen.run(concurrency=args.concurrency,
+                         duration=args.duration, requests=args.requests,
+                         server_pid=args.server_pid)
+        result['target'] = args.url
+        results.append(result)
+    else:
+        targets = [t for t in args.targets.split(',') if t]
+        for t in targets:
+            if t not in TARGETS:
+                parser.error('Unknown target: {0}'.format(t))
+        base = tempfile.mkdtemp(prefix='qgis-repo-load-')
+        try:
+            paths = prepare_repo(base, size=args.size,
+                                 packages=args.packages,
+                                 cache_dir=args.cache_dir)
+            for t in targets:
+                results.append(run_target(t, base, paths, mix, args))
+        finally:
+            shutil.rmtree(base)
+    print(report(results))
+    if args.json:
+        write_json({'environment': environment_info(), 'results': results},
+                   args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ run_benchmarks.py
+
+ Performance regression gate: runs the tree, ingestion and serving
+ benchmarks and compares them against a committed baseline
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from collections import OrderedDict
+
+try:
+    from .common import BENCH_DIR, DEFAULT_CACHE_DIR, SEED_PLUGINS_XML, \
+        bench_op, environment_info, format_table, write_json
+    from . import bench_tree, bench_ingest, bench_serve
+except ImportError:
+    from common import BENCH_DIR, DEFAULT_CACHE_DIR, SEED_PLUGINS_XML, \
+        bench_op, environment_info, format_table, write_json
+    import bench_tree
+    import bench_ingest
+    import bench_serve
+
+from lxml import etree
+
+from qgis_repo.repo import QgisPlugin
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_TOLERANCE = 0.5
+HOT_TOLERANCE = 0.3
+
+# Hot paths: a regression in these is what the gate is mostly for
+HOT_PATHS = [
+    'tree.merge_plugins',
+    'tree.to_xml',
+    'tree.filter_xml[catalog]',
+    'tree.filter_xml[flask_app]',
+    'serve.filter_xml[uncached]',
+    'ingest.update_zip_in_place',
+]
+
+# Small sizes, so the whole gate runs in about a minute
+TREE_SIZE = 5000
+TREE_OPS = ['load_plugins_xml', 'find_plugin_by_name', 'to_xml',
+            'filter_xml[catalog]', 'filter_xml[flask_app]', 'merge_plugins']
+INGEST_COUNT = 100
+INGEST_MAX_SIZE = 16384
+SERVE_SIZE = 5000
+
+
+def calibrate(runs=30):
+    """
+    Seconds for a fixed XML parse/serialize workload, to scale baseline
+    timings recorded on another machine (or under other load).
+    :rtype: float
+    """
+    parser = etree.XMLParser(strip_cdata=False, remove_blank_text=True)
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        tree = etree.parse(SEED_PLUGINS_XML, parser)
+        for _ in range(3):
+            etree.tostring(tree, pretty_print=True)
+        sum(len(e.get('name', '')) for e in tree.iter('pyqgis_plugin'))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _update_zip_in_place_metric(zip_dir, zips, min_time):
+    tmp_dir = tempfile.mkdtemp(prefix='bench-zip-')
+    try:
+        src = os.path.join(zip_dir, zips[0])
+        target = os.path.join(tmp_dir, zips[0])
+        package = zips[0].split('.')[0]
+        data = b'[general]\nname=Updated\nversion=1.0\n'
+
+        def _setup():
+            shutil.copyfile(src, target)
+
+        return bench_op(
+            lambda _: QgisPlugin._update_zip_in_place(
+                target, '{0}/metadata.txt'.format(package), data),
+            setup=_setup, min_time=min_time, max_runs=200, min_runs=5)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def collect(suites=('tree', 'ingest', 'serve'), min_time=0.5,
+            cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Run the gate's benchmarks.
+    :return: metric name -> seconds (best run, or total for ingestion)
+    :rtype: OrderedDict
+    """
+    metrics = OrderedDict()
+    if 'tree' in suites:
+        for r in bench_tree.run_size(TREE_SIZE, ops=TREE_OPS,
+                                     min_time=min_time, max_runs=50,
+                                     min_runs=3, merge_count=50,
+                                     cache_dir=cache_dir):
+            metrics['tree.{0}'.format(r['op'])] = r['min_s']
+    if 'ingest' in suites:
+        zip_dir, zips = bench_ingest.plugin_archives(
+            INGEST_COUNT, max_size=INGEST_MAX_SIZE, cache_dir=cache_dir)
+        for config in ['stable', 'dev']:
+            # best of two, ingestion is single-shot
+            metrics['ingest.{0}'.format(config)] = min(
+                bench_ingest.run_config(config, zip_dir, zips)['total_s']
+                for _ in range(2))
+        metrics['ingest.update_zip_in_place'] = _update_zip_in_place_metric(
+            zip_dir, zips, min_time)['min_s']
+    if 'serve' in suites:
+        for r in bench_serve.run_serve(SERVE_SIZE, min_time=min_time,
+                                       min_runs=3, cache_dir=cache_dir):
+            metrics['serve.{0}'.format(r['op'])] = r['min_s']
+    return metrics
+
+
+def best_of(*metric_sets):
+    """Per-metric best (lowest) of several collect() results"""
+    out = OrderedDict()
+    for metrics in metric_sets:
+        for name, value in metrics.items():
+            out[name] = value if name not in out else min(out[name], value)
+    return out
+
+
+def compare(baseline, metrics, calibration=None, tolerance_scale=1.0):
+    """
+    Compare metrics with a baseline, whose values are scaled by the ratio
+    of this machine's calibration time to the baseline's, if given.
+    :param baseline: dict As loaded from baseline.json
+    :param metrics: dict metric name -> seconds
+    :param tolerance_scale: float Multiplies every metric's tolerance
+    :return: (rows, regressions), rows being
+             [metric, expected, current, change, tolerance, status]
+    :rtype: (list[list], list[str])
+    """
+    scale = 1.0
+    if calibration and baseline.get('calibration_s'):
+        scale = calibration / baseline['calibration_s']
+    base_metrics = baseline.get('metrics', {})
+    rows = []
+    regressions = []
+    for name in list(base_metrics) + [m for m in metrics
+                                      if m not in base_metrics]:
+        base = base_metrics.get(name)
+        current = metrics.get(name)
+        if base is None:
+            rows.append([name, None, current, None, None, 'new'])
+            continue
+        tolerance = base.get('tolerance', baseline.get(
+            'default_tolerance', DEFAULT_TOLERANCE)) * tolerance_scale
+        if current is None:
+            rows.append([name, base['value'] * scale, None, None, tolerance,
+                         'not run'])
+            continue
+        expected = base['value'] * scale
+        change = (current - expected) / expected if expected else 0.0
+        if change > tolerance:
+            status = 'REGRESSED'
+            if name in HOT_PATHS:
+                status += ' (hot path)'
+            regressions.append(name)
+        elif change < -tolerance:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append([name, expected, current, change, tolerance, status])
+    return rows, regressions
+
+
+def report(rows, scale=None):
+    table = []
+    for name, expected, current, change, tolerance, status in rows:
+        table.append([
+            name,
+            None if expected is None else expected * 1000.0,
+            None if current is None else current * 1000.0,
+            None if change is None else '{0:+.1f}%'.format(change * 100.0),
+            None if tolerance is None else '{0:.0f}%'.format(
+                tolerance * 100.0),
+            status])
+    text = format_table(['metric', 'baseline ms', 'current ms', 'change',
+                         'tolerance', 'status'], table)
+    if scale is not None:
+        text = 'Baseline scaled by {0:.2f} (calibration ratio)\n{1}'.format(
+            scale, text)
+    return text
+
+
+def make_baseline(metrics, calibration, previous=None):
+    """
+    New baseline from metrics, keeping tolerances of a previous one.
+    :rtype: dict
+    """
+    prev_metrics = (previous or {}).get('metrics', {})
+    out = OrderedDict([
+        ('version', 1),
+        ('calibration_s', calibration),
+        ('default_tolerance', (previous or {}).get(
+            'default_tolerance', DEFAULT_TOLERANCE)),
+        ('environment', environment_info()),
+        ('metrics', OrderedDict()),
+    ])
+    for name, value in metrics.items():
+        tolerance = prev_metrics.get(name, {}).get(
+            'tolerance', HOT_TOLERANCE if name in HOT_PATHS
+            else out['default_tolerance'])
+        out['metrics'][name] = OrderedDict([
+            ('value', value), ('tolerance', tolerance),
+            ('hot', name in HOT_PATHS)])
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run benchmarks and fail if any metric regressed past '
+                    'its tolerance, compared to a baseline')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline JSON (default: %(default)s)')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Write the results as the new baseline, '
+                             'keeping existing tolerances')
+    parser.add_argument('--suites', default='tree,ingest,serve',
+                        help='Comma-separated suites (default: %(default)s)')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='Seconds to repeat each timed operation for')
+    parser.add_argument('--no-scale', action='store_true',
+                        help='Compare raw timings, without calibration')
+    parser.add_argument('--tolerance-scale', type=float, default=1.0,
+                        help='Multiply all tolerances, e.g. 2 on noisy hosts')
+    parser.add_argument('--retries', type=int, default=1,
+                        help='Times to re-run suites with regressed metrics '
+                             '(default: %(default)s)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--json', metavar='path',
+                        help='Also write current results to a JSON file')
+    args = parser.parse_args(argv)
+
+    suites = [x for x in args.suites.split(',') if x]
+    calibration = calibrate()
+    metrics = collect(suites=suites, min_time=args.min_time,
+                      cache_dir=args.cache_dir)
+    if args.update_baseline:
+        # a baseline is best of two, like a retried gate run
+        metrics = best_of(metrics, collect(
+            suites=suites, min_time=args.min_time, cache_dir=args.cache_dir))
+    # best of before and after, in case of load spikes
+    calibration = min(calibration, calibrate())
+
+    previous = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    if args.update_baseline:
+        write_json(make_baseline(metrics, calibration, previous),
+                   args.baseline)
+        print('Wrote baseline: {0}'.format(args.baseline))
+        return 0
+
+    if previous is None:
+        print('No baseline found at {0}; run with --update-baseline'
+              .format(args.baseline))
+        return 2
+
+    def _compare():
+        return compare(previous, metrics,
+                       calibration=None if args.no_scale else calibration,
+                       tolerance_scale=args.tolerance_scale)
+
+    rows, regressions = _compare()
+    for _ in range(args.retries):
+        if not regressions:
+            break
+        # re-measure, to tell regressions from noise
+        retry = sorted(set(r.split('.')[0] for r in regressions))
+        print('Re-running {0} for {1} regressed metric(s)...'.format(
+            ', '.join(retry), len(regressions)))
+        metrics = best_of(metrics, collect(
+            suites=retry, min_time=args.min_time, cache_dir=args.cache_dir))
+        calibration = min(calibration, calibrate())
+        rows, regressions = _compare()
+    if args.json:
+        write_json({'environment': environment_info(),
+                    'calibration_s': calibration, 'metrics': metrics},
+                   args.json)
+
+    scale = None if args.no_scale or not previous.get('calibration_s') \
+        else calibration / previous['calibration_s']
+    print(report(rows, scale))
+    if regressions:
+        print()
+        print('FAILED: {0} metric(s) regressed: {1}'.format(
+            len(regressions), ', '.join(regressions)))
+        return 1
+    print()
+    print('OK: no regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
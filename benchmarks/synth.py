@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ synth.py
+
+ Synthetic plugins.xml catalogs of any size, seeded from a real one
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import copy
+import os
+import re
+
+from html import escape
+
+from lxml import etree
+
+try:
+    from .common import SEED_PLUGINS_XML, DEFAULT_CACHE_DIR
+except ImportError:
+    from common import SEED_PLUGINS_XML, DEFAULT_CACHE_DIR
+
+_TOKEN = re.compile(r'@@(NAME|VERSION|FILE|URL)@@')
+
+XML_HEAD = (b"<?xml version = '1.0' encoding = 'UTF-8'?>\n"
+            b'<?xml-stylesheet type="text/xsl" href="plugins.xsl" ?>\n'
+            b'<plugins>\n')
+XML_TAIL = b'</plugins>\n'
+
+
+class _Template(object):
+    """A seed <pyqgis_plugin>, pre-serialized with substitution tokens"""
+
+    def __init__(self, elem):
+        self.name = elem.get('name')
+        self.version = elem.get('version')
+        file_name = elem.findtext('file_name') or 'plugin.zip'
+        # e.g. arpat.0.3.3.zip -> arpat
+        suffix = '.{0}.zip'.format(self.version)
+        self.stem = file_name[:-len(suffix)] if file_name.endswith(suffix) \
+            else os.path.splitext(file_name)[0]
+        elem = copy.deepcopy(elem)
+        elem.set('name', '@@NAME@@')
+        elem.set('version', '@@VERSION@@')
+        for tag, token in [('version', '@@VERSION@@'),
+                           ('file_name', '@@FILE@@'),
+                           ('download_url', '@@URL@@')]:
+            child = elem.find(tag)
+            if child is not None:
+                child.text = token
+        elem.tail = None
+        xml = etree.tostring(elem, encoding='UTF-8').decode('utf-8')
+        # alternating literal text and token names
+        self.parts = _TOKEN.split(xml)
+
+    def render(self, replica):
+        """
+        :param replica: int 0 renders the seed plugin as is
+        :rtype: str
+        """
+        if replica:
+            name = '{0} {1}'.format(self.name, replica)
+            stem = '{0}_{1}'.format(self.stem, replica)
+        else:
+            name, stem = self.name, self.stem
+        values = {
+            'NAME': name,
+            'VERSION': self.version,
+            'FILE': '{0}.{1}.zip'.format(stem, self.version),
+            'URL': 'http://localhost/plugins/packages/{0}.{1}.zip'.format(
+                stem, self.version),
+        }
+        out = []
+        for i, part in enumerate(self.parts):
+            out.append(escape(values[part]) if i % 2 else part)
+        return ''.join(out)
+
+
+def load_templates(seed_xml=SEED_PLUGINS_XML):
+    """
+    :rtype: list[_Template]
+    """
+    parser = etree.XMLParser(strip_cdata=False, remove_blank_text=True)
+    tree = etree.parse(seed_xml, parser)
+    return [_Template(e) for e in tree.getroot().iter('pyqgis_plugin')]
+
+
+def write_catalog(path, count, start=0, templates=None):
+    """
+    Write a plugins.xml of count plugins, numbered from start. Plugin i is
+    a copy of seed plugin i % len(seed), renamed for its replica number
+    i // len(seed), so the seed's mix of versions per plugin name, metadata
+    and sizes is kept at any scale.
+    :param path: str Output file
+    :param count: int Number of <pyqgis_plugin> elements
+    :param start: int Index of first plugin (overlapping ranges of two
+                  catalogs give duplicates, e.g. for merging)
+    :rtype: str path
+    """
+    if templates is None:
+        templates = load_templates()
+    n = len(templates)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(XML_HEAD)
+        batch = []
+        for i in range(start, start + count):
+            batch.append(templates[i % n].render(i // n))
+            if len(batch) >= 1000:
+                f.write('\n'.join(batch).encode('utf-8'))
+                f.write(b'\n')
+                batch = []
+        if batch:
+            f.write('\n'.join(batch).encode('utf-8'))
+            f.write(b'\n')
+        f.write(XML_TAIL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def synthetic_catalog(count, start=0, cache_dir=DEFAULT_CACHE_DIR,
+                      templates=None):
+    """
+    Path to a cached synthetic catalog, generated if missing.
+    :rtype: str
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    path = os.path.join(cache_dir, 'plugins_synthetic_{0}_{1}.xml'.format(
+        start, count))
+    if not os.path.exists(path):
+        write_catalog(path, count, start=start, templates=templates)
+    return path
+
+
+def catalog_name(templates, index):
+    """Plugin name of the plugin at index, as written by write_catalog"""
+    n = len(templates)
+    tmpl, replica = templates[index % n], index // n
+    return '{0} {1}'.format(tmpl.name, replica) if replica else tmpl.name
+
+
+def catalog_file_name(templates, index):
+    """Package file name of the plugin at index, as written by write_catalog"""
+    n = len(templates)
+    tmpl, replica = templates[index % n], index // n
+    stem = '{0}_{1}'.format(tmpl.stem, replica) if replica else tmpl.stem
+    return '{0}.{1}.zip'.format(stem, tmpl.version)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ zipgen.py
+
+ Generator of synthetic, valid plugin .zip archives, from the test plugins
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import zipfile
+
+try:
+    from .common import TEST_DATA_DIR
+except ImportError:
+    from common import TEST_DATA_DIR
+
+TEMPLATE_GLOB = os.path.join(TEST_DATA_DIR, 'plugins', 'test_plugin_*')
+
+# Probability of each metadata quirk, per generated plugin
+QUIRKS = {
+    'version_spaces': 0.1,  # e.g. 'version=version 1.2.3'
+    'quoted_name': 0.05,    # e.g. 'name="Synth Plugin 7"'
+    'no_icon': 0.15,        # no icon in archive or metadata
+    'dot_icon_path': 0.1,   # e.g. 'icon=./images/icon.png'
+    'versioned_zip': 0.3,   # e.g. synth_plugin_7.1.2.3.zip
+}
+
+
+class PluginTemplate(object):
+    """Files of a test plugin directory, e.g. tests/data/plugins/..."""
+
+    def __init__(self, plugin_dir):
+        self.package_name = os.path.basename(plugin_dir)
+        self.files = {}
+        for root, _, files in os.walk(plugin_dir):
+            for f in sorted(files):
+                path = os.path.join(root, f)
+                rel = os.path.relpath(path, plugin_dir).replace(os.sep, '/')
+                with open(path, 'rb') as fh:
+                    self.files[rel] = fh.read()
+        self.metadata = self.files.pop('metadata.txt').decode('utf-8')
+        self.icon = None
+        m = re.search(r'^icon\s*=\s*(\S+)', self.metadata, re.M)
+        if m:
+            self.icon = m.group(1)
+
+
+def load_templates(pattern=TEMPLATE_GLOB):
+    """
+    :rtype: list[PluginTemplate]
+    """
+    return [PluginTemplate(d) for d in sorted(glob.glob(pattern))
+            if os.path.isdir(d)]
+
+
+def _set_metadata(metadata, key, value):
+    if value is None:  # remove
+        return re.sub(r'^{0}\s*=.*\n'.format(key), '', metadata, flags=re.M)
+    return re.sub(r'^{0}\s*=.*$'.format(key),
+                  '{0}={1}'.format(key, value).replace('\\', r'\\'),
+                  metadata, count=1, flags=re.M)
+
+
+def _payload(rng, size):
+    """Somewhat compressible bytes, like real plugin sources and resources"""
+    words = [b'def ', b'self', b'return ', b'import ', b'qgis', b'layer',
+             b'    ', b'\n', b'# ', b'iface', b'=', b'(', b')', b':']
+    out = bytearray()
+    while len(out) < size:
+        if rng.random() < 0.2:
+            out.extend(rng.getrandbits(8 * 32).to_bytes(32, 'little'))
+        else:
+            out.extend(rng.choice(words))
+    return bytes(out[:size])
+
+
+def generate_plugin(out_dir, index, templates, seed=0, min_size=2048,
+                    max_size=2097152, max_members=40, quirks=None):
+    """
+    Write one valid plugin archive, varied by index and seed.
+    :param out_dir: str Directory to write the .zip into
+    :param index: int Plugin number, which names the plugin and package
+    :param templates: list[PluginTemplate]
+    :param min_size: int Min bytes of extra payload
+    :param max_size: int Max bytes of extra payload (log-uniform)
+    :param max_members: int Max number of extra archive members
+    :param quirks: dict Quirk probabilities, see QUIRKS
+    :return: (zip file name, dict of quirks applied)
+    :rtype: (str, dict)
+    """
+    quirks = QUIRKS if quirks is None else quirks
+    rng = random.Random('{0}-{1}'.format(seed, index))
+    tmpl = templates[index % len(templates)]
+    applied = dict((q, rng.random() < p) for q, p in quirks.items())
+    package = 'synth_plugin_{0}'.format(index)
+    version = '{0}.{1}.{2}'.format(rng.randint(0, 3), rng.randint(0, 20),
+                                   rng.randint(0, 99))
+    name = 'Synth Plugin {0}'.format(index)
+
+    metadata = tmpl.metadata
+    metadata = _set_metadata(
+        metadata, 'name', '"{0}"'.format(name) if applied.get('quoted_name')
+        else name)
+    metadata = _set_metadata(
+        metadata, 'version', 'version {0}'.format(version)
+        if applied.get('version_spaces') else version)
+    icon = tmpl.icon
+    if applied.get('no_icon'):
+        icon = None
+        metadata = _set_metadata(metadata, 'icon', None)
+    elif applied.get('dot_icon_path') and icon:
+        metadata = _set_metadata(metadata, 'icon', './' + icon)
+
+    zip_name = '{0}.{1}.zip'.format(package, version) \
+        if applied.get('versioned_zip') else '{0}.zip'.format(package)
+    zip_path = os.path.join(out_dir, zip_name)
+    members = rng.randint(0, max_members)
+    total = int(min_size * (max_size / float(min_size)) ** rng.random())
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('{0}/'.format(package), b'')
+        # __init__.py and metadata.txt first, as in typical packages
+        zf.writestr('{0}/__init__.py'.format(package),
+                    tmpl.files.get('__init__.py', b''))
+        zf.writestr('{0}/metadata.txt'.format(package),
+                    metadata.encode('utf-8'))
+        for rel, data in sorted(tmpl.files.items()):
+            if rel == '__init__.py' or (rel == tmpl.icon and icon is None):
+                continue
+            zf.writestr('{0}/{1}'.format(package, rel), data)
+        for m in range(members):
+            zf.writestr('{0}/lib/module_{1}.py'.format(package, m),
+                        _payload(rng, max(1, total // max(members, 1))))
+        if not members:
+            zf.writestr('{0}/resources.py'.format(package),
+                        _payload(rng, total))
+    return zip_name, applied
+
+
+def generate_plugins(out_dir, count, seed=0, templates=None, **kwargs):
+    """
+    Write count plugin archives into out_dir.
+    :return: list of .zip file names
+    :rtype: list[str]
+    """
+    if templates is None:
+        templates = load_templates()
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    return [generate_plugin(out_dir, i, templates, seed=seed, **kwargs)[0]
+            for i in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic plugin .zip archives from the '
+                    'tests/data/plugins/test_plugin_* templates')
+    parser.add_argument('out_dir', help='Directory to write archives into')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-size', type=int, default=2097152,
+                        help='Max bytes of extra payload per plugin')
+    parser.add_argument('--max-members', type=int, default=40,
+                        help='Max number of extra archive members')
+    args = parser.parse_args(argv)
+    zips = generate_plugins(args.out_dir, args.count, seed=args.seed,
+                            max_size=args.max_size,
+                            max_members=args.max_members)
+    print('Wrote {0} plugin archives to {1}'.format(len(zips), args.out_dir))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,9 +21,21 @@
 
 
 import os
-from flask import Flask, request, make_response, send_from_directory, abort
+import sys
+import threading
+from flask import Flask, request, make_response, send_from_directory, abort, g
 from lxml import etree
 
+# The qgis_repo package, if not installed, from this app's repo checkout
+try:
+    from qgis_repo.catalog import QgisPluginCatalog
+    from qgis_repo.metrics import ServingMetrics, CONTENT_TYPE
+except ImportError:
+    sys.path.insert(0, os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))))
+    from qgis_repo.catalog import QgisPluginCatalog
+    from qgis_repo.metrics import ServingMetrics, CONTENT_TYPE
+
 app = Flask(__name__)
 
 # Try to load auth module for custom auth
@@ -32,35 +44,25 @@ try:
 except ImportError:
     pass
 
+metrics = ServingMetrics()
 
-def vjust(s, level=3, delim='.', bitsize=3, fillchar=' ', force_zero=False):
-    """
-    Normalize a dotted version string.
-
-    1.12 becomes : 1.    12
-    1.1  becomes : 1.     1
-
-    if force_zero=True and level=2:
+# plugins.xml catalogs, by path, only re-parsed when the file changes
+catalogs = {}
+catalogs_lock = threading.Lock()
 
-    1.12 becomes : 1.    12.     0
-    1.1  becomes : 1.     1.     0
 
+def plugins_catalog(plugins_xml):
     """
-    if not s:
-        return s
-    nb = s.count(delim)
-    if nb < level:
-        if force_zero:
-            s += (level-nb) * (delim+'0')
-        else:
-            s += (level-nb) * delim
-    parts = []
-    for v in s.split(delim)[:level+1]:
-        if not v:
-            parts.append(v.rjust(bitsize, '#'))
-        else:
-            parts.append(v.rjust(bitsize, fillchar))
-    return delim.join(parts)
+    :param plugins_xml: str Path to plugins.xml
+    :rtype: QgisPluginCatalog
+    """
+    with catalogs_lock:
+        catalog = catalogs.get(plugins_xml)
+        if catalog is None:
+            catalog = catalogs[plugins_xml] = QgisPluginCatalog(plugins_xml)
+            return catalog
+    catalog.refresh()
+    return catalog
 
 
 @app.route("/plugins.xml")
@@ -74,34 +76,79 @@ def filter_xml():
     # Points to the real file, not the symlink
     xml_dir = os.path.join(request.environ.get('DOCUMENT_ROOT'), 'plugins')
     if not request.query_string:
-        xml_dir = os.path.join(request.environ.get('DOCUMENT_ROOT'), 'plugins')
         return send_from_directory(xml_dir, 'plugins.xml')
     elif request.args.get('qgis') is None:
         abort(404)
     else:
-        try:
-            xml = etree.parse(os.path.join(xml_dir, 'plugins.xml'))
-        except IOError:
+        plugins_xml = os.path.join(xml_dir, 'plugins.xml')
+        if not os.path.isfile(plugins_xml):
             return make_response("Cannot find plugins.xml", 404)
-        qgis_version = vjust(request.args.get('qgis'), force_zero=True)
-        for e in xml.xpath('//pyqgis_plugin'):
-            min_version = vjust(e.find('qgis_minimum_version').text, force_zero=True)
-            max_version = e.find('qgis_maximum_version').text
-            # max_version will be None if not defined, or can be empty
-            has_max_version = bool(max_version)
-            if has_max_version:
-                max_version = vjust(max_version, force_zero=True)
-                if max_version < min_version:
-                    # Error in metadata; set max unconstrained
-                    # Equal min/max versions are OK, i.e. plugin only works with that version
-                    has_max_version = False
-            if min_version > qgis_version or (has_max_version and max_version < qgis_version):
-                e.getparent().remove(e)
-        response = make_response(etree.tostring(xml, pretty_print=app.debug,
-                                                xml_declaration=True))
+        xml = plugins_catalog(plugins_xml).filtered_xml(
+            request.args.get('qgis'))
+        if app.debug:
+            # re-indented as a whole, for reading
+            tree = etree.fromstring(
+                xml, etree.XMLParser(remove_blank_text=True)).getroottree()
+            xml = etree.tostring(tree, pretty_print=True,
+                                 xml_declaration=True, encoding='UTF-8')
+        response = make_response(xml)
         response.headers['Content-type'] = 'text/xml'
         return response
 
 
+@app.before_request
+def metrics_begin():
+    g.metrics_start = metrics.begin()
+
+
+@app.after_request
+def metrics_end(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        nbytes = 0
+        if request.method != 'HEAD' and response.status_code != 304:
+            nbytes = response.content_length or 0
+        metrics.end(start, request.path, request.args.get('qgis'),
+                    response.status_code, nbytes)
+    return response
+
+
+@app.route("/metrics")
+def metrics_text():
+    response = make_response(metrics.render())
+    response.headers['Content-type'] = CONTENT_TYPE
+    return response
+
+
+def document_root_app(wsgi_app, document_root):
+    """Set DOCUMENT_ROOT for requests, as a fronting web server would"""
+    def _app(environ, start_response):
+        environ.setdefault('DOCUMENT_ROOT', document_root)
+        return wsgi_app(environ, start_response)
+    return _app
+
+
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', debug=True, port=8000)
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Serve plugins.xml filtering for a repo web directory')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Number of request threads per worker')
+    parser.add_argument('--debug', action='store_true',
+                        help='Run Flask test server in debug mode')
+    parser.add_argument('document_root', nargs='?',
+                        default=os.environ.get('DOCUMENT_ROOT', os.getcwd()),
+                        help='Repo web directory, e.g. www/qgis')
+    main_args = parser.parse_args()
+    doc_root = os.path.abspath(main_args.document_root)
+    app.wsgi_app = document_root_app(app.wsgi_app, doc_root)
+    if main_args.debug:
+        app.run(host=main_args.host, debug=True, port=main_args.port)
+    else:
+        from qgis_repo.wsgi import serve
+        serve(app, host=main_args.host, port=main_args.port,
+              workers=main_args.workers, threads=main_args.threads)
@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ aioserver.py
+
+ Asyncio-based HTTP server for a local plugins.xml-based QGIS plugin repo
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import asyncio
+import contextvars
+import logging
+import mimetypes
+import signal
+
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import urlsplit, unquote, parse_qs
+
+from .auth import AUTH_REALM, AuthError, canonical_path
+from .catalog import QgisPluginCatalog, CatalogQueryError
+from .httprange import resolve_request
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ServingMetrics
+from .repo import PackageIndex
+
+log = logging.getLogger(__name__)
+
+
+# [status, Content-Length] of the response being sent, per client task
+_response_info = contextvars.ContextVar('response_info', default=None)
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message=''):
+        Exception.__init__(self, message)
+        self.status = status
+        self.message = message
+
+
+class AsyncRequest(object):
+    """Parsed HTTP/1.x request line and headers"""
+
+    __slots__ = ('method', 'target', 'path', 'query', 'version', 'headers')
+
+    def __init__(self, method, target, version, headers):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        parts = urlsplit(target)
+        self.path = unquote(parts.path)
+        self.query = parts.query
+
+    def arg(self, name):
+        vals = parse_qs(self.query).get(name)
+        return vals[0] if vals else None
+
+    @property
+    def keep_alive(self):
+        conn = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return conn == 'keep-alive'
+        return conn != 'close'
+
+
+class AsyncRepoServer(object):
+    """
+    Serves the same routes as the 'serve' subcommand's Flask app, from a
+    single asyncio event loop. Files are streamed with non-blocking
+    loop.sendfile() (falling back to chunked reads, which like file opens
+    and stats run in the loop's executor), and every write awaits the
+    transport's drain(), so slow clients only cost a socket and a small
+    buffer, not a thread. Filtered plugins.xml responses come from the shared
+    catalog's cache.
+    """
+
+    server_software = 'qgis-repo-aio'
+    max_request_line = 65536
+    max_headers = 100
+
+    def __init__(self, repo, catalog=None, max_connections=10000,
+                 keepalive_timeout=15.0, chunk_size=262144,
+                 watch_interval=2.0, authorizer=None, metrics=None):
+        """
+        :param repo: QgisRepo
+        :param catalog: QgisPluginCatalog Shared, pre-parsed catalog (optional)
+        :param authorizer: PackageAuthorizer Enforce authorization of
+                           packages-auth downloads (optional)
+        :param metrics: ServingMetrics Shared metrics (optional)
+        :param max_connections: int Max concurrently open client connections
+        :param keepalive_timeout: float Seconds to wait for a client's request
+        :param chunk_size: int Bytes per read, when sendfile is unavailable
+        :param watch_interval: float Seconds between plugins.xml change checks
+        """
+        self.repo = repo
+        # not resolved here: it may be a symlink to a published generation,
+        # switched while serving
+        self.web_dir = os.path.abspath(repo.web_dir)
+        self.web_plugins_dir = os.path.abspath(repo.web_plugins_dir)
+        if catalog is None:
+            catalog = QgisPluginCatalog(repo.plugins_xml,
+                                        package_index=repo.package_index)
+        self.catalog = catalog
+        self.package_index = catalog.package_index
+        self.plugins_prefix = '/{0}/'.format(repo.plugins_subdir)
+        self.auth_prefix = '{0}{1}/'.format(self.plugins_prefix,
+                                            repo.packages_subdir(True))
+        self.authorizer = authorizer
+        self.metrics = metrics if metrics is not None \
+            else ServingMetrics(repo, catalog)
+        # reloads happen off the event loop, see _watch_catalog
+        self.catalog.check_interval = float('inf')
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.chunk_size = chunk_size
+        self.watch_interval = watch_interval
+        self.connections = 0
+        self._slots = None  # type: asyncio.Semaphore
+        self._server = None  # type: asyncio.AbstractServer
+
+    # ---- connection handling ----
+
+    async def handle_client(self, reader, writer):
+        """
+        :type reader: asyncio.StreamReader
+        :type writer: asyncio.StreamWriter
+        """
+        async with self._slots:
+            self.connections += 1
+            try:
+                while True:
+                    try:
+                        req = await asyncio.wait_for(
+                            self._read_request(reader),
+                            self.keepalive_timeout)
+                    except HttpError as e:
+                        await self._send_error(writer, e.status, e.message,
+                                               keep_alive=False)
+                        break
+                    if req is None:
+                        break
+                    keep_alive = await self._dispatch(req, writer)
+                    if not keep_alive:
+                        break
+            except (asyncio.TimeoutError, ConnectionError,
+                    asyncio.IncompleteReadError):
+                pass
+            finally:
+                self.connections -= 1
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except (ConnectionError, OSError):
+                    pass
+
+    @staticmethod
+    async def _read_line(reader, status):
+        try:
+            return await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            raise HttpError(status)
+
+    async def _read_request(self, reader):
+        line = await self._read_line(reader, HTTPStatus.REQUEST_URI_TOO_LONG)
+        if not line:
+            return None
+        try:
+            method, target, version = \
+                line.decode('iso-8859-1').rstrip('\r\n').split(' ')
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Malformed request line')
+        if not version.startswith('HTTP/1.'):
+            raise HttpError(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED)
+        headers = {}
+        while True:
+            hline = await self._read_line(
+                reader, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            if hline in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= self.max_headers:
+                raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            name, _, value = hline.decode('iso-8859-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return AsyncRequest(method, target, version, headers)
+
+    async def _dispatch(self, req, writer):
+        """
+        :type req: AsyncRequest
+        :rtype: bool Whether to keep the connection alive
+        """
+        keep_alive = req.keep_alive
+        if 'content-length' in req.headers or \
+                'transfer-encoding' in req.headers:
+            # request bodies are not supported; don't try to resync
+            keep_alive = False
+        start = self.metrics.begin()
+        info = [HTTPStatus.INTERNAL_SERVER_ERROR, 0]
+        token = _response_info.set(info)
+        try:
+            if req.method not in ('GET', 'HEAD'):
+                raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED)
+            await self.route(req, writer, keep_alive)
+        except HttpError as e:
+            await self._send_error(writer, e.status, e.message, keep_alive)
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            log.exception('Error handling %s %s: %s',
+                          req.method, req.target, e)
+            await self._send_error(writer, HTTPStatus.INTERNAL_SERVER_ERROR,
+                                   keep_alive=False)
+            return False
+        finally:
+            _response_info.reset(token)
+            self.metrics.end(start, req.path,
+                             req.arg('qgis') if req.query else None, info[0],
+                             0 if req.method == 'HEAD' else info[1])
+        return keep_alive
+
+    # ---- routes ----
+
+    async def route(self, req, writer, keep_alive):
+        head = req.method == 'HEAD'
+        if req.path == '/plugins.xml':
+            location = '/plugins/plugins.xml'
+            if req.query:
+                location += '?' + req.query
+            await self.send_response(
+                writer, HTTPStatus.FOUND, [('Location', location)],
+                keep_alive=keep_alive, head=head)
+        elif req.path == '/plugins/plugins.xml':
+            await self.filter_xml(req, writer, keep_alive)
+        elif req.path == '/plugins/plugins.json':
+            await self.catalog_json(req, writer, keep_alive)
+        elif req.path == '/metrics':
+            await self.send_response(
+                writer, HTTPStatus.OK,
+                [('Content-Type', METRICS_CONTENT_TYPE)],
+                self.metrics.render().encode('utf-8'),
+                keep_alive=keep_alive, head=head)
+        else:
+            await self.serve_resource(req, writer, keep_alive)
+
+    async def filter_xml(self, req, writer, keep_alive):
+        """
+        Filters plugins.xml removing incompatible plugins.
+        If no qgis parameter is found in the query string,
+        the whole plugins.xml file is served as is.
+        """
+        head = req.method == 'HEAD'
+        if not req.query:
+            await self.send_file(writer, self.repo.plugins_xml, keep_alive,
+                                 head=head)
+            return
+        qgis = req.arg('qgis')
+        if qgis is None:
+            raise HttpError(HTTPStatus.NOT_FOUND)
+        loop = asyncio.get_event_loop()
+        xml = await loop.run_in_executor(None, self.catalog.filtered_xml, qgis)
+        await self.send_response(writer, HTTPStatus.OK,
+                                 [('Content-Type', 'text/xml')], xml,
+                                 keep_alive=keep_alive, head=head)
+
+    async def catalog_json(self, req, writer, keep_alive):
+        def _split(name):
+            val = req.arg(name)
+            if not val:
+                return None
+            return [v for v in val.replace(' ', '').split(',') if v]
+
+        limit = req.arg('limit')
+        loop = asyncio.get_event_loop()
+        try:
+            data = await loop.run_in_executor(None, lambda: (
+                self.catalog.query_json(
+                    fields=_split('fields'),
+                    name_prefix=req.arg('name') or None,
+                    tags=_split('tags'),
+                    qgis=req.arg('qgis') or None,
+                    cursor=req.arg('cursor') or None,
+                    limit=int(limit) if limit else None)))
+        except (CatalogQueryError, ValueError) as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, str(e))
+        await self.send_response(writer, HTTPStatus.OK,
+                                 [('Content-Type', 'application/json')], data,
+                                 keep_alive=keep_alive,
+                                 head=req.method == 'HEAD')
+
+    def resolve_path(self, url_path):
+        """
+        Map a URL path to a file under the web directory (or its index).
+        :rtype: str
+        """
+        rel = url_path.lstrip('/')
+        web_dir = os.path.realpath(self.web_dir)
+        path = os.path.realpath(os.path.join(web_dir, rel))
+        if path != web_dir and not path.startswith(web_dir + os.sep):
+            raise HttpError(HTTPStatus.NOT_FOUND)
+        if os.path.isdir(path):
+            path = os.path.join(path, self.repo.html_index)
+        if not os.path.isfile(path):
+            raise HttpError(HTTPStatus.NOT_FOUND)
+        return path
+
+    async def authorize(self, req, meta):
+        """
+        Authorize a packages-auth download, only leaving the event loop if
+        the credentials' roles are not cached.
+        :rtype: int HTTP status, see PackageAuthorizer.authorize()
+        """
+        authorizer = self.authorizer
+        credentials = authorizer.credentials(req.headers.get('authorization'))
+        if credentials is None:
+            return HTTPStatus.UNAUTHORIZED
+        found, roles = authorizer.cached_roles(credentials)
+        if not found:
+            loop = asyncio.get_running_loop()
+            try:
+                roles = await loop.run_in_executor(
+                    None, authorizer.roles, credentials)
+            except AuthError as e:
+                log.warning('Auth backend failed: %s', e)
+                return HTTPStatus.SERVICE_UNAVAILABLE
+        return authorizer.decide(
+            roles, meta.get('roles') if meta is not None else None)
+
+    async def serve_resource(self, req, writer, keep_alive):
+        url_path = canonical_path(req.path)
+        if url_path is None:
+            raise HttpError(HTTPStatus.NOT_FOUND)
+        meta = None
+        if self.package_index is not None and \
+                url_path.startswith(self.plugins_prefix):
+            meta = self.package_index.get(
+                url_path[len(self.plugins_prefix):])
+        requires_auth = (url_path + '/').startswith(self.auth_prefix)
+        if self.authorizer is not None and requires_auth:
+            status = await self.authorize(req, meta)
+            if status != HTTPStatus.OK:
+                headers = []
+                if status == HTTPStatus.UNAUTHORIZED:
+                    headers.append(('WWW-Authenticate',
+                                    'Basic realm="{0}"'.format(AUTH_REALM)))
+                await self.send_response(writer, status, headers,
+                                         keep_alive=keep_alive)
+                return
+            if meta is None:
+                # unindexed, so its roles are unknown: fail closed
+                raise HttpError(HTTPStatus.NOT_FOUND)
+        if meta is not None:
+            await self.send_package(req, writer, keep_alive, url_path, meta,
+                                    private=requires_auth)
+            return
+        # realpath and stat calls block on slow disks: off the event loop
+        loop = asyncio.get_event_loop()
+        path = await loop.run_in_executor(None, self.resolve_path, url_path)
+        log.debug("Sending: {0}".format(path))
+        await self.send_file(writer, path, keep_alive,
+                             head=req.method == 'HEAD')
+
+    async def send_package(self, req, writer, keep_alive, url_path, meta,
+                           private=False):
+        """
+        Send a plugin package, with Range/If-Range and If-None-Match support,
+        using the size and hash from the repo's package index (no stat/hash).
+        :param url_path: str Canonical URL path of the package
+        :param private: bool Whether the package is role-restricted
+        """
+        status, offset, count, headers = resolve_request(
+            meta['size'], PackageIndex.etag(meta['sha256']),
+            range_header=req.headers.get('range'),
+            if_range=req.headers.get('if-range'),
+            if_none_match=req.headers.get('if-none-match'))
+        headers.append(('Last-Modified', formatdate(meta['mtime'],
+                                                    usegmt=True)))
+        if self.authorizer is not None and private:
+            headers.append(('Cache-Control', 'private'))
+        if status not in (200, 206):
+            await self.send_response(writer, status, headers,
+                                     keep_alive=keep_alive)
+            return
+        path = os.path.join(self.web_dir, url_path.lstrip('/'))
+        await self.send_file(writer, path, keep_alive,
+                             head=req.method == 'HEAD', status=status,
+                             content_type='application/zip',
+                             extra_headers=headers, offset=offset,
+                             count=count, size=meta['size'])
+
+    # ---- response writing ----
+
+    def _head_bytes(self, status, headers, keep_alive):
+        status = HTTPStatus(status)
+        info = _response_info.get()
+        if info is not None:
+            info[0] = status.value
+            info[1] = next((int(v) for k, v in headers
+                            if k == 'Content-Length'), 0)
+        lines = ['HTTP/1.1 {0} {1}'.format(status.value, status.phrase),
+                 'Server: {0}'.format(self.server_software),
+                 'Date: {0}'.format(formatdate(usegmt=True)),
+                 'Connection: {0}'.format(
+                     'keep-alive' if keep_alive else 'close')]
+        lines.extend('{0}: {1}'.format(k, v) for k, v in headers)
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1')
+
+    async def send_response(self, writer, status, headers, body=b'',
+                            keep_alive=True, head=False):
+        """
+        :type writer: asyncio.StreamWriter
+        """
+        headers = list(headers) + [('Content-Length', str(len(body)))]
+        writer.write(self._head_bytes(status, headers, keep_alive))
+        if body and not head:
+            writer.write(body)
+        await writer.drain()
+
+    async def _send_error(self, writer, status, message='', keep_alive=True):
+        body = '{0} {1}\n{2}'.format(
+            int(status), HTTPStatus(status).phrase, message).encode('utf-8')
+        await self.send_response(
+            writer, status, [('Content-Type', 'text/plain; charset=utf-8')],
+            body, keep_alive=keep_alive)
+
+    async def send_file(self, writer, path, keep_alive=True, head=False,
+                        status=HTTPStatus.OK, content_type=None,
+                        extra_headers=None, offset=0, count=None, size=None):
+        """
+        Stream (part of) a file, without blocking the event loop on slow
+        clients; the transport's buffer limits apply backpressure.
+        If the file's size is passed, the file is not stat'ed. The file is
+        opened, and read if sendfile is unavailable, off the event loop.
+        :type writer: asyncio.StreamWriter
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            f, st = await loop.run_in_executor(
+                None, self._open_file, path, size is None)
+        except OSError:
+            raise HttpError(HTTPStatus.NOT_FOUND)
+        with f:
+            headers = []
+            if st is not None:
+                size = st.st_size
+                headers.append(
+                    ('Last-Modified', formatdate(st.st_mtime, usegmt=True)))
+            if count is None:
+                count = size - offset
+            if content_type is None:
+                content_type, encoding = mimetypes.guess_type(path)
+                if encoding:
+                    headers.append(('Content-Encoding', encoding))
+            headers.append(
+                ('Content-Type', content_type or 'application/octet-stream'))
+            headers.append(('Content-Length', str(count)))
+            headers.extend(extra_headers or [])
+            writer.write(self._head_bytes(status, headers, keep_alive))
+            await writer.drain()
+            if head or count == 0:
+                return
+            try:
+                await loop.sendfile(writer.transport, f, offset, count,
+                                    fallback=False)
+            except (NotImplementedError, RuntimeError, AttributeError):
+                await self._copy_file(writer, f, offset, count)
+
+    @staticmethod
+    def _open_file(path, stat):
+        """
+        :param stat: bool Whether to stat the file too
+        :return: The file opened for reading, and its stat (or None)
+        :rtype: (io.BufferedReader, os.stat_result | None)
+        """
+        f = open(path, 'rb')
+        try:
+            return f, os.fstat(f.fileno()) if stat else None
+        except OSError:
+            f.close()
+            raise
+
+    async def _copy_file(self, writer, f, offset, count):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, f.seek, offset)
+        remaining = count
+        while remaining > 0:
+            chunk = await loop.run_in_executor(
+                None, f.read, min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            writer.write(chunk)
+            await writer.drain()
+
+    # ---- server lifecycle ----
+
+    async def _watch_catalog(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                if await loop.run_in_executor(None, self.catalog.reload):
+                    log.info('Reloaded plugins.xml (generation %s)',
+                             self.catalog.generation)
+            except Exception as e:
+                log.warning('Reloading plugins.xml failed: %s', e)
+
+    async def start(self, host='127.0.0.1', port=8008, backlog=1024):
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self._server = await asyncio.start_server(
+            self.handle_client, host, int(port), backlog=backlog,
+            limit=self.max_request_line + 2)
+        return self._server
+
+    async def serve_forever(self, host='127.0.0.1', port=8008):
+        server = await self.start(host, port)
+        watcher = asyncio.ensure_future(self._watch_catalog())
+        loop = asyncio.get_event_loop()
+        stop = loop.create_future()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, stop.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass
+        log.warning('Serving (asyncio) on http://%s:%s/', host, port)
+        try:
+            async with server:
+                await server.start_serving()
+                try:
+                    await stop
+                except asyncio.CancelledError:
+                    pass
+        finally:
+            watcher.cancel()
+
+
+def serve_async(repo, host='127.0.0.1', port=8008, catalog=None, **kwargs):
+    """
+    Serve a repo from an asyncio event loop, until SIGTERM/SIGINT.
+    :param repo: QgisRepo
+    :param catalog: QgisPluginCatalog Shared, pre-parsed catalog (optional)
+    :param kwargs: Extra AsyncRepoServer arguments
+    """
+    server = AsyncRepoServer(repo, catalog=catalog, **kwargs)
+    asyncio.run(server.serve_forever(host, port))
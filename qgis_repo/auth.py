@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ auth.py
+
+ Pluggable authorization of role-restricted plugin package downloads
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import base64
+import binascii
+import hashlib
+import importlib
+import json
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from .repo import Error
+
+log = logging.getLogger(__name__)
+
+AUTH_REALM = 'QGIS plugin repository'
+
+
+class AuthError(Error):
+    pass
+
+
+def canonical_path(path):
+    """
+    Canonical form of a decoded URL path, so package index lookups and
+    packages-auth prefix checks are done on the very same path, whatever
+    the spelling of the request (e.g. '//' or '/./', or '%2F' once
+    decoded).
+    :param path: str URL path, already percent-decoded
+    :return: path without empty or '.' segments (keeping a leading '/'),
+             or None if it has '..' segments
+    :rtype: str | None
+    """
+    segments = path.split('/')
+    if '..' in segments:
+        return None
+    lead = '/' if path.startswith('/') else ''
+    return lead + '/'.join(s for s in segments if s not in ('', '.'))
+
+
+class AuthBackend(object):
+    """
+    Base class of authorization backends. Subclasses look up the roles
+    granted to a set of request credentials, e.g. by asking a remote
+    subscription service. Lookups may block; results are cached by
+    PackageAuthorizer, so backends need not cache themselves.
+    """
+
+    def roles(self, credentials):
+        """
+        :param credentials: str Bearer token, or 'user:password' for Basic
+        :return: Roles granted to the credentials, or None if they are not
+                 valid (unknown, expired, etc.)
+        :rtype: set[str] | None
+        :raises AuthError: if the backend could not decide, e.g. it is down
+        """
+        raise NotImplementedError
+
+
+class LocalAuthBackend(AuthBackend):
+    """
+    Stand-in backend, with a fixed mapping of credentials to roles, for
+    testing and small local deployments. E.g. as a JSON file:
+
+        {"tokens": {"s3cr3t": ["DesktopBasic"],
+                    "alice:passw0rd": ["DesktopBasic", "DesktopPro"]}}
+    """
+
+    def __init__(self, tokens=None):
+        """
+        :param tokens: dict Credentials -> list of roles
+        """
+        self.tokens = dict(
+            (k, frozenset(v)) for k, v in (tokens or {}).items())
+        self.lookups = 0
+
+    @classmethod
+    def from_file(cls, json_path):
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            raise AuthError("Could not read auth tokens file '{0}': {1}"
+                            .format(json_path, e))
+        return cls(data.get('tokens', {}))
+
+    def roles(self, credentials):
+        self.lookups += 1
+        return self.tokens.get(credentials)
+
+
+def load_backend(spec):
+    """
+    Load an authorization backend from a command line spec: either a
+    LocalAuthBackend JSON tokens file, or 'package.module:factory', where
+    factory is an AuthBackend subclass or a callable returning an instance.
+    :param spec: str
+    :rtype: AuthBackend
+    """
+    if spec.endswith('.json'):
+        return LocalAuthBackend.from_file(spec)
+    mod_name, _, attr = spec.partition(':')
+    if not attr:
+        raise AuthError("Auth backend spec must be a .json tokens file or "
+                        "'module:factory': {0}".format(spec))
+    try:
+        factory = getattr(importlib.import_module(mod_name), attr)
+    except (ImportError, AttributeError) as e:
+        raise AuthError("Could not load auth backend '{0}': {1}"
+                        .format(spec, e))
+    backend = factory()
+    if not isinstance(backend, AuthBackend) and \
+            not callable(getattr(backend, 'roles', None)):
+        raise AuthError("Not an auth backend: {0}".format(spec))
+    return backend
+
+
+class TtlCache(object):
+    """
+    Small, thread-safe, size-bounded LRU cache whose entries also expire,
+    with hit/miss counters. Unlike LruCache, a cached None is a hit.
+    """
+
+    def __init__(self, max_size=1024, ttl=300.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """
+        :return: (found, value)
+        :rtype: (bool, object)
+        """
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return False, None
+            if expires <= self.clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, value, ttl=None):
+        expires = self.clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class PackageAuthorizer(object):
+    """
+    Decides whether a request may download a package from packages-auth,
+    caching each credentials' roles for a bounded time, so most requests
+    never reach the backend. Invalid credentials are cached for a shorter
+    time, so newly granted access is picked up quickly. Credentials are only
+    kept as a hash.
+    """
+
+    def __init__(self, backend, cache_size=1024, ttl=300.0,
+                 negative_ttl=30.0):
+        """
+        :param backend: AuthBackend
+        :param cache_size: int Max number of cached credentials
+        :param ttl: float Seconds to cache the roles of valid credentials
+        :param negative_ttl: float Seconds to cache invalid credentials
+        """
+        self.backend = backend
+        self.negative_ttl = negative_ttl
+        self.cache = TtlCache(max_size=cache_size, ttl=ttl)
+
+    @staticmethod
+    def credentials(authorization):
+        """
+        Extract credentials from an Authorization header value.
+        :param authorization: str e.g. 'Bearer xxx' or 'Basic dXNlcjpwYXNz'
+        :return: token, 'user:password', or None if missing or malformed
+        :rtype: str | None
+        """
+        if not authorization:
+            return None
+        scheme, _, value = authorization.strip().partition(' ')
+        scheme = scheme.lower()
+        value = value.strip()
+        if not value:
+            return None
+        if scheme == 'bearer':
+            return value
+        if scheme == 'basic':
+            try:
+                return base64.b64decode(value, validate=True)\
+                    .decode('utf-8')
+            except (binascii.Error, UnicodeDecodeError):
+                return None
+        return None
+
+    @staticmethod
+    def _cache_key(credentials):
+        return hashlib.sha256(credentials.encode('utf-8')).digest()
+
+    def cached_roles(self, credentials):
+        """
+        Roles of credentials, if cached, without calling the backend.
+        :rtype: (bool, set[str] | None) (found, roles)
+        """
+        return self.cache.get(self._cache_key(credentials))
+
+    def roles(self, credentials):
+        """
+        Roles of credentials, from the cache or else the backend (may block).
+        :rtype: set[str] | None
+        """
+        key = self._cache_key(credentials)
+        found, roles = self.cache.get(key)
+        if found:
+            return roles
+        roles = self.backend.roles(credentials)
+        if roles is None:
+            self.cache.put(key, None, ttl=self.negative_ttl)
+        else:
+            roles = frozenset(roles)
+            self.cache.put(key, roles)
+        return roles
+
+    @staticmethod
+    def decide(roles, required_roles):
+        """
+        :param roles: set[str] | None Roles of the credentials (None: invalid)
+        :param required_roles: list[str] Any one of these grants access;
+                               empty or None: any valid credentials do
+        :return: HTTP status, 200, 401 or 403
+        :rtype: int
+        """
+        if roles is None:
+            return 401
+        if required_roles and not roles.intersection(required_roles):
+            return 403
+        return 200
+
+    def authorize(self, authorization, required_roles=None):
+        """
+        :param authorization: str Authorization header value, or None
+        :param required_roles: list[str] See decide()
+        :return: HTTP status, 200, 401 or 403 (503 if the backend failed)
+        :rtype: int
+        """
+        credentials = self.credentials(authorization)
+        if credentials is None:
+            return 401
+        try:
+            roles = self.roles(credentials)
+        except AuthError as e:
+            log.warning('Auth backend failed: %s', e)
+            return 503
+        return self.decide(roles, required_roles)
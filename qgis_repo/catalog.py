@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ catalog.py
+
+ Pre-parsed, in-memory model of a repo's plugins.xml, for serving
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import base64
+import bisect
+import json
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from lxml import etree
+
+from .repo import QgisPluginTree, Error, vjust
+
+log = logging.getLogger(__name__)
+
+
+class CatalogQueryError(Error):
+    pass
+
+
+def version_compatible(qv_min, qv_max, qgis_version):
+    """
+    Whether a plugin's (vjust-normalized) min/max QGIS versions bracket a
+    (vjust-normalized) QGIS version. Missing bounds are unconstrained, as
+    is a max below the min (an error in the plugin's metadata); equal
+    bounds are fine, i.e. the plugin only works with that version.
+    :rtype: bool
+    """
+    if qv_min and qv_min > qgis_version:
+        return False
+    if qv_max and qv_max < qgis_version and \
+            not (qv_min and qv_max < qv_min):
+        return False
+    return True
+
+
+class LruCache(object):
+    """Small, thread-safe, size-bounded LRU cache with hit/miss counters"""
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _CatalogEntry(object):
+    __slots__ = ('record', 'key', 'qv_min', 'qv_max', 'tags', 'xml')
+
+    def __init__(self, elem):
+        rec = OrderedDict(elem.attrib)
+        for child in elem:
+            if not isinstance(child.tag, str):
+                continue  # comments, PIs
+            rec[child.tag] = child.text if child.text is not None else ''
+        self.record = rec
+        self.key = (rec.get('name', ''), rec.get('version', ''),
+                    rec.get('file_name', ''))
+        self.qv_min = vjust(rec.get('qgis_minimum_version'), force_zero=True)
+        self.qv_max = vjust(rec.get('qgis_maximum_version'), force_zero=True)
+        self.tags = frozenset(
+            t.strip() for t in rec.get('tags', '').lower().split(',')
+            if t.strip())
+        self.xml = etree.tostring(elem, encoding='UTF-8', pretty_print=True)
+
+
+class _CatalogSnapshot(object):
+    """Immutable view of one parsed generation of plugins.xml"""
+
+    def __init__(self, tree, generation, stat=None):
+        """
+        :param tree: QgisPluginTree
+        """
+        self.generation = generation
+        self.stat = stat
+        self.loaded_at = time.time()
+        self.entries = [_CatalogEntry(p) for p in tree.plugins()]
+        self.sorted_entries = sorted(self.entries, key=lambda e: e.key)
+        self.sorted_keys = [e.key for e in self.sorted_entries]
+
+        root = tree.root_elem()
+        preamble = []
+        if root is not None:
+            e = root.getprevious()
+            while e is not None:
+                preamble.insert(0, etree.tostring(e))
+                e = e.getprevious()
+        self.xml_head = b"<?xml version='1.0' encoding='UTF-8'?>\n" + \
+            b''.join(p.rstrip() + b'\n' for p in preamble) + b'<plugins>\n'
+        self.xml_tail = b'</plugins>\n'
+
+
+class QgisPluginCatalog(object):
+    """
+    In-memory model of a repo's plugins.xml, re-parsed only when the file
+    changes on disk. Filtered XML and JSON query responses are cached per
+    query signature, for the life of a catalog generation.
+    """
+
+    default_limit = 100
+    max_limit = 1000
+
+    def __init__(self, plugins_xml, cache_size=64, check_interval=1.0,
+                 package_index=None):
+        """
+        :param plugins_xml: str Path to plugins.xml
+        :param cache_size: int Max cached responses (per catalog)
+        :param check_interval: float Min seconds between file change checks
+        :param package_index: PackageIndex Index to reload along with catalog
+        """
+        self.plugins_xml = plugins_xml
+        self.package_index = package_index
+        self.check_interval = check_interval
+        self.cache = LruCache(cache_size)
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        # noinspection PyTypeChecker
+        self._snapshot = None  # type: _CatalogSnapshot
+        self.reload(force=True)
+
+    @property
+    def generation(self):
+        return self._snapshot.generation
+
+    @property
+    def loaded_at(self):
+        return self._snapshot.loaded_at
+
+    def __len__(self):
+        return len(self._snapshot.entries)
+
+    @staticmethod
+    def _file_stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def reload(self, force=False):
+        """
+        Re-parse plugins.xml, if it has changed (or forced).
+        :rtype: bool Whether a new generation was loaded
+        """
+        with self._lock:
+            if self.package_index is not None:
+                self.package_index.reload(force=force)
+            stat = self._file_stat(self.plugins_xml)
+            cur = self._snapshot
+            if not force and cur is not None and stat == cur.stat:
+                return False
+            tree = QgisPluginTree(self.plugins_xml if stat else None)
+            gen = cur.generation + 1 if cur is not None else 1
+            self._snapshot = _CatalogSnapshot(tree, gen, stat)
+            self.cache.clear()
+            log.debug('Catalog generation %s loaded: %s plugins',
+                      gen, len(self._snapshot.entries))
+            return True
+
+    def refresh(self):
+        """
+        Cheap, throttled check for plugins.xml changes; reloads if needed.
+        :rtype: bool Whether a new generation was loaded
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        try:
+            return self.reload()
+        except Error as e:
+            # keep serving the last good generation, e.g. mid-write
+            log.warning('Catalog reload failed: %s', e)
+            return False
+
+    def records(self):
+        """
+        :rtype: list[dict]
+        """
+        return [e.record for e in self._snapshot.entries]
+
+    def filtered_xml(self, qgis_version):
+        """
+        plugins.xml content constrained to plugins compatible with a QGIS
+        version, e.g. as requested by QGIS via ?qgis=#.#
+        :rtype: bytes
+        """
+        snap = self._snapshot
+        key = ('xml', snap.generation, qgis_version)
+        xml = self.cache.get(key)
+        if xml is not None:
+            return xml
+        qv = vjust(qgis_version, force_zero=True)
+        parts = [snap.xml_head]
+        parts.extend(e.xml for e in snap.entries
+                     if version_compatible(e.qv_min, e.qv_max, qv))
+        parts.append(snap.xml_tail)
+        xml = b''.join(parts)
+        self.cache.put(key, xml)
+        return xml
+
+    @staticmethod
+    def encode_cursor(key):
+        return base64.urlsafe_b64encode(
+            json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            key = json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if not isinstance(key, list) or len(key) != 3:
+                raise ValueError(key)
+        except (ValueError, TypeError, UnicodeError) as e:
+            raise CatalogQueryError('Invalid cursor: {0}'.format(e))
+        return tuple(key)
+
+    def query(self, fields=None, name_prefix=None, tags=None, qgis=None,
+              cursor=None, limit=None):
+        """
+        Query plugin records, ordered by name, version and file name.
+        :param fields: list[str] Record fields to return (default: all)
+        :param name_prefix: str Case-insensitive plugin name prefix
+        :param tags: list[str] Tags that all must be present
+        :param qgis: str QGIS version the plugins must be compatible with
+        :param cursor: str Opaque cursor from a previous page's 'next_cursor'
+        :param limit: int Max records per page
+        :rtype: dict
+        """
+        snap = self._snapshot
+        if limit is None:
+            limit = self.default_limit
+        if limit < 1 or limit > self.max_limit:
+            raise CatalogQueryError(
+                'Limit must be between 1 and {0}'.format(self.max_limit))
+        prefix = name_prefix.lower() if name_prefix else None
+        want_tags = frozenset(t.lower() for t in tags) if tags else None
+        qv = vjust(qgis, force_zero=True) if qgis else None
+
+        start = 0
+        if cursor:
+            start = bisect.bisect_right(snap.sorted_keys,
+                                        self.decode_cursor(cursor))
+
+        page = []
+        next_cursor = None
+        entries = snap.sorted_entries
+        for i in range(start, len(entries)):
+            e = entries[i]
+            if prefix and not e.key[0].lower().startswith(prefix):
+                continue
+            if want_tags and not want_tags <= e.tags:
+                continue
+            if qv and not version_compatible(e.qv_min, e.qv_max, qv):
+                continue
+            if len(page) == limit:
+                next_cursor = self.encode_cursor(page[-1][0])
+                break
+            page.append((e.key, e.record))
+
+        if fields:
+            plugins = [OrderedDict((f, r.get(f)) for f in fields)
+                       for _, r in page]
+        else:
+            plugins = [r for _, r in page]
+
+        return OrderedDict([
+            ('generation', snap.generation),
+            ('count', len(plugins)),
+            ('plugins', plugins),
+            ('next_cursor', next_cursor),
+        ])
+
+    def query_json(self, fields=None, name_prefix=None, tags=None, qgis=None,
+                   cursor=None, limit=None):
+        """
+        Cached, serialized result of query()
+        :rtype: bytes
+        """
+        key = ('json', self._snapshot.generation,
+               tuple(fields) if fields else None, name_prefix,
+               tuple(sorted(tags)) if tags else None, qgis, cursor, limit)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        data = json.dumps(
+            self.query(fields=fields, name_prefix=name_prefix, tags=tags,
+                       qgis=qgis, cursor=cursor, limit=limit),
+            separators=(',', ':')).encode('utf-8')
+        self.cache.put(key, data)
+        return data
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ daemon.py
+
+ Long-running repo daemon: watches the uploads directory and ingests new
+ plugin archives into a resident plugin tree, coalescing plugins.xml writes
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import sys
+import ctypes
+import ctypes.util
+import logging
+import select
+import signal
+import struct
+import threading
+import time
+
+from .repo import Error
+
+log = logging.getLogger(__name__)
+
+# inotify(7) flags and event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len; then name
+
+
+class WatchError(Error):
+    pass
+
+
+def is_upload(name):
+    """Whether a file name in the uploads directory is a plugin archive"""
+    return name.lower().endswith('.zip') and not name.startswith('.')
+
+
+def list_uploads(upload_dir):
+    """
+    :return: Plugin archive names in the uploads directory, oldest first
+    :rtype: list[str]
+    """
+    found = []
+    for entry in os.scandir(upload_dir):
+        if is_upload(entry.name) and entry.is_file():
+            found.append((entry.stat().st_mtime_ns, entry.name))
+    return [name for _, name in sorted(found)]
+
+
+class PollingWatcher(object):
+    """
+    Lists the uploads directory every interval. An archive is ready once
+    its size and mtime are unchanged since the previous listing, i.e. it is
+    no longer being written.
+    """
+
+    def __init__(self, upload_dir, interval=1.0):
+        self.upload_dir = upload_dir
+        self.interval = interval
+        self._seen = {}  # name -> (size, mtime_ns)
+        self._ready = {}  # name -> (size, mtime_ns), when reported
+        self._next_scan = 0.0
+
+    def _scan(self):
+        seen = {}
+        ready = []
+        for entry in os.scandir(self.upload_dir):
+            if not is_upload(entry.name):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            seen[entry.name] = sig
+            if self._seen.get(entry.name) == sig \
+                    and self._ready.get(entry.name) != sig:
+                self._ready[entry.name] = sig
+                ready.append(entry.name)
+        self._seen = seen
+        # forget archives gone (ingested), so a re-upload is seen again
+        for name in list(self._ready):
+            if name not in seen:
+                del self._ready[name]
+        return ready
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: float Seconds to wait for ready archives, at most
+        :return: Names of archives that are ready to ingest
+        :rtype: list[str]
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            if now >= self._next_scan:
+                self._next_scan = now + self.interval
+                ready = self._scan()
+                if ready:
+                    return ready
+            wake = self._next_scan if deadline is None \
+                else min(self._next_scan, deadline)
+            if deadline is not None and now >= deadline:
+                return []
+            time.sleep(max(0.0, wake - now))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Reports archives closed after writing, or moved, into the uploads
+    directory, through Linux inotify (via libc; no extra dependency).
+    """
+
+    def __init__(self, upload_dir):
+        self.upload_dir = upload_dir
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise WatchError('inotify not available on this platform')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise WatchError('inotify not available in libc')
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise WatchError('inotify_init1: {0}'.format(
+                os.strerror(ctypes.get_errno())))
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(upload_dir),
+                                    IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(self.fd)
+            self.fd = None
+            raise WatchError('inotify_add_watch: {0}'.format(
+                os.strerror(ctypes.get_errno())))
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: float Seconds to wait for ready archives, at most
+        :return: Names of archives that are ready to ingest
+        :rtype: list[str]
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        ready = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                log.warning('inotify queue overflowed, rescanning uploads')
+                return list_uploads(self.upload_dir)
+            if is_upload(name) and name not in ready:
+                ready.append(name)
+        return ready
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def upload_watcher(upload_dir, poll=False, poll_interval=1.0):
+    """
+    :param poll: bool Poll, even if inotify is available
+    :rtype: InotifyWatcher | PollingWatcher
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(upload_dir)
+        except WatchError as e:
+            log.warning('%s; polling uploads every %ss', e, poll_interval)
+    return PollingWatcher(upload_dir, poll_interval)
+
+
+class UploadDaemon(object):
+    """
+    Ingests archives landing in a repo's uploads directory into its plugin
+    tree, which stays parsed in memory. plugins.xml is written once uploads
+    pause for the coalesce window, or once the oldest unwritten upload is
+    max_delay old, so a burst of uploads costs one serialize and write.
+
+    If plugins.xml is changed by another process (e.g. 'plugins-xml remove'),
+    the tree and package index are reloaded before the next ingest. Archives
+    that fail to ingest are left in place, and retried only once changed.
+
+    For a repo that keeps generations, each written batch is published as
+    one generation.
+    """
+
+    def __init__(self, repo, watcher=None, coalesce=0.5, max_delay=5.0,
+                 **update_kwargs):
+        """
+        :param repo: QgisRepo
+        :param watcher: InotifyWatcher | PollingWatcher (default: one for
+        the repo's uploads directory)
+        :param coalesce: float Seconds without uploads before writing
+        :param max_delay: float Seconds an ingested upload waits, at most,
+        to be written to plugins.xml
+        :param update_kwargs: For QgisRepo.update_plugin(), e.g. auth
+        """
+        self.repo = repo
+        self.watcher = watcher
+        self.coalesce = coalesce
+        self.max_delay = max_delay
+        self.update_kwargs = update_kwargs
+        self.ingested = 0
+        self.failed = 0
+        self.writes = 0
+        self._pending = 0
+        self._first_pending = None
+        self._last_ingest = None
+        self._rejected = {}  # name -> (size, mtime_ns)
+        self._xml_stat = None
+        self._stop_event = threading.Event()
+
+    def _stat_xml(self):
+        try:
+            st = os.stat(self.repo.plugins_xml)
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except OSError:
+            return None
+
+    def start(self):
+        """Set up the repo, load its tree and ingest waiting uploads"""
+        self.repo.setup_repo()
+        if self.watcher is None:
+            self.watcher = upload_watcher(self.repo.upload_dir)
+        self.repo.load_plugins_tree()
+        self._xml_stat = self._stat_xml()
+        waiting = list_uploads(self.repo.upload_dir)
+        if waiting:
+            log.warning('Ingesting %s waiting upload(s)', len(waiting))
+        for name in waiting:
+            self.ingest(name)
+        self.flush(force=True)
+
+    def _reload_if_changed(self):
+        stat = self._stat_xml()
+        if stat == self._xml_stat:
+            return
+        log.warning('plugins.xml changed by another process, reloading')
+        self.repo.clear_plugins_tree()
+        self.repo.package_index.reload(force=True)
+        self.repo.load_plugins_tree()
+        self._xml_stat = stat
+
+    def ingest(self, name):
+        """
+        :param name: str Archive name in the uploads directory
+        :rtype: bool Whether it was ingested
+        """
+        path = os.path.join(self.repo.upload_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False  # already ingested, or removed
+        sig = (st.st_size, st.st_mtime_ns)
+        if self._rejected.get(name) == sig:
+            return False
+        if not self._pending:
+            self._reload_if_changed()
+            self.repo.begin_generation()
+        start = time.perf_counter()
+        try:
+            ok = self.repo.update_plugin(name, write_xml=False,
+                                         **self.update_kwargs)
+        except Error as e:
+            log.warning("Upload '%s' not ingested: %s", name, e)
+            ok = False
+        except Exception:  # e.g. zipfile.BadZipFile; keep running
+            log.exception("Upload '%s' not ingested", name)
+            ok = False
+        if not ok:
+            self._rejected[name] = sig
+            self.failed += 1
+            if not self._pending:
+                self.repo.abort_generation()
+            return False
+        self._rejected.pop(name, None)
+        self.ingested += 1
+        self._pending += 1
+        now = time.monotonic()
+        if self._first_pending is None:
+            self._first_pending = now
+        self._last_ingest = now
+        log.warning("Ingested '%s' (%.1f ms)", name,
+                    (time.perf_counter() - start) * 1000.0)
+        return True
+
+    def _due(self):
+        """
+        :return: Monotonic time plugins.xml is due to be written, or None
+        """
+        if not self._pending:
+            return None
+        return min(self._last_ingest + self.coalesce,
+                   self._first_pending + self.max_delay)
+
+    def flush(self, force=False):
+        """
+        Write plugins.xml, if uploads were ingested and the write is due
+        :rtype: bool Whether it was written
+        """
+        due = self._due()
+        if due is None or (not force and time.monotonic() < due):
+            return False
+        start = time.perf_counter()
+        self.repo.write_plugins_xml(self.repo.plugins_tree_xml())
+        self.repo.publish_generation()
+        self._xml_stat = self._stat_xml()
+        log.warning('Wrote plugins.xml for %s upload(s) (%.1f ms)',
+                    self._pending, (time.perf_counter() - start) * 1000.0)
+        self.writes += 1
+        self._pending = 0
+        self._first_pending = None
+        self._last_ingest = None
+        return True
+
+    def step(self, timeout=1.0):
+        """
+        Wait for uploads (at most timeout, or until a write is due), ingest
+        them, then write plugins.xml if due.
+        """
+        due = self._due()
+        if due is not None:
+            timeout = max(0.0, min(timeout, due - time.monotonic()))
+        for name in self.watcher.wait(timeout):
+            self.ingest(name)
+        self.flush()
+
+    def run(self):
+        """Ingest uploads until stop(), then write any pending ones"""
+        self.start()
+        try:
+            while not self._stop_event.is_set():
+                self.step()
+        finally:
+            self.flush(force=True)
+            self.watcher.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def watch_uploads(repo, coalesce=0.5, max_delay=5.0, poll=False,
+                  poll_interval=1.0, **update_kwargs):
+    """
+    Run an UploadDaemon for a repo until SIGTERM/SIGINT, which stop it
+    after writing any pending uploads to plugins.xml.
+
+    :param repo: QgisRepo
+    :param coalesce: float Seconds without uploads before writing
+    :param max_delay: float Seconds an upload waits, at most, to be written
+    :param poll: bool Poll the uploads directory, rather than use inotify
+    :param poll_interval: float Seconds between polls
+    :param update_kwargs: For QgisRepo.update_plugin(), e.g. auth
+    """
+    daemon = UploadDaemon(
+        repo, upload_watcher(repo.upload_dir, poll, poll_interval),
+        coalesce=coalesce, max_delay=max_delay, **update_kwargs)
+
+    def _shutdown(signum, frame):
+        daemon.stop()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    log.warning("Watching uploads for '%s': %s (%s)", repo.repo_name,
+                repo.upload_dir, type(daemon.watcher).__name__)
+    daemon.run()
+    return daemon
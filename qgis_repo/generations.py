@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ generations.py
+
+ Staged publishing of repo directories, as generations switched atomically
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import logging
+import shutil
+import time
+
+from datetime import datetime
+
+from .packaging import exchange_paths
+from .repo import Error
+
+log = logging.getLogger(__name__)
+
+BUILDING_SUFFIX = '.building'
+# beside a generation being built: the building process's pid, if any
+LOCK_SUFFIX = '.lock'
+# seconds a build no process owns, e.g. suspended for 'mirror --resume',
+# is kept before it is pruned
+BUILD_EXPIRY = 604800
+
+
+class GenerationError(Error):
+    pass
+
+
+def link_tree(src_dir, dest_dir):
+    """
+    Copy a directory tree, hard-linking its files (copying them, where links
+    are not possible), so only changed files take up space.
+    Files in either tree must then only be replaced, never modified in place.
+    """
+    for root, dirs, files in os.walk(src_dir):
+        rel = os.path.relpath(root, src_dir)
+        dest_root = os.path.normpath(os.path.join(dest_dir, rel))
+        os.makedirs(dest_root, exist_ok=True)
+        for f in files:
+            src = os.path.join(root, f)
+            dest = os.path.join(dest_root, f)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), dest)
+                continue
+            try:
+                os.link(src, dest)
+            except OSError:
+                shutil.copy2(src, dest)
+        shutil.copystat(root, dest_root)
+
+
+def process_alive(pid):
+    """
+    :param pid: int Process ID, on this host
+    :rtype: bool
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # another user's
+    return True
+
+
+class RepoGenerations(object):
+    """
+    Published generations of a repo directory. The repo directory is a
+    symlink to the live generation, in a hidden directory beside it:
+
+      web_base/qgis -> .qgis.generations/2026-10-19_08-00-00-000000
+      web_base/.qgis.generations/2026-10-19_07-00-00-000000/...
+
+    A generation is built (from a hard-linked copy of the live one, or
+    empty), then published by atomically replacing the symlink, so clients
+    never see a partially updated repo. Older generations are kept, up to
+    a limit, for rollback. A lock file beside each generation being built
+    names the process building it, so it is not pruned meanwhile.
+    """
+
+    def __init__(self, web_base, name, keep=3, build_expiry=BUILD_EXPIRY):
+        """
+        :param web_base: str Directory of the repo directory
+        :param name: str Repo directory name
+        :param keep: int Generations kept, including the live one
+        :param build_expiry: float Seconds a build no process owns (e.g.
+        interrupted or suspended) is kept, to be resumed, before pruned
+        """
+        self.web_base = web_base
+        self.name = name
+        self.keep = max(1, keep)
+        self.build_expiry = build_expiry
+        self.live_path = os.path.join(web_base, name)
+        self.gen_dir = os.path.join(web_base, '.{0}.generations'.format(name))
+
+    def path(self, generation):
+        return os.path.join(self.gen_dir, generation)
+
+    def list(self):
+        """
+        :return: Published generations, oldest first
+        :rtype: list[str]
+        """
+        if not os.path.isdir(self.gen_dir):
+            return []
+        return sorted(g for g in os.listdir(self.gen_dir)
+                      if not g.endswith(BUILDING_SUFFIX) and
+                      os.path.isdir(self.path(g)))
+
+    def current(self):
+        """
+        :return: Live generation, or None if the repo directory is not
+        published as generations (yet)
+        :rtype: str
+        """
+        if not os.path.islink(self.live_path):
+            return None
+        return os.path.basename(os.readlink(self.live_path))
+
+    def _new_id(self):
+        gen_id = datetime.now().strftime('%Y-%m-%d_%H-%M-%S-%f')
+        while os.path.lexists(self.path(gen_id)) or \
+                os.path.lexists(self.path(gen_id + BUILDING_SUFFIX)):
+            gen_id += '0'
+        return gen_id
+
+    def _switch(self, generation):
+        """Point the repo directory at a generation, atomically"""
+        target = os.path.join(os.path.basename(self.gen_dir), generation)
+        tmp_link = os.path.join(
+            self.web_base, '.{0}.switch-{1}'.format(self.name, os.getpid()))
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(target, tmp_link)
+        if os.path.isdir(self.live_path) and \
+                not os.path.islink(self.live_path):
+            # a plain repo directory, published before generations were
+            if not exchange_paths(tmp_link, self.live_path):
+                log.warning('Repo directory switched non-atomically')
+            shutil.rmtree(tmp_link)
+        else:
+            os.replace(tmp_link, self.live_path)
+        log.info("Repo '%s' switched to generation: %s", self.name,
+                 generation)
+
+    @staticmethod
+    def _lock(building, owned=True):
+        """
+        Record this process as building a generation, or that none is
+        (e.g. once suspended), from now
+        """
+        with open(building + LOCK_SUFFIX, 'w') as f:
+            if owned:
+                f.write('{0}\n'.format(os.getpid()))
+
+    @staticmethod
+    def _unlock(building):
+        try:
+            os.remove(building + LOCK_SUFFIX)
+        except FileNotFoundError:
+            pass
+
+    def _abandoned(self, building, now):
+        """
+        :return: Whether no live process owns a build, and none has for
+        build_expiry
+        :rtype: bool
+        """
+        lock = building + LOCK_SUFFIX
+        try:
+            with open(lock) as f:
+                owner = f.read().strip()
+            since = os.path.getmtime(lock)
+        except OSError:
+            owner = ''
+            since = os.path.getmtime(building)
+        if owner.isdigit() and process_alive(int(owner)):
+            return False
+        return now - since > self.build_expiry
+
+    def _adopt(self):
+        """
+        Make a plain repo directory the first generation
+        :rtype: str Its generation
+        """
+        gen_id = self._new_id()
+        building = self.path(gen_id + BUILDING_SUFFIX)
+        self._lock(building)
+        link_tree(self.live_path, building)
+        os.rename(building, self.path(gen_id))
+        self._unlock(building)
+        self._switch(gen_id)
+        return gen_id
+
+    def begin(self, empty=False):
+        """
+        Start building a new generation
+        :param empty: bool Start empty, instead of from the live generation
+        :return: Directory to build the generation in, for publish()
+        :rtype: str
+        """
+        if not os.path.isdir(self.gen_dir):
+            os.makedirs(self.gen_dir)
+        current = self.current()
+        if current is None and os.path.isdir(self.live_path):
+            current = self._adopt()
+        building = self.path(self._new_id() + BUILDING_SUFFIX)
+        # locked first, as link_tree() dates it as the live generation
+        self._lock(building)
+        if empty or current is None:
+            os.makedirs(building)
+        else:
+            link_tree(self.path(current), building)
+        log.info("Building '%s' generation: %s", self.name, building)
+        return building
+
+    def publish(self, building):
+        """
+        Make a built generation live, then remove generations beyond those
+        kept
+        :rtype: str The generation published
+        """
+        if not building.endswith(BUILDING_SUFFIX) or \
+                os.path.dirname(building) != self.gen_dir:
+            raise GenerationError('Not a generation being built: {0}'
+                                  .format(building))
+        gen_path = building[:-len(BUILDING_SUFFIX)]
+        os.rename(building, gen_path)
+        self._unlock(building)
+        generation = os.path.basename(gen_path)
+        self._switch(generation)
+        self.prune()
+        return generation
+
+    def abort(self, building):
+        if os.path.isdir(building):
+            shutil.rmtree(building)
+        self._unlock(building)
+
+    def suspend(self, building):
+        """
+        Stop building a generation, keeping it for resume(), for up to
+        build_expiry
+        """
+        if os.path.isdir(building):
+            self._lock(building, owned=False)
+
+    def resume(self, building):
+        """
+        Continue building a generation begun earlier, e.g. by an interrupted
+        process (unless pruned since)
+        :return: Directory to build the generation in, for publish()
+        :rtype: str
+        """
+        if not building.endswith(BUILDING_SUFFIX) or \
+                os.path.dirname(building) != self.gen_dir or \
+                not os.path.isdir(building):
+            raise GenerationError('Not a generation being built: {0}'
+                                  .format(building))
+        self._lock(building)
+        log.info("Resuming '%s' generation: %s", self.name, building)
+        return building
+
+    def rollback(self, generation=None):
+        """
+        Switch back to an earlier generation
+        :param generation: str Generation (default: the one before the live
+        one)
+        :rtype: str The generation switched to
+        """
+        generations = self.list()
+        current = self.current()
+        if generation is None:
+            earlier = [g for g in generations
+                       if current is None or g < current]
+            if not earlier:
+                raise GenerationError("No earlier generation of '{0}' kept"
+                                      .format(self.name))
+            generation = earlier[-1]
+        elif generation not in generations:
+            raise GenerationError("No generation of '{0}': {1}"
+                                  .format(self.name, generation))
+        self._switch(generation)
+        return generation
+
+    def prune(self):
+        """
+        Remove all but the newest kept generations (never the live one), and
+        builds no process owns, untouched for build_expiry
+        :rtype: list[str] Generations removed
+        """
+        current = self.current()
+        generations = self.list()
+        removed = [g for g in generations[:-self.keep] if g != current]
+        for g in removed:
+            shutil.rmtree(self.path(g))
+        builds = set()
+        for g in os.listdir(self.gen_dir):
+            if g.endswith(BUILDING_SUFFIX + LOCK_SUFFIX):
+                g = g[:-len(LOCK_SUFFIX)]
+            if g.endswith(BUILDING_SUFFIX):
+                builds.add(self.path(g))
+        now = time.time()
+        for building in sorted(builds):
+            try:
+                if not self._abandoned(building, now):
+                    continue
+            except OSError:
+                continue  # published or aborted meanwhile
+            log.info("Removing abandoned '%s' build: %s", self.name,
+                     building)
+            self.abort(building)
+        return removed
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ httprange.py
+
+ HTTP conditional and byte-range request handling for served packages
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import re
+
+_BYTES_RANGE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Parse a single 'bytes=' Range header value against a resource size.
+    Multiple ranges are rejected, since packages are only ever resumed.
+    :param header: str Range header value
+    :param size: int Resource size in bytes
+    :return: (start, end) inclusive byte positions, or None to ignore the
+             header (e.g. unknown unit or malformed, per RFC 7233)
+    :raises RangeNotSatisfiable: for multiple or unsatisfiable ranges
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+    if ',' in spec:
+        raise RangeNotSatisfiable('Multiple ranges are not supported')
+    m = _BYTES_RANGE.match(spec)
+    if not m or m.group(1) == m.group(2) == '':
+        return None
+    first, last = m.group(1), m.group(2)
+    if first == '':  # suffix range: last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable('Empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last != '' and int(last) < start:
+        return None  # syntactically invalid
+    if start >= size:
+        raise RangeNotSatisfiable('Range starts beyond end of resource')
+    end = int(last) if last != '' else size - 1
+    return start, min(end, size - 1)
+
+
+def _etag_in(etag, header):
+    if header.strip() == '*':
+        return True
+    tags = [t.strip() for t in header.split(',')]
+    # weak comparison, per RFC 7232 If-None-Match
+    return etag in tags or 'W/{0}'.format(etag) in tags
+
+
+def resolve_request(size, etag, range_header=None, if_range=None,
+                    if_none_match=None):
+    """
+    Decide how to answer a GET for a resource with a known size and strong
+    ETag, given the request's conditional and Range headers.
+    :return: (status, offset, count, headers) where headers are extra
+             response headers, e.g. Content-Range; count is 0 for 304/416
+    :rtype: (int, int, int, list[(str, str)])
+    """
+    headers = [('Accept-Ranges', 'bytes')]
+    if etag:
+        headers.append(('ETag', etag))
+    if if_none_match and etag and _etag_in(etag, if_none_match):
+        return 304, 0, 0, headers
+
+    # If-Range must match the strong ETag exactly; dates are not supported,
+    # so the whole resource is sent if it may have changed
+    use_range = range_header and (
+        not if_range or (etag is not None and if_range.strip() == etag))
+    if use_range:
+        try:
+            rng = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            headers.append(('Content-Range', 'bytes */{0}'.format(size)))
+            return 416, 0, 0, headers
+        if rng is not None:
+            start, end = rng
+            headers.append(('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, end, size)))
+            return 206, start, end - start + 1, headers
+    return 200, 0, size, headers
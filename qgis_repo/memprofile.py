@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ memprofile.py
+
+ Opt-in memory profiling of update and mirror runs: tracemalloc and RSS
+ snapshots at phase boundaries, with top allocators per phase
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+log = logging.getLogger(__name__)
+
+# Path to write a run's memory profile to, if set
+MEMPROFILE_ENV = 'QGIS_REPO_MEMPROFILE'
+
+_MB = 1048576.0
+
+
+def _proc_status_mb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024.0
+    except (IOError, ValueError, IndexError):
+        pass
+    return None
+
+
+def rss_mb():
+    """Resident set size of this process, in MiB (None if unknown)"""
+    return _proc_status_mb('VmRSS')
+
+
+def peak_rss_mb():
+    """Peak resident set size, since reset_peak_rss() if supported, in MiB"""
+    peak = _proc_status_mb('VmHWM')
+    if peak is not None or resource is None:
+        return peak
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return maxrss / (_MB if sys.platform == 'darwin' else 1024.0)
+
+
+def reset_peak_rss():
+    """Reset the peak RSS high-water mark (Linux only)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+class MemoryProfiler(object):
+    """
+    Records memory use per phase of a run. Phases may nest, e.g. update
+    phases within a mirror's ingest phase; only outermost ones are recorded.
+    tracemalloc only sees Python allocations: libxml2 memory (lxml trees)
+    shows up as RSS growth beyond traced growth, 'untraced_mb'.
+    """
+
+    def __init__(self, top=10, frames=1):
+        """
+        :param top: int Allocators listed per phase
+        :param frames: int Traceback frames kept per allocation
+        """
+        self.top = top
+        self.frames = frames
+        self.enabled = False
+        self.phases = []
+        self._depth = 0
+        self._filters = None
+
+    def enable(self):
+        """Start tracing allocations (slows the run down)"""
+        # imported here, as it is slow to import and seldom used
+        import tracemalloc
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False,
+                               '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ]
+        self.phases = []
+        self._depth = 0
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self._filters is None:
+            return  # never enabled
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _snapshot(self):
+        import tracemalloc
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
+
+    def phase(self, name):
+        """
+        Context manager recording a phase, if enabled and not nested.
+        :param name: str Phase name
+        """
+        if not self.enabled or self._depth:
+            return contextlib.nullcontext()
+        return self._phase(name)
+
+    @contextlib.contextmanager
+    def _phase(self, name):
+        import tracemalloc
+        self._depth += 1
+        before = self._snapshot()
+        traced_before = tracemalloc.get_traced_memory()[0]
+        rss_before = rss_mb()
+        tracemalloc.reset_peak()
+        reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            traced_after, traced_peak = tracemalloc.get_traced_memory()
+            rss_after = rss_mb()
+            after = self._snapshot()
+            self._depth -= 1
+            self.phases.append(self._record(
+                name, elapsed, before, after, traced_before, traced_after,
+                traced_peak, rss_before, rss_after))
+
+    def _record(self, name, elapsed, before, after, traced_before,
+                traced_after, traced_peak, rss_before, rss_after):
+        top = []
+        for stat in after.compare_to(before, 'lineno')[:self.top]:
+            if stat.size_diff <= 0:
+                break
+            top.append(OrderedDict([
+                ('where', str(stat.traceback)),
+                ('size_diff_kb', stat.size_diff / 1024.0),
+                ('count_diff', stat.count_diff),
+                ('size_kb', stat.size / 1024.0),
+            ]))
+        traced = (traced_after - traced_before) / _MB
+        rss_growth = None if rss_before is None or rss_after is None \
+            else rss_after - rss_before
+        return OrderedDict([
+            ('phase', name),
+            ('seconds', elapsed),
+            ('rss_mb', rss_after),
+            ('rss_growth_mb', rss_growth),
+            ('rss_peak_mb', peak_rss_mb()),
+            ('traced_mb', traced_after / _MB),
+            ('traced_growth_mb', traced),
+            ('traced_peak_mb', traced_peak / _MB),
+            ('untraced_mb', None if rss_growth is None
+             else rss_growth - traced),
+            ('top', top),
+        ])
+
+    def summary(self):
+        """
+        :rtype: OrderedDict
+        """
+        return OrderedDict([('top', self.top), ('frames', self.frames),
+                            ('phases', list(self.phases))])
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=1)
+            f.write('\n')
+        log.debug("Wrote memory profile: {0}".format(path))
+
+    def report(self):
+        """
+        :return: Plain-text report of phases and their top allocators
+        :rtype: str
+        """
+        def _mb(v):
+            return '-' if v is None else '{0:.1f}'.format(v)
+
+        lines = ['{0:<20} {1:>8} {2:>8} {3:>9} {4:>9} {5:>9} {6:>9}'.format(
+            'phase', 'seconds', 'RSS MiB', 'RSS +MiB', 'peak MiB',
+            'traced +', 'untraced')]
+        for p in self.phases:
+            lines.append(
+                '{0:<20} {1:>8.2f} {2:>8} {3:>9} {4:>9} {5:>9} {6:>9}'.format(
+                    p['phase'][:20], p['seconds'], _mb(p['rss_mb']),
+                    _mb(p['rss_growth_mb']), _mb(p['rss_peak_mb']),
+                    _mb(p['traced_growth_mb']), _mb(p['untraced_mb'])))
+        for p in self.phases:
+            if not p['top']:
+                continue
+            lines.append('')
+            lines.append("Top allocators, phase '{0}':".format(p['phase']))
+            for t in p['top']:
+                lines.append('  {0:>10.1f} KiB {1:>+9} blocks  {2}'.format(
+                    t['size_diff_kb'], t['count_diff'], t['where']))
+        return '\n'.join(lines)
+
+
+# Process-wide profiler, disabled unless enabled
+profiler = MemoryProfiler()
+
+
+def phase(name):
+    """Phase of the process-wide profiler, see MemoryProfiler.phase"""
+    return profiler.phase(name)
+
+
+def path_from_env(environ=None):
+    """
+    :return: Memory profile path set in the environment, or None
+    :rtype: str
+    """
+    environ = os.environ if environ is None else environ
+    return environ.get(MEMPROFILE_ENV) or None
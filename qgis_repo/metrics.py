@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ metrics.py
+
+ Request, cache and catalog metrics of the serving layer, in Prometheus
+ text exposition format
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Request latency histogram bucket bounds, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Routes whose requests are also labelled by QGIS version
+QGIS_ROUTES = ('plugins_xml', 'plugins_json')
+
+_QGIS_VARIANT = re.compile(r'^\s*(\d{1,2})\.(\d{1,3})')
+
+
+def qgis_variant(value):
+    """
+    Label for a 'qgis' query value, as major.minor, so that label values
+    stay few however clients spell versions.
+    :rtype: str
+    """
+    if value is None:
+        return ''
+    m = _QGIS_VARIANT.match(value)
+    if not m:
+        return 'invalid'
+    return '{0}.{1}'.format(int(m.group(1)), int(m.group(2)))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"')\
+        .replace('\n', r'\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(n, _escape(v))
+                          for n, v in zip(names, values)) + '}'
+
+
+def _num(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class ServingMetrics(object):
+    """
+    Metrics of one serving process. Servers call begin() as a request
+    arrives and end() once its response is out; both are a clock read and
+    a few dict updates under a lock.
+    """
+
+    def __init__(self, repo=None, catalog=None, buckets=DEFAULT_BUCKETS):
+        """
+        :param repo: QgisRepo To tell routes apart by path (optional)
+        :param catalog: QgisPluginCatalog Report its cache and generation
+        :param buckets: tuple Latency histogram bounds, in seconds
+        """
+        plugins = '/{0}/'.format(repo.plugins_subdir if repo else 'plugins')
+        self._xml_path = plugins + (repo.plugins_xml_name if repo
+                                    else 'plugins.xml')
+        self._json_path = plugins + 'plugins.json'
+        # also matches the -auth packages dir
+        self._packages_prefix = plugins + (repo.packages_subdir() if repo
+                                           else 'packages')
+        self._icons_prefix = plugins + (repo.web_icon_dir if repo
+                                        else 'icons') + '/'
+        self.catalog = catalog
+        self.buckets = tuple(sorted(buckets))
+        self.started = time.time()
+        self.in_flight = 0
+        self._requests = {}  # (route, qgis, status) -> count
+        self._durations = {}  # (route, qgis) -> [bucket counts..., sum]
+        self._bytes = {}  # route -> bytes
+        self._lock = threading.Lock()
+
+    def route(self, path):
+        """
+        :param path: str URL path
+        :rtype: str
+        """
+        if path == self._xml_path:
+            return 'plugins_xml'
+        if path.startswith(self._packages_prefix):
+            return 'package'
+        if path.startswith(self._icons_prefix):
+            return 'icon'
+        if path == self._json_path:
+            return 'plugins_json'
+        if path == '/plugins.xml':
+            return 'redirect'
+        if path == '/metrics':
+            return 'metrics'
+        if path.startswith('/upload/'):
+            return 'upload'
+        return 'other'
+
+    def begin(self):
+        """
+        :return: Start time, to pass to end()
+        :rtype: float
+        """
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def end(self, start, path, qgis, status, nbytes=0):
+        """
+        :param start: float begin()'s return value
+        :param path: str URL path
+        :param qgis: str 'qgis' query value, or None
+        :param status: int HTTP status
+        :param nbytes: int Response body bytes
+        """
+        elapsed = time.perf_counter() - start
+        route = self.route(path)
+        variant = qgis_variant(qgis) if route in QGIS_ROUTES else ''
+        i = bisect.bisect_left(self.buckets, elapsed)
+        with self._lock:
+            self.in_flight -= 1
+            key = (route, variant, int(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            hist = self._durations.get(key[:2])
+            if hist is None:
+                hist = self._durations[key[:2]] = \
+                    [0] * (len(self.buckets) + 1) + [0.0]
+            hist[i] += 1
+            hist[-1] += elapsed
+            self._bytes[route] = self._bytes.get(route, 0) + (nbytes or 0)
+
+    def render(self):
+        """
+        :return: All metrics, in Prometheus text exposition format
+        :rtype: str
+        """
+        with self._lock:
+            requests = sorted(self._requests.items())
+            durations = sorted((k, list(v))
+                               for k, v in self._durations.items())
+            sent = sorted(self._bytes.items())
+            in_flight = self.in_flight
+        lines = []
+
+        def _metric(name, kind, doc, samples, label_names=()):
+            lines.append('# HELP {0} {1}'.format(name, doc))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+            for values, value in samples:
+                lines.append('{0}{1} {2}'.format(
+                    name, _labels(label_names, values), _num(value)))
+
+        _metric('qgis_repo_requests_total', 'counter',
+                'Requests, by route, QGIS version and status',
+                [(k, v) for k, v in requests], ('route', 'qgis', 'status'))
+
+        name = 'qgis_repo_request_duration_seconds'
+        lines.append('# HELP {0} Time to handle requests, by route and '
+                     'QGIS version'.format(name))
+        lines.append('# TYPE {0} histogram'.format(name))
+        for (route, variant), hist in durations:
+            count = 0
+            for bound, n in zip(self.buckets + (float('inf'),), hist[:-1]):
+                count += n
+                lines.append('{0}_bucket{1} {2}'.format(
+                    name, _labels(('route', 'qgis', 'le'),
+                                  (route, variant, _num(bound))), count))
+            labels = _labels(('route', 'qgis'), (route, variant))
+            lines.append('{0}_sum{1} {2}'.format(name, labels,
+                                                 _num(hist[-1])))
+            lines.append('{0}_count{1} {2}'.format(name, labels, count))
+
+        _metric('qgis_repo_response_bytes_total', 'counter',
+                'Response body bytes served, by route',
+                [((r,), v) for r, v in sent], ('route',))
+        _metric('qgis_repo_requests_in_flight', 'gauge',
+                'Requests being handled', [((), in_flight)])
+
+        catalog = self.catalog
+        if catalog is not None:
+            cache = catalog.cache
+            _metric('qgis_repo_filter_cache_hits_total', 'counter',
+                    'Filtered plugins.xml/JSON responses served from cache',
+                    [((), cache.hits)])
+            _metric('qgis_repo_filter_cache_misses_total', 'counter',
+                    'Filtered plugins.xml/JSON responses built',
+                    [((), cache.misses)])
+            _metric('qgis_repo_filter_cache_evictions_total', 'counter',
+                    'Cached responses evicted, as least recently used',
+                    [((), cache.evictions)])
+            _metric('qgis_repo_filter_cache_entries', 'gauge',
+                    'Cached responses', [((), len(cache))])
+            _metric('qgis_repo_catalog_generation', 'gauge',
+                    'Times plugins.xml has been (re)loaded',
+                    [((), catalog.generation)])
+            _metric('qgis_repo_catalog_age_seconds', 'gauge',
+                    'Seconds since plugins.xml was last (re)loaded',
+                    [((), max(0.0, time.time() - catalog.loaded_at))])
+            _metric('qgis_repo_catalog_plugins', 'gauge',
+                    'Plugins in the loaded plugins.xml',
+                    [((), len(catalog))])
+        _metric('process_start_time_seconds', 'gauge',
+                'Start time of the process, in seconds since the epoch',
+                [((), self.started)])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,877 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ mirror.py
+
+ Upstream plugins.xml feeds and plugin archives of mirrored repos, fetched
+ only when changed or not already cached
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import urllib.error
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from lxml import etree
+
+from .repo import Error, PackageIndex, QgisPluginTree, clean_attr_value
+from .timing import span
+
+log = logging.getLogger(__name__)
+
+FEEDS_STATE_NAME = 'feeds.json'
+MERGED_XML_NAME = 'merged.xml'
+STATE_VERSION = 1
+FETCH_WORKERS = 4
+CACHE_INDEX_NAME = 'index.json'
+CACHE_MAX_SIZE = 8 * 1024 ** 3  # bytes
+CHECKPOINT_EVERY = 100  # plugins
+
+# mirror phases, in order
+DOWNLOAD, INGEST, OVERLAY, DONE = 'download', 'ingest', 'overlay', 'done'
+# mirrored plugin states, in order
+FETCHED, INGESTED, REJECTED, OVERLAID, UNMATCHED = \
+    'fetched', 'ingested', 'rejected', 'overlaid', 'unmatched'
+
+
+class MirrorError(Error):
+    pass
+
+
+def plugin_key(plugin):
+    """
+    :param plugin: etree._Element
+    :return: (name, version, file_name), as merge_plugins() dedupes on
+    :rtype: tuple
+    """
+    return (clean_attr_value(plugin.get('name')), plugin.get('version'),
+            plugin.findtext('file_name'))
+
+
+def iter_feed_plugins(path):
+    """
+    Stream the plugins of a plugins.xml file, each dropped from the parsed
+    document once handled (unless moved to another tree), so the whole file
+    is never held in memory
+    :param path: str
+    :rtype: iterator[etree._Element]
+    """
+    try:
+        for _, plugin in etree.iterparse(
+                path, events=('end',), tag='pyqgis_plugin',
+                remove_blank_text=True, strip_cdata=False):
+            parent = plugin.getparent()
+            yield plugin
+            if parent is not None and plugin.getparent() is parent:
+                parent.remove(plugin)
+    except (IOError, etree.XMLSyntaxError) as e:
+        raise MirrorError("Error parsing feed '{0}': {1}".format(path, e))
+
+
+class UpstreamFeeds(object):
+    """
+    Upstream plugins.xml feeds, e.g. one per QGIS version, kept (with their
+    merge) in a state directory between mirror runs.
+
+    Each feed's ETag, Last-Modified and content hash are stored, so it is
+    only downloaded again if the server says it changed (conditional GET),
+    and only re-merged if its content did. The (name, version, file_name)
+    of each feed's plugins are stored too, so a changed feed's plugins can
+    be swapped in the previous merge without merging the others again.
+
+    Feeds are fetched concurrently, and merged as streams: plugins are
+    deduplicated as they are parsed, so only unique ones are held in memory.
+    """
+
+    def __init__(self, state_dir, timeout=60):
+        """
+        :param state_dir: str Directory for the feeds, merge and state
+        :param timeout: float Seconds to wait for an upstream response
+        """
+        self.state_dir = state_dir
+        self.timeout = timeout
+        self.state_path = os.path.join(state_dir, FEEDS_STATE_NAME)
+        self.merged_xml = os.path.join(state_dir, MERGED_XML_NAME)
+        self._lock = threading.Lock()
+        if not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+        self.state = {'version': STATE_VERSION, 'feeds': {}, 'merged': None,
+                      'mirrored': {}}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (IOError, ValueError) as e:
+                log.warning("Error reading mirror feeds state '%s': %s",
+                            self.state_path, e)
+            else:
+                if state.get('version') == STATE_VERSION:
+                    self.state = state
+
+    def feed(self, url):
+        """
+        :rtype: dict 'file', 'etag', 'last_modified', 'sha256', 'size' and
+        'keys' of a feed last fetched, or None
+        """
+        return self.state['feeds'].get(url)
+
+    def fetch(self, url, file_name, force=False):
+        """
+        Download a feed, unless unchanged since last fetched
+        :param url: str
+        :param file_name: str Name to store the feed as, in the state dir
+        :param force: bool Download, even if the server says unchanged
+        :return: Whether its content changed, and bytes downloaded
+        :rtype: (bool, int)
+        """
+        with span('download_xml', url=url) as s:
+            changed, size = self._fetch(url, file_name, force)
+            s.add_bytes(size)
+        return changed, size
+
+    def _fetch(self, url, file_name, force):
+        feed = dict(self.feed(url) or {})
+        path = os.path.join(self.state_dir, file_name)
+        headers = {}
+        if not force and feed.get('file') == file_name and \
+                os.path.exists(path):
+            if feed.get('etag'):
+                headers['If-None-Match'] = feed['etag']
+            if feed.get('last_modified'):
+                headers['If-Modified-Since'] = feed['last_modified']
+        req = urllib.request.Request(url, headers=headers)
+        tmp_path = '{0}.part'.format(path)
+        sha = hashlib.sha256()
+        size = 0
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp, \
+                    open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: resp.read(65536), b''):
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                etag = resp.headers.get('ETag')
+                last_modified = resp.headers.get('Last-Modified')
+            os.replace(tmp_path, path)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                log.info('Feed not modified: %s', url)
+                return False, 0
+            raise MirrorError("Error fetching '{0}': {1}".format(url, e))
+        except (urllib.error.URLError, OSError) as e:
+            raise MirrorError("Error fetching '{0}': {1}".format(url, e))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        changed = (sha.hexdigest() != feed.get('sha256') or
+                   feed.get('file') != file_name)
+        feed.update({
+            'file': file_name,
+            'etag': etag,
+            'last_modified': last_modified,
+            'sha256': sha.hexdigest(),
+            'size': size,
+        })
+        if changed:
+            # its 'keys' are still those of the previous merge
+            feed['merged'] = False
+        with self._lock:
+            self.state['feeds'][url] = feed
+        log.info('Feed %s: %s', 'changed' if changed else 'unchanged', url)
+        return changed, size
+
+    def fetch_all(self, feeds, force=False, workers=FETCH_WORKERS,
+                  progress=None):
+        """
+        Download feeds concurrently, each as fetch() would
+        :param feeds: list[(str, str)] URL and file name of each feed
+        :param force: bool Download, even if the server says unchanged
+        :param workers: int Feeds downloaded at once
+        :param progress: callable(url, changed, size), as each is done
+        :return: URLs of feeds whose content changed, in order
+        :rtype: list[str]
+        """
+        changed = set()
+        workers = max(1, min(workers or 1, len(feeds)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = dict(
+                (pool.submit(self.fetch, url, file_name, force), url)
+                for url, file_name in feeds)
+            try:
+                for future in as_completed(futures):
+                    url = futures[future]
+                    feed_changed, size = future.result()
+                    if feed_changed:
+                        changed.add(url)
+                    if progress is not None:
+                        progress(url, feed_changed, size)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return [url for url, _ in feeds if url in changed]
+
+    def _merged_sha256(self):
+        """
+        :return: Hash of the previous merge, if it is intact
+        :rtype: str
+        """
+        merged = self.state.get('merged')
+        if merged is None or not os.path.exists(self.merged_xml):
+            return None
+        if PackageIndex.file_sha256(self.merged_xml) != merged['sha256']:
+            return None
+        return merged['sha256']
+
+    def unchanged(self, urls):
+        """
+        :return: Whether no feed changed since the previous merge (of the
+        same feeds), after fetch()
+        :rtype: bool
+        """
+        merged = self.state.get('merged')
+        return (merged is not None and merged['urls'] == list(urls) and
+                all(self.state['feeds'].get(u, {}).get('merged')
+                    for u in urls) and
+                self._merged_sha256() is not None)
+
+    def merge(self, urls):
+        """
+        Merge feeds (after fetch()), as merge_plugins() would in order, but
+        only re-merging into the previous merge those changed since (or all,
+        if there is none). Either way, of duplicate plugins the first feed's
+        is kept. Each feed is streamed into the merge, see
+        iter_feed_plugins().
+        :param urls: list[str] Feed URLs
+        :return: Merged tree, for save_merged()
+        :rtype: QgisPluginTree
+        """
+        feeds = self.state['feeds']
+        missing = [u for u in urls if u not in feeds]
+        if missing:
+            raise MirrorError('Feeds not fetched: {0}'
+                              .format(', '.join(missing)))
+        merged = {}
+        if self._merged_sha256() is None:
+            tree = QgisPluginTree()
+            for u in urls:
+                self._merge_feed(tree, merged, u)
+            log.info('Merged %s feeds', len(urls))
+            return tree
+
+        rank = dict((u, i) for i, u in enumerate(urls))
+        dropped = [u for u in self.state['merged']['urls'] if u not in urls]
+        remerge = [u for u in urls if not feeds[u].get('merged')]
+        # feed each plugin of the previous merge came from ('keys' of
+        # changed feeds are still those of the previous merge)
+        previous = {}
+        for u in self.state['merged']['urls']:
+            for k in feeds.get(u, {}).get('keys', []):
+                previous.setdefault(tuple(k), u)
+        # first unchanged feed with each plugin, as its copy is unchanged
+        first = {}
+        for u in urls:
+            if u not in remerge:
+                for k in feeds[u]['keys']:
+                    first.setdefault(tuple(k), u)
+
+        # plugins only from changed or dropped feeds are stale
+        tree = QgisPluginTree(self.merged_xml)
+        owners = {}
+        for p in tree.plugins():
+            key = plugin_key(p)
+            owner = previous.get(key)
+            if owner is None or owner in remerge or owner in dropped:
+                p.getparent().remove(p)
+            else:
+                merged[key] = p
+                owners[key] = rank[owner]
+        for u in remerge:
+            self._merge_feed(tree, merged, u, owners=owners, rank=rank[u])
+        # plugins now first found in an unchanged feed, e.g. no longer in
+        # an earlier changed one: only those are merged from it again
+        wanted = {}
+        for key, u in first.items():
+            if owners.get(key, len(urls)) > rank[u]:
+                wanted.setdefault(u, set()).add(key)
+        for u in urls:
+            if u in wanted:
+                self._merge_feed(tree, merged, u, owners=owners, rank=rank[u],
+                                 only=wanted[u])
+        for u in dropped:
+            feeds.pop(u, None)
+        log.info('Re-merged %s of %s feeds', len(remerge), len(urls))
+        return tree
+
+    def _merge_feed(self, tree, merged, url, owners=None, rank=None,
+                    only=None):
+        """
+        Stream a feed's plugins into a merge, skipping (or replacing)
+        duplicates as they are parsed
+        :param tree: QgisPluginTree
+        :param merged: dict Plugins of the merge, by plugin_key()
+        :param url: str Feed URL
+        :param owners: dict Rank of the feed each plugin of the merge came
+        from, by plugin_key(); a duplicate replaces the plugin of a later
+        feed. None: duplicates are skipped, as feeds are merged in order
+        :param rank: int Feed's position in the merge, with owners
+        :param only: set Keys of the plugins to merge, the others skipped
+        (the feed's keys are then left as they were)
+        """
+        feed = self.state['feeds'][url]
+        path = os.path.join(self.state_dir, feed['file'])
+        root = tree.root_elem()
+        keys = []
+        for plugin in iter_feed_plugins(path):
+            name = plugin.get('name')
+            if name is not None and clean_attr_value(name) != name:
+                # some plugins have quotes in their metadata.txt name field
+                plugin.set('name', clean_attr_value(name))
+            key = plugin_key(plugin)
+            if None in key:
+                log.warning('Plugin to merge lacks name, version or '
+                            'file_name: %s', key)
+                continue
+            keys.append(key)
+            if only is not None and key not in only:
+                continue
+            existing = merged.get(key)
+            if existing is None:
+                root.append(plugin)
+            elif owners is not None and owners[key] > rank:
+                existing.getparent().replace(existing, plugin)
+            else:
+                continue
+            merged[key] = plugin
+            if owners is not None:
+                owners[key] = rank
+        if only is None:
+            feed['keys'] = [list(k) for k in keys]
+            feed['merged'] = True
+
+    def save_merged(self, xml, urls):
+        """
+        Write the merged plugins.xml, and the feeds' state
+        :param xml: bytes Merged tree's XML, e.g. once sorted
+        :param urls: list[str] Feed URLs merged
+        """
+        tmp_path = '{0}.tmp'.format(self.merged_xml)
+        with open(tmp_path, 'wb') as f:
+            f.write(xml)
+        os.replace(tmp_path, self.merged_xml)
+        self.state['merged'] = {
+            'sha256': hashlib.sha256(xml).hexdigest(),
+            'urls': list(urls),
+        }
+        self.write()
+
+    @staticmethod
+    def _mirror_record(merged_sha256, options, plugins_xml):
+        """
+        :param merged_sha256: str Hash of the merged upstream plugins.xml
+        :param options: dict Mirror options affecting the repo's plugins
+        :param plugins_xml: str Path of the repo's plugins.xml
+        :rtype: dict
+        """
+        options_json = json.dumps(options or {}, sort_keys=True)
+        return {
+            'merged': merged_sha256,
+            'options': hashlib.sha256(
+                options_json.encode('utf-8')).hexdigest(),
+            'plugins_xml': PackageIndex.file_sha256(plugins_xml)
+            if plugins_xml and os.path.exists(plugins_xml) else None,
+        }
+
+    def mirrored(self, repo_name, options=None, plugins_xml=None):
+        """
+        :param options: dict Mirror options affecting the repo's plugins
+        :param plugins_xml: str Path of the repo's current plugins.xml
+        :return: Whether the (intact) merge was mirrored into a repo in full,
+        with the same options, and the repo's plugins.xml is still the one
+        then written (not e.g. cleared, rebuilt or rolled back since)
+        :rtype: bool
+        """
+        sha256 = self._merged_sha256()
+        if sha256 is None:
+            return False
+        record = self.state['mirrored'].get(repo_name)
+        return isinstance(record, dict) and \
+            record.get('plugins_xml') is not None and \
+            record == self._mirror_record(sha256, options, plugins_xml)
+
+    def set_mirrored(self, repo_name, options=None, plugins_xml=None):
+        """
+        Record that the merge was mirrored into a repo in full
+        :param options: dict Mirror options affecting the repo's plugins
+        :param plugins_xml: str Path of the repo's plugins.xml, as written
+        """
+        self.state['mirrored'][repo_name] = self._mirror_record(
+            self.state['merged']['sha256'], options, plugins_xml)
+        self.write()
+
+    def write(self):
+        """Atomically write the feeds' state"""
+        tmp_path = '{0}.tmp'.format(self.state_path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+
+class DownloadCache(object):
+    """
+    Persistent cache of downloaded plugin archives, shared by mirror runs
+    and by repos, so an archive is only fetched from upstream once.
+
+    Archives are stored once per content hash, and looked up by download URL
+    and upstream file name (which, for plugins.qgis.org, both include the
+    version, so never change content). Hits are hard-linked (or copied) to
+    their destination, so archives must only be replaced, never modified in
+    place, as with repo generations. Beyond a total size, the least recently
+    used archives are evicted.
+
+    Several processes may share a cache: archives are written atomically,
+    and the index is merged with that on disk when written. An archive
+    evicted by another process is simply fetched again.
+    """
+
+    # unindexed archives older than this are left over from interrupted runs
+    ORPHAN_AGE = 3600  # seconds
+    WRITE_EVERY = 100  # index changes
+
+    def __init__(self, cache_dir, max_size=CACHE_MAX_SIZE, timeout=60):
+        """
+        :param cache_dir: str
+        :param max_size: int Bytes kept, once evicted
+        :param timeout: float Seconds to wait for an upstream response
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.timeout = timeout
+        self.index_path = os.path.join(cache_dir, CACHE_INDEX_NAME)
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        if not os.path.exists(self.objects_dir):
+            os.makedirs(self.objects_dir)
+        # (url, file_name) -> {'sha256', 'size', 'used'}
+        self.entries = self._read()
+        # (url, file_name) -> last used, when dropped
+        self._evicted = {}
+        self._changes = 0
+        self._remove_orphans()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _read(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (IOError, ValueError) as e:
+            log.warning("Error reading download cache index '%s': %s",
+                        self.index_path, e)
+            return {}
+        if index.get('version') != STATE_VERSION:
+            return {}
+        return dict(((e['url'], e['file_name']),
+                     {'sha256': e['sha256'], 'size': e['size'],
+                      'used': e['used']})
+                    for e in index['entries'])
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2],
+                            '{0}.zip'.format(sha256))
+
+    def _remove_orphans(self):
+        shas = set(e['sha256'] for e in self.entries.values())
+        old = time.time() - self.ORPHAN_AGE
+        for root, _, files in os.walk(self.objects_dir):
+            for f in files:
+                path = os.path.join(root, f)
+                if os.path.splitext(f)[0] in shas:
+                    continue
+                try:
+                    if os.path.getmtime(path) < old:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def lookup(self, url, file_name, sha256=None):
+        """
+        :param sha256: str Expected content hash, if known
+        :return: Path of a cached archive, or None
+        :rtype: str
+        """
+        entry = self.entries.get((url, file_name))
+        if entry is None or \
+                (sha256 is not None and entry['sha256'] != sha256):
+            return None
+        path = self.object_path(entry['sha256'])
+        try:
+            if os.path.getsize(path) == entry['size']:
+                return path
+        except OSError:
+            pass
+        # evicted by another process, or damaged
+        self._drop((url, file_name))
+        return None
+
+    def get(self, url, file_name, dest, sha256=None):
+        """
+        Place a cached archive at a destination path
+        :return: Whether it was cached
+        :rtype: bool
+        """
+        path = self.lookup(url, file_name, sha256=sha256)
+        if path is None:
+            return False
+        try:
+            self._place(path, dest)
+        except OSError as e:
+            log.warning("Error placing cached '%s': %s", file_name, e)
+            self._drop((url, file_name))
+            return False
+        self.entries[(url, file_name)]['used'] = time.time()
+        self._changed()
+        return True
+
+    @staticmethod
+    def _place(path, dest):
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            os.link(path, dest)
+        except OSError:
+            shutil.copyfile(path, dest)
+
+    def fetch(self, url, file_name, dest, sha256=None):
+        """
+        Place an archive at a destination path, from the cache if there,
+        else downloaded into the cache first
+        :param url: str Download URL
+        :param file_name: str Upstream file name
+        :param dest: str Destination path
+        :param sha256: str Expected content hash, if known
+        :return: Whether it was cached, and its size
+        :rtype: (bool, int)
+        """
+        if self.get(url, file_name, dest, sha256=sha256):
+            return True, self.entries[(url, file_name)]['size']
+        tmp_path = os.path.join(self.objects_dir, '{0}-{1}.part'.format(
+            os.getpid(), threading.get_ident()))
+        sha = hashlib.sha256()
+        size = 0
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as resp, \
+                    open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: resp.read(65536), b''):
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            if sha256 is not None and sha.hexdigest() != sha256:
+                raise MirrorError("Hash mismatch of '{0}': {1}, not {2}"
+                                  .format(url, sha.hexdigest(), sha256))
+            path = self.object_path(sha.hexdigest())
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            self._place(path, dest)
+        except (urllib.error.URLError, OSError) as e:
+            raise MirrorError("Error fetching '{0}': {1}".format(url, e))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evicted.pop((url, file_name), None)
+        self.entries[(url, file_name)] = {
+            'sha256': sha.hexdigest(), 'size': size, 'used': time.time()}
+        self._changed()
+        log.info('Fetched into download cache: %s', url)
+        return False, size
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._evicted[key] = entry['used']
+        self._changed()
+
+    def _changed(self):
+        self._changes += 1
+        if self._changes >= self.WRITE_EVERY:
+            self.write()
+
+    def size(self):
+        """
+        :return: Bytes stored (once per archive content)
+        :rtype: int
+        """
+        return sum(dict((e['sha256'], e['size'])
+                        for e in self.entries.values()).values())
+
+    def evict(self):
+        """
+        Remove the least recently used archives, beyond the maximum size
+        :return: Entries evicted
+        :rtype: int
+        """
+        total = self.size()
+        if total <= self.max_size:
+            return 0
+        refs = {}
+        for entry in self.entries.values():
+            refs[entry['sha256']] = refs.get(entry['sha256'], 0) + 1
+        evicted = 0
+        by_use = sorted(self.entries.items(), key=lambda e: e[1]['used'])
+        for key, entry in by_use:
+            if total <= self.max_size:
+                break
+            del self.entries[key]
+            self._evicted[key] = entry['used']
+            evicted += 1
+            refs[entry['sha256']] -= 1
+            if refs[entry['sha256']]:
+                continue  # same archive under another URL
+            total -= entry['size']
+            try:
+                os.remove(self.object_path(entry['sha256']))
+            except OSError:
+                pass
+        log.info('Evicted %s archives from download cache', evicted)
+        return evicted
+
+    def write(self):
+        """
+        Evict, then atomically write the index, merged with any written
+        meanwhile by other processes
+        """
+        for key, entry in self._read().items():
+            if entry['used'] <= self._evicted.get(key, -1):
+                continue  # dropped here, not used elsewhere since
+            mine = self.entries.get(key)
+            if mine is None:
+                if os.path.exists(self.object_path(entry['sha256'])):
+                    self.entries[key] = entry
+            elif mine['sha256'] == entry['sha256']:
+                mine['used'] = max(mine['used'], entry['used'])
+        self.evict()
+        self._changes = 0
+        index = {
+            'version': STATE_VERSION,
+            'entries': [dict(url=k[0], file_name=k[1], **e)
+                        for k, e in sorted(self.entries.items())],
+        }
+        tmp_path = '{0}.{1}.tmp'.format(self.index_path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+
+class MirrorProgress(object):
+    """
+    Durable progress of mirroring upstream plugins into a repo: the phase
+    reached and the state of each plugin (by upstream file name), so an
+    interrupted mirror can be resumed where it stopped.
+
+    Plugins ingested or overlaid are only recorded together with the repo's
+    plugins.xml they are in, at checkpoints: the hash of the plugins.xml
+    about to be written is recorded first (as pending), then it is written,
+    then the checkpoint committed. On resume, recover() tells from the
+    plugins.xml on disk whether a pending checkpoint made it.
+    """
+
+    def __init__(self, state_dir, repo_name):
+        """
+        :param state_dir: str Directory for the state, e.g. of UpstreamFeeds
+        :param repo_name: str Repo mirrored into
+        """
+        self.path = os.path.join(state_dir,
+                                 'progress-{0}.json'.format(repo_name))
+        self.state = None
+        self._batch = {}  # plugin states since the last checkpoint
+        self._changes = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (IOError, ValueError) as e:
+                log.warning("Error reading mirror progress '%s': %s",
+                            self.path, e)
+            else:
+                if state.get('version') == STATE_VERSION:
+                    self.state = state
+
+    def unfinished(self):
+        """
+        :return: Whether a mirror was begun but not finished
+        :rtype: bool
+        """
+        return self.state is not None and self.state['phase'] != DONE
+
+    def resumable(self, merged_xml, options):
+        """
+        :param merged_xml: str Path of the merged upstream plugins.xml
+        :param options: dict Mirror options affecting the repo's plugins
+        :return: Whether an unfinished mirror of the same merge, with the
+        same options, can be resumed
+        :rtype: bool
+        """
+        return (self.unfinished() and os.path.exists(merged_xml) and
+                self.state['merged'] ==
+                PackageIndex.file_sha256(merged_xml) and
+                self.state['options'] == options)
+
+    def begin(self, merged_xml, options):
+        """
+        Start recording a new mirror, forgetting any earlier one
+        :param merged_xml: str Path of the merged upstream plugins.xml
+        :param options: dict Mirror options affecting the repo's plugins
+        """
+        self.state = {
+            'version': STATE_VERSION,
+            'merged': PackageIndex.file_sha256(merged_xml),
+            'options': options,
+            'phase': DOWNLOAD,
+            'building': None,
+            'xml_sha256': None,
+            'pending': None,
+            'plugins': {},
+        }
+        self._batch = {}
+        self.write()
+
+    @property
+    def phase(self):
+        return self.state['phase']
+
+    @property
+    def building(self):
+        """
+        :rtype: str Repo generation being built by the mirror, if any
+        """
+        return self.state['building']
+
+    def set_building(self, building):
+        self.state['building'] = building
+        self.write()
+
+    def status(self, file_name):
+        """
+        :return: State of a plugin, e.g. FETCHED, or None if not yet fetched
+        :rtype: str
+        """
+        return self._batch.get(file_name,
+                               self.state['plugins'].get(file_name))
+
+    def count(self, status):
+        return sum(1 for f in set(self.state['plugins']) | set(self._batch)
+                   if self.status(f) == status)
+
+    def fetched(self, file_name):
+        """Record a plugin as downloaded (written every so often)"""
+        self.state['plugins'][file_name] = FETCHED
+        self._changes += 1
+        if self._changes >= CHECKPOINT_EVERY:
+            self.write()
+
+    def set_status(self, file_name, status):
+        """Record a plugin's state, as of the next checkpoint"""
+        self._batch[file_name] = status
+
+    def pending(self):
+        """
+        :return: Plugins whose state changed since the last checkpoint
+        :rtype: int
+        """
+        return len(self._batch)
+
+    def set_phase(self, phase):
+        """Move on to a phase not depending on plugins.xml, e.g. INGEST"""
+        self.state['phase'] = phase
+        self.write()
+
+    def prepare_checkpoint(self, xml, phase=None):
+        """
+        Record a checkpoint about to be made, before writing plugins.xml
+        :param xml: bytes plugins.xml about to be written
+        :param phase: str Phase reached with it, if moving on
+        """
+        self.state['pending'] = {
+            'sha256': hashlib.sha256(xml).hexdigest(),
+            'phase': phase or self.state['phase'],
+            'plugins': self._batch,
+        }
+        self._batch = {}
+        self.write()
+
+    def commit_checkpoint(self):
+        """Record a checkpoint made, once plugins.xml is written"""
+        pending = self.state['pending']
+        if pending is None:
+            return
+        self.state['plugins'].update(pending['plugins'])
+        self.state['xml_sha256'] = pending['sha256']
+        self.state['phase'] = pending['phase']
+        self.state['pending'] = None
+        self.write()
+
+    def recover(self, plugins_xml):
+        """
+        Reconcile the progress with a repo's plugins.xml, before resuming
+        :param plugins_xml: str Path of the plugins.xml mirrored into
+        :return: Whether plugins.xml is as of the last checkpoint; if not
+        (e.g. changed since by something else), plugins recorded ingested
+        may not be in it
+        :rtype: bool
+        """
+        self._batch = {}
+        sha256 = None
+        if os.path.exists(plugins_xml):
+            sha256 = PackageIndex.file_sha256(plugins_xml)
+        pending = self.state['pending']
+        if pending is not None:
+            if sha256 == pending['sha256']:
+                log.info('Pending mirror checkpoint was made')
+                self.commit_checkpoint()
+            else:
+                log.info('Pending mirror checkpoint was not made')
+                self.state['pending'] = None
+                self.write()
+        return self.state['xml_sha256'] in (None, sha256)
+
+    def restart_ingest(self):
+        """Forget plugins ingested (or later), e.g. if their repo is lost"""
+        for f, status in self.state['plugins'].items():
+            if status != FETCHED:
+                self.state['plugins'][f] = FETCHED
+        if self.state['phase'] != DOWNLOAD:
+            self.state['phase'] = INGEST
+        self.state['xml_sha256'] = None
+        self.state['building'] = None
+        self.write()
+
+    def write(self):
+        """Atomically write the progress (not the uncommitted plugins)"""
+        self._changes = 0
+        tmp_path = '{0}.tmp'.format(self.path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
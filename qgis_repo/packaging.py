@@ -0,0 +1,690 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ packaging.py
+
+ Repo archives: tar streams compressed as parallel gzip blocks, storing
+ already-compressed files as is, with a manifest of file hashes and sizes
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import errno
+import gzip
+import json
+import hashlib
+import logging
+import shutil
+import tarfile
+import tempfile
+import zlib
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .repo import Error
+
+log = logging.getLogger(__name__)
+
+# Already compressed: deflating them again costs CPU for ~no size reduction
+STORED_EXTENSIONS = ('.zip', '.png', '.jpg', '.jpeg', '.gif', '.gz', '.ico')
+
+# Uncompressed bytes per gzip member, i.e. unit of parallel work
+BLOCK_SIZE = 1048576
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '.manifest.json'
+
+# renameat(2)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+
+class PackagingError(Error):
+    pass
+
+
+def is_stored(path):
+    """Whether a file is archived without compressing it again"""
+    return path.lower().endswith(STORED_EXTENSIONS)
+
+
+def _gzip_block(data, level):
+    # zlib releases the GIL while compressing, so blocks run in parallel;
+    # compressobj(), as zlib.compress() only takes wbits from Python 3.11
+    c = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
+
+
+class ParallelGzipWriter(object):
+    """
+    Write-only file object compressing its data, in blocks, on a thread
+    pool, as a multi-member gzip stream (readable by gzip, tar and Python's
+    gzip/tarfile modules as one stream). Setting level starts a new block,
+    so level 0 (stored) applies to only the data written after it.
+    """
+
+    def __init__(self, fileobj, level=6, workers=None,
+                 block_size=BLOCK_SIZE):
+        """
+        :param fileobj: Binary file object to write compressed data to
+        :param level: int zlib compression level, 0 (store) to 9
+        :param workers: int Compression threads (default: CPU count)
+        :param block_size: int Uncompressed bytes per gzip member
+        """
+        self.fileobj = fileobj
+        self._level = level
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = block_size
+        self.raw_size = 0
+        self.size = 0
+        self.blocks = 0
+        self.sha256 = hashlib.sha256()
+        self._buf = bytearray()
+        self._pending = deque()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    @property
+    def level(self):
+        return self._level
+
+    @level.setter
+    def level(self, level):
+        if level != self._level:
+            self._submit()
+            self._level = level
+
+    def tell(self):
+        return self.raw_size
+
+    def write(self, data):
+        self._buf += data
+        self.raw_size += len(data)
+        while len(self._buf) >= self.block_size:
+            block = bytes(self._buf[:self.block_size])
+            del self._buf[:self.block_size]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block=None):
+        if block is None:
+            if not self._buf:
+                return
+            block = bytes(self._buf)
+            self._buf.clear()
+        self._pending.append(
+            self._pool.submit(_gzip_block, block, self._level))
+        # bound memory: at most two blocks queued per worker
+        while len(self._pending) > self.workers * 2:
+            self._write_out(self._pending.popleft().result())
+
+    def _write_out(self, member):
+        self.fileobj.write(member)
+        self.sha256.update(member)
+        self.size += len(member)
+        self.blocks += 1
+
+    def flush(self):
+        """Compress and write out everything written so far"""
+        self._submit()
+        while self._pending:
+            self._write_out(self._pending.popleft().result())
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown()
+
+
+class _HashingReader(object):
+    """Read-only file object, hashing what is read through it"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
+def walk_repo(base_dir, name):
+    """
+    :param base_dir: str Directory containing the repo directory
+    :param name: str Repo directory name
+    :return: Archive names (relative to base_dir) of the repo directory and
+    everything under it, directories before their contents, sorted
+    :rtype: list[str]
+    """
+    names = [name]
+    for root, dirs, files in os.walk(os.path.join(base_dir, name)):
+        dirs.sort()
+        rel = os.path.relpath(root, base_dir)
+        for d in dirs:
+            names.append(os.path.join(rel, d))
+        for f in sorted(files):
+            names.append(os.path.join(rel, f))
+    return names
+
+
+def _file_sha256(path):
+    with open(path, 'rb') as f:
+        reader = _HashingReader(f)
+        while reader.read(1048576):
+            pass
+    return reader.sha256.hexdigest()
+
+
+class _ArchiveBuilder(object):
+    """
+    Adds a repo's entries to a tar archive, recording the manifest; with a
+    base manifest, only files added or changed since are archived.
+    """
+
+    def __init__(self, tar, writer, base_dir, name, level, base=None):
+        self.tar = tar
+        self.writer = writer
+        self.name = name
+        # resolved, as the repo directory may be a symlink to its live
+        # generation, archived as a plain directory
+        self.repo_dir = os.path.realpath(os.path.join(base_dir, name))
+        self.level = level
+        self.base_files = base['files'] if base else None
+        self.files = {}
+        self.dirs = []
+        self.archived = []
+
+    def add(self, arcname):
+        path = os.path.normpath(os.path.join(
+            self.repo_dir, os.path.relpath(arcname, self.name)))
+        key = arcname.replace(os.sep, '/')
+        info = self.tar.gettarinfo(path, arcname)
+        if info.isdir():
+            self.dirs.append(key)
+        if not info.isreg():
+            # directories always, so empty ones (and modes) are restored
+            self.tar.addfile(info)
+            return
+        prev = self.base_files.get(key) if self.base_files else None
+        sha256 = None
+        if prev is not None:
+            if prev['size'] == info.size and prev['mtime'] == info.mtime:
+                # quick check, as rsync does: unchanged, not read again
+                self.files[key] = prev
+                return
+            sha256 = _file_sha256(path)
+            if sha256 == prev['sha256'] and prev['size'] == info.size:
+                self.files[key] = dict(prev, mtime=info.mtime)
+                return
+        self.writer.level = 0 if is_stored(arcname) else self.level
+        with open(path, 'rb') as f:
+            reader = _HashingReader(f)
+            self.tar.addfile(info, reader)
+        self.files[key] = {
+            'size': reader.size,
+            'mtime': info.mtime,
+            'sha256': reader.sha256.hexdigest(),
+        }
+        self.archived.append(key)
+
+
+def write_repo_archive(base_dir, name, archive_path, level=6, workers=None,
+                       block_size=BLOCK_SIZE, progress=None, base=None):
+    """
+    Archive a repo directory as a .tar.gz, compressed on several threads,
+    with already-compressed files (see STORED_EXTENSIONS) stored as is.
+    Files are hashed as they are read into the archive.
+
+    With a base manifest, from a previous snapshot, the archive is an
+    increment: only files added or changed since (by size and mtime, then
+    hash) are archived, and those deleted since are listed in the manifest.
+
+    :param base_dir: str Directory containing the repo directory
+    :param name: str Repo directory name, i.e. the archive's top directory
+    (if a symlink, e.g. to the repo's live generation, its target is
+    archived)
+    :param archive_path: str .tar.gz to write (replaced, if it exists)
+    :param level: int zlib compression level for other files
+    :param workers: int Compression threads (default: CPU count)
+    :param progress: callable Called with each archive name, once added
+    :param base: dict Manifest of the snapshot to make an increment of
+    :return: Manifest of the archive, see write_manifest()
+    :rtype: dict
+    """
+    if base is not None and base.get('repo') != name:
+        raise PackagingError("Base snapshot '{0}' is not of repo '{1}'"
+                             .format(base.get('archive'), name))
+    part_path = archive_path + '.part'
+    try:
+        with open(part_path, 'wb') as out:
+            writer = ParallelGzipWriter(out, level=level, workers=workers,
+                                        block_size=block_size)
+            try:
+                with tarfile.TarFile(fileobj=writer, mode='w') as tar:
+                    builder = _ArchiveBuilder(tar, writer, base_dir, name,
+                                              level, base)
+                    for arcname in walk_repo(base_dir, name):
+                        builder.add(arcname)
+                        if progress is not None:
+                            progress(arcname)
+            finally:
+                writer.close()
+        os.replace(part_path, archive_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    log.info('Archived %s of %s files, %s bytes into %s bytes (%s blocks)',
+             len(builder.archived), len(builder.files), writer.raw_size,
+             writer.size, writer.blocks)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'repo': name,
+        'created': datetime.now().isoformat(),
+        'archive': os.path.basename(archive_path),
+        'archive_size': writer.size,
+        'archive_sha256': writer.sha256.hexdigest(),
+        'base': None,
+        'files': builder.files,
+        'dirs': builder.dirs,
+    }
+    if base is not None:
+        manifest.update({
+            'base': base['archive'],
+            'archived': builder.archived,
+            'deleted': sorted(set(base['files']) - set(builder.files)),
+            'deleted_dirs': sorted(set(base.get('dirs', [])) -
+                                   set(builder.dirs)),
+        })
+    return manifest
+
+
+def manifest_path(archive_path):
+    return archive_path + MANIFEST_SUFFIX
+
+
+def write_manifest(manifest, path):
+    """
+    :param manifest: dict Repo (directory) name, archive name, size and
+    SHA-256, 'dirs' and 'files' (archive name -> size, mtime and sha256) of
+    the repo at the time. Increments also have their 'base' snapshot's
+    archive name, and the files 'archived' in them or 'deleted' (and
+    'deleted_dirs') since the base.
+    :param path: str JSON file to write, e.g. manifest_path(archive)
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def read_manifest(path):
+    """
+    :rtype: dict
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (IOError, ValueError) as e:
+        raise PackagingError("Could not read manifest '{0}': {1}"
+                             .format(path, e))
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise PackagingError("Unsupported manifest version in '{0}'"
+                             .format(path))
+    return manifest
+
+
+def list_snapshots(snapshot_dir, name):
+    """
+    :param snapshot_dir: str Directory of archives and their manifests
+    :param name: str Repo (directory) name
+    :return: Manifests of the repo's snapshots, oldest first
+    :rtype: list[dict]
+    """
+    snapshots = []
+    if not os.path.isdir(snapshot_dir):
+        return snapshots
+    for entry in sorted(os.listdir(snapshot_dir)):
+        if not entry.endswith(MANIFEST_SUFFIX):
+            continue
+        try:
+            manifest = read_manifest(os.path.join(snapshot_dir, entry))
+        except PackagingError as e:
+            log.warning('%s', e)
+            continue
+        if manifest.get('repo') == name and os.path.exists(
+                os.path.join(snapshot_dir, manifest['archive'])):
+            snapshots.append(manifest)
+    return sorted(snapshots, key=lambda m: m['created'])
+
+
+def snapshot_chain(snapshot_dir, archive):
+    """
+    :param snapshot_dir: str Directory of archives and their manifests
+    :param archive: str Archive name of a (full or incremental) snapshot
+    :return: Manifests of the full snapshot, then each increment, up to and
+    including the archive's
+    :rtype: list[dict]
+    """
+    chain = []
+    while archive is not None:
+        if any(m['archive'] == archive for m in chain):
+            raise PackagingError("Snapshot chain loops at '{0}'"
+                                 .format(archive))
+        path = os.path.join(snapshot_dir, archive)
+        if not os.path.exists(path):
+            raise PackagingError("Snapshot archive not found: {0}"
+                                 .format(path))
+        manifest = read_manifest(manifest_path(path))
+        chain.insert(0, manifest)
+        archive = manifest.get('base')
+    return chain
+
+
+def _member_path(dest_dir, repo, name):
+    parts = name.split('/')
+    if parts[0] != repo or '..' in parts or '' in parts[1:]:
+        raise PackagingError("Unsafe or foreign archive member: {0}"
+                             .format(name))
+    return os.path.join(dest_dir, *parts)
+
+
+def _write_member(path, data, mode, mtime):
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.chmod(path, mode)
+    os.utime(path, (mtime, mtime))
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+
+def _stream_member(path, src, mode, mtime):
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in iter(lambda: src.read(1048576), b''):
+            sha.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    os.chmod(path, mode)
+    os.utime(path, (mtime, mtime))
+    return sha.hexdigest(), size
+
+
+class _SnapshotExtractor(object):
+    """
+    Extracts snapshot archives into a directory, streaming each archive
+    once: member data is read on the calling thread, then written and
+    hashed on a thread pool. Every file is verified against the manifest,
+    as is each archive's own hash. Only directories and regular files
+    under the repo directory are extracted.
+    """
+
+    # Members at most this big are written on the pool; bigger ones are
+    # streamed to disk on the reading thread
+    POOL_MEMBER_SIZE = 16777216
+    # Bytes of member data waiting for the pool, at most
+    MAX_QUEUED = 67108864
+
+    def __init__(self, dest_dir, repo, workers=None):
+        """
+        :param dest_dir: str Directory to extract the repo directory into
+        :param repo: str Repo (directory) name
+        :param workers: int Writer threads (default: CPU count)
+        """
+        self.dest_dir = dest_dir
+        self.repo = repo
+        self.workers = workers or os.cpu_count() or 1
+        self.hashes = {}  # archive name -> sha256, as last extracted
+        self.dirs = {}  # path -> mtime
+        self._pending = deque()
+        self._queued = 0
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _verify(self, key, expected, result):
+        sha256, size = result
+        if size != expected['size'] or sha256 != expected['sha256']:
+            raise PackagingError("Verification failed for {0}: "
+                                 "{1} bytes, sha256 {2}"
+                                 .format(key, size, sha256))
+        self.hashes[key] = sha256
+
+    def _drain(self, max_queued=-1):
+        # by default, until none are pending (even if empty files)
+        while self._pending and self._queued > max_queued:
+            key, expected, future, nbytes = self._pending.popleft()
+            self._queued -= nbytes
+            self._verify(key, expected, future.result())
+
+    def _extract_member(self, tar, member, manifest, seen):
+        key = member.name.rstrip('/')
+        path = _member_path(self.dest_dir, self.repo, key)
+        if member.isdir():
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self.dirs[path] = member.mtime
+            return
+        if not member.isreg():
+            raise PackagingError("Unsupported archive member type: {0}"
+                                 .format(key))
+        expected = manifest['files'].get(key)
+        if expected is None:
+            raise PackagingError("Archive member not in manifest: {0}"
+                                 .format(key))
+        seen.add(key)
+        parent = os.path.dirname(path)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        # as tarfile's 'data' filter: no group/other write, or setuid, etc.
+        mode = member.mode & 0o755
+        src = tar.extractfile(member)
+        if member.size > self.POOL_MEMBER_SIZE:
+            self._verify(key, expected,
+                         _stream_member(path, src, mode, member.mtime))
+            return
+        data = src.read()
+        self._pending.append((key, expected, self._pool.submit(
+            _write_member, path, data, mode, member.mtime), len(data)))
+        self._queued += len(data)
+        self._drain(self.MAX_QUEUED)
+
+    def extract(self, archive_path, manifest):
+        """
+        Extract (and verify) one snapshot archive, then remove the files its
+        manifest lists as deleted
+        :param archive_path: str
+        :param manifest: dict The archive's manifest
+        """
+        seen = set()
+        try:
+            with open(archive_path, 'rb') as f:
+                reader = _HashingReader(f)
+                # GzipFile: tarfile's own stream reads only the first member
+                with gzip.GzipFile(fileobj=reader, mode='rb') as gz, \
+                        tarfile.open(fileobj=gz, mode='r|') as tar:
+                    for member in tar:
+                        self._extract_member(tar, member, manifest, seen)
+                # end of archive padding, for the archive's hash
+                while reader.read(1048576):
+                    pass
+            self._drain()
+        except (EOFError, tarfile.TarError, zlib.error) as e:
+            raise PackagingError("Could not read archive {0}: {1}"
+                                 .format(archive_path, e))
+        if reader.sha256.hexdigest() != manifest['archive_sha256']:
+            raise PackagingError("Verification failed for archive {0}"
+                                 .format(archive_path))
+        missing = set(manifest.get('archived', manifest['files'])) - seen
+        if missing:
+            raise PackagingError("Files missing from archive {0}: {1}"
+                                 .format(archive_path,
+                                         ', '.join(sorted(missing))))
+        _remove_deleted(self.dest_dir, manifest)
+        for key in manifest.get('deleted', []):
+            self.hashes.pop(key, None)
+
+    def finish(self, manifest):
+        """
+        Check the extracted files are exactly those of the (last) manifest,
+        and set directory mtimes
+        :param manifest: dict Manifest of the snapshot extracted
+        """
+        self._drain()
+        self._pool.shutdown()
+        expected = dict((k, v['sha256'])
+                        for k, v in manifest['files'].items())
+        if self.hashes != expected:
+            diff = set(expected.items()) ^ set(self.hashes.items())
+            raise PackagingError(
+                "Extracted files differ from manifest: {0}".format(
+                    ', '.join(sorted(set(k for k, _ in diff)))))
+        # deepest first, since setting a child's mtime touches its parent
+        for path in sorted(self.dirs, reverse=True):
+            if os.path.isdir(path):
+                os.utime(path, (self.dirs[path], self.dirs[path]))
+
+    def close(self):
+        self._pool.shutdown()
+
+
+def _remove_deleted(dest_dir, manifest):
+    for key in manifest.get('deleted', []):
+        path = os.path.join(dest_dir, *key.split('/'))
+        if os.path.lexists(path):
+            os.remove(path)
+    # deepest first, so parents are empty by then
+    for key in sorted(manifest.get('deleted_dirs', []), reverse=True):
+        path = os.path.join(dest_dir, *key.split('/'))
+        if os.path.isdir(path) and not os.listdir(path):
+            os.rmdir(path)
+
+
+def reconstruct_snapshot(snapshot_dir, archive, dest_dir, progress=None,
+                         workers=None):
+    """
+    Restore a repo directory as of a snapshot, by extracting its full base
+    snapshot, then applying each increment (extracting its changed files
+    and removing those deleted) in order, verifying every file against the
+    manifests. Nothing is left in dest_dir if that fails.
+
+    :param snapshot_dir: str Directory of archives and their manifests
+    :param archive: str Archive name of the snapshot to restore
+    :param dest_dir: str Directory to restore the repo directory into
+    :param progress: callable Called with each manifest, once applied
+    :param workers: int Writer threads (default: CPU count)
+    :return: Manifest of the restored snapshot
+    :rtype: dict
+    :raises PackagingError: if a snapshot is missing, or does not verify
+    """
+    chain = snapshot_chain(snapshot_dir, archive)
+    target = os.path.join(dest_dir, chain[-1]['repo'])
+    if os.path.exists(target):
+        raise PackagingError("Restore destination already exists: {0}"
+                             .format(target))
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+    extractor = _SnapshotExtractor(dest_dir, chain[-1]['repo'], workers)
+    try:
+        for manifest in chain:
+            extractor.extract(
+                os.path.join(snapshot_dir, manifest['archive']), manifest)
+            if progress is not None:
+                progress(manifest)
+        extractor.finish(chain[-1])
+    except BaseException:
+        extractor.close()
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        raise
+    return chain[-1]
+
+
+_libc = None
+
+
+def exchange_paths(path_a, path_b):
+    """
+    Swap two paths on the same file system, atomically where supported
+    (Linux renameat2 RENAME_EXCHANGE, via libc), else with three renames.
+    :rtype: bool Whether the swap was atomic
+    """
+    global _libc
+    if _libc is None:
+        import ctypes
+        import ctypes.util
+        libc_name = ctypes.util.find_library('c')
+        _libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else False
+    if _libc and hasattr(_libc, 'renameat2'):
+        import ctypes
+        if _libc.renameat2(AT_FDCWD, os.fsencode(path_a), AT_FDCWD,
+                           os.fsencode(path_b), RENAME_EXCHANGE) == 0:
+            return True
+        err = ctypes.get_errno()
+        if err not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(err, os.strerror(err), path_a)
+    tmp_path = '{0}.swap-{1}'.format(path_b, os.getpid())
+    os.rename(path_b, tmp_path)
+    os.rename(path_a, path_b)
+    os.rename(tmp_path, path_a)
+    return False
+
+
+def unpack_snapshot(snapshot_dir, archive, web_base, progress=None,
+                    workers=None, generations=None):
+    """
+    Restore a repo directory in place, as of a snapshot: reconstructed and
+    verified in a staging directory in web_base, then swapped with the
+    current repo directory (if any), which is then removed. For a repo
+    published as generations, it is published as a new generation instead.
+
+    :param snapshot_dir: str Directory of archives and their manifests
+    :param archive: str Archive name of the snapshot to restore
+    :param web_base: str Directory of the repo directory
+    :param progress: callable Called with each manifest, once applied
+    :param workers: int Writer threads (default: CPU count)
+    :param generations: RepoGenerations The repo's, if it keeps any
+    :return: Manifest of the restored snapshot
+    :rtype: dict
+    """
+    if not os.path.exists(web_base):
+        os.makedirs(web_base)
+    repo = snapshot_chain(snapshot_dir, archive)[-1]['repo']
+    staging = tempfile.mkdtemp(prefix='.{0}.unpack-'.format(repo),
+                               dir=web_base)
+    building = None
+    try:
+        manifest = reconstruct_snapshot(snapshot_dir, archive, staging,
+                                        progress=progress, workers=workers)
+        live = os.path.join(web_base, repo)
+        staged = os.path.join(staging, repo)
+        if generations is not None:
+            building = generations.begin(empty=True)
+            os.rmdir(building)
+            os.rename(staged, building)
+            generations.publish(building)
+            building = None
+        elif os.path.exists(live):
+            if not exchange_paths(staged, live):
+                log.warning('Repo directory swapped non-atomically')
+        else:
+            os.rename(staged, live)
+    finally:
+        if building is not None:
+            generations.abort(building)
+        # the replaced repo directory, if any, or what was staged
+        shutil.rmtree(staging)
+    return manifest
@@ -25,6 +25,7 @@
 
 import os
 import sys
+import copy
 import logging
 import codecs
 import re
@@ -33,13 +34,17 @@ import io
 import tempfile
 import zipfile
 import configparser
-import pprint
+import hashlib
+import json
 
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from xml.sax.saxutils import escape
 from lxml import etree
 
+from .memprofile import phase
+from .timing import span
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 if os.environ.get('DEBUG') == '1':
@@ -69,6 +74,8 @@ conf = {
         'uploads_dir': './uploads',
         'uploaded_by': 'Administrator',
         'web_base': './www',
+        # published generations kept for rollback; 0: update in place
+        'generations': 0,
     },
     'repos': {
         'qgis': {
@@ -129,15 +136,22 @@ def vjust(ver_str, level=3, delim='.', bitsize=3,
 
 
 def xml_escape(text):
-    # escape() and unescape() takes care of &, < and >.
-    escape_table = {
-        '"': "&#34;",
-        "'": "&#39;",
-    }
-    t = escape(str(text), escape_table)
+    # as xml.sax.saxutils.escape() with a table for " and ', which is not
+    # imported since it pulls in urllib.request
+    t = str(text).replace('&', '&amp;').replace('>', '&gt;')\
+        .replace('<', '&lt;').replace('"', '&#34;').replace("'", '&#39;')
     return t.encode('ascii', 'xmlcharrefreplace')
 
 
+def unsafe_zip_member(zname):
+    """
+    Whether a ZIP archive member's path could escape its extract directory
+    :param zname: str Member name
+    :rtype: bool
+    """
+    return zname.find('..') != -1 or zname.find(os.path.sep) == 0
+
+
 def clean_attr_value(val):
     """
     Remove unwanted text values that should not be in XML attributes
@@ -156,6 +170,23 @@ def clean_attr_value(val):
     return new_val
 
 
+# A version stamped by a repo's name suffix: version-YYYYmmddHHMM[-githash]
+STAMPED_VERSION = re.compile(r'^(.+)-(\d{12})(-[^-]+)?$')
+
+
+def set_metadata_fields(metadatatxt, fields):
+    """
+    :param metadatatxt: str metadata.txt contents
+    :param fields: dict Field values to set, e.g. name, version
+    :rtype: str
+    """
+    for key, value in fields.items():
+        metadatatxt = re.sub(
+            r'(?m)^([ \t]*{0}[ \t]*=[ \t]*).*$'.format(re.escape(key)),
+            lambda m: m.group(1) + value, metadatatxt, count=1)
+    return metadatatxt
+
+
 class Error(Exception):
     """Base class for exceptions in this module."""
     def __init__(self, value):
@@ -437,7 +468,7 @@ class QgisPluginTree(object):
             return self.plugins_sorted_by_version(pth_res, reverse=reverse) \
                 if sort else pth_res
 
-    def merge_plugins(self, other_plugins_xml):
+    def merge_plugins(self, other_plugins_xml, replace=False):
         """
         Merge other plugins.xml into this tree, adding new plugins and
         avoiding  duplicates. Any to-merge plugin that matches name, version and
@@ -445,7 +476,11 @@ class QgisPluginTree(object):
 
         Note: this does not ensure parity of XML elements or base URLs, etc.
         :param other_plugins_xml: other plugins.xml path or URL (HTTP or FTP)
+        :param replace: bool Replace duplicates, rather than skip them
+        :return: (name, version, file_name) of each plugin in other
+        :rtype: list[tuple]
         """
+        keys = []
         # plugins = self.tree.getroot()
         other_tree = QgisPluginTree(other_plugins_xml)
         for a_plugin in other_tree.plugins():
@@ -465,6 +500,7 @@ class QgisPluginTree(object):
                     etree.tostring(a_plugin, pretty_print=True, method="xml",
                                    encoding='UTF-8', xml_declaration=True))
                 continue
+            keys.append((name, version, file_name))
             pth = ".//pyqgis_plugin[@name='{0}' and @version='{1}']/" \
                   "file_name[. = '{2}']/text()".format(name, version, file_name)
             log.debug('xpath = %s', pth)
@@ -475,8 +511,12 @@ class QgisPluginTree(object):
                       and pth_res[0] == file_name)
             log.debug('plugin exists already = %s', exists)
             if exists:
+                if replace:
+                    existing = pth_res[0].getparent().getparent()
+                    existing.getparent().replace(existing, a_plugin)
                 continue
             self.append_plugin(a_plugin)
+        return keys
 
 
 class QgisPlugin(object):
@@ -492,51 +532,89 @@ class QgisPlugin(object):
             self.out(RepoPluginError("Plugin .zip file name required"))
             return
 
-        self.repo = repo
-        """:type: QgisRepo"""
         self.zip_name = zip_name
-        self.zip_path = os.path.join(self.repo.upload_dir, self.zip_name)
+        self.zip_path = os.path.join(repo.upload_dir, self.zip_name)
         self.output = with_output
 
-        self.name_suffix = name_suffix if name_suffix is not None \
-            else self.repo.plugin_name_suffix
-        self.uploaded_by = self.repo.uploaded_by
-
         # Role based authorization
         self.auth = auth
         self.auth_role = auth_role
         self.requires_auth = self.auth_role is not None or self.auth
-        if self.auth_role is not None:
-            clean_roles = [s.replace('Desktop', '')
-                           for s in self.auth_role.split(',')]
-            subscription_text = "<b>%s</b>" % '</b> or <b>'.join(clean_roles)
-            self.authorization_message = \
-                (Path(self.repo.template_dir) / self.repo.auth_text_html)\
-                .read_text(encoding='utf-8')\
-                .replace('#SUBSCRIPTION_TEXT#', subscription_text)
-        else:
-            self.authorization_message = ''
-
-        self.auth_suffix = ''
-        if self.requires_auth:
-            self.auth_suffix = self.repo.auth_dld_msg
         self.git_hash = git_hash
         self.untrusted = untrusted
         self.invalid_fields = invalid_fields
+        self._bind_repo(repo, name_suffix)
+
+        # Link or copy the archive into place, rather than move it, e.g.
+        # while it is still to be added to other repos
+        self.keep_archive = False
 
         # undefined until validated
+        self.zip_size = None
         self.package_name = None
         self.metadata = None
         self.metadatatxt = None
         self.new_metadatatxt = None
         self.curdatetime = None
+        self._validated_metadata = None
+        # icon read from the archive, shared with for_repo() copies
+        self._icon_cache = {}
 
         # undefined until archive moved into place
         self.new_zip_name = None
         self.new_zip_path = None
 
         self._validate()
-        self._update_metadata()
+        self._validated_metadata = dict(self.metadata)
+        with span('update_metadata'):
+            self._update_metadata()
+
+    def _bind_repo(self, repo, name_suffix=None):
+        """Set up the repo-specific settings, e.g. name suffix, auth text"""
+        self.repo = repo
+        """:type: QgisRepo"""
+        self.name_suffix = name_suffix if name_suffix is not None \
+            else self.repo.plugin_name_suffix
+        self.uploaded_by = self.repo.uploaded_by
+
+        if self.auth_role is not None:
+            clean_roles = [s.replace('Desktop', '')
+                           for s in self.auth_role.split(',')]
+            subscription_text = "<b>%s</b>" % '</b> or <b>'.join(clean_roles)
+            self.authorization_message = \
+                (Path(self.repo.template_dir) / self.repo.auth_text_html)\
+                .read_text(encoding='utf-8')\
+                .replace('#SUBSCRIPTION_TEXT#', subscription_text)
+        else:
+            self.authorization_message = ''
+
+        self.auth_suffix = ''
+        if self.requires_auth:
+            self.auth_suffix = self.repo.auth_dld_msg
+
+    def for_repo(self, repo, name_suffix=None):
+        """
+        Copy of this (validated, not yet set up) plugin for adding to another
+        repo, with that repo's name suffix/version rewriting applied, but
+        without validating the archive again.
+        :param repo: QgisRepo
+        :param name_suffix: str Overrides the repo's plugin_name_suffix
+        :rtype: QgisPlugin
+        """
+        if self.new_zip_path is not None:
+            raise RepoPluginError('Plugin already set up in a repo')
+        if self.zip_size > repo.max_upload_size:
+            raise ValidationError(
+                "ZIP archive is too big at ({0}) Bytes. Max size is {1} Bytes"
+                .format(self.zip_size, repo.max_upload_size))
+        plugin = copy.copy(self)
+        plugin._bind_repo(repo, name_suffix)
+        plugin.metadata = dict(self._validated_metadata)
+        plugin.new_metadatatxt = None
+        plugin.curdatetime = None
+        with span('update_metadata'):
+            plugin._update_metadata()
+        return plugin
 
     @staticmethod
     def metadata_types(sometype):
@@ -573,6 +651,7 @@ class QgisPlugin(object):
 
     def dump_attributes(self, echo=False):
         txt = 'package_name: {0}\n'.format(self.package_name)
+        import pprint
         pp = pprint.PrettyPrinter(indent=2)
         txt += 'metadata: \n{0}\n'.format(pp.pprint(self.metadata))
         if echo:
@@ -580,16 +659,46 @@ class QgisPlugin(object):
         return txt
 
     def setup_plugin(self):
-        self._move_plugin_archive()
-        self._extract_icon()
-        self._update_zip_archive()
+        with span('move_archive', self.zip_size):
+            self._move_plugin_archive()
+        with span('extract_icon') as s:
+            self._extract_icon()
+            if s:
+                s.add_bytes(self._icon_size())
+        if self.new_metadatatxt is not None:
+            with span('update_zip', self.zip_size):
+                self._update_zip_archive()
+        with span('index_package') as s:
+            self._index_package()
+            if s:
+                s.add_bytes(os.path.getsize(self.new_zip_path))
         return True
 
+    def _icon_size(self):
+        icon = os.path.join(self.repo.web_plugins_dir,
+                            self.metadata.get('plugin_icon', ''))
+        return os.path.getsize(icon) if os.path.isfile(icon) else 0
+
+    def _index_package(self):
+        roles = None
+        if self.auth_role is not None:
+            roles = [r.strip() for r in self.auth_role.split(',')
+                     if r.strip()]
+        self.repo.package_index.add(
+            '{0}/{1}'.format(self.repo.packages_subdir(self.requires_auth),
+                             self.new_zip_name),
+            self.new_zip_path, roles=roles)
+
     def _validate(self):
         # verify archive and get metadata
         try:
-            self._validate_archive()
-            self.metadata = dict(self._validate_metadata())
+            with span('validate_archive') as s:
+                self._validate_archive()
+                s.add_bytes(self.zip_size)
+            with span('validate_metadata') as s:
+                self.metadata = dict(self._validate_metadata())
+                if self.metadatatxt is not None:
+                    s.add_bytes(len(self.metadatatxt[1]))
             # print metadata
         except ValidationError as e:
             msg = 'Not a valid plugin ZIP archive'
@@ -611,7 +720,7 @@ class QgisPlugin(object):
                 "ZIP archive can not be found in uploads directory: {0}"
                 .format(self.zip_name))
 
-        fsize = os.path.getsize(self.zip_path)
+        fsize = self.zip_size = os.path.getsize(self.zip_path)
         if fsize > self.repo.max_upload_size:
             raise ValidationError(
                 "ZIP archive is too big at ({0}) Bytes. Max size is {1} Bytes"
@@ -622,7 +731,7 @@ class QgisPlugin(object):
         except RuntimeError as e:
             raise ValidationError("Could not unzip archive:\n{0}".format(e))
         for zname in zip_obj.namelist():
-            if zname.find('..') != -1 or zname.find(os.path.sep) == 0:
+            if unsafe_zip_member(zname):
                 raise ValidationError(
                     "For security reasons, ZIP archive cannot contain paths")
         bad_file = zip_obj.testzip()
@@ -680,6 +789,7 @@ class QgisPlugin(object):
             return
 
         newmeta = ''
+        metadatatxt = codecs.decode(self.metadatatxt[1], 'utf-8')
 
         curver = str(self.metadata['version'])
 
@@ -691,7 +801,7 @@ class QgisPlugin(object):
             newmeta = re.sub(
                 re.compile(r'(\s*)(version\s*=\s*{0})(\s*)'.format(curver)),
                 str(r'\1version={0}\3'.format(newver)),
-                str(newmeta if newmeta else self.metadatatxt[1]))
+                newmeta if newmeta else metadatatxt)
             self.metadata['version'] = newver
 
         if self.name_suffix:
@@ -716,7 +826,7 @@ class QgisPlugin(object):
                 newmeta = re.sub(
                     re.compile(r'(\s*)(version\s*=\s*{0})(\s*)'.format(curver)),
                     str(r'\1version={0}\3'.format(newver)),
-                    str(newmeta if newmeta else self.metadatatxt[1]))
+                    newmeta if newmeta else metadatatxt)
                 self.metadata['version'] = newver
 
             # Update name with suffix
@@ -726,7 +836,7 @@ class QgisPlugin(object):
                 newmeta = re.sub(
                     re.compile(r'(\s*)(name\s*=\s*{0})(\s*)'.format(curname)),
                     str(r'\1name={0}\3'.format(newname)),
-                    str(newmeta if newmeta else self.metadatatxt[1]))
+                    newmeta if newmeta else metadatatxt)
                 self.metadata["name"] = newname
 
         # Update new_metadatatxt, so that the plugin can be updated
@@ -857,39 +967,49 @@ class QgisPlugin(object):
 
         return checked_metadata
 
+    def _read_icon(self):
+        """
+        :return: Icon file extension and data, or None if there is none
+        :rtype: (str, bytes) | None
+        """
+        if 'icon' not in self._icon_cache:
+            icon = None
+            try:
+                # Strip leading dir for some plugins
+                if self.metadata['icon'].startswith('./'):
+                    icon_path = self.metadata['icon'][2:]
+                else:
+                    icon_path = self.metadata['icon']
+                zip_icon = self.package_name + '/' + icon_path
+                with zipfile.ZipFile(self.new_zip_path) as zip_obj:
+                    if not zip_obj.getinfo(zip_icon).is_dir():
+                        icon = (os.path.splitext(zip_icon)[1],
+                                zip_obj.read(zip_icon))
+            except KeyError:
+                pass
+            self._icon_cache['icon'] = icon
+        return self._icon_cache['icon']
+
     def _extract_icon(self):
         package_icon_dir = os.path.join(self.repo.icons_dir, self.package_name)
         if not os.path.exists(package_icon_dir):
             os.makedirs(package_icon_dir)
 
         # dump any icon file
-        try:
-            zip_obj = zipfile.ZipFile(self.new_zip_path)
-            # Strip leading dir for some plugins
-            if self.metadata['icon'].startswith('./'):
-                icon_path = self.metadata['icon'][2:]
-            else:
-                icon_path = self.metadata['icon']
-            tmp_dir = tempfile.mkdtemp()
-            zip_icon = zip_obj.extract(
-                self.package_name + '/' + icon_path, tmp_dir)
-            if zip_icon and os.path.exists(zip_icon) and \
-                    os.path.isfile(zip_icon):
-                _, fext = os.path.splitext(zip_icon)
-                ver_icon_path = '{0}/{1}{2}'.format(
-                    package_icon_dir, self.metadata['version'], fext)
-
-                if os.path.exists(ver_icon_path):
-                    os.remove(ver_icon_path)
-                shutil.move(zip_icon, ver_icon_path)
-                self.metadata['plugin_icon'] = '{0}/{1}/{2}{3}'.format(
-                    self.repo.web_icon_dir, self.package_name,
-                    self.metadata['version'], fext)
-            else:
-                self.metadata['plugin_icon'] = self.repo.web_default_icon
-            shutil.rmtree(tmp_dir)
-        except KeyError:
+        icon = self._read_icon()
+        if icon is None:
             self.metadata['plugin_icon'] = self.repo.web_default_icon
+            return
+        fext, data = icon
+        ver_icon_path = '{0}/{1}{2}'.format(
+            package_icon_dir, self.metadata['version'], fext)
+        if os.path.exists(ver_icon_path):
+            os.remove(ver_icon_path)
+        with open(ver_icon_path, 'wb') as f:
+            f.write(data)
+        self.metadata['plugin_icon'] = '{0}/{1}/{2}{3}'.format(
+            self.repo.web_icon_dir, self.package_name,
+            self.metadata['version'], fext)
 
     def _move_plugin_archive(self):
         nam, ext = os.path.splitext(os.path.basename(self.zip_path))
@@ -922,7 +1042,15 @@ class QgisPlugin(object):
 
         if os.path.exists(self.new_zip_path):
             os.remove(self.new_zip_path)
-        shutil.move(self.zip_path, self.new_zip_path)
+        if self.keep_archive:
+            # archive metadata.txt updates replace, not modify, the file, so
+            # a hard link is safe
+            try:
+                os.link(self.zip_path, self.new_zip_path)
+            except OSError:
+                shutil.copyfile(self.zip_path, self.new_zip_path)
+        else:
+            shutil.move(self.zip_path, self.new_zip_path)
         os.chmod(self.new_zip_path, 0o644)
 
         self.metadata['file_name'] = self.new_zip_name
@@ -1029,6 +1157,108 @@ class QgisPlugin(object):
         return el
 
 
+class PackageIndex(object):
+    """
+    Size and content hash of each stored plugin package, computed once at
+    ingest time and stored in a JSON file alongside plugins.xml, so serving
+    never needs to stat or hash packages per request.
+
+    Keys are package paths relative to the plugins directory, e.g.
+    'packages/my_plugin.0.1.zip' or 'packages-auth/my_plugin.0.1.zip'.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.packages = {}
+        self.dirty = False
+        self._stat = None
+        self.reload(force=True)
+
+    def __len__(self):
+        return len(self.packages)
+
+    def __contains__(self, rel_path):
+        return rel_path in self.packages
+
+    @staticmethod
+    def file_sha256(file_path, chunk_size=1048576):
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    @staticmethod
+    def etag(sha256):
+        return '"{0}"'.format(sha256)
+
+    def reload(self, force=False):
+        """
+        Re-read the index file, if it has changed (or forced).
+        :rtype: bool Whether the index was (re)loaded
+        """
+        try:
+            st = os.stat(self.index_path)
+            stat = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            stat = None
+        if not force and stat == self._stat:
+            return False
+        packages = {}
+        if stat is not None:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    packages = json.load(f).get('packages', {})
+            except (IOError, ValueError) as e:
+                log.warning("Error reading package index '%s': %s",
+                            self.index_path, e)
+                return False
+        self.packages = packages
+        self._stat = stat
+        self.dirty = False
+        return True
+
+    def get(self, rel_path):
+        """
+        :rtype: dict {'size': int, 'sha256': str, 'mtime': float,
+                      'roles': list (if role-restricted)} or None
+        """
+        return self.packages.get(rel_path)
+
+    def add(self, rel_path, file_path, roles=None, sha256=None):
+        """
+        :param roles: list[str] Roles that may download the package, if
+                      role-restricted (any one of them grants access)
+        :param sha256: str Package's known hash, e.g. from another repo's
+                       index, instead of hashing it again
+        """
+        st = os.stat(file_path)
+        self.packages[rel_path] = {
+            'size': st.st_size,
+            'sha256': sha256 or self.file_sha256(file_path),
+            'mtime': st.st_mtime,
+        }
+        if roles:
+            self.packages[rel_path]['roles'] = list(roles)
+        self.dirty = True
+        return self.packages[rel_path]
+
+    def remove(self, rel_path):
+        if self.packages.pop(rel_path, None) is not None:
+            self.dirty = True
+
+    def write(self):
+        """Atomically write the index, if it has changed"""
+        if not self.dirty:
+            return
+        tmp_path = '{0}.tmp'.format(self.index_path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'packages': self.packages}, f,
+                      indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+
 class QgisRepo(object):
 
     def __init__(self, repo_name, config=None, with_output=False):
@@ -1043,7 +1273,8 @@ class QgisRepo(object):
             self.out(RepoSetupError('No repo name defined'))
         if any(['repo_defaults' not in self.conf, 'repos' not in self.conf]):
             raise RepoSetupError('Repo base settings incomplete')
-        self.repo = self.conf['repo_defaults']
+        # a copy, so repos sharing a config do not leak settings
+        self.repo = dict(self.conf['repo_defaults'])
         if self.repo_name not in self.conf['repos']:
             self.out(RepoSetupError(
                 "Repo '{0}' has no settings defined"
@@ -1071,8 +1302,11 @@ class QgisRepo(object):
             self.out(RepoSetupError(
                 'Repo web base directory undefined or does not exist: {0}'
                 .format(self.repo.get('web_base', 'undefined'))))
-        self.web_dir = os.path.join(self.repo['web_base'], self.repo_name)
-        self.web_plugins_dir = os.path.join(self.web_dir, self.plugins_subdir)
+        self.live_web_dir = os.path.join(self.repo['web_base'],
+                                         self.repo_name)
+        self.generations_kept = int(self.repo.get('generations', 0))
+        self._generations = None  # type: RepoGenerations
+        self._building = None  # generation directory being built
 
         self.packages_host_scheme = self.repo['packages_host_scheme']
         self.packages_host_name = self.repo['packages_host_name']
@@ -1092,7 +1326,6 @@ class QgisRepo(object):
         self.uploaded_by = self.repo['uploaded_by']
 
         self.web_icon_dir = "icons"  # relative to plugins.xml
-        self.icons_dir = os.path.join(self.web_plugins_dir, self.web_icon_dir)
 
         self.default_icon_name = 'default.png'
         self.default_icon_tmpl = 'default{0}.png'.format(self.templ_suffix)
@@ -1108,17 +1341,44 @@ class QgisRepo(object):
         self.plugin_name_suffix = self.repo['plugin_name_suffix']
         self.auth_dld_msg = self.repo['auth_dld_msg']
         self.auth_text_html = 'auth-text{0}.html'.format(self.templ_suffix)
-        self.plugins_xml = os.path.join(
-            self.web_plugins_dir, self.plugins_xml_name)
         self.plugins_xml_tmpl = 'plugins.xml'
         self.plugins_xsl_name = 'plugins.xsl'
         self.web_plugins_xsl = './plugins.xsl'
-        self.plugins_xsl = os.path.join(
-            self.web_plugins_dir, self.plugins_xsl_name)
         self.plugins_xsl_tmpl = 'plugins{0}.xsl'.format(self.templ_suffix)
 
+        self.package_index_name = 'packages-index.json'
+
         # noinspection PyTypeChecker
         self.plugins_tree = None  # type: QgisPluginTree
+        # noinspection PyTypeChecker
+        self._package_index = None  # type: PackageIndex
+
+        self._set_web_dir(self.live_web_dir)
+
+    def _set_web_dir(self, web_dir):
+        """
+        Point the repo's paths at a repo directory: the live one, or a
+        generation being built
+        """
+        self.web_dir = web_dir
+        self.web_plugins_dir = os.path.join(self.web_dir, self.plugins_subdir)
+        self.icons_dir = os.path.join(self.web_plugins_dir, self.web_icon_dir)
+        self.plugins_xml = os.path.join(
+            self.web_plugins_dir, self.plugins_xml_name)
+        self.plugins_xsl = os.path.join(
+            self.web_plugins_dir, self.plugins_xsl_name)
+        self.package_index_path = os.path.join(
+            self.web_plugins_dir, self.package_index_name)
+        self._package_index = None
+
+    @property
+    def package_index(self):
+        """
+        :rtype: PackageIndex
+        """
+        if self._package_index is None:
+            self._package_index = PackageIndex(self.package_index_path)
+        return self._package_index
 
     def packages_subdir(self, auth=False):
         return "{0}{1}".format(
@@ -1130,6 +1390,114 @@ class QgisRepo(object):
         return os.path.join(
             self.web_plugins_dir, self.packages_subdir(auth))
 
+    @property
+    def generations(self):
+        """
+        :rtype: RepoGenerations
+        """
+        if self._generations is None:
+            from .generations import RepoGenerations
+            self._generations = RepoGenerations(
+                self.repo['web_base'], self.repo_name,
+                keep=self.generations_kept)
+        return self._generations
+
+    @property
+    def building_generation(self):
+        """
+        :rtype: str Directory of the generation being built, or None
+        """
+        return self._building
+
+    def begin_generation(self, empty=False, resume=None):
+        """
+        Make changes in a new generation of the repo directory, rather than
+        the live one, until publish_generation() (no-op unless the repo
+        keeps generations, or one is already being built)
+        :param empty: bool Start from an empty repo directory
+        :param resume: str Directory of a generation to continue building
+        instead, see suspend_generation()
+        :rtype: bool Whether a generation was begun
+        """
+        if not self.generations_kept or self._building is not None:
+            return False
+        if resume is not None:
+            self._building = self.generations.resume(resume)
+        else:
+            self._building = self.generations.begin(empty=empty)
+        self._set_web_dir(self._building)
+        if empty or resume is not None:
+            self.clear_plugins_tree()
+        return True
+
+    def publish_generation(self):
+        """
+        Atomically make the generation being built live
+        :rtype: str The generation published, or None if none was built
+        """
+        if self._building is None:
+            return None
+        building, self._building = self._building, None
+        self._set_web_dir(self.live_web_dir)
+        generation = self.generations.publish(building)
+        self.out("Published '{0}' generation: {1}"
+                 .format(self.repo_name, generation))
+        return generation
+
+    def suspend_generation(self):
+        """
+        Stop building a generation, but keep it, for begin_generation() to
+        resume later
+        :rtype: str Its directory, or None if none was being built
+        """
+        if self._building is None:
+            return None
+        building, self._building = self._building, None
+        self._set_web_dir(self.live_web_dir)
+        self.generations.suspend(building)
+        self.clear_plugins_tree()
+        return building
+
+    def abort_generation(self):
+        """Discard the generation being built, if any"""
+        if self._building is None:
+            return
+        building, self._building = self._building, None
+        self._set_web_dir(self.live_web_dir)
+        self.generations.abort(building)
+        # the tree may hold changes that were not published
+        self.clear_plugins_tree()
+
+    @contextmanager
+    def generation(self, empty=False):
+        """
+        Publish the changes made in the block as one generation, or none of
+        them if it raises (see begin_generation())
+        """
+        begun = self.begin_generation(empty=empty)
+        try:
+            yield
+        except BaseException:
+            if begun:
+                self.abort_generation()
+            raise
+        if begun:
+            self.publish_generation()
+
+    def rollback(self, generation=None):
+        """
+        Switch the live repo directory back to an earlier generation
+        :param generation: str (default: the one before the live one)
+        :rtype: str The generation switched to
+        """
+        if self._building is not None:
+            raise RepoActionError('Cannot roll back while building a '
+                                  'generation')
+        generation = self.generations.rollback(generation)
+        self.clear_plugins_tree()
+        self._set_web_dir(self.live_web_dir)
+        return generation
+
     def out(self, msg):
         if isinstance(msg, Exception):
             if self.output:
@@ -1140,6 +1508,7 @@ class QgisRepo(object):
             print(msg)
 
     def dump_attributes(self, echo=False):
+        import pprint
         txt = '### configuration ###\n{0}\n'.format(pprint.pformat(self.conf))
         txt += '### attributes ###\n'
         attrs = [
@@ -1244,8 +1613,11 @@ class QgisRepo(object):
     def load_plugins_tree(self):
         if not self.plugins_tree:
             self.out('Loading plugin tree from plugins.xml')
-            self.plugins_tree = QgisPluginTree(self.plugins_xml,
-                                               self.web_plugins_xsl)
+            with span('load_tree') as s:
+                self.plugins_tree = QgisPluginTree(self.plugins_xml,
+                                                   self.web_plugins_xsl)
+                if s and os.path.exists(self.plugins_xml):
+                    s.add_bytes(os.path.getsize(self.plugins_xml))
         else:
             self.out('Plugin tree already loaded from plugins.xml')
 
@@ -1254,7 +1626,12 @@ class QgisRepo(object):
         self.plugins_tree = None
 
     def plugins_tree_xml(self):
-        return self.plugins_tree.to_xml() if self.plugins_tree else ''
+        if not self.plugins_tree:
+            return ''
+        with span('serialize_xml') as s:
+            xml = self.plugins_tree.to_xml()
+            s.add_bytes(len(xml))
+        return xml
 
     def remove_plugin_by_name(self, name, name_suffix=None,
                               versions='latest', keep_zip=False):
@@ -1334,6 +1711,7 @@ class QgisRepo(object):
                 continue
             pkg_pth = m.group(1)
             zip_path = os.path.join(self.web_plugins_dir, pkg_pth)
+            self.package_index.remove(pkg_pth)
             self.out("  removing .zip: {0}".format(zip_path))
             if os.path.isfile(zip_path):
                 os.remove(zip_path)
@@ -1349,19 +1727,47 @@ class QgisRepo(object):
             self.plugins_tree.append_plugin(plugin_elem)
 
     def write_plugins_xml(self, xml):
+        # index first, so servers reloading on plugins.xml change see it
+        with span('write_index'):
+            self.package_index.write()
         self.out("Writing plugins.xml: {0}".format(self.plugins_xml))
-        with open(self.plugins_xml, 'wb') as f:
-            f.write(xml)
+        # replaced, not rewritten, as it may be linked from other generations
+        tmp_path = '{0}.tmp'.format(self.plugins_xml)
+        with span('write_xml', len(xml)):
+            with open(tmp_path, 'wb') as f:
+                f.write(xml)
+            os.replace(tmp_path, self.plugins_xml)
 
     # noinspection PyMethodMayBeStatic
     def setup_plugin(self, plugin):
         # TODO: move functionality out of QgisPlugin and into QgisRepo
         return plugin.setup_plugin()
 
+    def add_plugin(self, plugin, versions='none', keep_zip=False):
+        """
+        Set up a validated plugin in this repo and append it to the loaded
+        plugin tree (plugins.xml is not written)
+        :param plugin: QgisPlugin Validated for this repo, e.g. by for_repo()
+        :param versions: Existing versions of the plugin to remove first
+        :param keep_zip: Keep the ZIP archives of removed versions
+        :return: bool
+        """
+        if versions is not None and versions.lower() != 'none':
+            # Remove any previous plugin of same name
+            with span('remove_old'):
+                self.remove_plugin_by_name(plugin.metadata["name"],
+                                           versions=versions,
+                                           keep_zip=keep_zip)
+        if not self.setup_plugin(plugin):
+            return False
+        with span('plugin_element'):
+            self.append_plugin_to_tree(plugin.pyqgis_plugin_element())
+        return True
+
     def update_plugin(self, zip_name, name_suffix=None,
                       auth=False, auth_role=None, git_hash=None,
                       versions='none', keep_zip=False, untrusted=False,
-                      invalid_fields=False):
+                      invalid_fields=False, write_xml=True, fan_out=None):
         """
 
         :param zip_name:
@@ -1373,13 +1779,21 @@ class QgisRepo(object):
         :param keep_zip:
         :param untrusted:
         :param invalid_fields:
+        :param write_xml: Write plugins.xml (and the package index) after;
+        False to batch several updates, then call write_plugins_xml()
+        :param fan_out: list[QgisRepo] Other repos to also add the plugins
+        to, each with its own name suffix/version rewriting (unless
+        name_suffix is set), but validating each archive only once
         :return: bool
         """
         if not zip_name:
             self.out(RepoActionError("Plugin .zip name or 'all' required"))
             return False
 
-        self.load_plugins_tree()
+        others = [r for r in (fan_out or []) if r is not self]
+        with phase('load_tree'):
+            for r in [self] + others:
+                r.load_plugins_tree()
 
         if zip_name.lower() == 'all':
             zips = [z for z in os.listdir(self.upload_dir)
@@ -1390,30 +1804,197 @@ class QgisRepo(object):
 
         self.out("Updating {0} plugins...".format(len(zips)))
 
-        for _zip in zips:
-            try:
-                plugin = QgisPlugin(self, _zip, name_suffix=name_suffix,
-                                    auth=auth, auth_role=auth_role,
-                                    git_hash=git_hash, untrusted=untrusted,
-                                    invalid_fields=invalid_fields,
-                                    with_output=self.output)
-                # plugin.dump_attributes(echo=True)
-            except ValidationError as e:
-                self.out(e)
-                return False
+        with phase('ingest'):
+            for _zip in zips:
+                try:
+                    plugin = QgisPlugin(self, _zip, name_suffix=name_suffix,
+                                        auth=auth, auth_role=auth_role,
+                                        git_hash=git_hash, untrusted=untrusted,
+                                        invalid_fields=invalid_fields,
+                                        with_output=self.output)
+                    # plugin.dump_attributes(echo=True)
+                    copies = [(r, plugin.for_repo(r, name_suffix))
+                              for r in others]
+                except ValidationError as e:
+                    self.out(e)
+                    return False
+
+                # other repos first, while the uploaded archive is in place
+                for r, copied in copies:
+                    copied.keep_archive = True
+                    if not r.add_plugin(copied, versions, keep_zip):
+                        return False
+                if not self.add_plugin(plugin, versions, keep_zip):
+                    return False
+
+        if write_xml:
+            with phase('write'):
+                # one plugins.xml write per repo, for all its plugins
+                for r in [self] + others:
+                    r.write_plugins_xml(r.plugins_tree_xml())
+        # self.clear_plugins_tree()
 
-            if versions is not None and versions.lower() != 'none':
-                # Remove any previous plugin of same name
-                self.remove_plugin_by_name(plugin.metadata["name"],
+        return True
+
+    def promote_plugin(self, source, plugin_name, version='latest',
+                       name_suffix=None, versions='none', keep_zip=False,
+                       write_xml=True):
+        """
+        Add a plugin already in another repo, e.g. a build tested in 'beta',
+        to this repo, from its plugins.xml record and stored package: no
+        validation, icon extraction or re-zipping. Only the name suffix and
+        version (and the archive's metadata.txt) are rewritten, if the repos'
+        suffixes differ; otherwise the package is linked (or copied) as is.
+
+        :param source: QgisRepo Repo to promote from
+        :param plugin_name: str Plugin name, with or without source's suffix
+        :param version: str Version in source repo, or latest
+        :param name_suffix: str Overrides this repo's plugin_name_suffix
+        :param versions: Existing versions of the plugin to remove first
+        :param keep_zip: Keep the ZIP archives of removed versions
+        :param write_xml: Write plugins.xml (and the package index) after
+        :return: bool
+        """
+        if source.web_dir == self.web_dir:
+            self.out(RepoActionError("Can not promote within a repo"))
+            return False
+        if not plugin_name:
+            self.out(RepoActionError("Plugin name required"))
+            return False
+
+        source.load_plugins_tree()
+        src_suffix = source.plugin_name_suffix
+        src_name = clean_attr_value(plugin_name)
+        if src_suffix and not src_name.endswith(src_suffix):
+            src_name += src_suffix
+        found = source.plugins_tree.find_plugin_by_name(
+            src_name, versions=version or 'latest')
+        if not found:
+            self.out(RepoActionError(
+                "Plugin '{0}' ({1}) not found in '{2}'"
+                .format(src_name, version, source.repo_name)))
+            return False
+        src_el = found[0]
+        src_version = src_el.get('version')
+
+        # e.g. packages-auth/my_plugin.0.1.zip
+        m = re.search(r"/{0}/({1}[^/]*)/([^/]+)$"
+                      .format(source.plugins_subdir,
+                              source.repo['packages_dir']),
+                      src_el.findtext('download_url', ''))
+        if not m:
+            self.out(RepoActionError(
+                "Plugin '{0}' has no package in '{1}'"
+                .format(src_name, source.repo_name)))
+            return False
+        requires_auth = m.group(1) == source.packages_subdir(auth=True)
+        src_rel = '{0}/{1}'.format(m.group(1), m.group(2))
+        src_zip = os.path.join(source.web_plugins_dir, src_rel)
+        if not os.path.isfile(src_zip):
+            self.out(RepoActionError(
+                "Package not found: {0}".format(src_zip)))
+            return False
+
+        # name and version, as if the original archive was added here
+        suffix = name_suffix if name_suffix is not None \
+            else self.plugin_name_suffix
+        name = src_name
+        if src_suffix and name.endswith(src_suffix):
+            name = name[:-len(src_suffix)]
+        new_version = src_version
+        stamped = STAMPED_VERSION.match(src_version) if src_suffix else None
+        if suffix:
+            if not name.endswith(suffix):
+                name += suffix
+            if not stamped:
+                new_version = '{0}-{1}'.format(
+                    src_version, datetime.now().strftime("%Y%m%d%H%M"))
+        elif stamped:
+            new_version = stamped.group(1)
+
+        file_name = m.group(2)
+        if new_version != src_version and src_version in file_name:
+            i = file_name.rindex(src_version)
+            file_name = file_name[:i] + new_version + \
+                file_name[i + len(src_version):]
+        rel_path = '{0}/{1}'.format(self.packages_subdir(requires_auth),
+                                    file_name)
+
+        self.load_plugins_tree()
+        if versions is not None and versions.lower() != 'none':
+            with span('remove_old'):
+                self.remove_plugin_by_name(name, name_suffix=suffix,
                                            versions=versions,
                                            keep_zip=keep_zip)
-            if not self.setup_plugin(plugin):
-                return False
-            self.append_plugin_to_tree(plugin.pyqgis_plugin_element())
-
-        self.write_plugins_xml(self.plugins_tree_xml())
-        # self.clear_plugins_tree()
 
+        self.out("Promoting {0} {1} from '{2}' as {3} {4}".format(
+            src_name, src_version, source.repo_name, name, new_version))
+        zip_path = os.path.join(self.web_plugins_dir, rel_path)
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        src_meta = source.package_index.get(src_rel)
+        sha256 = src_meta['sha256'] if src_meta else None
+        with span('link_package', os.path.getsize(src_zip)):
+            try:
+                os.link(src_zip, zip_path)
+            except OSError:
+                shutil.copyfile(src_zip, zip_path)
+        if name != src_name or new_version != src_version:
+            with span('update_zip', os.path.getsize(src_zip)):
+                with zipfile.ZipFile(zip_path) as zip_obj:
+                    namelist = zip_obj.namelist()
+                    md_name = '{0}/metadata.txt'.format(
+                        namelist[0].split('/')[0])
+                    metadatatxt = codecs.decode(zip_obj.read(md_name),
+                                                'utf-8')
+                # replaces (so unlinks) the archive
+                QgisPlugin._update_zip_in_place(
+                    zip_path, md_name, set_metadata_fields(
+                        metadatatxt, {'name': name, 'version': new_version}))
+            sha256 = None
+        os.chmod(zip_path, 0o644)
+        roles = [r.strip() for r in
+                 src_el.findtext('authorization_role', '').split(',')
+                 if r.strip()]
+        with span('index_package'):
+            self.package_index.add(rel_path, zip_path, roles=roles or None,
+                                   sha256=sha256)
+
+        el = copy.deepcopy(src_el)
+        el.set('name', name)
+        el.set('version', new_version)
+        icon = src_el.findtext('icon', '')
+        icon_path = os.path.join(source.web_plugins_dir, icon)
+        if icon and icon != source.web_default_icon \
+                and os.path.isfile(icon_path):
+            pkg_dir, icon_name = os.path.split(os.path.relpath(
+                icon_path, source.icons_dir))
+            icon = '{0}/{1}/{2}{3}'.format(
+                self.web_icon_dir, pkg_dir, new_version,
+                os.path.splitext(icon_name)[1])
+            dest = os.path.join(self.web_plugins_dir, icon)
+            if not os.path.exists(os.path.dirname(dest)):
+                os.makedirs(os.path.dirname(dest))
+            elif os.path.exists(dest):
+                os.remove(dest)
+            shutil.copyfile(icon_path, dest)
+        else:
+            icon = self.web_default_icon
+        for tag, text in [
+                ('version', new_version),
+                ('file_name', file_name),
+                ('icon', icon),
+                ('download_url', '{0}/{1}/{2}'.format(
+                    self.repo_url, self.plugins_subdir, rel_path)),
+                ('update_date', datetime.now().isoformat())]:
+            sub = el.find(tag)
+            if sub is None:
+                sub = etree.SubElement(el, tag)
+            sub.text = text
+        self.append_plugin_to_tree(el)
+
+        if write_xml:
+            self.write_plugins_xml(self.plugins_tree_xml())
         return True
 
     def remove_plugin(self, plugin_name,
@@ -1469,8 +2050,15 @@ class QgisRepo(object):
                 os.remove(path)
 
     def clear_repo(self):
+        if self.generations_kept and self._building is None:
+            # live contents stay up until the new generation replaces them
+            self.out('Setting up new repo generation...')
+            with self.generation(empty=True):
+                self.setup_repo()
+            return True
         self.out('Removing any existing repo contents...')
         self.remove_dir_contents(self.web_dir)
+        self._package_index = None
         self.out('Setting up new repo...')
         self.setup_repo()
         return True
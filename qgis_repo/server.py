@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ server.py
+
+ Flask application for serving a local plugins.xml-based QGIS plugin repo
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2016, 2017 by Boundless Spatial Inc.
+                             : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import json
+import logging
+
+from flask import Flask, Response, request, redirect, make_response, \
+    send_from_directory, abort, url_for, g
+from werkzeug.http import http_date
+
+from .auth import AUTH_REALM, canonical_path
+from .catalog import QgisPluginCatalog, CatalogQueryError
+from .httprange import resolve_request
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ServingMetrics
+from .repo import PackageIndex
+from .upload import UploadError, UploadReceiver
+from .wsgi import SendfileWrapper
+
+log = logging.getLogger(__name__)
+
+
+def _split_arg(name):
+    val = request.args.get(name)
+    if not val:
+        return None
+    return [v for v in val.replace(' ', '').split(',') if v]
+
+
+def _file_body(f, count, chunk_size=65536):
+    if request.environ.get('wsgi.file_wrapper') is SendfileWrapper:
+        return SendfileWrapper(f, chunk_size, length=count)
+
+    def _iter():
+        remaining = count
+        try:
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        finally:
+            f.close()
+    return _iter()
+
+
+def send_package(file_path, meta):
+    """
+    Send a plugin package, with Range/If-Range and If-None-Match support,
+    using the size and hash from the repo's package index (no stat/hash).
+    :param file_path: str
+    :param meta: dict Package index entry
+    :rtype: Response
+    """
+    etag = PackageIndex.etag(meta['sha256'])
+    status, offset, count, headers = resolve_request(
+        meta['size'], etag,
+        range_header=request.headers.get('Range'),
+        if_range=request.headers.get('If-Range'),
+        if_none_match=request.headers.get('If-None-Match'))
+    body = b''
+    if status in (200, 206) and request.method != 'HEAD':
+        try:
+            f = open(file_path, 'rb')
+        except OSError:
+            abort(404)
+        f.seek(offset)
+        body = _file_body(f, count)
+    response = Response(body, status=status, mimetype='application/zip',
+                        direct_passthrough=True)
+    for k, v in headers:
+        response.headers[k] = v
+    response.headers['Content-Length'] = str(count)
+    response.headers['Last-Modified'] = http_date(meta['mtime'])
+    return response
+
+
+def auth_error(status):
+    """
+    :param status: int 401, 403 or 503, see PackageAuthorizer.authorize()
+    :rtype: Response
+    """
+    response = make_response('', status)
+    if status == 401:
+        response.headers['WWW-Authenticate'] = \
+            'Basic realm="{0}"'.format(AUTH_REALM)
+    return response
+
+
+def upload_error(error):
+    """
+    :param error: UploadError
+    :rtype: Response
+    """
+    response = make_response(str(error) + '\n', error.status)
+    response.headers['Content-type'] = 'text/plain'
+    # the rest of a rejected body may not have been read
+    response.headers['Connection'] = 'close'
+    return response
+
+
+def create_app(repo, catalog=None, authorizer=None, metrics=None,
+               upload_roles=None):
+    """
+    Build the Flask app serving a repo's web directory, with filtering of
+    plugins.xml by QGIS version (as requested by QGIS itself) and a JSON
+    listing of the repo's plugins.
+    :param repo: QgisRepo
+    :param catalog: QgisPluginCatalog Shared, pre-parsed catalog (optional)
+    :param authorizer: PackageAuthorizer Enforce authorization of packages-auth
+                       downloads (optional; otherwise left to the web server)
+    :param metrics: ServingMetrics Shared metrics (optional)
+    :param upload_roles: list[str] Accept plugin uploads, at /upload/<name>,
+                         from credentials with any of these roles (any valid
+                         credentials, if empty); needs an authorizer
+    :rtype: Flask
+    """
+    if upload_roles is not None and authorizer is None:
+        raise UploadError('Accepting uploads needs an authorizer')
+    web_dir = os.path.abspath(repo.web_dir)
+    web_plugins_dir = os.path.abspath(repo.web_plugins_dir)
+    log.debug("web_dir: {0}".format(web_dir))
+    if catalog is None:
+        catalog = QgisPluginCatalog(repo.plugins_xml,
+                                    package_index=repo.package_index)
+    package_index = catalog.package_index
+    plugins_prefix = repo.plugins_subdir + '/'
+    auth_prefix = '{0}{1}/'.format(plugins_prefix, repo.packages_subdir(True))
+    app = Flask(__name__, root_path=web_dir)
+    app.config['QGIS_REPO'] = repo
+    app.config['QGIS_REPO_CATALOG'] = catalog
+    app.config['QGIS_REPO_AUTHORIZER'] = authorizer
+    if metrics is None:
+        metrics = ServingMetrics(repo, catalog)
+    app.config['QGIS_REPO_METRICS'] = metrics
+
+    @app.before_request
+    def metrics_begin():
+        g.metrics_start = metrics.begin()
+
+    @app.after_request
+    def metrics_end(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            nbytes = 0
+            if request.method != 'HEAD' and response.status_code != 304:
+                nbytes = response.content_length or 0
+            metrics.end(start, request.path, request.args.get('qgis'),
+                        response.status_code, nbytes)
+        return response
+
+    @app.route("/metrics", methods=['GET'])
+    def metrics_text():
+        response = make_response(metrics.render())
+        response.headers['Content-type'] = METRICS_CONTENT_TYPE
+        return response
+
+    @app.route("/", methods=['GET'])
+    @app.route("/<path:rsc>", methods=['GET'])
+    def serve_resource(rsc=""):
+        rsc = canonical_path(rsc)
+        if rsc is None:
+            abort(404)
+        meta = None
+        if package_index is not None and rsc.startswith(plugins_prefix):
+            catalog.refresh()
+            meta = package_index.get(rsc[len(plugins_prefix):])
+        requires_auth = (rsc + '/').startswith(auth_prefix)
+        if authorizer is not None and requires_auth:
+            status = authorizer.authorize(
+                request.headers.get('Authorization'),
+                meta.get('roles') if meta is not None else None)
+            if status != 200:
+                return auth_error(status)
+            if meta is None:
+                # unindexed, so its roles are unknown: fail closed
+                abort(404)
+        if meta is not None:
+            response = send_package(os.path.join(web_dir, rsc), meta)
+            if authorizer is not None and requires_auth:
+                response.headers['Cache-Control'] = 'private'
+            return response
+        if os.path.isdir(os.path.join(web_dir, rsc)):
+            rsc = os.path.join(rsc, repo.html_index)
+        log.debug("Sending: {0}".format(rsc))
+        return send_from_directory(web_dir, rsc)
+
+    @app.route("/plugins.xml", methods=['GET'])
+    def redirect_xml():
+        url = url_for('filter_xml', **request.args)
+        log.debug("Redirect URL: {0}".format(url))
+        return redirect(url)
+
+    @app.route("/plugins/plugins.xml", methods=['GET'])
+    def filter_xml():
+        """
+        Filters plugins.xml removing incompatible plugins.
+        If no qgis parameter is found in the query string,
+        the whole plugins.xml file is served as is.
+        """
+        # Points to the real file, not the symlink
+        if not request.query_string:
+            return send_from_directory(web_plugins_dir,
+                                       repo.plugins_xml_name)
+        elif request.args.get('qgis') is None:
+            abort(404)
+        else:
+            catalog.refresh()
+            response = make_response(
+                catalog.filtered_xml(request.args.get('qgis')))
+            response.headers['Content-type'] = 'text/xml'
+            return response
+
+    @app.route("/plugins/plugins.json", methods=['GET'])
+    def catalog_json():
+        """
+        JSON listing of plugins, with optional query parameters:
+          fields=a,b,...  only return these fields per plugin
+          name=prefix     plugin name starts with (case-insensitive)
+          tags=a,b,...    plugin has all of these tags
+          qgis=#.#        plugin is compatible with QGIS version
+          limit=#         max plugins per page
+          cursor=xxx      'next_cursor' value of previous page
+        """
+        limit = request.args.get('limit')
+        try:
+            catalog.refresh()
+            data = catalog.query_json(
+                fields=_split_arg('fields'),
+                name_prefix=request.args.get('name') or None,
+                tags=_split_arg('tags'),
+                qgis=request.args.get('qgis') or None,
+                cursor=request.args.get('cursor') or None,
+                limit=int(limit) if limit else None)
+        except (CatalogQueryError, ValueError) as e:
+            abort(400, description=str(e))
+        response = make_response(data)
+        response.headers['Content-type'] = 'application/json'
+        return response
+
+    if upload_roles is None:
+        return app
+
+    @app.route("/upload/<name>", methods=['PUT', 'POST'])
+    def upload_plugin(name):
+        """
+        Stream a plugin ZIP archive (the raw request body) into the uploads
+        directory, for 'watch' to ingest. Rejected as soon as it is too big,
+        not a ZIP archive or has unsafe paths; 202 once queued.
+        """
+        status = authorizer.authorize(request.headers.get('Authorization'),
+                                      list(upload_roles))
+        if status != 200:
+            return auth_error(status)
+        try:
+            receiver = UploadReceiver(repo.upload_dir, name,
+                                      repo.max_upload_size,
+                                      request.content_length)
+        except UploadError as e:
+            return upload_error(e)
+        try:
+            queued = receiver.receive(request.stream)
+        except UploadError as e:
+            receiver.close()
+            log.info("Upload '%s' rejected: %s", name, e)
+            return upload_error(e)
+        response = make_response(json.dumps(queued), 202)
+        response.headers['Content-type'] = 'application/json'
+        return response
+
+    return app
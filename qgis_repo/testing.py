@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ testing.py
+
+ Throwaway repos, with default settings, for the unit tests and benchmarks
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import copy
+import os
+import tempfile
+
+from .repo import QgisRepo, conf
+
+
+def temp_repo(repo_name='qgis', base=None, prefix=None):
+    """
+    Set up a repo, with default settings, in a temp dir (or base dir);
+    caller removes QgisRepo.temp_base
+    :param prefix: str Temp dir name prefix
+    :rtype: QgisRepo
+    """
+    if base is None:
+        base = tempfile.mkdtemp(prefix=prefix)
+    for d in ['www', 'uploads']:
+        if not os.path.exists(os.path.join(base, d)):
+            os.mkdir(os.path.join(base, d))
+    config = copy.deepcopy(conf)
+    config['repo_defaults']['web_base'] = os.path.join(base, 'www')
+    config['repo_defaults']['uploads_dir'] = os.path.join(base, 'uploads')
+    repo = QgisRepo(repo_name, config)
+    repo.setup_repo()
+    repo.temp_base = base
+    return repo
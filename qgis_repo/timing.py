@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ timing.py
+
+ Low-overhead timing spans for the plugin ingestion pipeline's stages,
+ with a JSON run summary and an optional Chrome trace
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# Paths to write a run's summary and Chrome trace to, if set
+TIMINGS_ENV = 'QGIS_REPO_TIMINGS'
+TRACE_ENV = 'QGIS_REPO_TRACE'
+
+
+class _NullSpan(object):
+    """Span of a disabled recorder: does nothing, and is falsy"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span(object):
+    """
+    Timed stage, as a context manager. Truthy, unlike spans of a disabled
+    recorder, so costly byte counts can be skipped: 'if s: s.add_bytes()'.
+    """
+
+    __slots__ = ('recorder', 'name', 'nbytes', 'args', 'start')
+
+    def __init__(self, recorder, name, nbytes=0, args=None):
+        self.recorder = recorder
+        self.name = name
+        self.nbytes = nbytes or 0
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self, time.perf_counter(), exc_type is not None)
+        return False
+
+    def add_bytes(self, nbytes):
+        self.nbytes += nbytes or 0
+
+
+class SpanRecorder(object):
+    """
+    Accumulates calls, time and bytes per stage name, and optionally every
+    span as a Chrome trace event. Spans may nest, e.g. stages of mirroring
+    around those of ingestion, so stage times are inclusive.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self.started = None
+        self.meta = OrderedDict()
+        self._start = None
+        self._stages = OrderedDict()
+        self._events = []
+        self._lock = threading.Lock()
+
+    def enable(self, trace=False):
+        """Start (or restart) recording"""
+        with self._lock:
+            self._stages = OrderedDict()
+            self._events = []
+            self.meta = OrderedDict()
+            self.started = datetime.now().isoformat()
+            self._start = time.perf_counter()
+            self.trace = trace
+            self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, nbytes=0, **args):
+        """
+        :param name: str Stage name
+        :param nbytes: int Bytes processed, if known up front
+        :param args: Extra values for the span's trace event
+        :rtype: Span
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, nbytes, args)
+
+    def record(self, span, end, failed=False):
+        elapsed = end - span.start
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = [0, 0.0, 0.0, 0, 0]
+            stage[0] += 1
+            stage[1] += elapsed
+            stage[2] = max(stage[2], elapsed)
+            stage[3] += span.nbytes
+            stage[4] += 1 if failed else 0
+            if self.trace:
+                args = dict(span.args or {})
+                if span.nbytes:
+                    args['bytes'] = span.nbytes
+                if failed:
+                    args['failed'] = True
+                self._events.append(OrderedDict([
+                    ('name', span.name), ('cat', 'qgis_repo'), ('ph', 'X'),
+                    ('ts', (span.start - self._start) * 1e6),
+                    ('dur', elapsed * 1e6), ('pid', os.getpid()),
+                    ('tid', threading.get_ident()), ('args', args)]))
+
+    def summary(self):
+        """
+        :return: Run summary, with per stage calls, seconds and bytes
+        :rtype: OrderedDict
+        """
+        with self._lock:
+            wall = time.perf_counter() - self._start \
+                if self._start is not None else 0.0
+            stages = OrderedDict()
+            for name, (calls, total, longest, nbytes, failed) in \
+                    self._stages.items():
+                stages[name] = OrderedDict([
+                    ('calls', calls),
+                    ('total_s', total),
+                    ('mean_ms', 1000.0 * total / calls),
+                    ('max_ms', 1000.0 * longest),
+                    ('bytes', nbytes),
+                    ('mb_per_s', nbytes / 1048576.0 / total
+                     if nbytes and total else None),
+                    ('failed', failed),
+                ])
+            out = OrderedDict([('started', self.started), ('wall_s', wall)])
+            out.update(self.meta)
+            out['stages'] = stages
+            return out
+
+    def chrome_trace(self):
+        """
+        :return: Trace for chrome://tracing or https://ui.perfetto.dev
+        :rtype: dict
+        """
+        with self._lock:
+            return {'traceEvents': list(self._events),
+                    'displayTimeUnit': 'ms'}
+
+    def write_summary(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=1)
+            f.write('\n')
+        log.debug("Wrote stage timings: {0}".format(path))
+
+    def write_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+        log.debug("Wrote stage trace: {0}".format(path))
+
+
+# Process-wide recorder, disabled (and near-free) unless enabled
+recorder = SpanRecorder()
+
+
+def span(name, nbytes=0, **args):
+    """Span of the process-wide recorder, see SpanRecorder.span"""
+    if not recorder.enabled:
+        return _NULL_SPAN
+    return Span(recorder, name, nbytes, args)
+
+
+def paths_from_env(environ=None):
+    """
+    :return: (summary path, trace path) set in the environment, or None
+    :rtype: (str, str)
+    """
+    environ = os.environ if environ is None else environ
+    return environ.get(TIMINGS_ENV) or None, environ.get(TRACE_ENV) or None
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ upload.py
+
+ Streamed plugin uploads: size and ZIP structure checked as bytes arrive,
+ then queued in the uploads directory for ingestion
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import io
+import os
+import re
+import hashlib
+import logging
+import secrets
+import struct
+import zipfile
+
+from .repo import Error, unsafe_zip_member
+
+log = logging.getLogger(__name__)
+
+# Uploads smaller than this stay in memory until accepted
+SPOOL_SIZE = 4194304
+
+_LOCAL_SIG = b'PK\x03\x04'
+_END_SIG = b'PK\x05\x06'  # end of central directory, i.e. an empty archive
+# signature, version, flags, method, time, date, crc, sizes, name/extra len
+_LOCAL_HEADER = struct.Struct('<4sHHHHHLLLHH')
+_DATA_DESCRIPTOR = 0x08
+_UTF8_NAME = 0x800
+
+_UPLOAD_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*\.zip$', re.I)
+
+
+class UploadError(Error):
+    """Rejected upload, with the HTTP status to respond with"""
+
+    def __init__(self, value, status=400):
+        Error.__init__(self, value)
+        self.status = status
+
+    def __str__(self):
+        return str(self.value)
+
+
+def check_upload_name(name):
+    """
+    :param name: str Archive name, as stored in the uploads directory
+    :raises UploadError: if not a plain '*.zip' file name
+    """
+    if not name or not _UPLOAD_NAME.match(name):
+        raise UploadError("Upload name must be a plain '*.zip' file name")
+
+
+class LocalHeaderScanner(object):
+    """
+    Checks a ZIP archive's local file headers as its bytes arrive, so a
+    body that is not a ZIP archive, or has an unsafe member path, is
+    rejected early. Stops at the central directory, or at a member whose
+    size is only known after its data (streamed archives), leaving the
+    rest to the central directory check.
+    """
+
+    def __init__(self):
+        self.members = 0
+        self.done = False
+        self._buf = b''
+        self._skip = 0
+
+    def feed(self, data):
+        """
+        :param data: bytes Next bytes of the archive
+        :raises UploadError: if not a ZIP archive, or a member is unsafe
+        """
+        if self.done:
+            return
+        if self._skip:
+            n = min(self._skip, len(data))
+            self._skip -= n
+            data = data[n:]
+            if not data:
+                return
+        buf = self._buf + data
+        while len(buf) >= 4:
+            if buf[:4] != _LOCAL_SIG:
+                if not self.members and buf[:4] != _END_SIG:
+                    raise UploadError('Upload is not a ZIP archive', 415)
+                self.done = True
+                break
+            if len(buf) < _LOCAL_HEADER.size:
+                break
+            _, _, flags, _, _, _, _, csize, _, nlen, xlen = \
+                _LOCAL_HEADER.unpack_from(buf)
+            end = _LOCAL_HEADER.size + nlen
+            if len(buf) < end:
+                break
+            name = buf[_LOCAL_HEADER.size:end].decode(
+                'utf-8' if flags & _UTF8_NAME else 'cp437', 'replace')
+            if unsafe_zip_member(name):
+                raise UploadError(
+                    'For security reasons, ZIP archive cannot contain paths')
+            self.members += 1
+            if flags & _DATA_DESCRIPTOR or csize == 0xFFFFFFFF:
+                self.done = True  # size follows the data, or is ZIP64
+                break
+            end += xlen + csize
+            if len(buf) < end:
+                self._skip = end - len(buf)
+                buf = b''
+                break
+            buf = buf[end:]
+        self._buf = b'' if self.done else buf
+
+
+def check_central_directory(f):
+    """
+    Check an archive's central directory: safe member paths, and the
+    plugin layout that ingestion validates (a top-level package directory
+    with __init__.py and metadata.txt). Member data is not read.
+    :param f: file object Whole archive
+    :raises UploadError: if not acceptable
+    """
+    try:
+        with zipfile.ZipFile(f) as zip_obj:
+            namelist = zip_obj.namelist()
+    except (zipfile.BadZipFile, RuntimeError, ValueError) as e:
+        raise UploadError('Upload is not a valid ZIP archive: {0}'.format(e),
+                          415)
+    for zname in namelist:
+        if unsafe_zip_member(zname):
+            raise UploadError(
+                'For security reasons, ZIP archive cannot contain paths')
+    if not namelist or '/' not in namelist[0]:
+        raise UploadError('Cannot find a folder inside the compressed '
+                          'package: this does not seem a valid plugin')
+    package_name = namelist[0][:namelist[0].index('/')]
+    for required in ('__init__.py', 'metadata.txt'):
+        if '{0}/{1}'.format(package_name, required) not in namelist:
+            raise UploadError('Cannot find {0}/{1} in the ZIP package'
+                              .format(package_name, required))
+
+
+class UploadReceiver(object):
+    """
+    Receives one upload, in memory while small, else into a dot-prefixed
+    part file in the uploads directory, enforcing the size limit and
+    checking the archive as bytes arrive. Once accepted, the part file is
+    linked into the uploads directory under the archive's name, where
+    'watch' ingests it.
+    """
+
+    def __init__(self, upload_dir, name, max_size, content_length=None,
+                 spool_size=SPOOL_SIZE):
+        """
+        :param upload_dir: str Uploads directory (the ingestion queue)
+        :param name: str Archive name
+        :param max_size: int Max archive size, in bytes
+        :param content_length: int Declared body size, if known
+        :raises UploadError: if the name, or declared size, is not allowed
+        """
+        check_upload_name(name)
+        if content_length is not None and content_length > max_size:
+            raise UploadError(
+                'ZIP archive is too big at ({0}) Bytes. Max size is {1} '
+                'Bytes'.format(content_length, max_size), 413)
+        if os.path.exists(os.path.join(upload_dir, name)):
+            raise UploadError(
+                "An upload named '{0}' is already waiting to be ingested"
+                .format(name), 409)
+        self.upload_dir = upload_dir
+        self.name = name
+        self.max_size = max_size
+        self.spool_size = spool_size
+        self.size = 0
+        self.scanner = LocalHeaderScanner()
+        self._sha = hashlib.sha256()
+        self._file = io.BytesIO()
+        self._part_path = None
+
+    def feed(self, data):
+        """
+        :param data: bytes Next bytes of the body
+        :raises UploadError: once too big, or not an acceptable archive
+        """
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadError(
+                'ZIP archive is too big, over {0} Bytes (max size)'
+                .format(self.max_size), 413)
+        self.scanner.feed(data)
+        self._sha.update(data)
+        self._file.write(data)
+        if self._part_path is None and self.size > self.spool_size:
+            self._rollover()
+
+    def _rollover(self):
+        """Move the body received so far from memory to a part file"""
+        # dot-prefixed, so not ingested; unique, as concurrent uploads of
+        # the same name may only be refused once complete
+        part_path = os.path.join(self.upload_dir, '.{0}.{1}.part'.format(
+            self.name, secrets.token_hex(8)))
+        f = os.fdopen(os.open(part_path,
+                              os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666),
+                      'w+b')
+        self._part_path = part_path
+        f.write(self._file.getvalue())
+        self._file = f
+
+    def receive(self, stream, chunk_size=65536):
+        """
+        Feed a whole body from a file-like stream, then finish().
+        :rtype: dict
+        """
+        while True:
+            data = stream.read(chunk_size)
+            if not data:
+                break
+            self.feed(data)
+        return self.finish()
+
+    def finish(self):
+        """
+        Check the whole archive, then queue it for ingestion
+        :return: Queued upload's name, size and SHA-256
+        :rtype: dict
+        :raises UploadError: if not an acceptable archive
+        """
+        check_central_directory(self._file)
+        try:
+            if self._part_path is None:
+                self._rollover()
+            self._file.flush()
+            dest = os.path.join(self.upload_dir, self.name)
+            # fails, rather than replacing, if one was queued meanwhile
+            os.link(self._part_path, dest)
+            # a link is only an inotify IN_CREATE: close it after writing,
+            # as 'watch' waits for (IN_CLOSE_WRITE), once it is complete
+            open(dest, 'ab').close()
+        except FileExistsError:
+            raise UploadError(
+                "An upload named '{0}' is already waiting to be "
+                "ingested".format(self.name), 409)
+        finally:
+            self.close()
+        log.info("Queued upload '%s' (%s bytes)", self.name, self.size)
+        return {'name': self.name, 'size': self.size,
+                'sha256': self._sha.hexdigest()}
+
+    def close(self):
+        self._file.close()
+        if self._part_path is not None:
+            try:
+                os.remove(self._part_path)
+            except FileNotFoundError:
+                pass
+            self._part_path = None
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ wsgi.py
+
+ Multi-threaded, optionally pre-forked WSGI server for serving a repo
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import sys
+import logging
+import signal
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, \
+    ServerHandler
+from wsgiref.util import FileWrapper
+
+log = logging.getLogger(__name__)
+
+
+class SendfileWrapper(FileWrapper):
+    """
+    wsgi.file_wrapper whose files are sent with os.sendfile, if possible.
+    Sends from the file's current position, up to an optional length.
+    """
+
+    def __init__(self, filelike, blksize=8192, length=None):
+        FileWrapper.__init__(self, filelike, blksize)
+        self.remaining = length
+
+    def __next__(self):
+        if self.remaining is None:
+            return FileWrapper.__next__(self)
+        if self.remaining <= 0:
+            raise StopIteration
+        data = self.filelike.read(min(self.blksize, self.remaining))
+        if not data:
+            raise StopIteration
+        self.remaining -= len(data)
+        return data
+
+
+class _SendfileServerHandler(ServerHandler):
+
+    wsgi_file_wrapper = SendfileWrapper
+
+    def sendfile(self):
+        filelike = self.result.filelike
+        length = self.headers.get('Content-Length')
+        if length is None or not hasattr(filelike, 'fileno'):
+            return False
+        try:
+            filelike.fileno()
+        except (OSError, ValueError, AttributeError):
+            return False  # e.g. io.BytesIO
+        sock = self.request_handler.connection
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        count = int(length)
+        sent = sock.sendfile(filelike, offset=filelike.tell(), count=count)
+        self.bytes_sent += sent
+        return True
+
+
+class _RequestHandler(WSGIRequestHandler):
+
+    def handle(self):
+        """Handle a single HTTP request (with sendfile support)"""
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+
+        if not self.parse_request():
+            return
+
+        handler = _SendfileServerHandler(
+            self.rfile, self.wfile, self.get_stderr(), self.get_environ(),
+            multithread=True, multiprocess=self.server.multiprocess
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+    def log_message(self, fmt, *args):
+        log.info("%s - %s", self.address_string(), fmt % args)
+
+
+class ThreadPoolWSGIServer(WSGIServer):
+    """WSGIServer that handles requests in a fixed-size pool of threads"""
+
+    request_queue_size = 256
+    allow_reuse_address = True
+    multiprocess = False
+
+    def __init__(self, server_address, threads=8, **kwargs):
+        self.threads = threads
+        self.pool = None  # created per (forked) process, in serve_forever
+        WSGIServer.__init__(self, server_address, _RequestHandler, **kwargs)
+
+    def serve_forever(self, poll_interval=0.5):
+        self.pool = ThreadPoolExecutor(max_workers=self.threads,
+                                       thread_name_prefix='wsgi')
+        try:
+            WSGIServer.serve_forever(self, poll_interval)
+        finally:
+            # let in-flight requests finish
+            self.pool.shutdown(wait=True)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class CatalogWatcher(threading.Thread):
+    """
+    Background thread that reloads a QgisPluginCatalog when plugins.xml
+    changes, so request threads never pay for the re-parse. Requests keep
+    being served from the previous generation until the new one is swapped in.
+    """
+
+    def __init__(self, catalog, interval=2.0):
+        threading.Thread.__init__(self, name='catalog-watcher', daemon=True)
+        self.catalog = catalog
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if self.catalog.reload():
+                    log.info('Reloaded plugins.xml (generation %s)',
+                             self.catalog.generation)
+            except Exception as e:
+                log.warning('Reloading plugins.xml failed: %s', e)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def _serve_process(server, catalog, watch_interval):
+    watcher = None
+    if catalog is not None:
+        # request-time checks are redundant with the watcher
+        catalog.check_interval = float('inf')
+        watcher = CatalogWatcher(catalog, watch_interval)
+        watcher.start()
+
+    def _shutdown(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    def _reload(signum, frame):
+        if catalog is not None:
+            threading.Thread(target=catalog.reload, kwargs={'force': True},
+                             daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, _reload)
+    try:
+        server.serve_forever()
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        server.server_close()
+
+
+def serve(app, host='127.0.0.1', port=8008, workers=1, threads=8,
+          catalog=None, watch_interval=2.0):
+    """
+    Serve a WSGI app with a pool of threads per process, optionally in
+    several pre-forked worker processes sharing one listening socket.
+
+    Any catalog (and the app) is set up before forking, so its parsed
+    plugins.xml is shared copy-on-write by all workers. Each worker reloads
+    the catalog when plugins.xml changes, or on SIGHUP. SIGTERM/SIGINT stops
+    accepting new connections and lets in-flight requests finish.
+
+    :param app: WSGI application
+    :param host: str
+    :param port: int
+    :param workers: int Number of worker processes (POSIX only)
+    :param threads: int Number of request threads per worker
+    :param catalog: QgisPluginCatalog Catalog to keep up-to-date
+    :param watch_interval: float Seconds between plugins.xml change checks
+    """
+    server = ThreadPoolWSGIServer((host, int(port)), threads=threads)
+    server.set_app(app)
+    if workers > 1 and not hasattr(os, 'fork'):
+        log.warning('Multiple workers not supported on this platform')
+        workers = 1
+    log.warning('Serving on http://%s:%s/ (%s worker(s), %s thread(s) each)',
+                host, port, workers, threads)
+
+    if workers <= 1:
+        _serve_process(server, catalog, watch_interval)
+        return
+
+    server.multiprocess = True
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:  # worker
+            try:
+                _serve_process(server, catalog, watch_interval)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def _forward(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signum)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, _forward)
+    server.socket.close()  # only workers accept connections
+    for child in children:
+        while True:
+            try:
+                os.waitpid(child, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+    sys.stdout.flush()
@@ -29,24 +29,20 @@ import os
 # import pprint
 import sys
 import logging
-import tarfile
-import urllib.request
 
 from datetime import datetime
-from urllib.parse import urlparse
-from lxml import etree
-from progress.bar import Bar
-from wget import download
-from flask import Flask, request, redirect, make_response, \
-    send_from_directory, abort, url_for
 
+# Subcommands import their own dependencies (Flask, tarfile, etc.),
+# so that frequent ones, e.g. update and remove, start quickly
 try:
-    from qgis_repo.repo import QgisRepo, QgisPluginTree, QgisPlugin, conf, vjust
+    from qgis_repo.repo import QgisRepo, QgisPluginTree, QgisPlugin, conf
+    from qgis_repo import memprofile, timing
 except ImportError:
     sys.path.insert(0,
                     os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     # pprint.pprint(sys.path)
-    from qgis_repo.repo import QgisRepo, QgisPluginTree, QgisPlugin, conf, vjust
+    from qgis_repo.repo import QgisRepo, QgisPluginTree, QgisPlugin, conf
+    from qgis_repo import memprofile, timing
 
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -70,6 +66,8 @@ if os.path.exists(local_templates) and custom_conf:
 
 # Global repo instance
 repo = None
+# Repos whose changes are being built as a new generation, see stage()
+staged_repos = []
 
 
 class Error(Exception):
@@ -108,6 +106,31 @@ def arg_parser():
                           '(overrides suffix defined in repo settings)',
                      dest='name_suffix',
                      metavar='SUFFIX')
+    parser.add_argument(
+        '--timings',
+        action='store',
+        metavar='path',
+        default=timing.paths_from_env()[0],
+        help='Write a JSON summary of time and bytes per pipeline stage '
+             '(or set {0})'.format(timing.TIMINGS_ENV)
+    )
+    parser.add_argument(
+        '--trace',
+        action='store',
+        metavar='path',
+        default=timing.paths_from_env()[1],
+        help='Write a Chrome trace (chrome://tracing) of pipeline stages '
+             '(or set {0})'.format(timing.TRACE_ENV)
+    )
+    parser.add_argument(
+        '--memory-profile',
+        action='store',
+        metavar='path',
+        default=memprofile.path_from_env(),
+        help='Write a JSON profile of RSS and traced allocations per phase, '
+             'with top allocators, and print it (slow; or set {0})'
+             .format(memprofile.MEMPROFILE_ENV)
+    )
     subparsers = parser.add_subparsers(
         title='subcommands',
         description="repository action to take... (see 'subcommand -h')",
@@ -161,6 +184,16 @@ def arg_parser():
         action='store_true',
         help='Sort the plugins.xml repo index after updating/adding plugins'
     )
+    parser_up.add_argument(
+        '--fan-out',
+        action='append',
+        dest='fan_out',
+        default=[],
+        choices=conf['repos'].keys(),
+        metavar='repo',
+        help='Also add the plugin(s) to this repository (repeatable), with '
+             'its own name suffix, validating each archive only once'
+    )
     parser_up.add_argument('repo', **repoopt)
     parser_up.add_argument(
         'zip_name',
@@ -170,6 +203,66 @@ def arg_parser():
     )
     parser_up.set_defaults(func=update_plugin)
 
+    parser_wa = subparsers.add_parser(
+        'watch', help='Keep a repository loaded, and add/update plugins '
+                      'as their ZIP archives land in the uploads directory')
+    parser_wa.add_argument('--auth', **authopt)
+    parser_wa.add_argument('--role', **roleopt)
+    parser_wa.add_argument('--name-suffix', **namsfxopt)
+    parser_wa.add_argument(
+        '--invalid-fields',
+        action='store_true',
+        help='Do not strictly validate recommended metadata fields'
+    )
+    parser_wa.add_argument(
+        '--remove-version', dest='versions',
+        action='store',
+        help='Remove existing plugin resources, for specific version(s) '
+             '(default: none)',
+        default='none',
+        metavar='(none | all | latest | oldest | #.#.#,...)'
+    )
+    parser_wa.add_argument(
+        '--keep-zip',
+        action='store_true',
+        help='Do not remove existing plugin ZIP archive(s) '
+             'when removing a plugin '
+    )
+    parser_wa.add_argument(
+        '--untrusted',
+        action='store_true',
+        help='Plugins are untrusted (default: trusted)'
+    )
+    parser_wa.add_argument(
+        '--coalesce',
+        type=float,
+        default=0.5,
+        help='Write plugins.xml once uploads pause for this many seconds',
+        metavar='seconds'
+    )
+    parser_wa.add_argument(
+        '--max-delay',
+        type=float,
+        default=5.0,
+        help='Write plugins.xml at least this many seconds after an upload, '
+             'even if uploads keep coming',
+        metavar='seconds'
+    )
+    parser_wa.add_argument(
+        '--poll',
+        action='store_true',
+        help='Poll the uploads directory, instead of using inotify (Linux)'
+    )
+    parser_wa.add_argument(
+        '--poll-interval',
+        type=float,
+        default=1.0,
+        help='Seconds between polls of the uploads directory',
+        metavar='seconds'
+    )
+    parser_wa.add_argument('repo', **repoopt)
+    parser_wa.set_defaults(func=watch_repo)
+
     parser_rm = subparsers.add_parser(
         'remove', help='Remove ALL versions of a plugin from a repository '
                        '(unless otherwise constrained)')
@@ -195,6 +288,48 @@ def arg_parser():
     )
     parser_rm.set_defaults(func=remove_plugin)
 
+    parser_pr = subparsers.add_parser(
+        'promote', help='Add a plugin from another repository, e.g. beta, '
+                        'without validating or re-packaging it again')
+    parser_pr.add_argument('--name-suffix', **namsfxopt)
+    parser_pr.add_argument(
+        '--version',
+        action='store',
+        help='Version of plugin to promote, in source repository',
+        default='latest',
+        metavar='(latest | #.#.#)'
+    )
+    parser_pr.add_argument(
+        '--remove-version', dest='versions',
+        action='store',
+        help='Remove existing plugin resources, for specific version(s) '
+             '(default: none)',
+        default='none',
+        metavar='(none | all | latest | oldest | #.#.#,...)'
+    )
+    parser_pr.add_argument(
+        '--keep-zip',
+        action='store_true',
+        help='Do not remove existing plugin ZIP archive(s) '
+             'when removing a plugin '
+    )
+    parser_pr.add_argument(
+        'source',
+        action='store',
+        help='Repository to promote from',
+        metavar='source',
+        choices=conf['repos'].keys()
+    )
+    parser_pr.add_argument('repo', **repoopt)
+    parser_pr.add_argument(
+        'plugin_name',
+        action='store',
+        help='Name of plugin (NOT package), with or without the source '
+             'repository\'s name suffix',
+        metavar='plugin_name'
+    )
+    parser_pr.set_defaults(func=promote_plugin)
+
     parser_mrr = subparsers.add_parser(
         'mirror', help='Mirror an existing QGIS plugin repository')
     parser_mrr.add_argument('--auth', **authopt)
@@ -228,6 +363,36 @@ def arg_parser():
              'copied back into the uploads directory and the merge.xml file is '
              'still present.'
     )
+    parser_mrr.add_argument(
+        '--force-fetch',
+        action='store_true',
+        help='Download plugins.xml files even if upstream reports them '
+             'unchanged, and mirror even if nothing changed since the last '
+             'mirror'
+    )
+    parser_mrr.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue an interrupted mirror where it stopped, from its '
+             'recorded progress, rather than starting over'
+    )
+    parser_mrr.add_argument(
+        '--checkpoint-every',
+        action='store',
+        type=int,
+        default=100,
+        metavar='number',
+        help='Number of plugins added or updated between writes of '
+             'plugins.xml, each a point to --resume from (default: 100)'
+    )
+    parser_mrr.add_argument(
+        '--fetch-workers',
+        action='store',
+        type=int,
+        default=4,
+        metavar='number',
+        help='Number of plugins.xml files downloaded at once (default: 4)'
+    )
     parser_mrr.add_argument(
         '--qgis-versions',
         action='store',
@@ -245,8 +410,8 @@ def arg_parser():
     parser_mrr.set_defaults(func=mirror_repo)
 
     parser_srv = subparsers.add_parser(
-        'serve', help='Test-serve a local QGIS plugin repository '
-                      '(NOT FOR PRODUCTION)')
+        'serve', help='Serve a local QGIS plugin repository '
+                      '(test server, unless --production)')
     parser_srv.add_argument(
         '--host',
         action='store',
@@ -264,14 +429,146 @@ def arg_parser():
         action='store_true',
         help='Run test server in debug mode'
     )
+    parser_srv.add_argument(
+        '--production',
+        action='store_true',
+        help='Serve with a multi-threaded (optionally multi-process) WSGI '
+             'server, instead of the Flask test server'
+    )
+    parser_srv.add_argument(
+        '--async',
+        action='store_true',
+        dest='use_async',
+        help='Serve from a single asyncio event loop, which holds many '
+             'concurrent (slow) clients cheaply'
+    )
+    parser_srv.add_argument(
+        '--workers',
+        action='store',
+        type=int,
+        default=1,
+        metavar='number',
+        help='Number of worker processes (with --production)'
+    )
+    parser_srv.add_argument(
+        '--threads',
+        action='store',
+        type=int,
+        default=8,
+        metavar='number',
+        help='Number of request threads per worker (with --production)'
+    )
+    parser_srv.add_argument(
+        '--auth-backend',
+        action='store',
+        metavar='spec',
+        help='Enforce authorization of packages-auth downloads, with a '
+             'JSON tokens file or a module:factory auth backend'
+    )
+    parser_srv.add_argument(
+        '--auth-cache-ttl',
+        action='store',
+        type=float,
+        default=300.0,
+        metavar='seconds',
+        help='How long to cache the roles of valid credentials'
+    )
+    parser_srv.add_argument(
+        '--upload-role',
+        action='append',
+        dest='upload_roles',
+        metavar='role',
+        help='Accept plugin uploads (PUT /upload/<name>.zip), for watch to '
+             'ingest, from credentials with this role (repeatable; \'\' for '
+             'any valid credentials; needs --auth-backend, and not --async)'
+    )
     parser_srv.add_argument('repo', **repoopt)
     parser_srv.set_defaults(func=serve_repo)
 
     parser_pkg = subparsers.add_parser(
         'package', help='Package a repository into a compressed archive')
+    parser_pkg.add_argument(
+        '--workers',
+        action='store',
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar='number',
+        help='Number of compression threads (default: CPU count)'
+    )
+    parser_pkg.add_argument(
+        '--level',
+        action='store',
+        type=int,
+        default=6,
+        choices=range(0, 10),
+        metavar='0-9',
+        help='gzip compression level (.zip, .png, etc. files are stored, '
+             'not compressed again) (default: 6)'
+    )
+    parser_pkg.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Only archive files added or changed since the latest snapshot '
+             '(full, if none), listing those deleted'
+    )
     parser_pkg.add_argument('repo', **repoopt)
     parser_pkg.set_defaults(func=package_repo)
 
+    parser_rc = subparsers.add_parser(
+        'reconstruct', help='Restore a repository directory as of a '
+                            'snapshot, from its full package and increments')
+    parser_rc.add_argument(
+        '--snapshot',
+        action='store',
+        help='Archive name of the snapshot to restore (default: latest)',
+        metavar='archive'
+    )
+    parser_rc.add_argument('repo', **repoopt)
+    parser_rc.add_argument(
+        'dest_dir',
+        action='store',
+        help='Directory to restore the repository directory into',
+        metavar='dest_dir'
+    )
+    parser_rc.set_defaults(func=reconstruct_repo)
+
+    parser_unp = subparsers.add_parser(
+        'unpack', help='Replace a repository directory with a snapshot, '
+                       'verified in a staging directory then swapped in')
+    parser_unp.add_argument(
+        '--snapshot',
+        action='store',
+        help='Archive name of the snapshot to unpack (default: latest)',
+        metavar='archive'
+    )
+    parser_unp.add_argument(
+        '--workers',
+        action='store',
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar='number',
+        help='Number of file writing threads (default: CPU count)'
+    )
+    parser_unp.add_argument('repo', **repoopt)
+    parser_unp.set_defaults(func=unpack_repo)
+
+    parser_rb = subparsers.add_parser(
+        'rollback', help='Switch a repository back to an earlier published '
+                         'generation (see \'generations\' setting)')
+    parser_rb.add_argument(
+        '--generation',
+        action='store',
+        help='Generation to switch to (default: the one before the live one)',
+        metavar='id'
+    )
+    parser_rb.add_argument(
+        '--list',
+        action='store_true',
+        help='List the kept generations, marking the live one, and exit'
+    )
+    parser_rb.add_argument('repo', **repoopt)
+    parser_rb.set_defaults(func=rollback_repo)
+
     parser_cl = subparsers.add_parser(
         'clear', help='Clear all plugins, archives and icons from a repository')
     parser_cl.add_argument('repo', **repoopt)
@@ -286,7 +583,26 @@ def setup_repo():
     return True
 
 
+def stage(r, resume=None):
+    """
+    Build a repo's changes as a new generation, if it keeps generations,
+    published once the subcommand succeeds (else discarded)
+    :param resume: str Generation directory to continue building instead
+    """
+    if r.begin_generation(resume=resume):
+        staged_repos.append(r)
+
+
+def unstage(r):
+    """Keep a repo's generation being built, neither published nor
+    discarded, e.g. for an interrupted subcommand to resume"""
+    if r in staged_repos:
+        staged_repos.remove(r)
+        r.suspend_generation()
+
+
 def update_plugin():
+    stage(repo)
     setup_repo()
     if args.zip_name.lower() == 'all':
         zips = [z for z in os.listdir(repo.upload_dir)
@@ -302,9 +618,20 @@ def update_plugin():
             print('No plugin archive name defined')
         return False
 
+    from progress.bar import Bar
+
     repo.output = False  # nix qgis_repo output, since using progress bar
-    up_bar = Bar("Updating plugins in '{0}'".format(repo.repo_name),
-                 fill='=', max=len(zips))
+    fan_out = []
+    for name in args.fan_out:
+        if name != repo.repo_name and \
+                name not in [r.repo_name for r in fan_out]:
+            fan_repo = QgisRepo(name, conf)
+            stage(fan_repo)
+            fan_repo.setup_repo()
+            fan_out.append(fan_repo)
+    up_bar = Bar("Updating plugins in '{0}'".format(
+        "', '".join([repo.repo_name] + [r.repo_name for r in fan_out])),
+        fill='=', max=len(zips))
     up_bar.start()
     for i in up_bar.iter(range(0, len(zips))):
         try:
@@ -317,21 +644,51 @@ def update_plugin():
                 versions=args.versions,
                 keep_zip=args.keep_zip,
                 untrusted=args.untrusted,
-                invalid_fields=args.invalid_fields
+                invalid_fields=args.invalid_fields,
+                write_xml=False,
+                fan_out=fan_out
             )
         except KeyboardInterrupt:
             return False
 
     if args.sort_xml:
         print("Sorting repo plugins.xml")
-        post_sort = QgisPluginTree.plugins_sorted_by_name(
-            repo.plugins_tree.plugins())
-        repo.plugins_tree.set_plugins(post_sort)
+        for r in [repo] + fan_out:
+            post_sort = QgisPluginTree.plugins_sorted_by_name(
+                r.plugins_tree.plugins())
+            r.plugins_tree.set_plugins(post_sort)
+
+    # one plugins.xml write per staged repo, for all the plugins
+    with memprofile.phase('write'):
+        for r in [repo] + fan_out:
+            r.write_plugins_xml(r.plugins_tree_xml())
 
     return True
 
 
+def watch_repo():
+    from qgis_repo.daemon import watch_uploads
+
+    repo.output = False  # failed uploads are logged, not printed
+    watch_uploads(
+        repo,
+        coalesce=args.coalesce,
+        max_delay=args.max_delay,
+        poll=args.poll,
+        poll_interval=args.poll_interval,
+        name_suffix=args.name_suffix,
+        auth=args.auth,
+        auth_role=args.auth_role,
+        versions=args.versions,
+        keep_zip=args.keep_zip,
+        untrusted=args.untrusted,
+        invalid_fields=args.invalid_fields
+    )
+    return True
+
+
 def remove_plugin():
+    stage(repo)
     setup_repo()
     return repo.remove_plugin(
         args.plugin_name,
@@ -340,11 +697,36 @@ def remove_plugin():
     )
 
 
+def promote_plugin():
+    stage(repo)
+    setup_repo()
+    source = QgisRepo(args.source, conf)
+    source.setup_repo()
+    return repo.promote_plugin(
+        source,
+        args.plugin_name,
+        version=args.version,
+        name_suffix=args.name_suffix,
+        versions=args.versions,
+        keep_zip=args.keep_zip
+    )
+
+
 def mirror_repo():
+    import urllib.request
+    from urllib.parse import urlparse
+    from lxml import etree
+    from progress.bar import Bar
+    from qgis_repo.generations import GenerationError
+    from qgis_repo.mirror import CACHE_MAX_SIZE, MERGED_XML_NAME, \
+        DOWNLOAD, INGEST, OVERLAY, DONE, FETCHED, INGESTED, REJECTED, \
+        OVERLAID, UNMATCHED, DownloadCache, MirrorError, MirrorProgress, \
+        UpstreamFeeds
+    from qgis_repo.repo import Error as RepoError
+
     setup_repo()
     mirror_temp = 'mirror-temp'
     mirror_dir = os.path.join(SCRIPT_DIR, mirror_temp)
-    merge_xml = 'merged.xml'
     # Setup default urllib handler to add a User-Agent header
     opener = urllib.request.build_opener()
     opener.addheaders = [('User-agent', 'Mozilla/5.0')]
@@ -355,8 +737,31 @@ def mirror_repo():
               'Choose either, but not both.')
         return False
 
-    if args.skip_download:
-        tree = QgisPluginTree(os.path.join(mirror_dir, merge_xml))
+    # upstream plugins.xml files and their merge are kept between runs, as
+    # is the progress of mirroring them into the repo
+    feeds = UpstreamFeeds(mirror_dir)
+    progress = MirrorProgress(mirror_dir, repo.repo_name)
+    options = {
+        'name_suffix': args.name_suffix,
+        'auth': args.auth,
+        'auth_role': args.auth_role,
+        'validate_fields': args.validate_fields,
+    }
+    if args.resume:
+        if not progress.unfinished():
+            print("No unfinished mirror into '{0}' to resume"
+                  .format(repo.repo_name))
+            return False
+        if not progress.resumable(feeds.merged_xml, options):
+            print("Unfinished mirror into '{0}' was of other upstream "
+                  "plugins, or with other options; run without --resume "
+                  "to start over".format(repo.repo_name))
+            return False
+        print("Resuming mirror into '{0}' at its {1} phase".format(
+            repo.repo_name, progress.phase))
+        tree = QgisPluginTree(feeds.merged_xml)
+    elif args.skip_download:
+        tree = QgisPluginTree(feeds.merged_xml)
     else:
         xml_url = args.plugins_xml_url
         if not xml_url or not xml_url.lower().endswith('.xml'):
@@ -367,10 +772,6 @@ def mirror_repo():
             url_parts.hostname.replace('.', '-'),
             os.path.splitext(os.path.basename(xml_url))[0])
 
-        if not os.path.exists(mirror_dir):
-            os.mkdir(mirror_dir)
-        repo.remove_dir_contents(mirror_dir, strict=False)
-
         q_vers = args.qgis_versions.replace(' ', '').split(',') \
             if args.qgis_versions is not None else None
         if q_vers is None:
@@ -382,155 +783,297 @@ def mirror_repo():
             names = ['{0}_{1}.xml'.format(b_name, v.replace('.', '-'))
                      for v in q_vers]
 
-        tree = QgisPluginTree()
-        dl_bar = Bar('Downloading/merging xml', fill='=', max=len(urls))
+        dl_bar = Bar('Fetching xml', fill='=', max=len(urls))
         dl_bar.start()
         try:
-            for i in dl_bar.iter(range(0, len(urls))):
-                out_xml = os.path.join(mirror_dir, names[i])
-                download(urls[i], out=out_xml, bar=None)
-                tree.merge_plugins(out_xml)
+            # concurrently, though the bar advances in completion order
+            with memprofile.phase('download_xml'):
+                changed = feeds.fetch_all(
+                    list(zip(urls, names)), force=args.force_fetch,
+                    workers=args.fetch_workers,
+                    progress=lambda *_: dl_bar.next())
         except KeyboardInterrupt:
             return False
-
-        print("Sorting merged plugins")
-        name_sort = QgisPluginTree.plugins_sorted_by_name(tree.plugins())
-        tree.set_plugins(name_sort)
-
-        xml = tree.to_xml()
-
-        print("Writing merged plugins to '{0}/{1}'".format(mirror_temp,
-                                                           merge_xml))
-        with open(os.path.join(mirror_dir, merge_xml), 'wb') as f:
-            f.write(xml)
+        except MirrorError as e:
+            print(e)
+            return False
+        finally:
+            dl_bar.finish()
+
+        if feeds.unchanged(urls):
+            if feeds.mirrored(repo.repo_name, options, repo.plugins_xml) \
+                    and not args.force_fetch:
+                print("Upstream plugins unchanged since last mirrored into "
+                      "'{0}', nothing to do".format(repo.repo_name))
+                return True
+            print("Upstream plugins unchanged, using previous merge")
+            tree = QgisPluginTree(feeds.merged_xml)
+        else:
+            print("Merging {0} changed of {1} plugins.xml files".format(
+                len(changed), len(urls)))
+            try:
+                with memprofile.phase('merge_xml'), timing.span('merge_xml'):
+                    tree = feeds.merge(urls)
+            except MirrorError as e:
+                print(e)
+                return False
+
+            print("Sorting merged plugins")
+            with memprofile.phase('sort'), timing.span('sort_plugins'):
+                name_sort = QgisPluginTree.plugins_sorted_by_name(
+                    tree.plugins())
+                tree.set_plugins(name_sort)
+
+            with memprofile.phase('serialize_xml'), \
+                    timing.span('serialize_xml') as s:
+                xml = tree.to_xml()
+                s.add_bytes(len(xml))
+
+            print("Writing merged plugins to '{0}/{1}'".format(
+                mirror_temp, MERGED_XML_NAME))
+            with memprofile.phase('write_merged_xml'), \
+                    timing.span('write_merged_xml', len(xml)):
+                feeds.save_merged(xml, urls)
         if args.only_xmls:
             return True
 
-    downloads = {}
-    elements = {}
-    for p in tree.plugins():
-        dl_url = p.findtext("download_url")
-        file_name = p.findtext("file_name")
-        if all([file_name, dl_url, dl_url not in downloads]):
-            downloads[file_name] = dl_url
-            elements[file_name] = p
-            # for testing against plugins.qgis.org
-            # if len(downloads) == 10:
-            #     break
-
+    with memprofile.phase('collect_downloads'):
+        downloads = {}
+        elements = {}
+        for p in tree.plugins():
+            dl_url = p.findtext("download_url")
+            file_name = p.findtext("file_name")
+            if all([file_name, dl_url, dl_url not in downloads]):
+                downloads[file_name] = dl_url
+                elements[file_name] = p
+                # for testing against plugins.qgis.org
+                # if len(downloads) == 10:
+                #     break
+
+    if not args.resume:
+        if progress.unfinished():
+            print("Starting over the unfinished mirror into '{0}' (see "
+                  "--resume)".format(repo.repo_name))
+            if progress.building is not None:
+                repo.generations.abort(progress.building)
+        progress.begin(feeds.merged_xml, options)
+        if not args.skip_download:
+            # cheap, since uploads are mostly links into the download cache
+            repo.remove_dir_contents(repo.upload_dir)
+
+    cache = None
     if not args.skip_download:
-        repo.remove_dir_contents(repo.upload_dir)
-
-        dl_bar = Bar('Downloading plugins', fill='=', max=len(downloads))
-        dl_bar.start()
-        try:
-            for f_name, dl_url in dl_bar.iter(downloads.items()):
-                out_dl = os.path.join(repo.upload_dir, f_name)
-                download(dl_url, out=out_dl, bar=None)
-        except KeyboardInterrupt:
-            return False
+        # shared by all repos mirrored from here
+        cache = DownloadCache(
+            conf.get('download_cache_dir') or
+            os.path.join(SCRIPT_DIR, 'download-cache'),
+            max_size=conf.get('download_cache_size', CACHE_MAX_SIZE))
+
+    if progress.phase == DOWNLOAD:
+        if cache is None:
+            for f_name in downloads:
+                if os.path.isfile(os.path.join(repo.upload_dir, f_name)):
+                    progress.fetched(f_name)
+        else:
+            todo = [(f_name, dl_url) for f_name, dl_url in downloads.items()
+                    if progress.status(f_name) is None]
+            cached = 0
+            dl_bar = Bar('Downloading plugins', fill='=', max=len(todo))
+            dl_bar.start()
+            try:
+                with memprofile.phase('download_plugins'):
+                    for f_name, dl_url in dl_bar.iter(todo):
+                        out_dl = os.path.join(repo.upload_dir, f_name)
+                        with timing.span('download_plugin',
+                                         url=dl_url) as s:
+                            hit, size = cache.fetch(dl_url, f_name, out_dl)
+                            if not hit:
+                                s.add_bytes(size)
+                        cached += hit
+                        progress.fetched(f_name)
+            except KeyboardInterrupt:
+                return False
+            except MirrorError as e:
+                print(e)
+                return False
+            finally:
+                cache.write()
+                progress.write()
+            print("{0} of {1} plugins from the download cache".format(
+                cached, len(todo)))
+        progress.set_phase(INGEST)
 
     if args.only_download:
         print("Downloads complete, exiting since --only-download specified")
         return True
 
-    zips = [z for z in os.listdir(repo.upload_dir)
-            if (os.path.isfile(os.path.join(repo.upload_dir, z))
-                and z.lower().endswith('.zip'))]
-    if not zips:
+    if not any(progress.status(f_name) for f_name in downloads):
         print('No plugins archives found in uploads directory')
         return False
 
-    repo.output = False  # nix qgis_repo output, since using progress bar
-    up_bar = Bar("Adding plugins to '{0}'".format(repo.repo_name),
-                 fill='=', max=len(downloads))
-    up_bar.start()
+    # continue building the generation an interrupted mirror began, if any
     try:
-        for zip_name in up_bar.iter(downloads):
-            repo.update_plugin(
-                zip_name,
-                name_suffix=args.name_suffix,
-                auth=args.auth,
-                auth_role=args.auth_role,
-                # don't remove existing or just-added plugins when mirroring
-                versions='none',
-                untrusted=True,
-                invalid_fields=(not args.validate_fields)
-            )
-            # plugins are 'untrusted,' until overwritten with mirrored repo data
-    except KeyboardInterrupt:
-        return False
+        stage(repo, resume=progress.building)
+    except GenerationError:
+        print("Generation built by the unfinished mirror is gone, "
+              "adding plugins again")
+        progress.restart_ingest()
+        stage(repo)
+    if not progress.recover(repo.plugins_xml):
+        print("'{0}' {1} changed since the mirror's last checkpoint, "
+              "adding plugins again".format(repo.repo_name,
+                                            repo.plugins_xml_name))
+        progress.restart_ingest()
+    progress.set_building(repo.building_generation)
+    repo.output = False  # nix qgis_repo output, since using progress bar
+    repo.load_plugins_tree()
+
+    def checkpoint(phase=None):
+        """Write plugins.xml, with the plugins' progress up to now"""
+        with memprofile.phase('write'):
+            xml = repo.plugins_tree_xml()
+            progress.prepare_checkpoint(xml, phase=phase)
+            repo.write_plugins_xml(xml)
+            progress.commit_checkpoint()
 
-    print("Sort plugins in '{0}'".format(repo.repo_name))
-    # Sorting is the right thing to do here, plus...
-    # Helps ensure 'startswith' finding of plugins will find earliest occurrance
-    # of a partial version, e.g. plugin.1.0 is found before plugin.1.0.1
-    init_sort = QgisPluginTree.plugins_sorted_by_name(
-        repo.plugins_tree.plugins())
-    repo.plugins_tree.set_plugins(init_sort)
-
-    up_bar = Bar("Updating '{0}' plugins with mirrored repo data"
-                 .format(repo.repo_name),
-                 fill='=', max=len(elements))
-    up_bar.start()
-    cp_tags = ['about', 'average_vote', 'author_name', 'create_date',
-               'deprecated', 'description', 'downloads', 'experimental',
-               'external_dependencies', 'homepage', 'rating_votes',
-               'repository', 'tags', 'tracker', 'trusted', 'update_date',
-               'uploaded_by']
-    maybe_missing = []
-    needs_resorted = False
     try:
-        for file_name, el in up_bar.iter(elements.items()):
-            nam, _ = os.path.splitext(file_name)
-            p = repo.plugins_tree.find_plugin_by_package_name(nam,
-                                                              starts_with=True)
-            if not p:  # maybe the base version has been adjusted, try again
-                temp_nam = re.sub(r'((\d+\.)?(\d+\.)?(\d+))', r'.\1', nam)
+        if progress.phase == INGEST:
+            todo = [f_name for f_name in downloads
+                    if progress.status(f_name) == FETCHED]
+            up_bar = Bar("Adding plugins to '{0}'".format(repo.repo_name),
+                         fill='=', max=len(todo))
+            up_bar.start()
+            # update_plugin()'s own phases nest in this one, so aren't
+            # recorded
+            with memprofile.phase('ingest'):
+                for zip_name in up_bar.iter(todo):
+                    zip_path = os.path.join(repo.upload_dir, zip_name)
+                    if cache is not None and not os.path.exists(zip_path):
+                        # moved into the repo by an ingest since lost
+                        cache.fetch(downloads[zip_name], zip_name, zip_path)
+                    try:
+                        added = repo.update_plugin(
+                            zip_name,
+                            name_suffix=args.name_suffix,
+                            auth=args.auth,
+                            auth_role=args.auth_role,
+                            # don't remove existing or just-added plugins
+                            # when mirroring
+                            versions='none',
+                            untrusted=True,
+                            invalid_fields=(not args.validate_fields),
+                            write_xml=False
+                        )
+                    except RepoError as e:
+                        log.warning("Plugin '%s' not added: %s", zip_name, e)
+                        added = False
+                    # plugins are 'untrusted,' until overwritten with
+                    # mirrored repo data
+                    progress.set_status(zip_name,
+                                        INGESTED if added else REJECTED)
+                    if progress.pending() >= args.checkpoint_every:
+                        checkpoint()
+
+            print("Sort plugins in '{0}'".format(repo.repo_name))
+            # Sorting is the right thing to do here, plus...
+            # Helps ensure 'startswith' finding of plugins will find earliest
+            # occurrance of a partial version, e.g. plugin.1.0 is found before
+            # plugin.1.0.1
+            with memprofile.phase('sort'), timing.span('sort_plugins'):
+                init_sort = QgisPluginTree.plugins_sorted_by_name(
+                    repo.plugins_tree.plugins())
+                repo.plugins_tree.set_plugins(init_sort)
+            checkpoint(phase=OVERLAY)
+
+        todo = [(file_name, el) for file_name, el in elements.items()
+                if progress.status(file_name) == INGESTED]
+        up_bar = Bar("Updating '{0}' plugins with mirrored repo data"
+                     .format(repo.repo_name),
+                     fill='=', max=len(todo))
+        up_bar.start()
+        cp_tags = ['about', 'average_vote', 'author_name', 'create_date',
+                   'deprecated', 'description', 'downloads', 'experimental',
+                   'external_dependencies', 'homepage', 'rating_votes',
+                   'repository', 'tags', 'tracker', 'trusted', 'update_date',
+                   'uploaded_by']
+        # names may have been updated before an interruption
+        needs_resorted = progress.count(OVERLAID) > 0
+        with memprofile.phase('overlay'), \
+                timing.span('apply_mirror_data', plugins=len(todo)):
+            for file_name, el in up_bar.iter(todo):
+                nam, _ = os.path.splitext(file_name)
                 p = repo.plugins_tree.find_plugin_by_package_name(
-                    temp_nam, starts_with=True)
-            if not p:
-                maybe_missing.append(file_name)
-                continue
-            else:
-                p = p[0]
-
-            # print("Updating '{0}'...".format(p[0].get('name')))
-            for tag in cp_tags:
-                tag_el = el.find(tag)
-                tag_p = p.find(tag)
-                if tag_el is not None and tag_p is not None:
-                    txt = tag_el.text
-                    # print("  {0}: {1} <- {2}".format(tag, tag_p.text, txt))
-                    if tag in QgisPlugin.metadata_types('cdata'):
-                        if tag_el.text is not None:
-                            txt = etree.CDATA(tag_el.text)
-                    tag_p.text = txt
-            # update plugin name
-            ns = args.name_suffix if args.name_suffix is not None \
-                else repo.plugin_name_suffix
-            if el.get('name') is not None:
-                el_name = "{0}{1}".format(el.get('name'), ns)
-                if p.get('name') != el_name:
-                    needs_resorted = True
-                    p.set('name', el_name)
+                    nam, starts_with=True)
+                # maybe the base version has been adjusted, try again
+                if not p:
+                    temp_nam = re.sub(r'((\d+\.)?(\d+\.)?(\d+))', r'.\1', nam)
+                    p = repo.plugins_tree.find_plugin_by_package_name(
+                        temp_nam, starts_with=True)
+                if not p:
+                    progress.set_status(file_name, UNMATCHED)
+                    continue
+                else:
+                    p = p[0]
+
+                # print("Updating '{0}'...".format(p[0].get('name')))
+                for tag in cp_tags:
+                    tag_el = el.find(tag)
+                    tag_p = p.find(tag)
+                    if tag_el is not None and tag_p is not None:
+                        txt = tag_el.text
+                        # print("  {0}: {1} <- {2}"
+                        #       .format(tag, tag_p.text, txt))
+                        if tag in QgisPlugin.metadata_types('cdata'):
+                            if tag_el.text is not None:
+                                txt = etree.CDATA(tag_el.text)
+                        tag_p.text = txt
+                # update plugin name
+                ns = args.name_suffix if args.name_suffix is not None \
+                    else repo.plugin_name_suffix
+                if el.get('name') is not None:
+                    el_name = "{0}{1}".format(el.get('name'), ns)
+                    if p.get('name') != el_name:
+                        needs_resorted = True
+                        p.set('name', el_name)
+                progress.set_status(file_name, OVERLAID)
+                if progress.pending() >= args.checkpoint_every:
+                    checkpoint()
+
+        if needs_resorted:
+            print("Re-sorting plugins in '{0}'".format(repo.repo_name))
+            with memprofile.phase('sort'), timing.span('sort_plugins'):
+                re_sort = QgisPluginTree.plugins_sorted_by_name(
+                    repo.plugins_tree.plugins())
+                repo.plugins_tree.set_plugins(re_sort)
+
+        print("Writing '{0}' {1}".format(repo.repo_name,
+                                         repo.plugins_xml_name))
+        checkpoint(phase=DONE)
     except KeyboardInterrupt:
+        # keep the generation being built, for --resume
+        unstage(repo)
+        print("\nInterrupted, continue with: mirror --resume {0} {1}"
+              .format(repo.repo_name, args.plugins_xml_url))
         return False
+    except MirrorError as e:
+        unstage(repo)
+        print(e)
+        return False
+    except BaseException:
+        unstage(repo)
+        raise
 
-    if needs_resorted:
-        print("Re-sorting plugins in '{0}'".format(repo.repo_name))
-        re_sort = QgisPluginTree.plugins_sorted_by_name(
-            repo.plugins_tree.plugins())
-        repo.plugins_tree.set_plugins(re_sort)
-
-    print("Writing '{0}' {1}".format(repo.repo_name, repo.plugins_xml_name))
-    repo.write_plugins_xml(repo.plugins_tree_xml())
+    if not args.skip_download:
+        feeds.set_mirrored(repo.repo_name, options, repo.plugins_xml)
 
     print('\nDone mirroring...')
 
-    print("Plugin results:\n  attempted: {0}\n  mirrored: {1}"
-          .format(len(tree.plugins()), len(repo.plugins_tree.plugins())))
+    print("Plugin results:\n  attempted: {0}\n  mirrored: {1}\n"
+          "  rejected: {2}".format(len(tree.plugins()),
+                                   len(repo.plugins_tree.plugins()),
+                                   progress.count(REJECTED)))
 
+    maybe_missing = [f for f in elements if progress.status(f) == UNMATCHED]
     if maybe_missing:
         print('\nWARNING (version conflicts): plugins downloaded but MAY not '
               'be in XML after update:\n  {0}\n'
@@ -540,55 +1083,13 @@ def mirror_repo():
 
 
 def serve_repo():
+    from qgis_repo.auth import PackageAuthorizer, load_backend
+    from qgis_repo.catalog import QgisPluginCatalog
+
     setup_repo()
-    web_dir = os.path.abspath(repo.web_dir)
-    log.debug("web_dir: {0}".format(web_dir))
-    app = Flask(__name__, root_path=web_dir)
-
-    @app.route("/", methods=['GET'])
-    @app.route("/<path:rsc>", methods=['GET'])
-    def serve_resource(rsc=""):
-        if os.path.isdir(os.path.join(web_dir, rsc)):
-            rsc = os.path.join(rsc, repo.html_index)
-        log.debug("Sending: {0}".format(rsc))
-        return send_from_directory(web_dir, rsc)
-
-    @app.route("/plugins.xml", methods=['GET'])
-    def redirect_xml():
-        url = url_for('filter_xml', **request.args)
-        log.debug("Redirect URL: {0}".format(url))
-        return redirect(url)
-
-    @app.route("/plugins/plugins.xml", methods=['GET'])
-    def filter_xml():
-        """
-        Filters plugins.xml removing incompatible plugins.
-        If no qgis parameter is found in the query string,
-        the whole plugins.xml file is served as is.
-        """
-        # Points to the real file, not the symlink
-        if not request.query_string:
-            web_plugins_dir = os.path.abspath(repo.web_plugins_dir)
-            return send_from_directory(web_plugins_dir,
-                                       repo.plugins_xml_name)
-        elif request.args.get('qgis') is None:
-            abort(404)
-        else:
-            tree = QgisPluginTree(repo.plugins_xml)
-            root = tree.root_elem()
-            qgis_version = vjust(request.args.get('qgis'), force_zero=True)
-            for e in root.xpath('//pyqgis_plugin'):
-                qv_min = vjust(e.find('qgis_minimum_version').text,
-                               force_zero=True)
-                qv_max = vjust(e.find('qgis_maximum_version').text,
-                               force_zero=True)
-                if qv_max and not (qv_min <= qgis_version <= qv_max):
-                    root.remove(e)
-                elif not (qv_min <= qgis_version):
-                    root.remove(e)
-            response = make_response(tree.to_xml())
-            response.headers['Content-type'] = 'text/xml'
-            return response
+    # parsed once, then shared by all request handlers (and workers)
+    catalog = QgisPluginCatalog(repo.plugins_xml,
+                                package_index=repo.package_index)
 
     if args.host is not None:
         host = args.host
@@ -604,14 +1105,48 @@ def serve_repo():
     else:
         port = '8008'
 
-    app.run(host=host, port=int(port), threaded=True, debug=args.debug)
+    authorizer = None
+    if args.auth_backend:
+        authorizer = PackageAuthorizer(load_backend(args.auth_backend),
+                                       ttl=args.auth_cache_ttl)
+
+    if args.upload_roles is not None and not authorizer:
+        print('--upload-role needs --auth-backend')
+        return False
+
+    if args.use_async:
+        if args.upload_roles is not None:
+            print('Uploads are not supported with --async')
+            return False
+        from qgis_repo.aioserver import serve_async
+        serve_async(repo, host=host, port=int(port), catalog=catalog,
+                    authorizer=authorizer)
+        return True
+
+    from qgis_repo.server import create_app
+    upload_roles = None
+    if args.upload_roles is not None:
+        # '' (any valid credentials) leaves no role to require
+        upload_roles = [r for r in args.upload_roles if r]
+    app = create_app(repo, catalog, authorizer=authorizer,
+                     upload_roles=upload_roles)
+    if args.production:
+        from qgis_repo.wsgi import serve
+        serve(app, host=host, port=int(port), workers=args.workers,
+              threads=args.threads, catalog=catalog)
+    else:
+        app.run(host=host, port=int(port), threaded=True, debug=args.debug)
+    return True
 
 
 def package_repo():
+    from progress.bar import Bar
+    from qgis_repo.packaging import list_snapshots, manifest_path, \
+        write_manifest, write_repo_archive
+
     setup_repo()
     repo_name = repo.repo_name
-    pkg_temp = 'packaged-repos'
-    pkg_dir = os.path.join(SCRIPT_DIR, pkg_temp)
+    pkg_dir = packaged_repos_dir()
 
     web_base = os.path.dirname(os.path.abspath(repo.web_dir))
     if not os.path.exists(web_base):
@@ -627,37 +1162,141 @@ def package_repo():
     if not os.path.exists(pkg_dir):
         os.mkdir(pkg_dir)
 
+    base = None
+    if args.incremental:
+        snapshots = list_snapshots(pkg_dir, repo_name)
+        if snapshots:
+            base = snapshots[-1]
+            print("  increment of snapshot: {0}".format(base['archive']))
+        else:
+            print("  no snapshot to make an increment of; archiving all")
+
     curdatetime = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    targz = os.path.join(pkg_dir,
-                         "{0}-repo_{1}.tar.gz".format(repo_name, curdatetime))
+    targz = os.path.join(pkg_dir, "{0}-repo_{1}{2}.tar.gz".format(
+        repo_name, curdatetime, '-incr' if base else ''))
     if os.path.exists(targz):
         os.unlink(targz)
 
     bar = Bar('Archiving repo', fill='=', max=item_count)
 
-    def size_progress(tarinfo):
-        bar.next()
-        return tarinfo
-
     os.chdir(web_base)  # just to make sure
     try:
         bar.start()
-        with tarfile.open(targz, "w:gz") as tar:
-            tar.add(repo_name, filter=size_progress)
+        with timing.span('archive_repo') as s:
+            manifest = write_repo_archive(
+                web_base, repo_name, targz, level=args.level,
+                workers=args.workers, progress=lambda name: bar.next(),
+                base=base)
+            s.add_bytes(manifest['archive_size'])
     except KeyboardInterrupt:
         print("\nArchiving error: keyboard interrupt; archive incomplete")
         return False
-    except tarfile.TarError as e:
+    except (IOError, OSError) as e:
         print("\nArchiving error: {0}".format(e))
         return False
     finally:
         bar.finish()
+    write_manifest(manifest, manifest_path(targz))
 
     print("Repo '{0}' archived: {1}".format(repo_name, targz))
+    print("  {0} files, {1} bytes; manifest: {2}".format(
+        len(manifest.get('archived', manifest['files'])),
+        manifest['archive_size'], manifest_path(targz)))
+    if base:
+        print("  {0} files deleted since base snapshot".format(
+            len(manifest['deleted'])))
 
     return True
 
 
+def packaged_repos_dir():
+    return os.path.join(SCRIPT_DIR, 'packaged-repos')
+
+
+def latest_snapshot(pkg_dir):
+    from qgis_repo.packaging import list_snapshots
+
+    snapshots = list_snapshots(pkg_dir, repo.repo_name)
+    if not snapshots:
+        print("No snapshots of repo '{0}' found in: {1}"
+              .format(repo.repo_name, pkg_dir))
+        return None
+    return snapshots[-1]['archive']
+
+
+def _applied(manifest):
+    print("  applied: {0}".format(manifest['archive']))
+
+
+def reconstruct_repo():
+    from qgis_repo.packaging import PackagingError, reconstruct_snapshot
+
+    pkg_dir = packaged_repos_dir()
+    archive = args.snapshot or latest_snapshot(pkg_dir)
+    if archive is None:
+        return False
+
+    print("Reconstructing '{0}' as of snapshot: {1}"
+          .format(repo.repo_name, archive))
+    try:
+        manifest = reconstruct_snapshot(pkg_dir, archive, args.dest_dir,
+                                        progress=_applied)
+    except PackagingError as e:
+        print(e)
+        return False
+    print("Repo '{0}' reconstructed ({1} files): {2}".format(
+        repo.repo_name, len(manifest['files']),
+        os.path.join(args.dest_dir, manifest['repo'])))
+    return True
+
+
+def unpack_repo():
+    from qgis_repo.packaging import PackagingError, unpack_snapshot
+
+    pkg_dir = packaged_repos_dir()
+    archive = args.snapshot or latest_snapshot(pkg_dir)
+    if archive is None:
+        return False
+
+    web_base = os.path.dirname(os.path.abspath(repo.web_dir))
+    print("Unpacking '{0}' snapshot {1} into: {2}"
+          .format(repo.repo_name, archive, web_base))
+    try:
+        manifest = unpack_snapshot(
+            pkg_dir, archive, web_base, progress=_applied,
+            workers=args.workers,
+            generations=repo.generations if repo.generations_kept else None)
+    except PackagingError as e:
+        print(e)
+        print("Repo directory left unchanged")
+        return False
+    print("Repo '{0}' unpacked ({1} files, verified): {2}".format(
+        repo.repo_name, len(manifest['files']), repo.web_dir))
+    return True
+
+
+def rollback_repo():
+    from qgis_repo.generations import GenerationError
+
+    current = repo.generations.current()
+    if args.list:
+        generations = repo.generations.list()
+        if not generations:
+            print("No generations of repo '{0}' published"
+                  .format(repo.repo_name))
+        for g in generations:
+            print("{0} {1}".format('*' if g == current else ' ', g))
+        return True
+    try:
+        generation = repo.rollback(args.generation)
+    except GenerationError as e:
+        print(e)
+        return False
+    print("Repo '{0}' switched from generation {1} to: {2}".format(
+        repo.repo_name, current, generation))
+    return True
+
+
 def clear_repo():
     setup_repo()
     return repo.clear_repo()
@@ -680,4 +1319,34 @@ if __name__ == '__main__':
     repo = QgisRepo(args.repo, conf, with_output=True)
     # repo.dump_attributes(echo=True)
 
-    sys.exit(not args.func())
+    if args.timings or args.trace:
+        timing.recorder.enable(trace=bool(args.trace))
+        timing.recorder.meta['command'] = args.command
+        timing.recorder.meta['repo'] = args.repo
+    if args.memory_profile:
+        memprofile.profiler.enable()
+    try:
+        try:
+            ok = args.func()
+        except BaseException:
+            for r in staged_repos:
+                r.abort_generation()
+            raise
+        for r in staged_repos:
+            if ok:
+                r.publish_generation()
+            else:
+                r.abort_generation()
+    finally:
+        if args.memory_profile:
+            memprofile.profiler.disable()
+            memprofile.profiler.write(args.memory_profile)
+            print(memprofile.profiler.report())
+            print("Wrote memory profile: {0}".format(args.memory_profile))
+        if args.timings:
+            timing.recorder.write_summary(args.timings)
+            print("Wrote stage timings: {0}".format(args.timings))
+        if args.trace:
+            timing.recorder.write_trace(args.trace)
+            print("Wrote stage trace: {0}".format(args.trace))
+    sys.exit(not ok)
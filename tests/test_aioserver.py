@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_aioserver.py
+
+ Unit tests for the asyncio-based server for a QGIS plugin repo
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import asyncio
+import shutil
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .utilities import test_file as _test_file, \
+        test_plugin as _test_plugin, temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_file as _test_file, \
+        test_plugin as _test_plugin, temp_repo as _temp_repo
+from qgis_repo.aioserver import AsyncRepoServer
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+async def _request(reader, writer, path, method='GET', close=False):
+    writer.write('{0} {1} HTTP/1.1\r\nHost: test\r\n{2}\r\n'.format(
+        method, path, 'Connection: close\r\n' if close else '')
+        .encode('ascii'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        k, _, v = line.decode('ascii').partition(':')
+        headers[k.strip().lower()] = v.strip()
+    body = b''
+    if method != 'HEAD':
+        body = await reader.readexactly(int(headers['content-length']))
+    return status, headers, body
+
+
+class TestAsyncRepoServer(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo()
+        shutil.copyfile(_test_file('plugins_test_find-sort.xml'),
+                        self.repo.plugins_xml)
+        self.zip_path = os.path.join(self.repo.packages_dir(),
+                                     'test_plugin_1.zip')
+        shutil.copyfile(_test_plugin('test_plugin_1.zip'), self.zip_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+
+    def _run(self, client_coro_fn, setup_loop=None, **kwargs):
+        async def _main():
+            if setup_loop is not None:
+                setup_loop(asyncio.get_running_loop())
+            srv = AsyncRepoServer(self.repo, **kwargs)
+            server = await srv.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await client_coro_fn(port)
+            finally:
+                server.close()
+                await server.wait_closed()
+        return asyncio.run(_main())
+
+    def testRoutesKeepAlive(self):
+        async def _client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            res = [
+                await _request(reader, writer,
+                               '/plugins/packages/test_plugin_1.zip'),
+                await _request(reader, writer, '/plugins.xml?qgis=2.18'),
+                await _request(reader, writer, '/plugins/plugins.xml?qgis=2.18'),
+                await _request(reader, writer, '/plugins/plugins.xml?foo=1'),
+                await _request(reader, writer, '/../../etc/passwd'),
+                await _request(reader, writer, '/', close=True),
+            ]
+            writer.close()
+            return res
+
+        zip_res, redir, xml, no_qgis, outside, index = self._run(_client)
+        with open(self.zip_path, 'rb') as f:
+            self.assertEqual(zip_res[2], f.read())
+        self.assertEqual(redir[0], 302)
+        self.assertEqual(redir[1]['location'],
+                         '/plugins/plugins.xml?qgis=2.18')
+        self.assertEqual(xml[0], 200)
+        self.assertEqual(xml[2].count(b'<pyqgis_plugin '), 5)
+        self.assertEqual(no_qgis[0], 404)
+        self.assertEqual(outside[0], 404)
+        self.assertEqual(index[0], 200)
+        self.assertEqual(index[1]['connection'], 'close')
+
+    def testCopyFileOffLoop(self):
+        # without sendfile, the zip is read in chunks, in the executor
+        submitted = []
+
+        class _Executor(ThreadPoolExecutor):
+            def submit(self, fn, *args, **kwargs):
+                submitted.append(fn)
+                return super().submit(fn, *args, **kwargs)
+
+        def _no_sendfile(*args, **kwargs):
+            raise NotImplementedError
+
+        def _setup_loop(loop):
+            loop.set_default_executor(_Executor())
+            loop.sendfile = _no_sendfile
+
+        async def _client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            res = await _request(reader, writer,
+                                 '/plugins/packages/test_plugin_1.zip',
+                                 close=True)
+            writer.close()
+            return res
+
+        status, headers, body = self._run(_client, setup_loop=_setup_loop,
+                                          chunk_size=1024)
+        with open(self.zip_path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(status, 200)
+        self.assertEqual(body, data)
+        chunks = (len(data) + 1023) // 1024
+        self.assertGreater(chunks, 1)
+        self.assertGreaterEqual(len(submitted), chunks)
+
+    def testConcurrentClients(self):
+        async def _one(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            res = await _request(reader, writer,
+                                 '/plugins/plugins.xml?qgis=2.18', close=True)
+            writer.close()
+            return res[0]
+
+        async def _client(port):
+            return await asyncio.gather(*[_one(port) for _ in range(200)])
+
+        self.assertEqual(self._run(_client, max_connections=50), [200] * 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
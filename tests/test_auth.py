@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_auth.py
+
+ Unit tests for authorization of role-restricted plugin package downloads
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import asyncio
+import base64
+import shutil
+import logging
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo.auth import LocalAuthBackend, PackageAuthorizer, TtlCache
+from qgis_repo.aioserver import AsyncRepoServer
+from qgis_repo.server import create_app
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+TOKENS = {
+    'basic-token': ['DesktopBasic'],
+    'pro-token': ['DesktopBasic', 'DesktopPro'],
+    'alice:passw0rd': ['DesktopPro'],
+}
+
+# other spellings of the DesktopPro-only package's path
+BYPASS_PATHS = [
+    '/plugins//packages-auth/test_plugin_1.0.1.zip',
+    '/plugins/./packages-auth/test_plugin_1.0.1.zip',
+    '/plugins%2Fpackages-auth%2Ftest_plugin_1.0.1.zip',
+]
+
+
+async def _status(port, path, token=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    auth = 'Authorization: Bearer {0}\r\n'.format(token) if token else ''
+    writer.write('GET {0} HTTP/1.1\r\nHost: test\r\n{1}'
+                 'Connection: close\r\n\r\n'.format(path, auth)
+                 .encode('ascii'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    await reader.read()
+    writer.close()
+    return status
+
+
+class TestPackageAuthorizer(unittest.TestCase):
+
+    def testTtlCache(self):
+        now = [0.0]
+        cache = TtlCache(max_size=2, ttl=10, clock=lambda: now[0])
+        cache.put('a', None)
+        cache.put('b', 1)
+        self.assertEqual(cache.get('a'), (True, None))
+        cache.put('c', 2)  # evicts 'b', the least recently used
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(cache.evictions, 1)
+        now[0] = 10.0
+        self.assertEqual(cache.get('c'), (False, None))
+        self.assertEqual(cache.expirations, 1)
+        self.assertEqual(len(cache), 1)
+
+    def testCredentials(self):
+        basic = 'Basic ' + base64.b64encode(b'alice:passw0rd').decode()
+        self.assertEqual(PackageAuthorizer.credentials(basic),
+                         'alice:passw0rd')
+        self.assertEqual(PackageAuthorizer.credentials('Bearer abc'), 'abc')
+        self.assertIsNone(PackageAuthorizer.credentials('Basic !!!'))
+        self.assertIsNone(PackageAuthorizer.credentials('Digest abc'))
+        self.assertIsNone(PackageAuthorizer.credentials(None))
+
+    def testAuthorizeCachesDecisions(self):
+        backend = LocalAuthBackend(TOKENS)
+        authorizer = PackageAuthorizer(backend)
+        for _ in range(3):
+            self.assertEqual(authorizer.authorize(
+                'Bearer pro-token', ['DesktopPro']), 200)
+            self.assertEqual(authorizer.authorize(
+                'Bearer basic-token', ['DesktopPro']), 403)
+            self.assertEqual(authorizer.authorize(
+                'Bearer basic-token', None), 200)
+            self.assertEqual(authorizer.authorize('Bearer nope'), 401)
+        self.assertEqual(authorizer.authorize(None), 401)
+        # one backend lookup per distinct credentials
+        self.assertEqual(backend.lookups, 3)
+
+
+class TestAuthPackageServing(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo()
+        for z in ['test_plugin_1.zip', 'test_plugin_2.zip']:
+            shutil.copyfile(_test_plugin(z),
+                            os.path.join(self.repo.upload_dir, z))
+        self.assertTrue(self.repo.update_plugin(
+            'test_plugin_1.zip', auth_role='DesktopPro'))
+        self.assertTrue(self.repo.update_plugin(
+            'test_plugin_2.zip', auth=True))
+        self.pro_url = '/plugins/packages-auth/test_plugin_1.0.1.zip'
+        self.any_url = '/plugins/packages-auth/test_plugin_2.0.1.zip'
+        self.backend = LocalAuthBackend(TOKENS)
+        self.authorizer = PackageAuthorizer(self.backend)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+
+    def testIndexRoles(self):
+        meta = self.repo.package_index.get(
+            'packages-auth/test_plugin_1.0.1.zip')
+        self.assertEqual(meta['roles'], ['DesktopPro'])
+
+    def testFlaskServing(self):
+        client = create_app(self.repo,
+                            authorizer=self.authorizer).test_client()
+        resp = client.get(self.pro_url)
+        self.assertEqual(resp.status_code, 401)
+        self.assertIn('Basic', resp.headers['WWW-Authenticate'])
+        basic = 'Basic ' + base64.b64encode(b'alice:passw0rd').decode()
+        self.assertEqual(client.get(self.pro_url, headers={
+            'Authorization': basic}).status_code, 200)
+        self.assertEqual(client.get(self.pro_url, headers={
+            'Authorization': 'Bearer basic-token'}).status_code, 403)
+        resp = client.get(self.any_url, headers={
+            'Authorization': 'Bearer basic-token'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers['Cache-Control'], 'private')
+        # no bypass through other spellings of the path
+        self.assertEqual(client.get(
+            '/plugins/packages/../packages-auth/test_plugin_1.0.1.zip',
+            headers={'Authorization': 'Bearer basic-token'})
+            .status_code, 404)
+        for path in BYPASS_PATHS:
+            self.assertEqual(client.get(path, headers={
+                'Authorization': 'Bearer basic-token'}).status_code, 403,
+                path)
+        self.assertEqual(self.backend.lookups, 2)
+
+    def testUnindexedFailsClosed(self):
+        index = self.repo.package_index
+        index.remove('packages-auth/test_plugin_1.0.1.zip')
+        index.write()
+        client = create_app(self.repo,
+                            authorizer=self.authorizer).test_client()
+        self.assertEqual(client.get(self.pro_url, headers={
+            'Authorization': 'Bearer basic-token'}).status_code, 404)
+        self.assertEqual(client.get(self.pro_url).status_code, 401)
+
+        async def _main():
+            srv = AsyncRepoServer(self.repo, authorizer=self.authorizer)
+            server = await srv.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return [await _status(port, self.pro_url, 'basic-token'),
+                        await _status(port, self.pro_url)]
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        self.assertEqual(asyncio.run(_main()), [404, 401])
+
+    def testAsyncServing(self):
+        async def _main():
+            srv = AsyncRepoServer(self.repo, authorizer=self.authorizer)
+            server = await srv.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return [
+                    await _status(port, self.pro_url),
+                    await _status(port, self.pro_url, 'pro-token'),
+                    await _status(port, self.pro_url, 'pro-token'),
+                    await _status(port, self.pro_url, 'basic-token'),
+                    await _status(
+                        port, '/plugins/packages/test_plugin_2.0.1.zip'),
+                    await _status(
+                        port, '/plugins/packages/../packages-auth/'
+                              'test_plugin_1.0.1.zip', 'basic-token'),
+                    await _status(
+                        port, '/plugins/packages/%2E%2E/packages-auth/'
+                              'test_plugin_1.0.1.zip', 'basic-token'),
+                ] + [await _status(port, path, 'basic-token')
+                     for path in BYPASS_PATHS]
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        self.assertEqual(asyncio.run(_main()),
+                         [401, 200, 200, 403, 404, 404, 404] +
+                         [403] * len(BYPASS_PATHS))
+        self.assertEqual(self.backend.lookups, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
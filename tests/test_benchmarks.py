@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_benchmarks.py
+
+ Smoke tests for the benchmark suite, so it keeps working as code changes
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import logging
+
+try:
+    from .utilities import test_file as _test_file
+except ImportError:
+    from utilities import test_file as _test_file
+
+sys.path.insert(0,
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import bench_tree, bench_ingest, bench_serve, \
+    bench_startup, loadgen, run_benchmarks
+from benchmarks.synth import load_templates, write_catalog, catalog_name, \
+    catalog_file_name
+from qgis_repo.repo import QgisPluginTree
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def testSyntheticCatalog(self):
+        templates = load_templates(
+            _test_file('plugins_plugins-qgis-org.xml'))
+        count = len(templates) * 2 + 10
+        path = write_catalog(os.path.join(self.cache_dir, 'plugins.xml'),
+                             count, templates=templates)
+        tree = QgisPluginTree(path)
+        self.assertEqual(len(tree.plugins()), count)
+        last = catalog_name(templates, count - 1)
+        self.assertTrue(last.endswith(' 2'))
+        self.assertGreaterEqual(len(tree.find_plugin_by_name(last)), 1)
+        self.assertEqual(len(tree.find_plugin_by_package_name(
+            catalog_file_name(templates, count - 1))), 1)
+
+    def testTreeBenchmarkRuns(self):
+        results = bench_tree.run_size(300, min_time=0, max_runs=1,
+                                      merge_count=20,
+                                      cache_dir=self.cache_dir)
+        self.assertEqual([r['op'] for r in results], bench_tree.OPERATIONS)
+        for r in results:
+            self.assertEqual(r['size'], 300)
+            self.assertGreater(r['ops_per_sec'], 0)
+        self.assertIn('merge_plugins', bench_tree.report(results))
+
+    def testIngestBenchmarkRuns(self):
+        zip_dir, zips = bench_ingest.plugin_archives(
+            12, max_size=4096, cache_dir=self.cache_dir)
+        self.assertEqual(len(zips), 12)
+        results = [bench_ingest.run_config(c, zip_dir, zips)
+                   for c in bench_ingest.CONFIGS]
+        for r in results:
+            self.assertEqual(r['plugins'], 12)
+            self.assertEqual(r['stages']['validate_archive']['calls'], 12)
+            self.assertEqual(r['stages']['write_xml']['calls'], 1)
+        # the -dev repo rewrites every archive's metadata.txt
+        self.assertEqual(results[1]['stages']['update_zip']['calls'], 12)
+        self.assertIn('extract_icon', bench_ingest.report(results))
+
+    def testServeBenchmarkRuns(self):
+        results = bench_serve.run_serve(200, min_time=0, max_runs=1,
+                                        cache_dir=self.cache_dir)
+        self.assertEqual([r['op'] for r in results], bench_serve.OPERATIONS)
+        for r in results:
+            self.assertGreater(r['ops_per_sec'], 0)
+
+    def testRegressionGate(self):
+        baseline = run_benchmarks.make_baseline(
+            {'tree.to_xml': 0.1, 'tree.find_plugin_by_name': 0.1},
+            calibration=0.01)
+        self.assertEqual(baseline['metrics']['tree.to_xml']['tolerance'],
+                         run_benchmarks.HOT_TOLERANCE)
+        self.assertEqual(
+            baseline['metrics']['tree.find_plugin_by_name']['tolerance'],
+            run_benchmarks.DEFAULT_TOLERANCE)
+
+        current = {'tree.to_xml': 0.14, 'tree.find_plugin_by_name': 0.14,
+                   'serve.package': 0.001}
+        rows, regressions = run_benchmarks.compare(baseline, current)
+        self.assertEqual(regressions, ['tree.to_xml'])
+        self.assertEqual(rows[-1][-1], 'new')
+        # a machine twice as slow at the calibration workload
+        _, regressions = run_benchmarks.compare(baseline, current,
+                                                calibration=0.02)
+        self.assertEqual(regressions, [])
+        _, regressions = run_benchmarks.compare(baseline, current,
+                                                tolerance_scale=2)
+        self.assertEqual(regressions, [])
+        self.assertEqual(run_benchmarks.best_of(
+            {'a': 2.0, 'b': 1.0}, {'a': 1.0})['a'], 1.0)
+
+    def testLoadSummary(self):
+        self.assertEqual(loadgen.percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(loadgen.percentile([1, 2, 3, 4], 99), 4)
+        records = [('xml', 200, 0.01, 100), ('conditional', 304, 0.002, 0),
+                   ('package', 404, 0.003, 10), ('icon', None, 1.0, 0)]
+        result = loadgen.summarize(records, 2.0, server_cpu_s=0.04)
+        self.assertEqual(result['requests'], 4)
+        self.assertEqual(result['throughput_rps'], 2.0)
+        self.assertEqual(result['errors'], 2)
+        self.assertEqual(result['not_modified'], 1)
+        self.assertEqual(result['server_cpu_ms_per_request'], 10.0)
+        self.assertEqual(result['statuses'],
+                         {'error': 1, '200': 1, '304': 1, '404': 1})
+        self.assertEqual(list(result['kinds']),
+                         ['xml', 'conditional', 'package', 'icon'])
+        self.assertRaises(ValueError, loadgen.parse_mix, 'xml=1,bogus=2')
+
+    def testLoadGeneratorRuns(self):
+        base = tempfile.mkdtemp(dir=self.cache_dir)
+        paths = loadgen.prepare_repo(base, size=100, packages=3,
+                                     max_size=4096, cache_dir=self.cache_dir)
+        self.assertEqual(len(paths['package']), 3)
+        with loadgen.ServerProcess('serve-production', base) as server:
+            gen = loadgen.LoadGenerator(server.base_url, paths)
+            self.assertEqual(gen.prime(), [])
+            result = gen.run(concurrency=4, duration=None, requests=60,
+                             server_pid=server.pid)
+        self.assertEqual(result['requests'], 60)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['not_modified'], 0)
+        self.assertIn('xml_qgis', loadgen.report([dict(result, target='t')]))
+
+    def testStartupBenchmarkRuns(self):
+        results = bench_startup.run_startup(['update', 'remove'], runs=1,
+                                            cache_dir=self.cache_dir)
+        self.assertEqual([r['op'] for r in results],
+                         ['python', 'import qgis_repo.repo',
+                          'plugins-xml update', 'plugins-xml remove'])
+        for r in results[2:]:
+            self.assertGreater(r['min_s'], 0)
+            # e.g. Flask, wget and tarfile only load for their subcommands
+            self.assertEqual(r['heavy_modules'], [], r['op'])
+        self.assertIn('plugins-xml update', bench_startup.report(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
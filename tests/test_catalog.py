@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_catalog.py
+
+ Unit tests for the pre-parsed plugins.xml catalog and serving app
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import importlib.util
+import json
+import unittest
+import os
+import shutil
+import tempfile
+import logging
+
+from lxml import etree
+
+try:
+    from .utilities import test_file as _test_file, temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_file as _test_file, temp_repo as _temp_repo
+from qgis_repo.catalog import QgisPluginCatalog, CatalogQueryError
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestQgisPluginCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.plugins_xml = os.path.join(self.temp_dir, 'plugins.xml')
+        shutil.copyfile(_test_file('plugins_test_find-sort.xml'),
+                        self.plugins_xml)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def testCatalogFilteredXml(self):
+        catalog = QgisPluginCatalog(self.plugins_xml)
+        self.assertEqual(len(catalog), 7)
+        xml = catalog.filtered_xml('2.18')
+        tree = etree.fromstring(xml)
+        self.assertEqual(len(tree.xpath('//pyqgis_plugin')), 5)
+        for p in tree.xpath('//pyqgis_plugin'):
+            self.assertFalse(
+                p.findtext('qgis_maximum_version').startswith('1.'))
+        self.assertIn(b'type="text/xsl"', xml)
+        self.assertEqual(
+            len(etree.fromstring(catalog.filtered_xml('3.10'))), 0)
+        # served from cache
+        self.assertIs(catalog.filtered_xml('2.18'), xml)
+        self.assertEqual(catalog.cache.hits, 1)
+
+    def testMaxBelowMinVersion(self):
+        with open(self.plugins_xml, 'rb') as f:
+            xml = f.read()
+        # an error in the plugin's metadata: max (2.99.0) below min
+        with open(self.plugins_xml, 'wb') as f:
+            f.write(xml.replace(
+                b'<qgis_minimum_version>2.4.0</qgis_minimum_version>',
+                b'<qgis_minimum_version>3.4</qgis_minimum_version>', 1))
+        catalog = QgisPluginCatalog(self.plugins_xml)
+
+        def _versions(qgis):
+            return [p.get('version') for p in etree.fromstring(
+                catalog.filtered_xml(qgis)).xpath(
+                    '//pyqgis_plugin[@name="OpenGeo Explorer"]')]
+        # unconstrained above its min
+        self.assertIn('0.6.4.2', _versions('3.10'))
+        self.assertIn('0.6.4.2', _versions('3.4'))
+        self.assertNotIn('0.6.4.2', _versions('3.2'))
+        self.assertNotIn('0.6.4.2', _versions('2.18'))
+
+    def testCatalogQuery(self):
+        catalog = QgisPluginCatalog(self.plugins_xml)
+        res = catalog.query(fields=['name', 'version'],
+                            name_prefix='geoserver', limit=2)
+        self.assertEqual(res['count'], 2)
+        self.assertEqual(list(res['plugins'][0].keys()), ['name', 'version'])
+        res2 = catalog.query(fields=['version'], name_prefix='geoserver',
+                             limit=2, cursor=res['next_cursor'])
+        self.assertEqual(res2['count'], 1)
+        self.assertIsNone(res2['next_cursor'])
+        self.assertEqual(
+            [p['version'] for p in res['plugins'] + res2['plugins']],
+            ['0.2', '0.3', '1.0'])
+
+        with self.assertRaises(CatalogQueryError):
+            catalog.query(cursor='bogus')
+
+    def testCatalogReload(self):
+        catalog = QgisPluginCatalog(self.plugins_xml, check_interval=0)
+        gen = catalog.generation
+        self.assertFalse(catalog.refresh())
+        shutil.copyfile(_test_file('plugins_test.xml'), self.plugins_xml)
+        self.assertTrue(catalog.refresh())
+        self.assertEqual(catalog.generation, gen + 1)
+        self.assertEqual(len(catalog), 2)
+
+
+class TestQgisRepoServer(unittest.TestCase):
+
+    def setUp(self):
+        from qgis_repo.server import create_app
+        self.repo = _temp_repo()
+        shutil.copyfile(_test_file('plugins_test_find-sort.xml'),
+                        self.repo.plugins_xml)
+        self.client = create_app(self.repo).test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+
+    def testServeJson(self):
+        resp = self.client.get(
+            '/plugins/plugins.json?fields=name,version&qgis=2.18&limit=50')
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(resp.data)
+        self.assertTrue(data['count'] > 0)
+        self.assertEqual(set(data['plugins'][0].keys()), {'name', 'version'})
+        self.assertEqual(
+            self.client.get('/plugins/plugins.json?limit=0').status_code, 400)
+
+    def testServeFilteredXml(self):
+        resp = self.client.get('/plugins/plugins.xml?qgis=3.10')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers['Content-type'], 'text/xml')
+        self.assertEqual(
+            self.client.get('/plugins/plugins.xml?foo=1').status_code, 404)
+
+    def testFlaskAppFilteredXml(self):
+        main_py = os.path.join(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))), 'flask_app', 'main.py')
+        spec = importlib.util.spec_from_file_location('flask_app_main',
+                                                      main_py)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        client = mod.app.test_client()
+        env = {'DOCUMENT_ROOT': self.repo.web_dir}
+        for _ in range(2):
+            resp = client.get('/plugins/plugins.xml?qgis=2.18',
+                              environ_base=env)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.data, self.client.get(
+                '/plugins/plugins.xml?qgis=2.18').data)
+        # re-indented in debug mode
+        mod.app.debug = True
+        resp = client.get('/plugins/plugins.xml?qgis=2.18', environ_base=env)
+        parser = etree.XMLParser(remove_blank_text=True)
+        self.assertEqual(
+            etree.tostring(etree.fromstring(resp.data, parser),
+                           method='c14n'),
+            etree.tostring(etree.fromstring(self.client.get(
+                '/plugins/plugins.xml?qgis=2.18').data, parser),
+                method='c14n'))
+        self.assertIn(b'\n  <pyqgis_plugin', resp.data)
+        self.assertIn(b'type="text/xsl"', resp.data)
+        # parsed once, not per request
+        catalog = mod.catalogs[self.repo.plugins_xml]
+        self.assertEqual(catalog.generation, 1)
+        self.assertEqual(catalog.cache.hits, 2)
+        self.assertEqual(client.get(
+            '/plugins/plugins.xml?qgis=2.18',
+            environ_base={'DOCUMENT_ROOT': self.repo.temp_base})
+            .status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_daemon.py
+
+ Unit tests for the uploads directory watchers and repo daemon
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+import logging
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo.daemon import InotifyWatcher, PollingWatcher, \
+    UploadDaemon, WatchError
+from qgis_repo.repo import QgisPluginTree
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.upload_dir)
+
+    def _write(self, name, data=b'PK'):
+        with open(os.path.join(self.upload_dir, name), 'wb') as f:
+            f.write(data)
+
+    def testPollingWatcher(self):
+        watcher = PollingWatcher(self.upload_dir, interval=0.01)
+        self._write('a.zip')
+        self._write('notes.txt')
+        # first seen; ready once unchanged for an interval
+        self.assertEqual(watcher.wait(0), [])
+        self.assertEqual(watcher.wait(1), ['a.zip'])
+        self.assertEqual(watcher.wait(0.05), [])
+        # re-uploaded under the same name, after ingest
+        os.remove(os.path.join(self.upload_dir, 'a.zip'))
+        self.assertEqual(watcher.wait(0.05), [])
+        self._write('a.zip', b'PK2')
+        self.assertEqual(watcher.wait(1), ['a.zip'])
+
+    def testInotifyWatcher(self):
+        try:
+            watcher = InotifyWatcher(self.upload_dir)
+        except WatchError as e:
+            self.skipTest(str(e))
+        try:
+            self.assertEqual(watcher.wait(0), [])
+            self._write('a.zip')
+            self._write('.partial.zip')
+            self._write('b.tmp')
+            os.rename(os.path.join(self.upload_dir, 'b.tmp'),
+                      os.path.join(self.upload_dir, 'b.zip'))
+            self.assertEqual(watcher.wait(1), ['a.zip', 'b.zip'])
+        finally:
+            watcher.close()
+
+    def testDaemonCoalescesWrites(self):
+        repo = _temp_repo('qgis')
+        try:
+            shutil.copy(_test_plugin('test_plugin_1.zip'), repo.upload_dir)
+            watcher = PollingWatcher(repo.upload_dir, interval=0.01)
+            daemon = UploadDaemon(repo, watcher, coalesce=0.05,
+                                  max_delay=10.0)
+            daemon.start()  # ingests waiting uploads, then writes
+            self.assertEqual((daemon.ingested, daemon.writes), (1, 1))
+
+            shutil.copy(_test_plugin('test_plugin_2.zip'), repo.upload_dir)
+            shutil.copy(_test_plugin('test_plugin_3.zip'), repo.upload_dir)
+            with open(os.path.join(repo.upload_dir, 'bad.zip'), 'wb') as f:
+                f.write(b'not a zip')
+            for _ in range(200):
+                daemon.step(timeout=0.02)
+                if daemon.writes == 2:
+                    break
+            self.assertEqual((daemon.ingested, daemon.failed), (3, 1))
+            self.assertEqual(daemon.writes, 2)
+            self.assertEqual(len(QgisPluginTree(repo.plugins_xml).plugins()),
+                             3)
+            # a failed upload is not retried until changed
+            daemon.step(timeout=0.05)
+            self.assertEqual(daemon.failed, 1)
+            self.assertTrue(os.path.exists(
+                os.path.join(repo.upload_dir, 'bad.zip')))
+
+            # plugins.xml changed by another process is reloaded first
+            other = _temp_repo('qgis', base=repo.temp_base)
+            other.remove_plugin('Test Plugin 2')
+            shutil.copy(_test_plugin('test_plugin_4.zip'), repo.upload_dir)
+            for _ in range(200):
+                daemon.step(timeout=0.02)
+                if daemon.writes == 3:
+                    break
+            names = [p.get('name') for p in
+                     QgisPluginTree(repo.plugins_xml).plugins()]
+            self.assertEqual(len(names), 3)
+            self.assertNotIn('Test Plugin 2', names)
+        finally:
+            shutil.rmtree(repo.temp_base)
+
+
+if __name__ == '__main__':
+    unittest.main()
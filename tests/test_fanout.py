@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_fanout.py
+
+ Unit tests for adding a plugin to several repos with one validation
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import shutil
+import logging
+import zipfile
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo.repo import QgisPlugin, QgisPluginTree
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestFanOut(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo('qgis')
+        base = self.repo.temp_base
+        self.dev = _temp_repo('qgis-dev', base=base)
+        self.beta = _temp_repo('qgis-beta', base=base)
+        shutil.copy(_test_plugin('test_plugin_1.zip'), self.repo.upload_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+
+    def testFanOut(self):
+        validations = []
+        validate = QgisPlugin._validate
+
+        def _validate(plugin):
+            validations.append(plugin.zip_name)
+            validate(plugin)
+
+        QgisPlugin._validate = _validate
+        try:
+            self.assertTrue(self.repo.update_plugin(
+                'test_plugin_1.zip', fan_out=[self.dev, self.beta]))
+        finally:
+            QgisPlugin._validate = validate
+        self.assertEqual(validations, ['test_plugin_1.zip'])
+        self.assertEqual(os.listdir(self.repo.upload_dir), [])
+
+        for r, suffix in [(self.repo, ''), (self.dev, ' DEV'),
+                          (self.beta, ' BETA')]:
+            plugins = QgisPluginTree(r.plugins_xml).plugins()
+            self.assertEqual(len(plugins), 1)
+            plugin = plugins[0]
+            self.assertEqual(plugin.get('name'),
+                             'Test Plugin 1{0}'.format(suffix))
+            file_name = plugin.find('file_name').text
+            zip_path = os.path.join(r.packages_dir(), file_name)
+            self.assertEqual(
+                r.package_index.get('packages/{0}'.format(file_name))['size'],
+                os.path.getsize(zip_path))
+            # metadata.txt rewritten per repo
+            with zipfile.ZipFile(zip_path) as zip_obj:
+                metadata = zip_obj.read(
+                    'test_plugin_1/metadata.txt').decode('utf-8')
+            self.assertIn('name=Test Plugin 1{0}\n'.format(suffix),
+                          metadata)
+            self.assertIn('version={0}'.format(plugin.get('version')),
+                          metadata)
+            icon = plugin.find('icon').text
+            self.assertTrue(os.path.isfile(
+                os.path.join(r.web_plugins_dir, icon)))
+
+    def testFanOutNameSuffix(self):
+        self.assertTrue(self.repo.update_plugin(
+            'test_plugin_1.zip', name_suffix=' RC', fan_out=[self.dev]))
+        for r in [self.repo, self.dev]:
+            plugins = QgisPluginTree(r.plugins_xml).plugins()
+            self.assertEqual(plugins[0].get('name'), 'Test Plugin 1 RC')
+
+
+if __name__ == '__main__':
+    unittest.main()
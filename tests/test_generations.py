@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_generations.py
+
+ Unit tests for publishing repo directories as generations
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import time
+import logging
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo.daemon import PollingWatcher, UploadDaemon
+from qgis_repo.generations import LOCK_SUFFIX, GenerationError
+from qgis_repo.repo import QgisPluginTree
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestGenerations(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo()
+        self.repo.generations_kept = 2
+        self.live_xml = os.path.join(
+            self.repo.live_web_dir, 'plugins', 'plugins.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+
+    def _live_names(self):
+        return [p.get('name') for p in
+                QgisPluginTree(self.live_xml).plugins()]
+
+    def _update(self, zip_name):
+        shutil.copy(_test_plugin(zip_name), self.repo.upload_dir)
+        self.assertTrue(self.repo.update_plugin(zip_name))
+
+    def testPublish(self):
+        gens = self.repo.generations
+        with self.repo.generation():
+            self._update('test_plugin_1.zip')
+            # built aside, the live repo is as it was
+            self.assertNotEqual(self.repo.web_dir, self.repo.live_web_dir)
+            self.assertEqual(self._live_names(), [])
+        self.assertEqual(self.repo.web_dir, self.repo.live_web_dir)
+        self.assertTrue(os.path.islink(self.repo.live_web_dir))
+        self.assertEqual(self._live_names(), ['Test Plugin 1'])
+        # the plain repo directory was adopted as the first generation
+        first, second = gens.list()
+        self.assertEqual(gens.current(), second)
+
+        with self.repo.generation():
+            self._update('test_plugin_2.zip')
+        third = gens.current()
+        self.assertEqual(gens.list(), [second, third])
+        self.assertEqual(sorted(self._live_names()),
+                         ['Test Plugin 1', 'Test Plugin 2'])
+        # unchanged files are shared between generations
+        rel = os.path.join('plugins', 'packages', 'test_plugin_1.0.1.zip')
+        self.assertTrue(os.path.samefile(
+            os.path.join(gens.path(second), rel),
+            os.path.join(gens.path(third), rel)))
+        with open(os.path.join(gens.path(second), 'plugins',
+                               'plugins.xml'), 'rb') as f:
+            self.assertNotIn(b'Test Plugin 2', f.read())
+
+    def testAbort(self):
+        with self.repo.generation():
+            self._update('test_plugin_1.zip')
+        gens = self.repo.generations.list()
+        with self.assertRaises(RuntimeError):
+            with self.repo.generation():
+                self._update('test_plugin_2.zip')
+                raise RuntimeError('interrupted')
+        self.assertEqual(self.repo.generations.list(), gens)
+        self.assertEqual(sorted(os.listdir(self.repo.generations.gen_dir)),
+                         gens)
+        self.assertEqual(self._live_names(), ['Test Plugin 1'])
+        self.assertIsNone(self.repo.plugins_tree)
+
+    def testRollback(self):
+        with self.repo.generation():
+            self._update('test_plugin_1.zip')
+        first = self.repo.generations.current()
+        self.repo.clear_repo()
+        self.assertEqual(self._live_names(), [])
+        self.assertEqual(self.repo.rollback(), first)
+        self.assertEqual(self._live_names(), ['Test Plugin 1'])
+        with self.assertRaises(GenerationError):
+            self.repo.rollback('2000-01-01_00-00-00-000000')
+
+    def testSuspendResume(self):
+        with self.repo.generation():
+            self._update('test_plugin_1.zip')
+        self.assertTrue(self.repo.begin_generation())
+        self._update('test_plugin_2.zip')
+        building = self.repo.suspend_generation()
+        self.assertEqual(self.repo.web_dir, self.repo.live_web_dir)
+        self.assertIsNone(self.repo.plugins_tree)
+        self.assertTrue(os.path.isdir(building))
+        self.assertEqual(self._live_names(), ['Test Plugin 1'])
+
+        # e.g. by another process
+        self.assertTrue(self.repo.begin_generation(resume=building))
+        self.assertEqual(self.repo.building_generation, building)
+        self._update('test_plugin_3.zip')
+        self.repo.publish_generation()
+        self.assertEqual(sorted(self._live_names()),
+                         ['Test Plugin 1', 'Test Plugin 2', 'Test Plugin 3'])
+        with self.assertRaises(GenerationError):
+            self.repo.begin_generation(resume=building)
+
+    def testPruneKeepsOwnedBuilds(self):
+        gens = self.repo.generations
+        with self.repo.generation():
+            self._update('test_plugin_1.zip')
+        old = time.time() - gens.build_expiry - 60
+
+        # being built by this (live) process, for longer than the expiry
+        running = gens.begin()
+        os.utime(running + LOCK_SUFFIX, (old, old))
+        # suspended, e.g. for 'mirror --resume'
+        self.assertTrue(self.repo.begin_generation())
+        suspended = self.repo.suspend_generation()
+        # its process died, long ago
+        child = subprocess.Popen([sys.executable, '-c', ''])
+        child.wait()
+        crashed = gens.begin()
+        with open(crashed + LOCK_SUFFIX, 'w') as f:
+            f.write('{0}\n'.format(child.pid))
+        os.utime(crashed + LOCK_SUFFIX, (old, old))
+
+        for _ in range(3):
+            with self.repo.generation():
+                pass
+        self.assertTrue(os.path.isdir(running))
+        self.assertTrue(os.path.isdir(suspended))
+        self.assertFalse(os.path.lexists(crashed))
+        self.assertFalse(os.path.lexists(crashed + LOCK_SUFFIX))
+
+        # suspended past the expiry
+        os.utime(suspended + LOCK_SUFFIX, (old, old))
+        gens.prune()
+        self.assertFalse(os.path.lexists(suspended))
+        self.assertTrue(os.path.isdir(running))
+        gens.publish(running)
+        self.assertEqual(gens.list(), sorted(os.listdir(gens.gen_dir)))
+
+    def testDaemonPublishesBatches(self):
+        shutil.copy(_test_plugin('test_plugin_1.zip'), self.repo.upload_dir)
+        watcher = PollingWatcher(self.repo.upload_dir, interval=0.01)
+        daemon = UploadDaemon(self.repo, watcher, coalesce=0.05,
+                              max_delay=10.0)
+        daemon.start()
+        first = self.repo.generations.current()
+        self.assertIsNotNone(first)
+
+        with open(os.path.join(self.repo.upload_dir, 'bad.zip'), 'wb') as f:
+            f.write(b'not a zip')
+        daemon.step(timeout=0.05)
+        self.assertEqual(daemon.failed, 1)
+        self.assertEqual(self.repo.generations.current(), first)
+
+        shutil.copy(_test_plugin('test_plugin_2.zip'), self.repo.upload_dir)
+        for _ in range(200):
+            daemon.step(timeout=0.02)
+            if daemon.writes == 2:
+                break
+        self.assertNotEqual(self.repo.generations.current(), first)
+        self.assertEqual(sorted(self._live_names()),
+                         ['Test Plugin 1', 'Test Plugin 2'])
+        watcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
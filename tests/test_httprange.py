@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_httprange.py
+
+ Unit tests for byte-range and conditional serving of plugin packages
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import hashlib
+import json
+import shutil
+import logging
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo.httprange import parse_range, resolve_request, \
+    RangeNotSatisfiable
+from qgis_repo.server import create_app
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestHttpRange(unittest.TestCase):
+
+    def testParseRange(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=990-2000', 1000), (990, 999))
+        self.assertIsNone(parse_range('items=0-1', 1000))
+        self.assertIsNone(parse_range('bytes=5-1', 1000))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=0-1,5-6', 1000)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=1000-', 1000)
+
+    def testResolveRequest(self):
+        etag = '"abc"'
+        status, offset, count, headers = resolve_request(
+            1000, etag, range_header='bytes=100-')
+        self.assertEqual((status, offset, count), (206, 100, 900))
+        self.assertIn(('Content-Range', 'bytes 100-999/1000'), headers)
+        # stale If-Range sends the whole package
+        self.assertEqual(resolve_request(
+            1000, etag, range_header='bytes=100-', if_range='"old"')[:3],
+            (200, 0, 1000))
+        self.assertEqual(resolve_request(
+            1000, etag, range_header='bytes=100-', if_range=etag)[0], 206)
+        self.assertEqual(resolve_request(
+            1000, etag, if_none_match=etag)[0], 304)
+        self.assertEqual(resolve_request(
+            1000, etag, range_header='bytes=0-1,3-4')[0], 416)
+
+
+class TestPackageIndexServing(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo()
+        shutil.copyfile(_test_plugin('test_plugin_1.zip'),
+                        os.path.join(self.repo.upload_dir,
+                                     'test_plugin_1.zip'))
+        self.assertTrue(self.repo.update_plugin('test_plugin_1.zip'))
+        self.zip_name = 'test_plugin_1.0.1.zip'
+        with open(os.path.join(self.repo.packages_dir(), self.zip_name),
+                  'rb') as f:
+            self.zip_data = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+
+    def testIngestIndexesPackage(self):
+        with open(self.repo.package_index_path) as f:
+            index = json.load(f)['packages']
+        meta = index['packages/{0}'.format(self.zip_name)]
+        self.assertEqual(meta['size'], len(self.zip_data))
+        self.assertEqual(meta['sha256'],
+                         hashlib.sha256(self.zip_data).hexdigest())
+
+        self.repo.remove_plugin('Test Plugin 1', versions='all')
+        self.repo.package_index.reload(force=True)
+        self.assertEqual(len(self.repo.package_index), 0)
+
+    def testServeRange(self):
+        client = create_app(self.repo).test_client()
+        url = '/plugins/packages/{0}'.format(self.zip_name)
+        full = client.get(url)
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full.data, self.zip_data)
+        etag = full.headers['ETag']
+
+        part = client.get(url, headers={'Range': 'bytes=100-',
+                                        'If-Range': etag})
+        self.assertEqual(part.status_code, 206)
+        self.assertEqual(part.data, self.zip_data[100:])
+        self.assertEqual(part.headers['Content-Range'], 'bytes 100-{0}/{1}'
+                         .format(len(self.zip_data) - 1, len(self.zip_data)))
+
+        self.assertEqual(client.get(url, headers={
+            'Range': 'bytes=0-1,4-5'}).status_code, 416)
+        self.assertEqual(client.get(url, headers={
+            'If-None-Match': etag}).status_code, 304)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_memprofile.py
+
+ Unit tests for memory profiling of update and mirror phases
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import logging
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo import memprofile
+from qgis_repo.memprofile import MemoryProfiler
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestMemoryProfile(unittest.TestCase):
+
+    def tearDown(self):
+        memprofile.profiler.disable()
+
+    def testDisabledPhases(self):
+        prof = MemoryProfiler()
+        with prof.phase('merge'):
+            pass
+        self.assertEqual(prof.phases, [])
+
+    def testPhasesAndTopAllocators(self):
+        prof = MemoryProfiler(top=5)
+        prof.enable()
+        try:
+            with prof.phase('merge'):
+                held = [bytearray(1024) for _ in range(2000)]
+                with prof.phase('nested'):
+                    held.append(bytearray(4096))
+            with prof.phase('sort'):
+                del held
+        finally:
+            prof.disable()
+        self.assertEqual([p['phase'] for p in prof.phases],
+                         ['merge', 'sort'])
+        merge, sort = prof.phases
+        self.assertGreater(merge['traced_growth_mb'], 1.5)
+        self.assertGreaterEqual(merge['traced_peak_mb'],
+                                merge['traced_mb'])
+        self.assertLess(sort['traced_growth_mb'], -1.5)
+        top = merge['top'][0]
+        self.assertIn('test_memprofile.py', top['where'])
+        self.assertGreater(top['size_diff_kb'], 1900)
+        self.assertGreaterEqual(top['count_diff'], 2000)
+        self.assertEqual(sort['top'], [])
+        if memprofile.rss_mb() is not None:
+            self.assertGreater(merge['rss_mb'], 0)
+            self.assertIsNotNone(merge['untraced_mb'])
+        report = prof.report()
+        self.assertIn("Top allocators, phase 'merge':", report)
+        self.assertNotIn("phase 'sort'", report)
+
+    def testPathFromEnv(self):
+        self.assertIsNone(memprofile.path_from_env({}))
+        self.assertEqual(
+            memprofile.path_from_env({memprofile.MEMPROFILE_ENV: 'm.json'}),
+            'm.json')
+
+    def testUpdatePluginPhases(self):
+        repo = _temp_repo('qgis-dev')
+        out_dir = tempfile.mkdtemp()
+        try:
+            shutil.copy(_test_plugin('test_plugin_1.zip'), repo.upload_dir)
+            memprofile.profiler.enable()
+            self.assertTrue(repo.update_plugin('test_plugin_1.zip'))
+            memprofile.profiler.disable()
+            path = os.path.join(out_dir, 'memory.json')
+            memprofile.profiler.write(path)
+            with open(path) as f:
+                phases = json.load(f)['phases']
+            self.assertEqual([p['phase'] for p in phases],
+                             ['load_tree', 'ingest', 'write'])
+            self.assertTrue(phases[1]['top'])
+        finally:
+            shutil.rmtree(repo.temp_base)
+            shutil.rmtree(out_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
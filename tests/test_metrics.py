@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_metrics.py
+
+ Unit tests for the serving layer metrics endpoint
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import re
+import asyncio
+import shutil
+import logging
+import importlib.util
+
+try:
+    from .utilities import test_file as _test_file, \
+        test_plugin as _test_plugin, temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_file as _test_file, \
+        test_plugin as _test_plugin, temp_repo as _temp_repo
+from qgis_repo.aioserver import AsyncRepoServer
+from qgis_repo.metrics import ServingMetrics, qgis_variant
+from qgis_repo.server import create_app
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+def _samples(text):
+    """metric{labels} -> value, of a Prometheus text exposition"""
+    out = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, _, value = line.rpartition(' ')
+            out[name] = float(value)
+    return out
+
+
+class TestServingMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo()
+        shutil.copyfile(_test_file('plugins_test_find-sort.xml'),
+                        self.repo.plugins_xml)
+        zip_path = os.path.join(self.repo.packages_dir(), 'test_plugin_1.zip')
+        shutil.copyfile(_test_plugin('test_plugin_1.zip'), zip_path)
+        self.repo.package_index.add('packages/test_plugin_1.zip', zip_path)
+        self.repo.package_index.write()
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+
+    def testQgisVariant(self):
+        self.assertEqual(qgis_variant('3.34'), '3.34')
+        self.assertEqual(qgis_variant('3.34.5'), '3.34')
+        self.assertEqual(qgis_variant('03.4'), '3.4')
+        self.assertEqual(qgis_variant('latest'), 'invalid')
+        self.assertEqual(qgis_variant(None), '')
+
+    def testRender(self):
+        metrics = ServingMetrics(self.repo, buckets=(0.1, 1.0))
+        start = metrics.begin()
+        self.assertEqual(metrics.in_flight, 1)
+        metrics.end(start, '/plugins/plugins.xml', '3.28.1', 200, 1000)
+        metrics.end(metrics.begin() - 0.5, '/plugins/packages/a.zip',
+                    '3.28', 206, 10)
+        metrics.end(metrics.begin(), '/plugins/packages-auth/b.zip', None,
+                    401)
+        samples = _samples(metrics.render())
+        self.assertEqual(samples['qgis_repo_requests_in_flight'], 0)
+        self.assertEqual(samples[
+            'qgis_repo_requests_total{route="plugins_xml",qgis="3.28",'
+            'status="200"}'], 1)
+        # qgis label only for plugins.xml/json
+        self.assertEqual(samples[
+            'qgis_repo_requests_total{route="package",qgis="",'
+            'status="401"}'], 1)
+        hist = 'qgis_repo_request_duration_seconds'
+        self.assertEqual(samples[hist + '_bucket{route="package",qgis="",'
+                                        'le="0.1"}'], 1)
+        self.assertEqual(samples[hist + '_bucket{route="package",qgis="",'
+                                        'le="1"}'], 2)
+        self.assertEqual(samples[hist + '_bucket{route="package",qgis="",'
+                                        'le="+Inf"}'], 2)
+        self.assertEqual(samples[hist + '_count{route="package",qgis=""}'],
+                         2)
+        self.assertEqual(samples[
+            'qgis_repo_response_bytes_total{route="package"}'], 10)
+        self.assertNotIn('qgis_repo_catalog_generation', samples)
+
+    def testFlaskMetrics(self):
+        app = create_app(self.repo)
+        client = app.test_client()
+        for _ in range(3):
+            self.assertEqual(
+                client.get('/plugins/plugins.xml?qgis=2.18').status_code, 200)
+        resp = client.get('/plugins/packages/test_plugin_1.zip')
+        size = len(resp.get_data())
+        resp.close()
+        self.assertEqual(client.get('/nowhere').status_code, 404)
+        resp = client.get('/metrics')
+        self.assertTrue(resp.headers['Content-Type'].startswith(
+            'text/plain; version=0.0.4'))
+        samples = _samples(resp.get_data(as_text=True))
+        self.assertEqual(samples[
+            'qgis_repo_requests_total{route="plugins_xml",qgis="2.18",'
+            'status="200"}'], 3)
+        self.assertEqual(samples[
+            'qgis_repo_requests_total{route="other",qgis="",'
+            'status="404"}'], 1)
+        self.assertEqual(samples[
+            'qgis_repo_response_bytes_total{route="package"}'], size)
+        self.assertEqual(samples['qgis_repo_filter_cache_misses_total'], 1)
+        self.assertEqual(samples['qgis_repo_filter_cache_hits_total'], 2)
+        self.assertEqual(samples['qgis_repo_catalog_generation'], 1)
+        self.assertEqual(samples['qgis_repo_catalog_plugins'], 7)
+        self.assertIn('qgis_repo_catalog_age_seconds', samples)
+        # this scrape itself is in flight
+        self.assertEqual(samples['qgis_repo_requests_in_flight'], 1)
+
+    def testAsyncMetrics(self):
+        async def _get(reader, writer, path):
+            writer.write('GET {0} HTTP/1.1\r\nHost: test\r\n\r\n'
+                         .format(path).encode('ascii'))
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                k, _, v = line.decode('ascii').partition(':')
+                if k.lower() == 'content-length':
+                    length = int(v)
+            return status, await reader.readexactly(length)
+
+        async def _main():
+            srv = AsyncRepoServer(self.repo)
+            server = await srv.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1',
+                                                               port)
+                await _get(reader, writer, '/plugins/plugins.xml?qgis=3.4')
+                await _get(reader, writer,
+                           '/plugins/packages/test_plugin_1.zip')
+                await _get(reader, writer, '/plugins/plugins.xml?foo=1')
+                res = await _get(reader, writer, '/metrics')
+                writer.close()
+                return res
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        status, body = asyncio.run(_main())
+        self.assertEqual(status, 200)
+        samples = _samples(body.decode('utf-8'))
+        self.assertEqual(samples[
+            'qgis_repo_requests_total{route="plugins_xml",qgis="3.4",'
+            'status="200"}'], 1)
+        self.assertEqual(samples[
+            'qgis_repo_requests_total{route="plugins_xml",qgis="",'
+            'status="404"}'], 1)
+        self.assertEqual(
+            samples['qgis_repo_response_bytes_total{route="package"}'],
+            os.path.getsize(_test_plugin('test_plugin_1.zip')))
+
+    def testFlaskAppMetrics(self):
+        main_py = os.path.join(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))), 'flask_app', 'main.py')
+        spec = importlib.util.spec_from_file_location('flask_app_main',
+                                                      main_py)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        client = mod.app.test_client()
+        env = {'DOCUMENT_ROOT': self.repo.web_dir}
+        self.assertEqual(client.get('/plugins/plugins.xml?qgis=2.18',
+                                    environ_base=env).status_code, 200)
+        text = client.get('/metrics').get_data(as_text=True)
+        self.assertTrue(re.search(
+            r'^qgis_repo_requests_total\{route="plugins_xml",qgis="2.18",'
+            r'status="200"\} 1$', text, re.M))
+
+
+if __name__ == '__main__':
+    unittest.main()
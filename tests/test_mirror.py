@@ -0,0 +1,531 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_mirror.py
+
+ Unit tests for fetching and merging upstream plugins.xml feeds
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import logging
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from qgis_repo.mirror import DownloadCache, MirrorError, MirrorProgress, \
+    UpstreamFeeds, iter_feed_plugins, plugin_key, DOWNLOAD, INGEST, \
+    OVERLAY, FETCHED, INGESTED, REJECTED
+from qgis_repo.repo import QgisPluginTree
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+def feed_xml(plugins):
+    """
+    :param plugins: list[(name, version, description)]
+    :rtype: bytes
+    """
+    els = ''.join(
+        '<pyqgis_plugin name="{0}" version="{1}">'
+        '<description>{2}</description>'
+        '<file_name>{3}.{1}.zip</file_name>'
+        '<download_url>http://upstream/{3}.{1}.zip</download_url>'
+        '</pyqgis_plugin>'.format(n, v, d, n.lower().replace(' ', '_'))
+        for n, v, d in plugins)
+    return "<?xml version='1.0' encoding='UTF-8'?><plugins>{0}</plugins>" \
+        .format(els).encode('utf-8')
+
+
+class _Upstream(object):
+    """Local HTTP stand-in for an upstream repo, honoring validators"""
+
+    def __init__(self):
+        self.feeds = {}  # path -> (body, with etag, with last-modified)
+        self.requests = []  # (path, status)
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path not in upstream.feeds:
+                    upstream.requests.append((self.path, 404))
+                    self.send_error(404)
+                    return
+                body, etag, modified = upstream.feeds[self.path]
+                validators = {}
+                if etag:
+                    validators['ETag'] = '"{0}"'.format(
+                        hashlib.sha256(body).hexdigest()[:16])
+                if modified:
+                    validators['Last-Modified'] = \
+                        'Mon, 19 Oct 2026 0{0}:00:00 GMT'.format(
+                            len(body) % 10)
+                unchanged = (
+                    (etag and self.headers.get('If-None-Match') ==
+                     validators['ETag']) or
+                    (not etag and modified and
+                     self.headers.get('If-Modified-Since') ==
+                     validators['Last-Modified']))
+                status = 304 if unchanged else 200
+                upstream.requests.append((self.path, status))
+                self.send_response(status)
+                for k, v in validators.items():
+                    self.send_header(k, v)
+                if status == 200:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if status == 200:
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def url(self, path):
+        return 'http://127.0.0.1:{0}{1}'.format(self.server.server_port,
+                                                path)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestUpstreamFeeds(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.upstream = _Upstream()
+        self.a = '/plugins.xml?qgis=3.10'
+        self.b = '/plugins.xml?qgis=3.22'
+        self.upstream.feeds[self.a] = (feed_xml([
+            ('Plugin One', '1.0', 'one'),
+            ('Plugin Two', '1.0', 'two'),
+        ]), True, False)
+        self.upstream.feeds[self.b] = (feed_xml([
+            ('Plugin Two', '1.0', 'two'),
+            ('Plugin Three', '1.0', 'three'),
+        ]), False, True)
+        self.urls = [self.upstream.url(self.a), self.upstream.url(self.b)]
+        self.options = {'name_suffix': None, 'auth': False,
+                        'auth_role': None, 'validate_fields': False}
+
+    def tearDown(self):
+        self.upstream.close()
+        shutil.rmtree(self.state_dir)
+
+    def _fetch_all(self, feeds):
+        return [feeds.fetch(u, 'feed_{0}.xml'.format(i))[0]
+                for i, u in enumerate(self.urls)]
+
+    def _merged(self, feeds):
+        tree = feeds.merge(self.urls)
+        feeds.save_merged(tree.to_xml(), self.urls)
+        return dict((plugin_key(p)[0], p.findtext('description'))
+                    for p in QgisPluginTree(feeds.merged_xml).plugins())
+
+    def testConditionalFetch(self):
+        feeds = UpstreamFeeds(self.state_dir)
+        self.assertEqual(self._fetch_all(feeds), [True, True])
+        self.assertEqual(self._merged(feeds), {
+            'Plugin One': 'one', 'Plugin Two': 'two',
+            'Plugin Three': 'three'})
+        repo_xml = os.path.join(self.state_dir, 'repo-plugins.xml')
+        with open(repo_xml, 'wb') as f:
+            f.write(feed_xml([('Plugin One', '1.0', 'one')]))
+        feeds.set_mirrored('qgis-mirror', self.options, repo_xml)
+
+        # state persisted: ETag and Last-Modified validate, nothing sent
+        feeds = UpstreamFeeds(self.state_dir)
+        del self.upstream.requests[:]
+        self.assertEqual(self._fetch_all(feeds), [False, False])
+        self.assertEqual([s for _, s in self.upstream.requests], [304, 304])
+        self.assertTrue(feeds.unchanged(self.urls))
+        self.assertTrue(
+            feeds.mirrored('qgis-mirror', self.options, repo_xml))
+        self.assertFalse(feeds.mirrored('qgis', self.options, repo_xml))
+
+        # sent again in full, but the same content
+        self.assertEqual(feeds.fetch(self.urls[0], 'feed_0.xml',
+                                     force=True), (False, len(
+                                         self.upstream.feeds[self.a][0])))
+        self.assertTrue(feeds.unchanged(self.urls))
+
+        with self.assertRaises(MirrorError):
+            feeds.fetch(self.upstream.url('/missing.xml'), 'missing.xml')
+        self.assertFalse(os.path.exists(
+            os.path.join(self.state_dir, 'missing.xml.part')))
+
+    def testMirroredOptionsAndRepo(self):
+        feeds = UpstreamFeeds(self.state_dir)
+        self._fetch_all(feeds)
+        self._merged(feeds)
+        repo_xml = os.path.join(self.state_dir, 'repo-plugins.xml')
+        with open(repo_xml, 'wb') as f:
+            f.write(feed_xml([('Plugin One', '1.0', 'one')]))
+        # no repo plugins.xml: never mirrored
+        missing_xml = os.path.join(self.state_dir, 'missing-plugins.xml')
+        feeds.set_mirrored('qgis-mirror', self.options, missing_xml)
+        self.assertFalse(
+            feeds.mirrored('qgis-mirror', self.options, missing_xml))
+        feeds.set_mirrored('qgis-mirror', self.options, repo_xml)
+
+        feeds = UpstreamFeeds(self.state_dir)
+        self.assertTrue(
+            feeds.mirrored('qgis-mirror', dict(self.options), repo_xml))
+        # mirrored with other options
+        for k, v in [('name_suffix', ' (mirror)'), ('auth', True),
+                     ('auth_role', ['DesktopPro']),
+                     ('validate_fields', True)]:
+            options = dict(self.options)
+            options[k] = v
+            self.assertFalse(feeds.mirrored('qgis-mirror', options, repo_xml))
+        # repo cleared, rebuilt or rolled back since
+        with open(repo_xml, 'wb') as f:
+            f.write(feed_xml([]))
+        self.assertFalse(
+            feeds.mirrored('qgis-mirror', self.options, repo_xml))
+        os.remove(repo_xml)
+        self.assertFalse(
+            feeds.mirrored('qgis-mirror', self.options, repo_xml))
+
+        # state of an older run, without the options and repo hashes
+        feeds.state['mirrored']['qgis-mirror'] = \
+            feeds.state['merged']['sha256']
+        self.assertFalse(
+            feeds.mirrored('qgis-mirror', self.options, repo_xml))
+
+    def testIncrementalMerge(self):
+        feeds = UpstreamFeeds(self.state_dir)
+        self._fetch_all(feeds)
+        self._merged(feeds)
+        repo_xml = os.path.join(self.state_dir, 'repo-plugins.xml')
+        with open(repo_xml, 'wb') as f:
+            f.write(feed_xml([('Plugin One', '1.0', 'one')]))
+        feeds.set_mirrored('qgis-mirror', self.options, repo_xml)
+
+        # second feed drops one plugin, adds one and updates a duplicate
+        self.upstream.feeds[self.b] = (feed_xml([
+            ('Plugin Two', '1.0', 'two, updated'),
+            ('Plugin Four', '1.0', 'four'),
+        ]), False, True)
+        feeds = UpstreamFeeds(self.state_dir)
+        self.assertEqual(self._fetch_all(feeds), [False, True])
+        self.assertFalse(feeds.unchanged(self.urls))
+
+        merged = []
+        merge_feed = UpstreamFeeds._merge_feed
+
+        def _merge_feed(feeds_, tree, plugins, url, **kwargs):
+            merged.append(feeds_.feed(url)['file'])
+            return merge_feed(feeds_, tree, plugins, url, **kwargs)
+
+        UpstreamFeeds._merge_feed = _merge_feed
+        try:
+            result = self._merged(feeds)
+        finally:
+            UpstreamFeeds._merge_feed = merge_feed
+        self.assertEqual(merged, ['feed_1.xml'])
+        # the first feed's duplicate is kept, as in a full merge
+        self.assertEqual(result, {
+            'Plugin One': 'one', 'Plugin Two': 'two',
+            'Plugin Four': 'four'})
+        self.assertFalse(
+            feeds.mirrored('qgis-mirror', self.options, repo_xml))
+
+        # a feed no longer mirrored: its plugins found nowhere else go
+        feeds = UpstreamFeeds(self.state_dir)
+        self.urls = self.urls[:1]
+        self._fetch_all(feeds)
+        self.assertEqual(sorted(self._merged(feeds)),
+                         ['Plugin One', 'Plugin Two'])
+
+    def testIncrementalMergeMatchesFullMerge(self):
+        c = '/plugins.xml?qgis=3.28'
+        self.upstream.feeds[c] = (feed_xml([
+            ('Plugin One', '1.0', 'one, from c'),
+            ('Plugin Three', '1.0', 'three, from c'),
+        ]), True, True)
+        self.urls.append(self.upstream.url(c))
+        feeds = UpstreamFeeds(self.state_dir)
+        self._fetch_all(feeds)
+        self._merged(feeds)
+
+        for a, b, c_ in [
+            # first feed drops a plugin the third has, and the second
+            # updates one the first has
+            ([('Plugin Two', '1.0', 'two, a2')],
+             [('Plugin Two', '1.0', 'two, b2'),
+              ('Plugin Three', '1.0', 'three, b2')], None),
+            # two changed feeds with the same plugin, and the first feed
+            # taking back one from the others
+            ([('Plugin One', '1.0', 'one, a3'),
+              ('Plugin Three', '1.0', 'three, a3')],
+             [('Plugin One', '1.0', 'one, b3'),
+              ('Plugin Four', '1.0', 'four, b3')],
+             None),
+            # only the last feed changes, with duplicates of the others'
+            (None, None, [('Plugin One', '1.0', 'one, c4'),
+                          ('Plugin Four', '1.0', 'four, c4'),
+                          ('Plugin Five', '1.0', 'five, c4')]),
+        ]:
+            for path, plugins in zip([self.a, self.b, c], [a, b, c_]):
+                if plugins is not None:
+                    self.upstream.feeds[path] = (feed_xml(plugins),
+                                                 True, True)
+            feeds = UpstreamFeeds(self.state_dir)
+            self._fetch_all(feeds)
+            incremental = self._merged(feeds)
+            os.remove(feeds.merged_xml)
+            feeds = UpstreamFeeds(self.state_dir)
+            self.assertEqual(self._merged(feeds), incremental)
+
+    def testConcurrentFetchStreamingMerge(self):
+        c = '/plugins.xml?qgis=3.28'
+        self.upstream.feeds[c] = (feed_xml([
+            ('Plugin Three', '1.0', 'three, again'),
+            ('&quot;Plugin Five&quot;', '1.0', 'five'),
+            ('Plugin Six', '1.0', 'no file name'),
+        ]).replace(b'<file_name>plugin_six.1.0.zip</file_name>', b''),
+            True, True)
+        self.urls.append(self.upstream.url(c))
+        feeds = UpstreamFeeds(self.state_dir)
+        done = []
+        changed = feeds.fetch_all(
+            [(u, 'feed_{0}.xml'.format(i)) for i, u in enumerate(self.urls)],
+            workers=3, progress=lambda url, *_: done.append(url))
+        self.assertEqual(changed, self.urls)
+        self.assertEqual(sorted(done), sorted(self.urls))
+        self.assertEqual(feeds.fetch_all([]), [])
+
+        # duplicates are skipped as parsed, the first feed's kept
+        self.assertEqual(self._merged(feeds), {
+            'Plugin One': 'one', 'Plugin Two': 'two',
+            'Plugin Three': 'three', 'Plugin Five': 'five'})
+        self.assertEqual(len(feeds.feed(self.urls[2])['keys']), 2)
+
+        # plugins are dropped from the parsed feed once handled
+        path = os.path.join(self.state_dir, 'feed_0.xml')
+        roots = set(p.getparent() for p in iter_feed_plugins(path))
+        self.assertEqual([len(r) for r in roots], [0])
+
+        with open(path, 'wb') as f:
+            f.write(b'<plugins><pyqgis_plugin name="truncated"')
+        with self.assertRaises(MirrorError):
+            list(iter_feed_plugins(path))
+
+        self.upstream.feeds.pop(c)
+        with self.assertRaises(MirrorError):
+            feeds.fetch_all([(u, 'feed_{0}.xml'.format(i))
+                             for i, u in enumerate(self.urls)], force=True)
+
+
+class TestDownloadCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.upload_dir = os.path.join(self.temp_dir, 'uploads')
+        os.makedirs(self.upload_dir)
+        self.upstream = _Upstream()
+        for n in 'abc':
+            self.upstream.feeds['/{0}.zip'.format(n)] = (
+                n.encode('utf-8') * 100, False, False)
+        # same content, under another URL
+        self.upstream.feeds['/a-again.zip'] = (b'a' * 100, False, False)
+
+    def tearDown(self):
+        self.upstream.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _fetch(self, cache, name, dest_name=None, sha256=None):
+        return cache.fetch(
+            self.upstream.url('/{0}'.format(name)), name,
+            os.path.join(self.upload_dir, dest_name or name), sha256=sha256)
+
+    def _gets(self):
+        return len([r for r in self.upstream.requests if r[1] == 200])
+
+    def testFetchThroughCache(self):
+        cache = DownloadCache(self.cache_dir)
+        self.assertEqual(self._fetch(cache, 'a.zip'), (False, 100))
+        self.assertEqual(self._fetch(cache, 'a.zip', 'a2.zip'), (True, 100))
+        self.assertEqual(self._gets(), 1)
+        path = os.path.join(self.upload_dir, 'a.zip')
+        self.assertTrue(os.path.samefile(
+            path, os.path.join(self.upload_dir, 'a2.zip')))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 100)
+        cache.write()
+
+        # persisted, and shared by another mirror, e.g. of another repo
+        cache = DownloadCache(self.cache_dir)
+        self.assertEqual(self._fetch(cache, 'a.zip'), (True, 100))
+        sha = hashlib.sha256(b'a' * 100).hexdigest()
+        self.assertEqual(self._fetch(cache, 'a.zip', sha256=sha),
+                         (True, 100))
+        self.assertEqual(self._gets(), 1)
+
+        # removed behind the cache's back, so fetched again
+        os.remove(cache.object_path(sha))
+        self.assertEqual(self._fetch(cache, 'a.zip'), (False, 100))
+        self.assertEqual(self._gets(), 2)
+
+        with self.assertRaises(MirrorError):
+            self._fetch(cache, 'b.zip', sha256=sha)
+        with self.assertRaises(MirrorError):
+            self._fetch(cache, 'missing.zip')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual([f for _, _, files in os.walk(cache.objects_dir)
+                          for f in files], ['{0}.zip'.format(sha)])
+
+    def testEvictLeastRecentlyUsed(self):
+        cache = DownloadCache(self.cache_dir, max_size=250)
+        for n in ['a.zip', 'a-again.zip', 'b.zip', 'c.zip']:
+            self._fetch(cache, n)
+        self.assertEqual(cache.size(), 300)
+        # a.zip used most recently
+        for key, entry in cache.entries.items():
+            entry['used'] = {'a.zip': 4, 'a-again.zip': 1,
+                             'b.zip': 2, 'c.zip': 3}[key[1]]
+        cache.write()
+        # a-again.zip went first, but only with b.zip was space freed
+        self.assertEqual(sorted(k[1] for k in cache.entries),
+                         ['a.zip', 'c.zip'])
+        self.assertEqual(cache.size(), 200)
+        self.assertFalse(os.path.exists(
+            cache.object_path(hashlib.sha256(b'b' * 100).hexdigest())))
+        self.assertEqual(self._fetch(cache, 'c.zip'), (True, 100))
+
+        # writes merge with entries written meanwhile by other processes,
+        # but not ones evicted here
+        other = DownloadCache(self.cache_dir, max_size=1000)
+        self._fetch(other, 'b.zip')
+        other.write()
+        self.assertEqual(len(DownloadCache(self.cache_dir)), 3)
+        cache.max_size = 150
+        cache.write()
+        self.assertEqual(sorted(k[1] for k in cache.entries),
+                         ['b.zip'])
+        self.assertEqual(sorted(k[1] for k in
+                                DownloadCache(self.cache_dir).entries),
+                         ['b.zip'])
+
+
+class TestMirrorProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.merged_xml = os.path.join(self.state_dir, 'merged.xml')
+        with open(self.merged_xml, 'wb') as f:
+            f.write(feed_xml([('Plugin One', '1.0', 'one')]))
+        self.plugins_xml = os.path.join(self.state_dir, 'plugins.xml')
+        self.options = {'name_suffix': None, 'auth': False}
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def _write_xml(self, progress, xml, phase=None, crash=None):
+        progress.prepare_checkpoint(xml, phase=phase)
+        if crash == 'before_write':
+            return
+        with open(self.plugins_xml, 'wb') as f:
+            f.write(xml)
+        if crash == 'before_commit':
+            return
+        progress.commit_checkpoint()
+
+    def _reloaded(self):
+        progress = MirrorProgress(self.state_dir, 'qgis-mirror')
+        self.assertTrue(progress.resumable(self.merged_xml, self.options))
+        return progress
+
+    def testCheckpoints(self):
+        progress = MirrorProgress(self.state_dir, 'qgis-mirror')
+        self.assertFalse(progress.unfinished())
+        progress.begin(self.merged_xml, self.options)
+        self.assertEqual(progress.phase, DOWNLOAD)
+        for f in ['a.zip', 'b.zip', 'c.zip']:
+            progress.fetched(f)
+        progress.set_phase(INGEST)
+
+        progress.set_status('a.zip', INGESTED)
+        self._write_xml(progress, b'<plugins>a</plugins>')
+        # not yet checkpointed, so lost
+        progress.set_status('b.zip', REJECTED)
+        progress = self._reloaded()
+        self.assertEqual(progress.phase, INGEST)
+        self.assertTrue(progress.recover(self.plugins_xml))
+        self.assertEqual([progress.status(f) for f in
+                          ['a.zip', 'b.zip', 'c.zip']],
+                         [INGESTED, FETCHED, FETCHED])
+
+        # interrupted after recording, before writing plugins.xml
+        progress.set_status('b.zip', REJECTED)
+        self._write_xml(progress, b'<plugins>a</plugins><!-- b -->',
+                        crash='before_write')
+        progress = self._reloaded()
+        self.assertTrue(progress.recover(self.plugins_xml))
+        self.assertEqual(progress.status('b.zip'), FETCHED)
+
+        # interrupted after writing plugins.xml, before committing
+        progress.set_status('b.zip', REJECTED)
+        progress.set_status('c.zip', INGESTED)
+        self._write_xml(progress, b'<plugins>ac</plugins>', phase=OVERLAY,
+                        crash='before_commit')
+        progress = self._reloaded()
+        self.assertTrue(progress.recover(self.plugins_xml))
+        self.assertEqual(progress.phase, OVERLAY)
+        self.assertEqual(progress.count(INGESTED), 2)
+        self.assertEqual(progress.count(REJECTED), 1)
+
+        # plugins.xml changed by something else: ingest again
+        with open(self.plugins_xml, 'wb') as f:
+            f.write(b'<plugins/>')
+        progress = self._reloaded()
+        progress.set_building('/somewhere.building')
+        self.assertFalse(progress.recover(self.plugins_xml))
+        progress.restart_ingest()
+        self.assertEqual(progress.phase, INGEST)
+        self.assertEqual(progress.count(FETCHED), 3)
+        self.assertIsNone(progress.building)
+
+        # not resumable with other options, or once the merge changed
+        self.assertFalse(MirrorProgress(self.state_dir, 'qgis-mirror')
+                         .resumable(self.merged_xml, {'auth': True}))
+        with open(self.merged_xml, 'ab') as f:
+            f.write(b'\n')
+        self.assertFalse(MirrorProgress(self.state_dir, 'qgis-mirror')
+                         .resumable(self.merged_xml, self.options))
+        self.assertFalse(MirrorProgress(self.state_dir, 'qgis')
+                         .unfinished())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_packaging.py
+
+ Unit tests for repo archives and their manifests
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import gzip
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import logging
+import zlib
+
+from unittest import mock
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo.packaging import ParallelGzipWriter, PackagingError, \
+    _gzip_block, exchange_paths, list_snapshots, manifest_path, \
+    read_manifest, reconstruct_snapshot, unpack_snapshot, write_manifest, \
+    write_repo_archive
+from qgis_repo.repo import PackageIndex
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestPackaging(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo()
+        for z in ['test_plugin_1.zip', 'test_plugin_2.zip']:
+            shutil.copy(_test_plugin(z), self.repo.upload_dir)
+        self.assertTrue(self.repo.update_plugin('all'))
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+        shutil.rmtree(self.out_dir)
+
+    def _snapshot(self, archive_name, base=None):
+        archive = os.path.join(self.out_dir, archive_name)
+        manifest = write_repo_archive(
+            os.path.dirname(self.repo.web_dir), 'qgis', archive, base=base)
+        write_manifest(manifest, manifest_path(archive))
+        return manifest
+
+    @staticmethod
+    def _tree(root):
+        tree = {}
+        for dirpath, dirs, files in os.walk(root):
+            rel = os.path.relpath(dirpath, root)
+            tree[rel] = None
+            for f in files:
+                with open(os.path.join(dirpath, f), 'rb') as fh:
+                    tree[os.path.join(rel, f)] = fh.read()
+        return tree
+
+    def testParallelGzipWriter(self):
+        data = b''.join(b'line %d\n' % i for i in range(20000))
+        out = io.BytesIO()
+        writer = ParallelGzipWriter(out, level=6, workers=3, block_size=4096)
+        writer.write(data[:50000])
+        writer.level = 0
+        writer.write(data[50000:60000])
+        writer.level = 6
+        writer.write(data[60000:])
+        writer.close()
+        self.assertEqual(gzip.decompress(out.getvalue()), data)
+        self.assertEqual(writer.raw_size, len(data))
+        self.assertEqual(writer.size, len(out.getvalue()))
+        self.assertGreater(writer.blocks, len(data) // 4096)
+
+        # stored blocks are (at least) as big as their data
+        out = io.BytesIO()
+        writer = ParallelGzipWriter(out, level=0)
+        writer.write(data)
+        writer.close()
+        self.assertGreater(writer.size, len(data))
+        self.assertEqual(zlib.decompress(out.getvalue(), 31), data)
+
+    def testGzipBlock(self):
+        def compress(data, level=-1):
+            # zlib.compress() before Python 3.11: no wbits
+            return zlib.compressobj(level).compress(data)
+
+        data = b'block\n' * 1000
+        with mock.patch.object(zlib, 'compress', compress):
+            for level in (0, 6):
+                block = _gzip_block(data, level)
+                self.assertEqual(block[:2], b'\x1f\x8b')
+                self.assertEqual(gzip.decompress(block), data)
+        # blocks are complete gzip members, concatenated as one stream
+        self.assertEqual(gzip.decompress(
+            _gzip_block(b'a', 6) + _gzip_block(b'b', 1)), b'ab')
+
+    def testWriteRepoArchive(self):
+        archive = os.path.join(self.out_dir, 'qgis.tar.gz')
+        added = []
+        manifest = write_repo_archive(
+            os.path.dirname(self.repo.web_dir), 'qgis', archive, workers=2,
+            block_size=1024, progress=added.append)
+        self.assertEqual(os.listdir(self.out_dir), ['qgis.tar.gz'])
+        self.assertEqual(manifest['archive_size'], os.path.getsize(archive))
+        self.assertEqual(manifest['archive_sha256'],
+                         PackageIndex.file_sha256(archive))
+
+        with tarfile.open(archive, 'r:gz') as tar:
+            names = tar.getnames()
+            self.assertEqual(names, added)
+            files = [m.name for m in tar.getmembers() if m.isreg()]
+            self.assertEqual(sorted(files), sorted(manifest['files']))
+            for name in files:
+                path = os.path.join(os.path.dirname(self.repo.web_dir), name)
+                with open(path, 'rb') as f:
+                    self.assertEqual(tar.extractfile(name).read(), f.read())
+                self.assertEqual(manifest['files'][name]['sha256'],
+                                 PackageIndex.file_sha256(path))
+        self.assertIn('qgis/plugins/packages/test_plugin_1.0.1.zip',
+                      manifest['files'])
+
+        path = manifest_path(archive)
+        write_manifest(manifest, path)
+        self.assertEqual(read_manifest(path), manifest)
+        with open(path, 'w') as f:
+            f.write('{"version": 0}')
+        with self.assertRaises(PackagingError):
+            read_manifest(path)
+
+    def testIncrementalSnapshots(self):
+        full = self._snapshot('qgis-1.tar.gz')
+        self.assertIsNone(full['base'])
+
+        # unchanged: nothing archived, nothing read again
+        incr = self._snapshot('qgis-2-incr.tar.gz', base=full)
+        self.assertEqual((incr['archived'], incr['deleted']), ([], []))
+        self.assertEqual(incr['files'], full['files'])
+
+        shutil.copy(_test_plugin('test_plugin_3.zip'), self.repo.upload_dir)
+        self.assertTrue(self.repo.update_plugin('test_plugin_3.zip'))
+        self.assertTrue(self.repo.remove_plugin('Test Plugin 1',
+                                                versions='all'))
+        incr = self._snapshot('qgis-3-incr.tar.gz', base=incr)
+        self.assertEqual(incr['base'], 'qgis-2-incr.tar.gz')
+        self.assertIn('qgis/plugins/packages/test_plugin_3.0.1.zip',
+                      incr['archived'])
+        self.assertIn('qgis/plugins/plugins.xml', incr['archived'])
+        self.assertNotIn('qgis/plugins/packages/test_plugin_2.0.1.zip',
+                         incr['archived'])
+        self.assertIn('qgis/plugins/packages/test_plugin_1.0.1.zip',
+                      incr['deleted'])
+        self.assertEqual(incr['deleted_dirs'],
+                         ['qgis/plugins/icons/test_plugin_1'])
+        self.assertEqual([m['archive'] for m in
+                          list_snapshots(self.out_dir, 'qgis')],
+                         ['qgis-1.tar.gz', 'qgis-2-incr.tar.gz',
+                          'qgis-3-incr.tar.gz'])
+
+        restore_dir = os.path.join(self.out_dir, 'restored')
+        applied = []
+        manifest = reconstruct_snapshot(
+            self.out_dir, 'qgis-3-incr.tar.gz', restore_dir,
+            progress=lambda m: applied.append(m['archive']))
+        self.assertEqual(manifest['archive'], 'qgis-3-incr.tar.gz')
+        self.assertEqual(len(applied), 3)
+        self.assertEqual(self._tree(os.path.join(restore_dir, 'qgis')),
+                         self._tree(self.repo.web_dir))
+
+        # earlier point in time
+        shutil.rmtree(restore_dir)
+        reconstruct_snapshot(self.out_dir, 'qgis-2-incr.tar.gz', restore_dir)
+        self.assertTrue(os.path.exists(os.path.join(
+            restore_dir, 'qgis/plugins/packages/test_plugin_1.0.1.zip')))
+        with self.assertRaises(PackagingError):
+            reconstruct_snapshot(self.out_dir, 'qgis-2-incr.tar.gz',
+                                 restore_dir)
+
+    def testUnpack(self):
+        self._snapshot('qgis-1.tar.gz')
+        snapshot = self._tree(self.repo.web_dir)
+        web_base = os.path.dirname(self.repo.web_dir)
+
+        # live tree changed since
+        self.assertTrue(self.repo.remove_plugin('Test Plugin 1',
+                                                versions='all'))
+        with open(os.path.join(self.repo.web_dir, 'extra.txt'), 'w') as f:
+            f.write('not in snapshot')
+        manifest = unpack_snapshot(self.out_dir, 'qgis-1.tar.gz', web_base,
+                                   workers=3)
+        self.assertEqual(manifest['archive'], 'qgis-1.tar.gz')
+        self.assertEqual(self._tree(self.repo.web_dir), snapshot)
+        self.assertEqual(os.listdir(web_base), ['qgis'])
+
+        # swapped, not copied over
+        a = os.path.join(self.out_dir, 'a')
+        b = os.path.join(self.out_dir, 'b')
+        os.makedirs(os.path.join(a, 'in_a'))
+        os.makedirs(os.path.join(b, 'in_b'))
+        exchange_paths(a, b)
+        self.assertEqual(os.listdir(a), ['in_b'])
+        self.assertEqual(os.listdir(b), ['in_a'])
+
+    def testUnpackGenerations(self):
+        self.repo.generations_kept = 3
+        gens = self.repo.generations
+        with self.repo.generation():
+            self.assertTrue(self.repo.remove_plugin('Test Plugin 2',
+                                                    versions='all'))
+        self.assertTrue(os.path.islink(self.repo.web_dir))
+        self._snapshot('qgis-1.tar.gz')
+        snapshot = self._tree(self.repo.web_dir)
+        with tarfile.open(os.path.join(self.out_dir, 'qgis-1.tar.gz')) as t:
+            self.assertTrue(t.getmember('qgis').isdir())
+
+        # restored as a new generation, the earlier ones kept
+        with self.repo.generation():
+            self.assertTrue(self.repo.remove_plugin('Test Plugin 1',
+                                                    versions='all'))
+        before = gens.current()
+        web_base = os.path.dirname(self.repo.web_dir)
+        unpack_snapshot(self.out_dir, 'qgis-1.tar.gz', web_base,
+                        generations=gens)
+        self.assertTrue(os.path.islink(self.repo.web_dir))
+        self.assertNotEqual(gens.current(), before)
+        self.assertIn(before, gens.list())
+        self.assertEqual(self._tree(self.repo.web_dir), snapshot)
+        self.assertEqual(sorted(os.listdir(web_base)),
+                         ['.qgis.generations', 'qgis'])
+        self.assertEqual(gens.list(), sorted(os.listdir(gens.gen_dir)))
+
+    def testUnpackUnverified(self):
+        manifest = self._snapshot('qgis-1.tar.gz')
+        web_base = os.path.dirname(self.repo.web_dir)
+        live = self._tree(self.repo.web_dir)
+        archive = os.path.join(self.out_dir, 'qgis-1.tar.gz')
+
+        # manifest not matching an archived file
+        key = 'qgis/plugins/plugins.xml'
+        manifest['files'][key]['sha256'] = '0' * 64
+        write_manifest(manifest, manifest_path(archive))
+        with self.assertRaises(PackagingError):
+            unpack_snapshot(self.out_dir, 'qgis-1.tar.gz', web_base)
+        self.assertEqual(self._tree(self.repo.web_dir), live)
+        self.assertEqual(os.listdir(web_base), ['qgis'])
+
+        # archive truncated
+        self._snapshot('qgis-1.tar.gz')
+        with open(archive, 'r+b') as f:
+            f.truncate(os.path.getsize(archive) // 2)
+        with self.assertRaises(PackagingError):
+            unpack_snapshot(self.out_dir, 'qgis-1.tar.gz', web_base)
+        self.assertEqual(self._tree(self.repo.web_dir), live)
+        self.assertEqual(os.listdir(web_base), ['qgis'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_promote.py
+
+ Unit tests for promoting plugins between repos
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import shutil
+import logging
+import zipfile
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo.repo import QgisPlugin, QgisPluginTree, RepoActionError, \
+    set_metadata_fields
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestPromote(unittest.TestCase):
+
+    def setUp(self):
+        self.beta = _temp_repo('qgis-beta')
+        base = self.beta.temp_base
+        self.repo = _temp_repo('qgis', base=base)
+        self.mirror = _temp_repo('qgis-mirror', base=base)
+        shutil.copy(_test_plugin('test_plugin_1.zip'), self.beta.upload_dir)
+        self.assertTrue(self.beta.update_plugin('test_plugin_1.zip',
+                                                auth_role='DesktopPro'))
+
+    def tearDown(self):
+        shutil.rmtree(self.beta.temp_base)
+
+    def _promoted(self, repo):
+        plugins = QgisPluginTree(repo.plugins_xml).plugins()
+        self.assertEqual(len(plugins), 1)
+        el = plugins[0]
+        zip_path = os.path.join(
+            repo.packages_dir(auth=True), el.findtext('file_name'))
+        return el, zip_path
+
+    def testSetMetadataFields(self):
+        txt = '[general]\nname = My Plugin BETA\nversion=0.1-202601011200\n'
+        self.assertEqual(
+            set_metadata_fields(txt, {'name': 'My Plugin', 'version': '0.1'}),
+            '[general]\nname = My Plugin\nversion=0.1\n')
+
+    def testPromote(self):
+        validate = QgisPlugin._validate
+
+        def _validate(plugin):
+            raise AssertionError('Promoted plugin validated again')
+
+        QgisPlugin._validate = _validate
+        try:
+            self.assertTrue(self.repo.promote_plugin(self.beta,
+                                                     'Test Plugin 1'))
+        finally:
+            QgisPlugin._validate = validate
+
+        el, zip_path = self._promoted(self.repo)
+        self.assertEqual((el.get('name'), el.get('version')),
+                         ('Test Plugin 1', '0.1'))
+        self.assertEqual(el.findtext('version'), '0.1')
+        self.assertEqual(el.findtext('file_name'), 'test_plugin_1.0.1.zip')
+        self.assertEqual(el.findtext('authorization_role'), 'DesktopPro')
+        self.assertEqual(
+            el.findtext('download_url'),
+            'http://qgis-repo.local:8008/plugins/packages-auth/'
+            'test_plugin_1.0.1.zip')
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.repo.web_plugins_dir, el.findtext('icon'))))
+        with zipfile.ZipFile(zip_path) as zip_obj:
+            metadata = zip_obj.read(
+                'test_plugin_1/metadata.txt').decode('utf-8')
+        self.assertIn('\nname=Test Plugin 1\n', metadata)
+        self.assertIn('\nversion=0.1\n', metadata)
+        meta = self.repo.package_index.get(
+            'packages-auth/test_plugin_1.0.1.zip')
+        self.assertEqual(meta['roles'], ['DesktopPro'])
+        self.assertEqual(meta['sha256'],
+                         self.repo.package_index.file_sha256(zip_path))
+
+        # same (no) suffix: package linked as is, hash reused
+        self.assertTrue(self.mirror.promote_plugin(self.repo,
+                                                   'Test Plugin 1'))
+        el, mirror_zip = self._promoted(self.mirror)
+        self.assertEqual(el.get('name'), 'Test Plugin 1')
+        self.assertTrue(os.path.samefile(zip_path, mirror_zip))
+        self.assertEqual(self.mirror.package_index.get(
+            'packages-auth/test_plugin_1.0.1.zip')['sha256'], meta['sha256'])
+
+    def testPromoteMissing(self):
+        with self.assertRaises(RepoActionError):
+            self.repo.promote_plugin(self.beta, 'Test Plugin 2')
+        with self.assertRaises(RepoActionError):
+            self.repo.promote_plugin(self.beta, 'Test Plugin 1',
+                                     version='0.2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_timing.py
+
+ Unit tests for timing spans of the plugin ingestion pipeline stages
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import logging
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo import timing
+from qgis_repo.timing import SpanRecorder
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestTiming(unittest.TestCase):
+
+    def tearDown(self):
+        timing.recorder.disable()
+
+    def testDisabledSpans(self):
+        rec = SpanRecorder()
+        with rec.span('stage', 10) as s:
+            self.assertFalse(s)
+            s.add_bytes(5)
+        rec.enable()
+        self.assertEqual(rec.summary()['stages'], {})
+
+    def testSummaryAndTrace(self):
+        rec = SpanRecorder()
+        rec.enable(trace=True)
+        with rec.span('read', 100) as s:
+            self.assertTrue(s)
+            s.add_bytes(28)
+        with rec.span('read'):
+            pass
+        with self.assertRaises(ValueError):
+            with rec.span('parse', url='x'):
+                raise ValueError('bad')
+        stages = rec.summary()['stages']
+        self.assertEqual(list(stages), ['read', 'parse'])
+        self.assertEqual(stages['read']['calls'], 2)
+        self.assertEqual(stages['read']['bytes'], 128)
+        self.assertEqual(stages['parse']['failed'], 1)
+        events = rec.chrome_trace()['traceEvents']
+        self.assertEqual([e['name'] for e in events],
+                         ['read', 'read', 'parse'])
+        self.assertEqual(events[0]['ph'], 'X')
+        self.assertEqual(events[0]['args'], {'bytes': 128})
+        self.assertEqual(events[2]['args'], {'url': 'x', 'failed': True})
+
+    def testPathsFromEnv(self):
+        self.assertEqual(timing.paths_from_env({}), (None, None))
+        self.assertEqual(
+            timing.paths_from_env({timing.TIMINGS_ENV: 't.json',
+                                   timing.TRACE_ENV: 'trace.json'}),
+            ('t.json', 'trace.json'))
+
+    def testUpdatePluginStages(self):
+        repo = _temp_repo('qgis-dev')
+        out_dir = tempfile.mkdtemp()
+        try:
+            shutil.copy(_test_plugin('test_plugin_1.zip'), repo.upload_dir)
+            timing.recorder.enable(trace=True)
+            self.assertTrue(repo.update_plugin('test_plugin_1.zip'))
+            summary_path = os.path.join(out_dir, 'timings.json')
+            trace_path = os.path.join(out_dir, 'trace.json')
+            timing.recorder.write_summary(summary_path)
+            timing.recorder.write_trace(trace_path)
+            with open(summary_path) as f:
+                stages = json.load(f)['stages']
+            for name in ['load_tree', 'validate_archive', 'validate_metadata',
+                         'update_metadata', 'move_archive', 'extract_icon',
+                         'update_zip', 'index_package', 'plugin_element',
+                         'serialize_xml', 'write_index', 'write_xml']:
+                self.assertEqual(stages[name]['calls'], 1, name)
+            zip_size = os.path.getsize(_test_plugin('test_plugin_1.zip'))
+            self.assertEqual(stages['validate_archive']['bytes'], zip_size)
+            self.assertGreater(stages['extract_icon']['bytes'], 0)
+            self.assertEqual(stages['write_xml']['bytes'],
+                             os.path.getsize(repo.plugins_xml))
+            with open(trace_path) as f:
+                self.assertEqual(len(json.load(f)['traceEvents']), 12)
+        finally:
+            shutil.rmtree(repo.temp_base)
+            shutil.rmtree(out_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_upload.py
+
+ Unit tests for streamed plugin uploads
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import io
+import os
+import shutil
+import tempfile
+import logging
+import zipfile
+
+try:
+    from .utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_plugin as _test_plugin, \
+        temp_repo as _temp_repo
+from qgis_repo.auth import LocalAuthBackend, PackageAuthorizer
+from qgis_repo.daemon import InotifyWatcher, WatchError
+from qgis_repo.server import create_app
+from qgis_repo.upload import LocalHeaderScanner, UploadError, \
+    UploadReceiver
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+def _zip_bytes(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zip_obj:
+        for name, data in members:
+            zip_obj.writestr(name, data)
+    return buf.getvalue()
+
+
+class _Stream(object):
+    """Body stream counting the bytes read from it"""
+
+    def __init__(self, data):
+        self._f = io.BytesIO(data)
+        self.read_bytes = 0
+
+    def read(self, size):
+        data = self._f.read(size)
+        self.read_bytes += len(data)
+        return data
+
+
+class TestUploadReceiver(unittest.TestCase):
+
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        with open(_test_plugin('test_plugin_1.zip'), 'rb') as f:
+            self.plugin = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.upload_dir)
+
+    def _receive(self, data, name='plugin.zip', max_size=10000000,
+                 chunk_size=1024):
+        receiver = UploadReceiver(self.upload_dir, name, max_size)
+        stream = _Stream(data)
+        try:
+            return receiver.receive(stream, chunk_size), stream
+        except UploadError as e:
+            receiver.close()
+            e.stream = stream
+            raise
+
+    def testScannerRejectsEarly(self):
+        scanner = LocalHeaderScanner()
+        with self.assertRaises(UploadError) as cm:
+            scanner.feed(b'GIF89a')
+        self.assertEqual(cm.exception.status, 415)
+
+        # unsafe member path, before its data arrives
+        data = _zip_bytes([('../evil.py', b'x' * 100000)])
+        scanner = LocalHeaderScanner()
+        with self.assertRaises(UploadError) as cm:
+            scanner.feed(data[:64])
+        self.assertEqual(cm.exception.status, 400)
+
+        # headers split across feeds
+        scanner = LocalHeaderScanner()
+        for i in range(0, len(self.plugin), 7):
+            scanner.feed(self.plugin[i:i + 7])
+        self.assertTrue(scanner.done)
+        with zipfile.ZipFile(io.BytesIO(self.plugin)) as zip_obj:
+            self.assertEqual(scanner.members, len(zip_obj.namelist()))
+
+    def testRejectedMidStream(self):
+        data = b'not a zip archive' * 10000
+        with self.assertRaises(UploadError) as cm:
+            self._receive(data)
+        self.assertEqual(cm.exception.status, 415)
+        self.assertEqual(cm.exception.stream.read_bytes, 1024)
+
+        with self.assertRaises(UploadError) as cm:
+            self._receive(self.plugin, max_size=2000)
+        self.assertEqual(cm.exception.status, 413)
+        self.assertLessEqual(cm.exception.stream.read_bytes, 3072)
+
+        with self.assertRaises(UploadError) as cm:
+            UploadReceiver(self.upload_dir, 'plugin.zip', 2000,
+                           content_length=len(self.plugin))
+        self.assertEqual(cm.exception.status, 413)
+
+        for name in ['../plugin.zip', '.plugin.zip', 'plugin.tar']:
+            with self.assertRaises(UploadError):
+                UploadReceiver(self.upload_dir, name, 2000)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def testRejectedLayout(self):
+        data = _zip_bytes([('plugin/__init__.py', b'')])
+        with self.assertRaises(UploadError) as cm:
+            self._receive(data)
+        self.assertIn('metadata.txt', str(cm.exception))
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def testQueued(self):
+        queued, _ = self._receive(self.plugin)
+        self.assertEqual(queued['size'], len(self.plugin))
+        self.assertEqual(os.listdir(self.upload_dir), ['plugin.zip'])
+        with open(os.path.join(self.upload_dir, 'plugin.zip'), 'rb') as f:
+            self.assertEqual(f.read(), self.plugin)
+        # still waiting to be ingested
+        with self.assertRaises(UploadError) as cm:
+            self._receive(self.plugin)
+        self.assertEqual(cm.exception.status, 409)
+
+    def testSpooledToPartFile(self):
+        receiver = UploadReceiver(self.upload_dir, 'plugin.zip', 10000000,
+                                  spool_size=1024)
+        receiver.feed(self.plugin[:1000])
+        self.assertEqual(os.listdir(self.upload_dir), [])
+        receiver.feed(self.plugin[1000:])
+        parts = os.listdir(self.upload_dir)
+        self.assertEqual(len(parts), 1)
+        self.assertTrue(parts[0].startswith('.plugin.zip.'))
+        ino = os.stat(os.path.join(self.upload_dir, parts[0])).st_ino
+        receiver.finish()
+        # the part file itself, not a copy
+        self.assertEqual(os.listdir(self.upload_dir), ['plugin.zip'])
+        self.assertEqual(
+            os.stat(os.path.join(self.upload_dir, 'plugin.zip')).st_ino, ino)
+
+    def testQueuedMeanwhile(self):
+        receiver = UploadReceiver(self.upload_dir, 'plugin.zip', 10000000,
+                                  spool_size=1024)
+        receiver.feed(self.plugin)
+        # another upload of the same name, queued first
+        with open(os.path.join(self.upload_dir, 'plugin.zip'), 'wb') as f:
+            f.write(b'first')
+        with self.assertRaises(UploadError) as cm:
+            receiver.finish()
+        self.assertEqual(cm.exception.status, 409)
+        self.assertEqual(os.listdir(self.upload_dir), ['plugin.zip'])
+        with open(os.path.join(self.upload_dir, 'plugin.zip'), 'rb') as f:
+            self.assertEqual(f.read(), b'first')
+
+    def testQueuedUploadsWatched(self):
+        try:
+            watcher = InotifyWatcher(self.upload_dir)
+        except WatchError as e:
+            self.skipTest(str(e))
+        try:
+            # in memory, then spooled to a part file
+            for name, spool_size in [('a.zip', 10000000), ('b.zip', 1024)]:
+                receiver = UploadReceiver(self.upload_dir, name, 10000000,
+                                          spool_size=spool_size)
+                receiver.receive(_Stream(self.plugin), 1024)
+            ready = []
+            while True:
+                names = watcher.wait(1.0)
+                if not names:
+                    break
+                ready.extend(names)
+            self.assertEqual(ready, ['a.zip', 'b.zip'])
+        finally:
+            watcher.close()
+
+
+class TestUploadServing(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo()
+        self.authorizer = PackageAuthorizer(LocalAuthBackend({
+            'uploader-token': ['Uploader'],
+            'basic-token': ['DesktopBasic'],
+        }))
+        with open(_test_plugin('test_plugin_2.zip'), 'rb') as f:
+            self.plugin = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.repo.temp_base)
+
+    def testFlaskUpload(self):
+        client = create_app(self.repo, authorizer=self.authorizer,
+                            upload_roles=['Uploader']).test_client()
+        url = '/upload/test_plugin_2.zip'
+        self.assertEqual(client.put(url, data=self.plugin).status_code, 401)
+        self.assertEqual(client.put(url, data=self.plugin, headers={
+            'Authorization': 'Bearer basic-token'}).status_code, 403)
+        self.repo.max_upload_size = 100
+        resp = client.put(url, data=self.plugin, headers={
+            'Authorization': 'Bearer uploader-token'})
+        self.assertEqual(resp.status_code, 413)
+        self.repo.max_upload_size = 1000000
+        resp = client.put(url, data=self.plugin, headers={
+            'Authorization': 'Bearer uploader-token'})
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.get_json()['name'], 'test_plugin_2.zip')
+
+        # queued, then ingested as any other upload
+        self.assertEqual(os.listdir(self.repo.upload_dir),
+                         ['test_plugin_2.zip'])
+        self.assertTrue(self.repo.update_plugin('test_plugin_2.zip'))
+
+        # not served unless enabled
+        client = create_app(self.repo,
+                            authorizer=self.authorizer).test_client()
+        self.assertEqual(client.put(url, data=self.plugin, headers={
+            'Authorization': 'Bearer uploader-token'}).status_code, 405)
+        with self.assertRaises(UploadError):
+            create_app(self.repo, upload_roles=[])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ test_wsgi.py
+
+ Unit tests for the multi-threaded WSGI server for a QGIS plugin repo
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import unittest
+import os
+import shutil
+import threading
+import logging
+import time
+import urllib.request
+
+try:
+    from .utilities import test_file as _test_file, \
+        test_plugin as _test_plugin, temp_repo as _temp_repo
+except ImportError:
+    from utilities import test_file as _test_file, \
+        test_plugin as _test_plugin, temp_repo as _temp_repo
+from qgis_repo.catalog import QgisPluginCatalog
+from qgis_repo.server import create_app
+from qgis_repo.wsgi import ThreadPoolWSGIServer, CatalogWatcher, \
+    _SendfileServerHandler
+
+if os.environ.get('DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
+
+log = logging.getLogger(__name__)
+
+
+class TestThreadPoolWSGIServer(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = _temp_repo()
+        shutil.copyfile(_test_file('plugins_test_find-sort.xml'),
+                        self.repo.plugins_xml)
+        self.zip_path = os.path.join(self.repo.packages_dir(),
+                                     'test_plugin_1.zip')
+        shutil.copyfile(_test_plugin('test_plugin_1.zip'), self.zip_path)
+        self.catalog = QgisPluginCatalog(self.repo.plugins_xml)
+        self.server = ThreadPoolWSGIServer(('127.0.0.1', 0), threads=2)
+        self.server.set_app(create_app(self.repo, self.catalog))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.base_url = 'http://127.0.0.1:{0}'.format(
+            self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.repo.temp_base)
+
+    def _get(self, path):
+        with urllib.request.urlopen(self.base_url + path) as resp:
+            return resp.status, resp.read()
+
+    def testServePackageWithSendfile(self):
+        calls = []
+        orig_sendfile = _SendfileServerHandler.sendfile
+
+        def _sendfile(handler):
+            # record before sending, since the client may finish reading
+            # before this server thread returns
+            calls.append(handler.headers.get('Content-Length') is not None)
+            return orig_sendfile(handler)
+
+        _SendfileServerHandler.sendfile = _sendfile
+        try:
+            status, data = self._get('/plugins/packages/test_plugin_1.zip')
+        finally:
+            _SendfileServerHandler.sendfile = orig_sendfile
+        self.assertEqual(status, 200)
+        with open(self.zip_path, 'rb') as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(calls, [True])
+
+    def testServeConcurrentXml(self):
+        results = []
+
+        def _fetch():
+            results.append(self._get('/plugins/plugins.xml?qgis=2.18')[0])
+
+        threads = [threading.Thread(target=_fetch) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [200] * 8)
+
+    def testCatalogWatcherReload(self):
+        watcher = CatalogWatcher(self.catalog, interval=0.05)
+        watcher.start()
+        try:
+            gen = self.catalog.generation
+            shutil.copyfile(_test_file('plugins_test.xml'),
+                            self.repo.plugins_xml)
+            for _ in range(40):
+                if self.catalog.generation > gen:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(self.catalog.generation, gen + 1)
+            self.assertEqual(len(self.catalog), 2)
+        finally:
+            watcher.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ utilities.py
+
+ Shared helpers for unit tests of a plugins.xml-based QGIS plugin repo
+                             -------------------
+        begin                : 2026-10-19
+        git sha              : $Format:%H$
+        copyright            : (C) 2026 by Planet Inc.
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import os
+import sys
+
+# temp_repo() is shared with the benchmarks, and imported from here by tests
+try:
+    from qgis_repo.testing import temp_repo
+except ImportError:
+    sys.path.insert(0,
+                    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from qgis_repo.testing import temp_repo
+
+
+def test_file(f):
+    return os.path.join(os.path.dirname(__file__), 'data', f)
+
+
+def test_plugin(p):
+    return os.path.join(os.path.dirname(__file__), 'data', 'plugins', p)
+
+
+# helpers, not tests, if this module is collected, e.g. 'pytest tests/*.py'
+test_file.__test__ = False
+test_plugin.__test__ = False